@@ -58,6 +58,10 @@ from strategies.key_time_weight_turning_point_strategy import KeyTimeWeightTurni
 from strategies.live.sandbox import SandboxExecutionEngine # <--- 取消注释这一行
 from strategies.risk_management.risk_manager import RiskManager # ADDED
 from strategies.core.strategy_base import StrategyBase # <--- 恢复这个
+from core.data_quality import DataQualityReport, analyze_bars, check_file_quality, timeframe_to_seconds
+from strategies.core.space_precompute import load_or_precompute_spaces
+from strategies.core.bar_context import BarContext
+from core.fast_logging import resolve_profile
 # SandboxExecutionEngine = Any # <--- 移除这一行对 Any 的赋值
 # RiskManagerBase = Any # <--- 移除这个
 
@@ -127,6 +131,8 @@ class BacktestEngine:
         self.data_granularity = OmegaConf.select(self.engine_params, 'data_granularity', default="M1")
         self.primary_timeframe = OmegaConf.select(self.engine_params, 'primary_timeframe', default="M30") # 策略主要运作的时间框架
         self.data_padding_days = OmegaConf.select(self.engine_params, 'data_padding_days', default=30)
+        # 按K线数换算预加载时间时的放大系数 (K线时间只覆盖交易时段，日历时间还包含夜间休市、周末和节假日)
+        self.lookback_gap_factor = OmegaConf.select(self.engine_params, 'lookback_gap_factor', default=2.0)
 
         # 从 backtest 节点获取其他回测参数
         self.initial_capital = self.backtest_params.get('initial_capital', 100000)
@@ -172,6 +178,10 @@ class BacktestEngine:
         self.equity_curve = pd.DataFrame(columns=['Equity']) # 存储资金曲线
         self.symbols_to_backtest = [] # 存储实际回测的品种 (可能在 _load_data 中根据 self.symbols 或自动检测填充)
         self.strategy_required_timeframes: List[str] = [] # 将由 _initialize_strategy 填充
+        self.strategy_data_requirements: Dict[str, Dict[str, Any]] = {} # {tf: {'columns': [...], 'lookback_bars': n}}，由 _initialize_strategy 填充
+        self.historical_data_cache: Dict[tuple, pd.DataFrame] = {} # {(symbol, tf): DataFrame}
+        self.all_market_data: Dict[str, Dict[str, pd.DataFrame]] = {} # {symbol: {tf: DataFrame}}，供主循环使用
+        self.downcast_float32 = bool(self.data_params.get('downcast_float32', False)) # 价格列是否以 float32 加载
 
         # initial_cash 已在上面通过 self.initial_capital 获取
         # self.initial_cash = OmegaConf.select(self.app_config, 'backtest.cash', default=100000)
@@ -187,32 +197,30 @@ class BacktestEngine:
         """加载历史数据"""
         return self._load_data()
 
-    def validate_data_quality(self, data: pd.DataFrame) -> bool:
-        """执行数据质量检查"""
+    def validate_data_quality(self, data: pd.DataFrame, timeframe: Optional[str] = None) -> bool:
+        """执行数据质量检查 (单次向量化扫描，见 core.data_quality)"""
         if isinstance(data, dict):
             data = pd.concat(data.values(), axis=1)
-        if data.empty:
-            self.logger.error("数据质量验证失败: DataFrame为空")
-            return False
+        report = analyze_bars(
+            data,
+            expected_interval_seconds=timeframe_to_seconds(timeframe),
+            gap_multiplier=self.data_params.get('quality_gap_multiplier', 100),
+            outlier_threshold=self.data_params.get('quality_outlier_threshold', 10.0)
+        )
+        return self._evaluate_quality_report(report, "loaded data" if timeframe is None else timeframe)
 
-        # 检查空值
-        null_counts = data.isnull().sum()
-        if null_counts.any():
-            self.logger.error(f"数据包含空值:\\n{null_counts}")
+    def _evaluate_quality_report(self, report: DataQualityReport, label: str) -> bool:
+        """根据质量报告输出日志并判断数据是否可用。"""
+        if report.is_empty:
+            self.logger.error(f"数据质量验证失败 ({label}): DataFrame为空")
             return False
-
-        # 检查重复数据
-        duplicates = data.duplicated().sum()
-        if duplicates > 0:
-            self.logger.error(f"发现{duplicates}条重复数据")
+        if report.has_errors:
+            self.logger.error(f"数据质量验证失败 ({label}): {report.summary()}")
             return False
-
-        # 检查时间序列连续性
-        time_diff = data.index.to_series().diff().dropna()
-        if (time_diff.value_counts().shape[0] > 1):
-            self.logger.warning("时间间隔不一致，可能存在数据缺口")
-
-        self.logger.info("数据质量检查通过")
+        if report.has_warnings:
+            self.logger.warning(f"数据质量警告 ({label}): {report.summary()}")
+        else:
+            self.logger.info(f"数据质量检查通过 ({label}): rows={report.rows}")
         return True
         # --------------------------------------------
 
@@ -239,40 +247,33 @@ class BacktestEngine:
             self.logger.error(f"数据质量检查失败 for {symbol} {timeframe}: DataFrame is None or empty.")
             return False
 
-        # 1. 检查空值 (简单示例：不允许 OHLC 有空值)
-        required_cols = ['open', 'high', 'low', 'close']
-        if df[required_cols].isnull().any().any():
-            self.logger.error(f"数据质量检查失败 for {symbol} {timeframe}: OHLC 包含空值。空值统计:\\n{df[required_cols].isnull().sum()}")
+        # 单次向量化扫描得到全部统计 (空值/OHLC合理性/单调性/缺口)
+        report = analyze_bars(
+            df,
+            expected_interval_seconds=timeframe_to_seconds(timeframe),
+            gap_multiplier=self.data_params.get('quality_gap_multiplier', 100),
+            outlier_threshold=self.data_params.get('quality_outlier_threshold', 10.0)
+        )
+
+        # 1. 检查空值 (不允许 OHLC 有空值)
+        if report.null_count > 0:
+            self.logger.error(f"数据质量检查失败 for {symbol} {timeframe}: OHLC 包含空值 ({report.null_count} 行)。")
             return False
-            
+
         # 1.1 检查OHLC价格合理性
-        invalid_ohlc = (
-            (df['high'] < df['low']) |
-            (df['open'] > df['high']) |
-            (df['open'] < df['low']) |
-            (df['close'] > df['high']) |
-            (df['close'] < df['low'])
-        )
-        if invalid_ohlc.any():
-            invalid_count = invalid_ohlc.sum()
-            self.logger.error(f"数据质量检查失败 for {symbol} {timeframe}: 发现{invalid_count}条无效OHLC记录(high<low或价格超出范围)。")
+        if report.invalid_ohlc_count > 0:
+            self.logger.error(f"数据质量检查失败 for {symbol} {timeframe}: 发现{report.invalid_ohlc_count}条无效OHLC记录(high<low或价格超出范围)。")
             return False
 
         # 2. 检查时间序列连续性
-        if not df.index.is_monotonic_increasing:
+        if report.non_monotonic_count > 0:
             self.logger.error(f"数据质量检查失败 for {symbol} {timeframe}: 时间戳非单调递增。")
             return False
-            
-        # 检查时间间隔是否符合预期
-        time_diffs = df.index.to_series().diff().dropna()
-        if not time_diffs.empty:
-            expected_interval = pd.Timedelta(minutes=int(timeframe[1:])) if timeframe.startswith('M') else pd.Timedelta(hours=1)
-            invalid_intervals = time_diffs[time_diffs > expected_interval * 100] # MODIFIED: from 1.5 to 100
-            if not invalid_intervals.empty:
-                gap_count = len(invalid_intervals)
-                max_gap = invalid_intervals.max().total_seconds() / 60
-                self.logger.error(f"数据质量检查失败 for {symbol} {timeframe}: 发现{gap_count}处时间间隔异常(最大间隔{max_gap:.1f}分钟)。")
-                return False
+
+        # 检查时间间隔是否符合预期 (超过预期间隔 quality_gap_multiplier 倍视为异常)
+        if report.gap_count > 0:
+            self.logger.error(f"数据质量检查失败 for {symbol} {timeframe}: 发现{report.gap_count}处时间间隔异常(最大间隔{report.max_gap_seconds / 60:.1f}分钟)。")
+            return False
 
         # 3. 检查数据量是否过少 (可选)
         min_records = self.data_params.get('min_records_for_quality_check', 50) # 从配置获取，默认50
@@ -306,8 +307,19 @@ class BacktestEngine:
             self.logger.error("无法加载数据: 数据提供器未初始化。")
             return False
 
+        if not hasattr(self, 'start_date_utc') or not hasattr(self, 'end_date_utc'):
+            self.start_date_utc = pd.Timestamp(self.start_date_str, tz='UTC')
+            self.end_date_utc = pd.Timestamp(self.end_date_str, tz='UTC')
+
         # 记录回测时间范围
         self.logger.info(f"回测时间范围: {self.start_date_utc} 至 {self.end_date_utc}")
+
+        # 只加载策略声明的时间框架/列；策略未声明时回退到引擎主时间框架并加载全部列
+        data_requirements = self.strategy_data_requirements or {
+            tf: {'columns': None, 'lookback_bars': None}
+            for tf in (self.strategy_required_timeframes or self.engine_requested_timeframes)
+        }
+        self.logger.info(f"按需加载时间框架: {list(data_requirements.keys())}, float32: {self.downcast_float32}")
         
         for symbol in self.symbols:
             # 增强日志: 记录尝试加载的货币对
@@ -317,11 +329,12 @@ class BacktestEngine:
             if hasattr(self.data_provider, 'data_path'):
                 self.logger.info(f"数据来源路径: {self.data_provider.data_path}")
             
-            for timeframe in self.engine_requested_timeframes:
+            for timeframe, tf_requirement in data_requirements.items():
                 # 增强日志: 记录正在加载的时间框架
                 self.logger.info(f"正在加载 {symbol} 的 {timeframe} 时间框架数据...")
                 
                 # 构建或获取数据文件路径（新增日志）
+                file_path = None
                 if hasattr(self.data_provider, '_get_hist_filepath'):
                     try:
                         file_path = self.data_provider._get_hist_filepath(symbol, timeframe)
@@ -331,11 +344,14 @@ class BacktestEngine:
                 
                 try:
                     # 加载历史数据
+                    padding = self._preload_padding(timeframe, tf_requirement.get('lookback_bars'))
                     historical_data = self.data_provider.get_historical_prices(
                         symbol=symbol,
                         timeframe=timeframe,
-                        start_date=self.start_date_utc - timedelta(days=self.config.get('data_provider', {}).get('data_padding_days', 0)),
-                        end_date=self.end_date_utc
+                        start_time=self.start_date_utc - padding,
+                        end_time=self.end_date_utc,
+                        columns=tf_requirement.get('columns'),
+                        downcast_float32=self.downcast_float32
                     )
                     
                     # 增强日志: 检查和记录返回的数据情况
@@ -359,34 +375,58 @@ class BacktestEngine:
                     if data_end < self.end_date_utc:
                         self.logger.warning(f"注意: {symbol} 的 {timeframe} 数据结束时间 ({data_end}) 早于请求的结束时间 ({self.end_date_utc}).")
                     
-                    # 验证数据质量
-                    if not self.validate_data_quality(historical_data):
-                        self.logger.error(f"{symbol} 的 {timeframe} 数据质量验证失败，可能影响回测结果。")
+                    # 验证数据质量: 优先使用按文件指纹缓存的整文件报告，文件未变化时无需重新扫描；
+                    # 缓存未命中时分析整个文件一次并缓存 (加载的数据已覆盖整个文件时直接分析它)。
+                    # 整文件报告无错误时，其中任意区间也没有空值，可跳过前向填充
+                    file_report = None
+                    if file_path is not None and Path(file_path).exists():
+                        file_report = check_file_quality(
+                            file_path,
+                            expected_interval_seconds=timeframe_to_seconds(timeframe),
+                            gap_multiplier=self.data_params.get('quality_gap_multiplier', 100),
+                            outlier_threshold=self.data_params.get('quality_outlier_threshold', 10.0),
+                            df=historical_data
+                        )
+                    if file_report is not None and not file_report.has_errors:
+                        if file_report.has_warnings:
+                            self.logger.warning(f"{symbol} 的 {timeframe} 数据文件质量警告: {file_report.summary()}")
+                        has_nulls = False
+                    else:
+                        if not self.validate_data_quality(historical_data, timeframe):
+                            self.logger.error(f"{symbol} 的 {timeframe} 数据质量验证失败，可能影响回测结果。")
+                        has_nulls = True
                     
                     # 记录数据缓存
                     self.historical_data_cache[(symbol, timeframe)] = historical_data
                     self.logger.debug(f"已将 {symbol} 的 {timeframe} 数据添加到缓存。")
                     
-                    # 验证关键字段是否存在
-                    required_columns = ['open', 'high', 'low', 'close', 'volume']
-                    missing_columns = [col for col in required_columns if col not in historical_data.columns]
+                    # 验证关键字段是否存在 (策略声明的列中不含成交量时不加载 volume，也不要求该列)
+                    required_columns = ['open', 'high', 'low', 'close']
+                    declared_columns = tf_requirement.get('columns')
+                    if not declared_columns or {c.lower() for c in declared_columns} & {'volume', 'tick_volume'}:
+                        required_columns.append('volume')
+                    missing_columns = [col for col in required_columns if col not in historical_data.columns
+                                       and not (col == 'volume' and 'tick_volume' in historical_data.columns)]
                     if missing_columns:
                         self.logger.error(f"{symbol} 的 {timeframe} 数据缺少必要字段: {missing_columns}")
                         return False
                     
-                    # 验证close字段的完整性
-                    if historical_data['close'].isnull().any():
-                        self.logger.warning(f"{symbol} 的 {timeframe} 数据中 'close' 字段存在空值，将使用前向填充处理。")
-                        historical_data['close'].fillna(method='ffill', inplace=True)
-                    
-                    # 验证high、low、open、close字段的完整性
-                    for col in ['high', 'low', 'open', 'close']:
-                        if historical_data[col].isnull().any():
-                            self.logger.warning(f"{symbol} 的 {timeframe} 数据中 '{col}' 字段存在空值，将使用前向填充处理。")
-                            historical_data[col].fillna(method='ffill', inplace=True)
+                    # 验证high、low、open、close字段的完整性 (质量报告确认无空值时跳过)
+                    if has_nulls:
+                        ohlc_cols = ['high', 'low', 'open', 'close']
+                        null_cols = [col for col in ohlc_cols if historical_data[col].isnull().any()]
+                        if null_cols:
+                            self.logger.warning(f"{symbol} 的 {timeframe} 数据中 {null_cols} 字段存在空值，将使用前向填充处理。")
+                            historical_data[null_cols] = historical_data[null_cols].ffill()
                     
                     # 更新缓存中的数据
                     self.historical_data_cache[(symbol, timeframe)] = historical_data
+                    self.all_market_data.setdefault(symbol, {})[timeframe] = historical_data
+                    # 注册到数据提供器的内存窗口缓存，策略通过 get_window 按二分查找取K线
+                    if hasattr(self.data_provider, 'register_bars'):
+                        self.data_provider.register_bars(symbol, timeframe, historical_data)
+                    if hasattr(self.data_provider, 'indicators'):
+                        self.data_provider.indicators.reset(symbol, timeframe) # 数据重新加载后指标从头送入
                     
                 except Exception as e:
                     self.logger.error(f"加载 {symbol} 的 {timeframe} 数据时发生错误: {e}", exc_info=True)
@@ -395,6 +435,45 @@ class BacktestEngine:
         self.logger.info("历史数据加载完成。")
         return True
 
+    def _preload_padding(self, timeframe: str, lookback_bars: Optional[int]) -> timedelta:
+        """
+        回测开始前预加载的时间长度。data_padding_days 是下限；策略声明了 lookback_bars 时，
+        K线时间乘以 lookback_gap_factor 并加上一个周末 (3 天，含周五收盘后和节假日)，
+        保证跨越周末或休市后仍有足够的K线。
+        """
+        padding = timedelta(days=self.data_padding_days)
+        interval_seconds = timeframe_to_seconds(timeframe)
+        if lookback_bars and interval_seconds:
+            bars_time = timedelta(seconds=int(lookback_bars) * interval_seconds)
+            padding = max(padding, bars_time * self.lookback_gap_factor + timedelta(days=3))
+        return padding
+
+    def _attach_precomputed_spaces(self):
+        """
+        为支持预计算空间的策略 (EventDrivenSpaceStrategy 系列) 加载或计算整个回测区间的事件空间表。
+        由 backtest.precompute_spaces.enabled 控制；失败时策略回退到逐步构建空间。
+        """
+        cfg = OmegaConf.select(self.app_config, "backtest.precompute_spaces", default=None)
+        if cfg is None or not cfg.get('enabled', False) or not hasattr(self.strategy, 'attach_precomputed_spaces'):
+            return
+        if self.all_events_df is None or self.all_events_df.empty or 'timestamp' not in self.all_events_df.columns:
+            return
+        events = self.all_events_df
+        if 'datetime' not in events.columns:
+            events = events.assign(datetime=events['timestamp'])
+        primary_tf = self.strategy.primary_timeframe
+        bars_by_symbol = {symbol: tfs[primary_tf] for symbol, tfs in self.all_market_data.items() if primary_tf in tfs}
+        cache_dir = Path(cfg.get('cache_dir', 'backtesting/cache/spaces'))
+        if not cache_dir.is_absolute():
+            cache_dir = self.project_root / cache_dir
+        try:
+            start = time.perf_counter()
+            precomputed = load_or_precompute_spaces(self.strategy, events, bars_by_symbol, cache_dir)
+            if self.strategy.attach_precomputed_spaces(precomputed):
+                self.logger.info(f"已启用预计算空间表: {len(precomputed)} 个空间, {len(precomputed.event_keys)} 个事件, 耗时 {time.perf_counter() - start:.3f} 秒。")
+        except Exception as e:
+            self.logger.warning(f"事件空间预计算失败，策略将逐步构建空间: {e}", exc_info=True)
+
     def _find_strategy_module(self, strategy_class_name: str) -> Optional[str]:
         """
         将策略类名映射到模块名（文件名）
@@ -538,6 +617,10 @@ class BacktestEngine:
             else:
                 self.logger.warning(f"Strategy '{self.strategy_name}' does not have 'get_required_timeframes' method. Defaulting to engine's primary_timeframe: {self.engine_requested_timeframes}")
                 self.strategy_required_timeframes = self.engine_requested_timeframes # Fallback
+            # 获取策略声明的数据需求 (时间框架 -> 列/回看深度)，用于按需加载
+            if hasattr(self.strategy, 'get_data_requirements') and callable(self.strategy.get_data_requirements):
+                self.strategy_data_requirements = self.strategy.get_data_requirements()
+                self.logger.info(f"Strategy '{self.strategy_name}' data requirements: {self.strategy_data_requirements}")
         except TypeError as e:
             self.logger.error(f"Error initializing strategy '{strategy_name_to_load}' due to TypeError: {e}. Check constructor signature and parameters.")
             # return False # OLD
@@ -689,7 +772,7 @@ class BacktestEngine:
                 risk_manager=self.risk_manager,
                 live_mode=False                # For backtesting
             )
-            logger.info(f"策略 '{strategy_name_to_load}' 初始化成功。")
+            logger.info(f"策略 '{strategy_name_to_load}' 初始化成功。日志配置档: {resolve_profile(self.app_config)}")
             return True
         except Exception as e:
             logger.error(f"初始化策略 {strategy_name_to_load} 时出错: {e}", exc_info=True)
@@ -821,6 +904,9 @@ class BacktestEngine:
             # For now, run_single_backtest might still misinterpret this if it doesn't check return value properly.
             raise RuntimeError("Data loading failed, cannot continue backtest.") # Changed to raise
         
+        # 6. 事件空间预计算 (空间与交易参数无关，参数扫描中各次回测共用缓存的空间表)
+        self._attach_precomputed_spaces()
+
         # 如果所有初始化都成功 (即没有异常被抛出并导致提前退出)
         logger.info(f"使用策略: {self.strategy.get_name()}")
         logger.info(f"回测品种: {self.symbols_to_backtest}")
@@ -863,6 +949,9 @@ class BacktestEngine:
                              relevant_bars = df.loc[:current_time_utc_loop]
                              if not relevant_bars.empty:
                                   current_market_data[symbol][tf] = relevant_bars
+                                  # 增量指标只处理本时间点新收盘的K线
+                                  if hasattr(self.data_provider, 'update_indicators'):
+                                      self.data_provider.update_indicators(symbol, tf, relevant_bars)
 
                 events_df_for_strategy = None
                 # Corrected OmegaConf.get usage and string literal for timeframe
@@ -889,6 +978,10 @@ class BacktestEngine:
                      else: # if events_now_slice was empty
                          events_df_for_strategy = pd.DataFrame() # Assign an empty DataFrame
 
+                # 每个时间点创建一次共享上下文，策略及其组合的子策略复用同一份窗口和指标
+                if hasattr(self.strategy, 'bind_bar_context'):
+                    self.strategy.bind_bar_context(BarContext(current_time_utc_loop, self.data_provider, current_market_data))
+
                 # Strategy core logic call
                 self.strategy.process_new_data(current_time_utc_loop, current_market_data, events_df_for_strategy)
                 
@@ -1,6 +1,75 @@
+import threading
+import time
+
+import numpy as np
 import pytest
 from omegaconf import OmegaConf
 
+RATE_DTYPE = [('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+              ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')]
+
+
+class FakeMT5:
+    """
+    MetaTrader5 模块的替身: 按 timeframe (分钟数) 生成连续K线。
+    copy_rates_from_pos 以 self.now 所在K线为最新K线，收盘价为 self.close；
+    copy_rates_range 返回区间内的K线。记录每次调用 (方法, 品种, 周期, 线程名) 和同时进行的请求数峰值，
+    delay 秒模拟终端响应时间。
+    """
+
+    def __init__(self, now=1_700_000_000, delay=0.0):
+        self.now = now
+        self.close = 1.1
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _rates(self, times):
+        rates = np.zeros(len(times), dtype=RATE_DTYPE)
+        rates['time'] = times
+        rates['open'] = 1.1
+        rates['close'] = self.close
+        rates['high'] = max(1.1002, self.close)
+        rates['low'] = 1.0998
+        rates['tick_volume'] = 10
+        return rates
+
+    def _call(self, method, symbol, timeframe, make_rates):
+        with self._lock:
+            self.calls.append((method, symbol, timeframe, threading.current_thread().name))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            return make_rates()
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        step = timeframe * 60
+        last = self.now // step * step
+        return self._call('copy_rates_from_pos', symbol, timeframe,
+                          lambda: self._rates(last - step * np.arange(count - 1, -1, -1)))
+
+    def copy_rates_range(self, symbol, timeframe, start, end):
+        step = timeframe * 60
+        first = -(-int(start.timestamp()) // step) * step
+        return self._call('copy_rates_range', symbol, timeframe,
+                          lambda: self._rates(np.arange(first, int(end.timestamp()) + 1, step, dtype=np.int64)))
+
+    def last_error(self):
+        return (0, 'ok')
+
+
+@pytest.fixture
+def fake_mt5():
+    return FakeMT5()
+
+
 @pytest.fixture(scope="session")
 def base_config():
     return OmegaConf.create({
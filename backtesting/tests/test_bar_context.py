@@ -0,0 +1,72 @@
+import pandas as pd
+from omegaconf import OmegaConf
+
+from strategies.core.bar_context import BarContext
+from strategies.event_driven_space_strategy import EventDrivenSpaceStrategy
+from strategies.exhaustion_strategy import ExhaustionStrategy
+
+T0 = pd.Timestamp('2024-01-02 10:00', tz='UTC')
+
+
+class CountingProvider:
+    def __init__(self):
+        index = pd.date_range(T0 - pd.Timedelta(minutes=30 * 49), T0, freq='30min')
+        self.bars = pd.DataFrame({'open': 1.1, 'high': 1.2, 'low': 1.0, 'close': 1.1}, index=index)
+        self.calls = []
+
+    def get_window(self, symbol, timeframe, end_time, n_bars):
+        self.calls.append(('window', n_bars))
+        return self.bars.loc[:end_time].tail(n_bars)
+
+    def get_indicator(self, symbol, timeframe, name, as_of=None, **params):
+        self.calls.append(('indicator', name))
+        return 1.2
+
+
+def test_window_and_indicator_memoised_per_bar():
+    provider = CountingProvider()
+    context = BarContext(T0, provider)
+    assert len(context.window('EURUSD', 'M30', T0, 20)) == 20
+    # 同一结束时间的较短请求取尾部切片，不再请求数据提供者
+    short = context.window('EURUSD', 'M30', T0, 5)
+    assert list(short.index) == list(provider.bars.index[-5:])
+    assert context.indicator('EURUSD', 'M30', 'rolling_high', as_of=T0, period=10) == 1.2
+    assert context.indicator('EURUSD', 'M30', 'rolling_high', as_of=T0, period=10) == 1.2
+    assert provider.calls == [('window', 20), ('indicator', 'rolling_high')]
+    # 更长的窗口重新请求一次
+    assert len(context.window('EURUSD', 'M30', T0, 30)) == 30
+    assert provider.calls[-1] == ('window', 30)
+
+
+def test_composed_checker_shares_parent_context():
+    provider = CountingProvider()
+    parent = EventDrivenSpaceStrategy('EventDrivenSpaceStrategy', OmegaConf.create({}), provider, None, None)
+    parent._ex_checker = ExhaustionStrategy('ExhaustionStrategy', OmegaConf.create({}), provider, None, None)
+
+    context = parent._ensure_bar_context(T0)
+    assert parent._ex_checker.bar_context is context
+    parent._get_window('EURUSD', 'M30', T0, 10)
+    parent._ex_checker._get_window('EURUSD', 'M30', T0, 10)
+    assert parent._ex_checker._rolling_extreme('EURUSD', 'high', provider.bars, T0) == 1.2
+    assert parent._get_indicator('EURUSD', 'M30', 'rolling_high', as_of=T0,
+                                 period=parent._ex_checker.exhaustion_lookback) == 1.2
+    assert provider.calls == [('window', 10), ('indicator', 'rolling_high')]
+
+    # 下一根K线使用新的上下文
+    assert parent._ensure_bar_context(T0 + pd.Timedelta(minutes=30)) is not context
+
+
+def test_reassigned_child_strategy_bound_on_next_bar():
+    provider = CountingProvider()
+    parent = EventDrivenSpaceStrategy('EventDrivenSpaceStrategy', OmegaConf.create({}), provider, None, None)
+    first = ExhaustionStrategy('ExhaustionStrategy', OmegaConf.create({}), provider, None, None)
+    parent._ex_checker = first
+    assert parent.child_strategies() == [first]
+    assert parent._ensure_bar_context(T0) is first.bar_context
+
+    second = ExhaustionStrategy('ExhaustionStrategy', OmegaConf.create({}), provider, None, None)
+    parent._ex_checker = second
+    context = parent._ensure_bar_context(T0 + pd.Timedelta(minutes=30))
+    assert second.bar_context is context and first.bar_context is not context
+    parent._ex_checker = None
+    assert parent.child_strategies() == []
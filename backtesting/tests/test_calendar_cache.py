@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+from omegaconf import OmegaConf
+
+from strategies.core import data_providers
+from strategies.core.data_providers import EconomicCalendarProvider
+
+
+def test_filtered_events_cached_until_file_changes(tmp_path, monkeypatch):
+    loads = []
+
+    def fake_load_input_file(path, **kwargs):
+        loads.append(path)
+        return pd.read_csv(path)
+
+    monkeypatch.setattr(data_providers, 'load_input_file', fake_load_input_file)
+    config = OmegaConf.create({'paths': {'data_dir': str(tmp_path)}})
+    provider = EconomicCalendarProvider(config)
+    live_path = tmp_path / 'calendar' / 'filtered' / 'live' / 'filtered_realtime.csv'
+    live_path.parent.mkdir(parents=True)
+
+    now_sh = pd.Timestamp.now(tz='Asia/Shanghai').tz_localize(None).floor('min')
+    rows = [(now_sh + pd.Timedelta(hours=h)).strftime('%Y-%m-%d %H:%M:%S') for h in (5, -2, 1, 30)]
+    pd.DataFrame({'datetime': rows, 'event': ['e5', 'e-2', 'e1', 'e30']}).to_csv(live_path, index=False)
+
+    first = provider.get_filtered_events(live=True)
+    assert str(first['datetime'].dt.tz) == 'UTC'
+    first['extra'] = 1 # 调用方修改不影响缓存
+    first.loc[first.index[0], 'event'] = 'changed'
+    second = provider.get_filtered_events(live=True)
+    assert 'extra' not in second.columns
+    assert list(second['event']) == ['e5', 'e-2', 'e1', 'e30']
+    assert len(loads) == 1
+
+    upcoming = provider.get_upcoming_events('24h')
+    assert list(upcoming['event']) == ['e1', 'e5']
+    assert len(loads) == 1
+
+    # 日历流程重写文件后重新加载
+    pd.DataFrame({'datetime': rows[:1], 'event': ['only']}).to_csv(live_path, index=False)
+    stat = os.stat(live_path)
+    os.utime(live_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert list(provider.get_filtered_events(live=True)['event']) == ['only']
+    assert len(loads) == 2
+
+
+def test_upcoming_events_use_injected_clock(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_providers, 'load_input_file', lambda path, **kwargs: pd.read_csv(path))
+    config = OmegaConf.create({'paths': {'data_dir': str(tmp_path)}})
+    clock = {'now': pd.Timestamp('2024-03-01 00:00', tz='UTC')}
+    provider = EconomicCalendarProvider(config, clock=lambda: clock['now'])
+    live_path = tmp_path / 'calendar' / 'filtered' / 'live' / 'filtered_realtime.csv'
+    live_path.parent.mkdir(parents=True)
+    # 北京时间 naive: 分别为 UTC 2024-03-01 02:00 和 2024-03-02 02:00
+    pd.DataFrame({'datetime': ['2024-03-01 10:00:00', '2024-03-02 10:00:00'],
+                  'event': ['a', 'b']}).to_csv(live_path, index=False)
+
+    assert list(provider.get_upcoming_events('24h')['event']) == ['a']
+    clock['now'] = pd.Timestamp('2024-03-01 12:00', tz='UTC')
+    assert list(provider.get_upcoming_events('24h')['event']) == ['b']
+    provider.set_clock(None) # 恢复系统时间: 2024 年的事件均已过去
+    upcoming = provider.get_upcoming_events('24h')
+    assert upcoming is None or upcoming.empty
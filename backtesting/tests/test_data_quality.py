@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.data_quality import analyze_bars, check_file_quality, quality_report_path
+
+
+@pytest.fixture
+def m30_bars():
+    times = pd.date_range('2024-01-01', periods=200, freq='30min', tz='UTC')
+    close = 1.1 + np.cumsum(np.full(200, 1e-5))
+    return pd.DataFrame({'open': close, 'high': close + 2e-4, 'low': close - 2e-4, 'close': close}, index=times)
+
+
+def _write_csv(df: pd.DataFrame, path):
+    out = df.reset_index(names='time')
+    out['time'] = out['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    out.to_csv(path, index=False, float_format='%.5f')
+
+
+def test_analyze_bars_detects_issues(m30_bars):
+    df = m30_bars.drop(m30_bars.index[50:60])
+    df.iloc[3, df.columns.get_loc('high')] = df.iloc[3]['low']
+    df = pd.concat([df, df.iloc[[-1]]])
+
+    report = analyze_bars(df, expected_interval_seconds=1800)
+
+    assert report.gap_count == 1
+    assert report.max_gap_seconds == 11 * 1800
+    assert report.duplicate_count == 1
+    assert report.non_monotonic_count == 0
+    assert report.zero_range_count == 1
+    assert report.invalid_ohlc_count == 1
+    assert report.has_errors
+
+
+def test_check_file_quality_uses_cache(m30_bars, tmp_path):
+    csv_path = tmp_path / 'EURUSD_m30.csv'
+    _write_csv(m30_bars, csv_path)
+
+    first = check_file_quality(csv_path, expected_interval_seconds=1800)
+    assert quality_report_path(csv_path).exists()
+    assert first.rows == 200 and not first.has_errors
+    assert first.fingerprint['last_timestamp'] == '2024-01-05 03:30:00'
+
+    second = check_file_quality(csv_path, expected_interval_seconds=1800)
+    assert second.to_dict() == first.to_dict()
+
+    _write_csv(m30_bars.iloc[::-1], csv_path)
+    third = check_file_quality(csv_path, expected_interval_seconds=1800)
+    assert third.non_monotonic_count == 199
+
+
+def test_check_file_quality_reuses_loaded_frame(m30_bars, tmp_path, monkeypatch):
+    csv_path = tmp_path / 'EURUSD_m30.csv'
+    _write_csv(m30_bars, csv_path)
+
+    def fail_read(*args, **kwargs):
+        raise AssertionError("文件不应被再次读取")
+    monkeypatch.setattr(pd, 'read_csv', fail_read)
+
+    # 覆盖整个文件: 直接分析传入的数据并写入缓存，之后不传 df 也命中缓存
+    full = check_file_quality(csv_path, expected_interval_seconds=1800, df=m30_bars)
+    assert full.rows == 200 and quality_report_path(csv_path).exists()
+    assert check_file_quality(csv_path, expected_interval_seconds=1800).to_dict() == full.to_dict()
+
+
+def test_check_file_quality_date_ranged_load_caches_file_report(m30_bars, tmp_path, monkeypatch):
+    csv_path = tmp_path / 'EURUSD_m30.csv'
+    bars = m30_bars.copy()
+    bars.iloc[10, bars.columns.get_loc('close')] = np.nan # 空值在加载区间之外
+    _write_csv(bars, csv_path)
+
+    # 按日期区间加载的部分数据: 分析整个文件一次并缓存，报告反映区间外的空值
+    ranged = check_file_quality(csv_path, expected_interval_seconds=1800, df=bars.iloc[50:])
+    assert ranged.rows == 200 and ranged.null_count == 1 and ranged.has_errors
+    assert quality_report_path(csv_path).exists()
+
+    def fail_read(*args, **kwargs):
+        raise AssertionError("缓存命中时不应读取文件")
+    monkeypatch.setattr(pd, 'read_csv', fail_read)
+    again = check_file_quality(csv_path, expected_interval_seconds=1800, df=bars.iloc[100:150])
+    assert again.to_dict() == ranged.to_dict()
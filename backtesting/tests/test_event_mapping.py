@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import yaml
+
+from strategies.core.event_mapping import EventMappingIndex, compile_condition, evaluate_condition
+
+RULES_PATH = Path(__file__).resolve().parents[2] / 'config' / 'event_mapping.yaml'
+
+
+def test_configured_rules_map_events():
+    rules = yaml.safe_load(RULES_PATH.read_text(encoding='utf-8'))['event_mappings']
+    index = EventMappingIndex(rules)
+
+    nfp = {'id': 1, 'title': 'Non-Farm Payrolls', 'country_code': 'us', 'actual': '250K', 'forecast': '180K', 'previous': None}
+    mapped = index.map_event(nfp)
+    assert [(m['symbol'], m['suggested_direction'], m['rule_id']) for m in mapped] == [
+        ('XAUUSD', 'SELL', 'us_nfp'), ('EURUSD', 'SELL', 'us_nfp'), ('USDJPY', 'BUY', 'us_nfp')]
+
+    # 同一关键词在不同国家只匹配本国规则；缺少所需数值时结果为 bad
+    ecb = index.map_event({'id': 2, 'title': 'ECB Interest Rate Decision', 'country_code': 'EA', 'actual': float('nan'), 'previous': 4.5})
+    assert {m['rule_id'] for m in ecb} == {'ea_interest_rate_decision'}
+    assert all(m['base_currency_outcome'] == 'bad' for m in ecb)
+
+    assert index.map_event({'id': 3, 'title': 'Retail Sales', 'country_code': 'US'}) == []
+    # 缓存返回副本
+    index.map_event(nfp)[0]['symbol'] = 'CHANGED'
+    assert index.map_event(nfp)[0]['symbol'] == 'XAUUSD'
+
+
+def test_overlapping_keywords_and_conditions():
+    rules = [
+        {'id': 'long', 'country_codes': ['US'], 'title_keywords': ['CPI m/m'], 'outcome_is_good_condition': 'A > F',
+         'symbols_and_reactions': [{'symbol': 'EURUSD', 'direction_if_good': 'SELL', 'direction_if_bad': 'BUY'}]},
+        {'id': 'short', 'country_codes': ['US'], 'title_keywords': ['CPI'], 'outcome_is_good_condition': 'A <= 2.5',
+         'symbols_and_reactions': [{'symbol': 'XAUUSD', 'direction_if_good': 'BUY', 'direction_if_bad': 'HOLD'}]},
+    ]
+    mapped = EventMappingIndex(rules).map_event({'title': 'Core CPI m/m', 'country_code': 'US', 'actual': '0.4%', 'forecast': '0.3%'})
+    assert [(m['rule_id'], m['suggested_direction']) for m in mapped] == [('long', 'SELL'), ('short', 'BUY')]
+
+    assert compile_condition('A >> F') is None
+    assert evaluate_condition(compile_condition('p != A'), '1,200', None, 1200.0) is False
+
+
+def test_batch_event_processing_creates_spaces_per_symbol():
+    import numpy as np
+    import pandas as pd
+    from omegaconf import OmegaConf
+
+    from strategies.event_driven_space_strategy import EventDrivenSpaceStrategy
+
+    strategy = EventDrivenSpaceStrategy('EventDrivenSpaceStrategy', OmegaConf.create({}), None, None, None)
+    strategy.event_mapping_rules = yaml.safe_load(RULES_PATH.read_text(encoding='utf-8'))['event_mappings']
+    index = pd.date_range('2024-01-05 10:00', periods=10, freq='30min')
+    m30 = pd.DataFrame({'high': 1.102 + np.arange(10) * 1e-4, 'low': 1.1, 'close': 1.101}, index=index)
+    events = pd.DataFrame({'id': ['nfp', 'nfp_rev'], 'title': ['Non-Farm Payrolls', 'NFP'], 'country_code': ['US', 'US'],
+                           'datetime': ['2024-01-05 13:30', '2024-01-05 10:45+00:00'],
+                           'actual': ['250K', '100K'], 'forecast': ['180K', '180K']})
+
+    strategy._process_events(events, {'EURUSD': {'M30': m30}}, pd.Timestamp('2024-01-05 14:00', tz='UTC'))
+
+    spaces = strategy.active_spaces['EURUSD']
+    assert [(s['event_id'], s['initial_pulse_end_time']) for s in spaces] == [
+        ('nfp', pd.Timestamp('2024-01-05 13:30', tz='UTC')), ('nfp_rev', pd.Timestamp('2024-01-05 10:30', tz='UTC'))]
+    assert spaces[0]['space_high'] == m30['high'].iloc[7] and spaces[0]['status'] == 'active'
+    assert set(strategy.active_spaces) == {'EURUSD'} # 没有M30数据的品种不创建空间
@@ -0,0 +1,31 @@
+import logging
+
+from omegaconf import OmegaConf
+
+from core.fast_logging import FastLogger, as_fast_logger, resolve_profile
+
+
+def test_profile_sets_level_and_skips_lazy_messages():
+    log = FastLogger(logging.getLogger('test_fast_logging.silent'), 'silent')
+    assert not log.debug_enabled and not log.info_enabled
+    calls = []
+    log.debug(lambda: calls.append('built') or 'message')
+    assert calls == []
+
+    log.set_profile('verbose')
+    assert log.debug_enabled
+    log.debug(lambda: calls.append('built') or 'message')
+    assert calls == ['built']
+
+
+def test_resolve_profile():
+    assert resolve_profile(OmegaConf.create({'logging': {'profile': 'Silent'}})) == 'silent'
+    assert resolve_profile(OmegaConf.create({'logging': {'profile': 'unknown'}})) == 'verbose'
+    assert resolve_profile(None) == 'verbose'
+
+
+def test_sampling_and_throttle():
+    log = FastLogger(logging.getLogger('test_fast_logging.sampling'), sample_every=3)
+    assert [log.sampled('k') for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert log.throttle('t', 60) and not log.throttle('t', 60)
+    assert as_fast_logger(log) is log
@@ -0,0 +1,213 @@
+import threading
+import time
+import types
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+from omegaconf import OmegaConf
+
+import market_price_data.history as history
+from backtesting.tests.conftest import RATE_DTYPE
+
+
+@pytest.fixture
+def updater(tmp_path, monkeypatch, fake_mt5):
+    fake = fake_mt5
+    start_date = (datetime.now(timezone.utc) - timedelta(days=3)).strftime('%Y-%m-%d')
+    config = OmegaConf.create({
+        'paths': {'data_dir': str(tmp_path)},
+        'logging': {},
+        'execution': {'mt5': {'login': 1}},
+        'historical': {
+            'enabled': True, 'symbols': ['EURUSD', 'GBPUSD'], 'timeframes': ['M30', 'H1'],
+            'start_date': start_date, 'batch_size_days': 1, 'delay_between_requests_ms': 0,
+            'pipeline_workers': 2,
+        },
+    })
+    monkeypatch.setattr(history, 'MT5_AVAILABLE', True)
+    monkeypatch.setattr(history, 'mt5', fake)
+    monkeypatch.setattr(history, 'load_app_config', lambda *_: config)
+    monkeypatch.setattr(history, 'setup_logging', lambda *_, **__: history.logging.getLogger('test_history'))
+    monkeypatch.setattr(history, 'parse_timeframes', lambda *_: {'M30': 30, 'H1': 60})
+    monkeypatch.setattr(history, 'initialize_mt5', lambda *_: True)
+    monkeypatch.setattr(history, 'shutdown_mt5', lambda *_: None)
+    updater = history.HistoryUpdater()
+    updater.fake_mt5 = fake
+    return updater
+
+
+def test_run_update_cycle_pipeline(updater, tmp_path):
+    # MT5 请求和文件处理都放慢，使并发 (如果存在) 能被观测到
+    fake = updater.fake_mt5
+    fake.delay = 0.01
+    process_stage = updater._process_stage
+    lock = threading.Lock()
+    processing = {'active': 0, 'peak': 0, 'fetches_during_processing': 0}
+
+    def slow_process_stage(job):
+        with lock:
+            processing['active'] += 1
+            processing['peak'] = max(processing['peak'], processing['active'])
+        try:
+            time.sleep(0.1)
+            return process_stage(job)
+        finally:
+            with lock:
+                processing['active'] -= 1
+
+    def copy_rates_range(*args, _original=fake.copy_rates_range):
+        with lock:
+            processing['fetches_during_processing'] += processing['active'] > 0
+        return _original(*args)
+
+    updater._process_stage = slow_process_stage
+    fake.copy_rates_range = copy_rates_range
+    updater.run_update_cycle()
+
+    assert len(fake.calls) >= 4 * 3
+    # MT5 请求串行且都在同一线程；文件处理在 pipeline_workers 个线程上并行，并与后续请求重叠
+    assert fake.max_active == 1
+    assert len({thread for *_, thread in fake.calls}) == 1
+    assert processing['peak'] == updater.pipeline_workers == 2
+    assert processing['fetches_during_processing'] > 0
+    fake.delay = 0.0
+    for symbol in ('EURUSD', 'GBPUSD'):
+        for tf, minutes in (('m30', 30), ('h1', 60)):
+            df = pd.read_csv(tmp_path / 'historical' / symbol / f'{symbol}_{tf}.csv')
+            times = pd.to_datetime(df['time'])
+            assert len(df) > 0 and times.is_unique and times.is_monotonic_increasing
+            assert (times.diff().dropna() == pd.Timedelta(minutes=minutes)).all()
+
+    # 第二个周期从末根K线增量更新，不应产生重复行
+    before = len(pd.read_csv(tmp_path / 'historical' / 'EURUSD' / 'EURUSD_m30.csv'))
+    updater.run_update_cycle()
+    after = pd.read_csv(tmp_path / 'historical' / 'EURUSD' / 'EURUSD_m30.csv')
+    assert after['time'].is_unique and before <= len(after) <= before + 1
+
+
+def _bars(start, count, close=1.1):
+    times = pd.date_range(start, periods=count, freq='30min', tz='UTC')
+    return pd.DataFrame({'time': times, 'open': 1.1, 'high': 1.2, 'low': 1.0, 'close': close, 'volume': 10.0})
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'EURUSD_m30.csv'
+    path.write_text('time,open,high,low,close,volume\n'
+                    '2024-01-02 00:00:00,1.10000,1.20000,1.00000,1.10000,10.00000\n'
+                    '2024-01-02 00:30:00,1.10000,1.20000,1.00000,1.10000,10.00000\n')
+    return path
+
+
+def test_incremental_append_and_refresh_last_bar(updater, csv_file):
+    before = csv_file.read_bytes()
+    assert updater._try_incremental_update(csv_file, _bars('2024-01-02 01:00', 2))
+    assert csv_file.read_bytes().startswith(before)
+    assert len(pd.read_csv(csv_file)) == 4
+
+    # 末根K线收盘价变化: 替换末行并追加新K线
+    assert updater._try_incremental_update(csv_file, _bars('2024-01-02 01:30', 2, close=1.15))
+    df = pd.read_csv(csv_file)
+    assert len(df) == 5 and df['time'].is_unique and list(df['close'].iloc[-2:]) == [1.15, 1.15]
+    assert not updater._journal_path(csv_file).exists()
+
+
+def test_incremental_skips_unchanged_last_bar(updater, csv_file):
+    mtime = csv_file.stat().st_mtime_ns
+    before = csv_file.read_bytes()
+    assert updater._try_incremental_update(csv_file, _bars('2024-01-02 00:30', 1))
+    assert csv_file.read_bytes() == before and csv_file.stat().st_mtime_ns == mtime
+
+    # 末根K线未变化但有新K线: 只追加
+    assert updater._try_incremental_update(csv_file, _bars('2024-01-02 00:30', 2))
+    assert csv_file.read_bytes() == before + b'2024-01-02 01:00:00,1.10000,1.20000,1.00000,1.10000,10.00000\n'
+
+
+def test_incremental_append_without_trailing_newline(updater, csv_file):
+    csv_file.write_bytes(csv_file.read_bytes().rstrip(b'\n'))
+    assert updater._try_incremental_update(csv_file, _bars('2024-01-02 01:00', 1))
+    df = pd.read_csv(csv_file)
+    assert len(df) == 3 and df['time'].iloc[-1] == '2024-01-02 01:00:00'
+
+
+def test_incremental_write_rolls_back(updater, csv_file, monkeypatch):
+    before = csv_file.read_bytes()
+
+    real_fsync = history.os.fsync
+    calls = []
+
+    def failing_fsync(fd):
+        calls.append(fd)
+        if len(calls) == 2:  # 第 1 次是日志文件，第 2 次是写入后的数据文件
+            raise OSError("disk full")
+        real_fsync(fd)
+    monkeypatch.setattr(history.os, 'fsync', failing_fsync)
+    with pytest.raises(OSError):
+        updater._try_incremental_update(csv_file, _bars('2024-01-02 00:30', 2, close=1.15))
+    assert csv_file.read_bytes() == before
+    assert not updater._journal_path(csv_file).exists()
+
+
+def test_interrupted_write_is_recovered(updater, csv_file, monkeypatch):
+    before = csv_file.read_bytes()
+
+    class Crash(BaseException):
+        pass
+
+    real_fsync = history.os.fsync
+    calls = []
+
+    def crash_on_data_fsync(fd):
+        calls.append(fd)
+        if len(calls) == 2:  # 第 1 次是日志文件，第 2 次是截断并写入后的数据文件
+            raise Crash()
+        real_fsync(fd)
+    monkeypatch.setattr(history.os, 'fsync', crash_on_data_fsync)
+    with pytest.raises(Crash):
+        updater._try_incremental_update(csv_file, _bars('2024-01-02 00:30', 2, close=1.15))
+    monkeypatch.setattr(history.os, 'fsync', real_fsync)
+
+    assert updater._journal_path(csv_file).exists()
+    assert updater._recover_interrupted_write(csv_file)
+    assert csv_file.read_bytes() == before
+    assert not updater._journal_path(csv_file).exists()
+    assert not updater._recover_interrupted_write(csv_file)
+
+
+# data/historical 中的真实表头 (XTIUSD_h4.csv / EURUSD_d1.csv): 含 MT5 不返回的 volume 列，部分文件列顺序不同
+_REAL_FILES = {
+    'time,open,high,low,close,tick_volume,spread,real_volume,volume': (
+        '2025-05-14 00:00:00,63.22300,63.24100,63.00300,63.00900,893.00000,11,0.00000,\n'
+        '2025-05-14 04:00:00,63.01800,63.06100,62.77000,62.85800,2955.00000,23,0.00000,\n'),
+    'time,open,high,low,close,volume,spread,tick_volume,real_volume': (
+        '2025-05-14 00:00:00,63.22300,63.24100,63.00300,63.00900,,11,893.00000,0.00000\n'
+        '2025-05-14 04:00:00,63.01800,63.06100,62.77000,62.85800,,23,2955.00000,0.00000\n'),
+}
+
+
+@pytest.mark.parametrize('header', list(_REAL_FILES))
+def test_incremental_update_with_real_file_header(updater, tmp_path, header):
+    path = tmp_path / 'XTIUSD_h4.csv'
+    path.write_text(header + '\n' + _REAL_FILES[header])
+    before, mtime = path.read_bytes(), path.stat().st_mtime_ns
+
+    rates = np.zeros(2, dtype=RATE_DTYPE)
+    rates['time'] = [int(pd.Timestamp(t, tz='UTC').timestamp()) for t in ('2025-05-14 04:00', '2025-05-14 08:00')]
+    rates['open'], rates['high'], rates['low'], rates['close'] = (63.018, 62.858), (63.061, 62.9), (62.77, 62.8), (62.858, 62.85)
+    rates['tick_volume'], rates['spread'] = (2955, 100), (23, 20)
+    new_data = updater._rates_to_dataframe([rates[:1]], 'XTIUSD')
+
+    # 末根K线数值未变化 (文件中为 2955.00000，MT5 为整数 2955): 不写文件
+    assert updater._try_incremental_update(path, new_data)
+    assert path.read_bytes() == before and path.stat().st_mtime_ns == mtime
+
+    # 新K线按文件的列顺序追加，MT5 不返回的 volume 留空
+    assert updater._try_incremental_update(path, updater._rates_to_dataframe([rates], 'XTIUSD'))
+    appended = path.read_bytes()[len(before):].decode()
+    assert appended.startswith('2025-05-14 08:00:00,')
+    df = pd.read_csv(path)
+    assert list(df.columns) == header.split(',')
+    assert len(df) == 3 and df['tick_volume'].iloc[-1] == 100 and df['spread'].iloc[-1] == 20
+    assert df['volume'].isna().all()
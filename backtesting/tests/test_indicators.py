@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+from omegaconf import OmegaConf
+
+from strategies.core.data_providers import DataProvider
+from strategies.core.indicators import IndicatorRegistry, last_closed_bar_time
+from strategies.core.strategy_runner import StrategyRunner
+from strategies.exhaustion_strategy import ExhaustionStrategy
+
+
+def _bars(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 1e-3, n))
+    high = close + rng.uniform(0, 1e-3, n)
+    low = close - rng.uniform(0, 1e-3, n)
+    index = pd.date_range('2024-01-02', periods=n, freq='30min', tz='UTC', name='time')
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close,
+                         'tick_volume': rng.integers(1, 100, n).astype(float)}, index=index)
+
+
+def _wilder(values, period):
+    """简单平均作为初值的 Wilder 平滑 (参考实现)。"""
+    out = values[:period].mean()
+    for v in values[period:]:
+        out += (v - out) / period
+    return out
+
+
+def test_incremental_values_match_window_computation():
+    df = _bars()
+    registry = IndicatorRegistry()
+    # 逐根送入 (与回测引擎每个时间点送入 df.loc[:t] 相同)
+    for end in range(1, len(df) + 1):
+        registry.feed('EURUSD', 'M30', df.iloc[:end])
+
+    tail = df.tail(20)
+    typical = (tail['high'] + tail['low'] + tail['close']) / 3
+    assert registry.value('EURUSD', 'M30', 'vwap', period=20) == pytest.approx((typical * tail['tick_volume']).sum() / tail['tick_volume'].sum())
+    assert registry.value('EURUSD', 'M30', 'rolling_high', period=20) == tail['high'].max()
+    assert registry.value('EURUSD', 'M30', 'rolling_low', period=20) == tail['low'].min()
+
+    prev_close = df['close'].shift(1)
+    tr = pd.concat([df['high'] - df['low'], (df['high'] - prev_close).abs(), (df['low'] - prev_close).abs()], axis=1).max(axis=1)
+    assert registry.value('EURUSD', 'M30', 'atr', period=14) == pytest.approx(_wilder(tr.to_numpy(), 14))
+
+    change = df['close'].diff().to_numpy()[1:]
+    avg_gain, avg_loss = _wilder(np.clip(change, 0, None), 14), _wilder(np.clip(-change, 0, None), 14)
+    assert registry.value('EURUSD', 'M30', 'rsi', period=14) == pytest.approx(100 - 100 / (1 + avg_gain / avg_loss))
+
+
+def test_registry_shares_instances_and_respects_until_and_as_of():
+    df = _bars(50)
+    registry = IndicatorRegistry()
+    assert registry.feed('EURUSD', 'M30', df, until=df.index[39]) == 40
+    assert registry.feed('EURUSD', 'M30', df, until=df.index[39]) == 0 # 没有新K线
+
+    high = registry.get('EURUSD', 'M30', 'rolling_high', period=10)
+    assert high is registry.get('eurusd', 'm30', 'rolling_high', period=10)
+    assert high.value == df['high'].iloc[30:40].max() # 创建时用已送入的K线预热
+
+    assert registry.feed('EURUSD', 'M30', df) == 10
+    assert high.value == df['high'].iloc[40:50].max()
+    assert registry.value('EURUSD', 'M30', 'rolling_high', as_of=df.index[-1], period=10) == high.value
+    assert registry.value('EURUSD', 'M30', 'rolling_high', as_of=df.index[-2], period=10) is None
+    assert registry.value('EURUSD', 'M30', 'vwap', period=100) is None # 数据不足
+
+    with pytest.raises(ValueError):
+        registry.get('EURUSD', 'M30', 'macd')
+
+
+class _ProbeStrategy(ExhaustionStrategy):
+    """每个周期记录 _rolling_extreme 的结果；回退计算使用 high=99 的K线，用于区分是否命中共享指标。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = []
+
+    def process_new_data(self, current_time, market_data, event_data):
+        fallback = pd.DataFrame({'high': [99.0] * self.exhaustion_lookback})
+        self.values.append(self._rolling_extreme('EURUSD', 'high', fallback, current_time))
+
+
+def test_live_cycle_wall_clock_as_of_hits_shared_indicator(tmp_path):
+    df = _bars(60)
+    provider = DataProvider(OmegaConf.create({'paths': {'data_dir': str(tmp_path)}}))
+    probe = _ProbeStrategy('ExhaustionStrategy', OmegaConf.create({}), provider, None, None)
+    runner = StrategyRunner(data_provider=provider)
+    period = probe.exhaustion_lookback
+
+    # 与策略调度器相同: 墙钟时间 (K线收盘后几秒 / 心跳)，市场数据含仍在形成的K线，只送入到最新已收盘K线
+    for i in (40, 41):
+        for now in (df.index[i] + pd.Timedelta(seconds=2), df.index[i] + pd.Timedelta(minutes=17)):
+            closed = last_closed_bar_time(now, 'M30')
+            assert closed == df.index[i - 1]
+            provider.update_indicators('EURUSD', 'M30', df.iloc[:i + 1], until=closed)
+            runner.run([probe], now.to_pydatetime().replace(tzinfo=None), {'M30': {'EURUSD': df.iloc[:i + 1]}}, None)
+            assert probe.values[-1] == df['high'].iloc[i - period:i].max()
+
+    # 回测: as_of 即已送入的最新K线开盘时间
+    provider.update_indicators('EURUSD', 'M30', df.iloc[:50])
+    assert provider.get_indicator('EURUSD', 'M30', 'rolling_high', as_of=df.index[49], period=period) == df['high'].iloc[50 - period:50].max()
+    assert provider.get_indicator('EURUSD', 'M30', 'rolling_high', as_of=df.index[55], period=period) is None
@@ -0,0 +1,73 @@
+import logging
+
+import pandas as pd
+
+from strategies.utils.key_time_detector import KeyTimeDetector
+
+T0 = pd.Timestamp('2024-01-05 12:00', tz='UTC')
+
+
+def _space(space_id, created):
+    return {'space_id': space_id, 'creation_time': created, 'event_data': {'symbol': 'EURUSD'}}
+
+
+def test_key_times_fire_once_per_space_and_hour():
+    detector = KeyTimeDetector(logging.getLogger('test'))
+    spaces = [_space('a', T0), _space('b', T0 + pd.Timedelta(hours=1))]
+    for space in spaces:
+        assert detector.register_space(space, [1, 3])
+    assert not detector.register_space(spaces[0], [1, 3])
+    fired = []
+    for step in range(12):
+        now = T0 + pd.Timedelta(minutes=30 * step)
+        for space in spaces:
+            point = detector.is_key_time(now, space, key_time_hours_after_event=[1, 3])
+            if point is not None:
+                fired.append((space['space_id'], now, point))
+
+    # 关键时间点窗口 [点 - 30分钟, 点 + 30分钟] 内的第一根K线触发，之后不再触发
+    assert fired == [
+        ('a', T0 + pd.Timedelta(minutes=30), T0 + pd.Timedelta(hours=1)),
+        ('b', T0 + pd.Timedelta(minutes=90), T0 + pd.Timedelta(hours=2)),
+        ('a', T0 + pd.Timedelta(minutes=150), T0 + pd.Timedelta(hours=3)),
+        ('b', T0 + pd.Timedelta(minutes=210), T0 + pd.Timedelta(hours=4)),
+    ]
+    assert not detector._due and not detector._schedule
+    # 最后一个窗口结束后登记被移除，之后的调用不会重新登记
+    detector.is_key_time(T0 + pd.Timedelta(hours=6), spaces[0], key_time_hours_after_event=[1, 3])
+    assert not detector._registered and not detector._schedule
+
+
+def test_due_key_times_only_returns_firing_points():
+    detector = KeyTimeDetector(logging.getLogger('test'))
+    for i in range(100):
+        detector.register_space(_space(f's{i}', T0 + pd.Timedelta(minutes=30 * i)), [2])
+    detector.forget_space(_space('s1', T0 + pd.Timedelta(minutes=30)), 'EURUSD')
+
+    assert detector.due_key_times(T0) == []
+    fired = detector.due_key_times(T0 + pd.Timedelta(hours=2))
+    # s0 (2:00) 与 s1 (2:30, 已失效) / s2 (3:00) 中只有窗口包含当前时间且未失效的触发
+    assert [(key[0], point) for key, _, point in fired] == [('s0', T0 + pd.Timedelta(hours=2))]
+    assert [key[0] for key, _, _ in detector.due_key_times(T0 + pd.Timedelta(hours=2, minutes=30))] == ['s2']
+
+
+def test_bar_key_times_and_forget_space():
+    detector = KeyTimeDetector(logging.getLogger('test'))
+    kept, dropped = _space('kept', T0), _space('dropped', T0)
+    # 相邻窗口在 T0+1:30 重叠: 每根K线每个空间至多触发一个时间点
+    detector.register_space(kept, [1, 2])
+    detector.register_space(dropped, [1, 2])
+
+    first = detector.bar_key_times(T0 + pd.Timedelta(minutes=90))
+    assert first == {detector.space_key(kept): T0 + pd.Timedelta(hours=1),
+                     detector.space_key(dropped): T0 + pd.Timedelta(hours=1)}
+    assert detector.bar_key_times(T0 + pd.Timedelta(minutes=90)) is first # 同一K线不再推进
+
+    detector.forget_space(dropped)
+    assert detector.space_key(dropped) not in detector._due
+    assert detector.bar_key_times(T0 + pd.Timedelta(hours=2)) == {detector.space_key(kept): T0 + pd.Timedelta(hours=2)}
+
+    # 到期后失效标记和登记都被清理；未登记的空间不会留下失效标记
+    detector.forget_space(_space('never', T0))
+    assert detector.bar_key_times(T0 + pd.Timedelta(hours=3)) == {}
+    assert not detector._registered and not detector._forgotten and not detector._due
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from omegaconf import OmegaConf
+
+import market_price_data.realtime as realtime
+from strategies.live.fake_mt5 import RATES_DTYPE, FakeMT5, ReplayClock, installed_fake_mt5
+
+
+def _rates(start, n, minutes=5):
+    index = pd.date_range(start, periods=n, freq=f'{minutes}min', tz='UTC')
+    rates = np.zeros(n, dtype=RATES_DTYPE)
+    rates['time'] = index.as_unit('s').asi8
+    rates['open'] = rates['high'] = rates['low'] = rates['close'] = 1.1 + np.arange(n) * 1e-4
+    rates['tick_volume'] = 10
+    return rates
+
+
+def test_fake_mt5_only_returns_closed_bars_and_fills_orders():
+    rates = _rates('2024-01-02', 100)
+    clock = ReplayClock(rates['time'][10])
+    fake = FakeMT5({('EURUSD', 'M5'): rates}, clock)
+
+    # 开盘时间 + 5 分钟 <= 时钟的K线才算收盘
+    closed = fake.copy_rates_from_pos('EURUSD', fake.TIMEFRAME_M5, 0, 3)
+    assert list(closed['time']) == list(rates['time'][7:10])
+    clock.now += 300
+    assert fake.copy_rates_from_pos('EURUSD', fake.TIMEFRAME_M5, 0, 1)['time'][0] == rates['time'][10]
+    assert fake.copy_rates_from_pos('GBPUSD', fake.TIMEFRAME_M5, 0, 1) is None
+
+    result = fake.order_send({'action': fake.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.1,
+                              'type': fake.ORDER_TYPE_BUY, 'magic': 7})
+    assert result.retcode == fake.TRADE_RETCODE_DONE
+    assert result.price == rates['close'][10]
+    assert [p.magic for p in fake.positions_get(symbol='EURUSD')] == [7]
+
+    clock.now += 600
+    assert fake.account_info().profit > 0
+    fake.order_send({'action': fake.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.1,
+                     'type': fake.ORDER_TYPE_SELL, 'position': result.order})
+    assert fake.positions_get() == ()
+    assert fake.balance > 100000
+    assert len(fake.history_orders_get()) == 2
+
+
+def test_updater_poll_all_once_follows_replay_clock(tmp_path):
+    rates = _rates('2024-01-02', 100)
+    clock = ReplayClock(rates['time'][20])
+    fake = FakeMT5({('EURUSD', 'M5'): rates}, clock)
+    config = OmegaConf.create({
+        'paths': {'data_dir': str(tmp_path)},
+        'logging': {},
+        'realtime': {
+            'enabled': True, 'symbols': ['EURUSD'], 'timeframes': ['M5'],
+            'poll_intervals': {}, 'fetch_bars_count': 5,
+            'adaptive_polling': {'enabled': False},
+            'session': {'pause_outside_session': False},
+        },
+    })
+    original_mt5 = realtime.mt5
+
+    with installed_fake_mt5(fake):
+        updater = realtime.RealtimeUpdater(config=config)
+        assert updater.updater_enabled
+        updater.mt5_initialized = True
+        assert updater.poll_all_once() == [] # 首次轮询只建立基线
+        assert updater.poll_all_once() == [] # 没有新K线
+
+        clock.now += 300
+        messages = updater.poll_all_once()
+        assert [(m['topic'], m['symbol'], m['timeframe']) for m in messages] == [('bar_closed', 'EURUSD', 'M5')]
+
+        csv = pd.read_csv(updater._get_stream_filepath('EURUSD', 'M5'))
+        assert pd.Timestamp(csv['time'].iloc[-1], tz='UTC').timestamp() == rates['time'][20]
+        updater.stop_updater()
+
+    assert realtime.mt5 is original_mt5
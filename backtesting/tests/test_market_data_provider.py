@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+from omegaconf import OmegaConf
+
+from strategies.core.data_providers import MarketDataProvider
+
+
+def _write_bars(path, volume_column):
+    times = pd.date_range('2024-01-01', periods=10, freq='h')
+    pd.DataFrame({
+        'time': times.strftime('%Y-%m-%d %H:%M:%S'),
+        'open': 1.0, 'high': 1.1, 'low': 0.9, 'close': 1.05,
+        volume_column: range(10), 'spread': 2,
+    }).to_csv(path, index=False)
+
+
+@pytest.mark.parametrize('file_column, requested', [('volume', 'tick_volume'), ('tick_volume', 'volume')])
+def test_load_from_cache_maps_volume_aliases(tmp_path, file_column, requested):
+    provider = MarketDataProvider(OmegaConf.create({}))
+    path = tmp_path / 'EURUSD_h1.csv'
+    _write_bars(path, file_column)
+    provider._get_hist_filepath = lambda symbol, timeframe: path
+
+    df = provider.load_from_cache('EURUSD', 'H1', columns=['close', requested])
+    assert list(df.columns) == ['close', file_column]
+    assert df[file_column].tolist() == list(range(10))
+
+    ohlc = provider.load_from_cache('EURUSD', 'H1', columns=['open', 'high', 'low', 'close'])
+    assert list(ohlc.columns) == ['open', 'high', 'low', 'close']
+
+
+def _write_csv(path, df):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    out = df.reset_index(names='time')
+    out['time'] = out['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    out.to_csv(path, index=False)
+
+
+def _bars(start, n, close_offset=0.0):
+    index = pd.date_range(start, periods=n, freq='1min', name='time')
+    close = [float(i) + close_offset for i in range(n)]
+    return pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close}, index=index)
+
+
+def test_get_window_registered_bars_are_protected(tmp_path):
+    provider = MarketDataProvider(OmegaConf.create({'paths': {'data_dir': str(tmp_path)}}))
+    bars = _bars('2024-01-02 10:00', 100).tz_localize('UTC')
+    provider.register_bars('EURUSD', 'M1', bars)
+
+    window = provider.get_window('EURUSD', 'M1', pd.Timestamp('2024-01-02 10:49:30'), 10)
+    assert list(window['close']) == [float(i) for i in range(40, 50)]
+    assert provider.get_window('EURUSD', 'M1', pd.Timestamp('2024-01-02 09:00', tz='UTC'), 10) is None
+
+    window.loc[window.index[-1], 'close'] = -1.0 # 调用方修改不写回缓存
+    again = provider.get_window('EURUSD', 'M1', pd.Timestamp('2024-01-02 10:49:30'), 10)
+    assert again['close'].iloc[-1] == 49.0
+
+
+def test_get_window_live_appends_realtime_without_reloading_history(tmp_path, monkeypatch):
+    provider = MarketDataProvider(OmegaConf.create({'paths': {'data_dir': str(tmp_path)}}))
+    history = _bars('2024-01-02 10:00', 100)
+    _write_csv(provider._get_hist_filepath('EURUSD', 'M1'), history)
+    rt_path = provider._get_rt_filepath('EURUSD', 'M1')
+    _write_csv(rt_path, history.iloc[-3:])
+
+    calls = {'history': 0, 'realtime': 0}
+    load_from_cache, load_realtime_data = provider.load_from_cache, provider.load_realtime_data
+    monkeypatch.setattr(provider, 'load_from_cache', lambda *a, **k: calls.__setitem__('history', calls['history'] + 1) or load_from_cache(*a, **k))
+    monkeypatch.setattr(provider, 'load_realtime_data', lambda *a, **k: calls.__setitem__('realtime', calls['realtime'] + 1) or load_realtime_data(*a, **k))
+
+    end = pd.Timestamp('2024-01-03', tz='UTC')
+    window = provider.get_window('EURUSD', 'M1', end, 5)
+    assert list(window['close']) == [95.0, 96.0, 97.0, 98.0, 99.0]
+    assert calls['history'] == 1
+
+    # 实时文件未变化: 不再读取任何文件
+    for _ in range(3):
+        provider.get_window('EURUSD', 'M1', end, 5)
+    assert calls == {'history': 1, 'realtime': 1}
+
+    # 实时文件更新 (最后一根K线变化 + 一根新K线): 只读取实时数据并增量追加
+    _write_csv(rt_path, _bars('2024-01-02 11:39', 2, close_offset=199))
+    window = provider.get_window('EURUSD', 'M1', end, 3)
+    assert list(window['close']) == [98.0, 199.0, 200.0]
+    assert window.index[-1] == pd.Timestamp('2024-01-02 11:40', tz='UTC')
+    assert calls['history'] == 1
+
+
+def test_load_realtime_data_ignores_partially_written_last_line(tmp_path):
+    provider = MarketDataProvider(OmegaConf.create({'paths': {'data_dir': str(tmp_path)}}))
+    rt_path = provider._get_rt_filepath('EURUSD', 'M1')
+    _write_csv(rt_path, _bars('2024-01-02 10:00', 3))
+    with open(rt_path, 'ab') as f:
+        f.write(b'2024-01-02 10:03:00,3.0,3.') # RealtimeUpdater 正在追加的行
+
+    df = provider.load_realtime_data('EURUSD', 'M1')
+    assert len(df) == 3 and df.index[-1] == pd.Timestamp('2024-01-02 10:02', tz='UTC')
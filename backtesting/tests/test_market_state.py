@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+from strategies.core.market_state import MarketStateStore
+
+
+def _bars(start, n, close_offset=0.0):
+    index = pd.date_range(start, periods=n, freq='1min', tz='UTC', name='time')
+    close = np.arange(n, dtype=float) + close_offset
+    return pd.DataFrame({
+        'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+        'tick_volume': np.arange(n, dtype=np.int64),
+    }, index=index)
+
+
+class FakeProvider:
+    def __init__(self, combined, realtime):
+        self.combined = combined
+        self.realtime = realtime
+        self.combined_calls = 0
+
+    def get_combined_prices(self, symbol, timeframe):
+        self.combined_calls += 1
+        return self.combined
+
+    def load_realtime_data(self, symbol, timeframe):
+        return self.realtime
+
+
+def test_incremental_update_appends_and_patches_tail():
+    history = _bars('2024-01-02 10:00', 2000)
+    provider = FakeProvider(history, history.iloc[-5:])
+    store = MarketStateStore(provider)
+
+    first = store.snapshot(['EURUSD'], ['M1'])['M1']['EURUSD']
+    pd.testing.assert_frame_equal(first, history, check_freq=False)
+    assert provider.combined_calls == 1
+
+    # 最后一根K线更新 + 两根新K线
+    realtime = _bars(history.index[-3], 5, close_offset=1997)
+    realtime.iloc[2, realtime.columns.get_loc('close')] = 123.0
+    provider.realtime = realtime
+    assert store.update('EURUSD', 'M1') == 2
+
+    view = store.view('EURUSD', 'M1')
+    assert len(view) == 2002
+    assert view['close'].iloc[-3] == 123.0
+    assert view.index[-1] == realtime.index[-1]
+    assert view['tick_volume'].dtype == np.int64
+    assert provider.combined_calls == 1
+
+    # 实时数据与内存数据之间存在缺口时重新完整加载
+    provider.realtime = _bars('2024-01-05 10:00', 3)
+    store.update('EURUSD', 'M1')
+    assert provider.combined_calls == 2
+
+
+def test_max_bars_keeps_trailing_window():
+    history = _bars('2024-01-02 10:00', 50)
+    provider = FakeProvider(history, history.iloc[-1:])
+    store = MarketStateStore(provider, max_bars=10)
+    store.seed('EURUSD', 'M1')
+    for i in range(1, 40):
+        provider.realtime = _bars(history.index[-1] + pd.Timedelta(minutes=i - 1), 2, close_offset=100 + i)
+        store.update('EURUSD', 'M1')
+    view = store.view('EURUSD', 'M1')
+    assert len(view) == 10
+    assert view.index.is_monotonic_increasing
+    assert view.index[-1] == history.index[-1] + pd.Timedelta(minutes=39)
+
+
+def test_realtime_without_history_only_columns_updates_incrementally():
+    # 历史文件有 volume，实时数据 (共享内存/实时 CSV) 没有
+    history = _bars('2024-01-02 10:00', 100).assign(volume=5.0)
+    provider = FakeProvider(history, _bars(history.index[-2], 2, close_offset=98))
+    store = MarketStateStore(provider)
+    store.seed('EURUSD', 'M1')
+    for i in range(3):
+        provider.realtime = _bars(history.index[-1] + pd.Timedelta(minutes=i), 2, close_offset=200 + i)
+        assert store.update('EURUSD', 'M1') == 1
+    assert provider.combined_calls == 1
+    view = store.view('EURUSD', 'M1')
+    assert len(view) == 103 and view['volume'].iloc[-1:].isna().all() and view['volume'].iloc[-4] == 5.0
+
+    # 缺少 OHLC 列时才重新完整加载
+    provider.realtime = provider.realtime.drop(columns=['close'])
+    store.update('EURUSD', 'M1')
+    assert provider.combined_calls == 2
+
+
+def test_published_views_are_not_rewritten():
+    history = _bars('2024-01-02 10:00', 50)
+    provider = FakeProvider(history, history.iloc[-1:])
+    store = MarketStateStore(provider)
+    before = store.snapshot(['EURUSD'], ['M1'])['M1']['EURUSD']
+    before_close = before['close'].to_numpy().copy()
+
+    # 形成中的K线变化 + 追加新K线
+    realtime = _bars(history.index[-1], 2, close_offset=500)
+    provider.realtime = realtime
+    store.update('EURUSD', 'M1')
+    after = store.view('EURUSD', 'M1')
+
+    np.testing.assert_array_equal(before['close'].to_numpy(), before_close)
+    assert after['close'].iloc[-2] == 500 and after['close'].iloc[-1] == 501 and len(after) == 51
+
+
+def test_forming_bar_changes_alternate_two_buffers():
+    history = _bars('2024-01-02 10:00', 2000)
+    provider = FakeProvider(history, history.iloc[-1:])
+    store = MarketStateStore(provider)
+    previous = store.snapshot(['EURUSD'], ['M1'])['M1']['EURUSD']
+    buffers = set()
+    expected = history['close'].tolist()
+
+    for i in range(1, 9):
+        # 每个周期形成中的K线变化，每隔一个周期收盘并追加一根新K线
+        provider.realtime = _bars(previous.index[-1], 1 + i % 2, close_offset=5000 + i)
+        previous_close = previous['close'].to_numpy().copy()
+        store.update('EURUSD', 'M1')
+        current = store.view('EURUSD', 'M1')
+        buffers.add(id(store._states[('EURUSD', 'M1')]['times']))
+
+        np.testing.assert_array_equal(previous['close'].to_numpy(), previous_close)
+        expected[-1] = 5000 + i
+        if i % 2:
+            expected.append(5001 + i)
+        assert current['close'].tolist() == expected
+        previous = current
+
+    assert len(buffers) == 2
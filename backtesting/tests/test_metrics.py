@@ -0,0 +1,36 @@
+import urllib.request
+
+from core.metrics import MetricsRegistry, start_metrics_server
+
+
+def test_registry_renders_prometheus_text_and_serves_it():
+    registry = MetricsRegistry()
+    polls = registry.counter('test_polls_total', 'Polls', ('symbol',))
+    lag = registry.gauge('test_lag_seconds', 'Lag')
+    latency = registry.histogram('test_latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1.0))
+
+    polls.labels('EURUSD').inc()
+    polls.labels(symbol='EURUSD').inc(2)
+    lag.set(0.25)
+    stage = latency.labels('fetch')
+    for value in (0.05, 0.5, 5.0):
+        stage.observe(value)
+    assert registry.counter('test_polls_total', 'Polls', ('symbol',)) is polls
+
+    text = registry.render()
+    assert '# TYPE test_polls_total counter' in text
+    assert 'test_polls_total{symbol="EURUSD"} 3' in text
+    assert 'test_lag_seconds 0.25' in text
+    assert 'test_latency_seconds_bucket{stage="fetch",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{stage="fetch",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="fetch",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{stage="fetch"} 3' in text
+
+    server = start_metrics_server(0, registry=registry)
+    assert server is not None
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as resp:
+            assert resp.read().decode('utf-8') == registry.render()
+    finally:
+        server.shutdown()
+        server.server_close()
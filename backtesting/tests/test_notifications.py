@@ -0,0 +1,29 @@
+import time
+
+from core.notifications import (
+    NotificationPublisher,
+    NotificationSubscriber,
+    TOPIC_BAR_CLOSED,
+    TOPIC_CALENDAR_UPDATED,
+)
+
+
+def test_publish_subscribe_coalesces_burst():
+    subscriber = NotificationSubscriber('127.0.0.1', 0, coalesce_seconds=0.1)
+    publisher = NotificationPublisher('127.0.0.1', subscriber.port)
+    try:
+        assert subscriber.wait(0.05) == []
+
+        assert publisher.publish(TOPIC_BAR_CLOSED, symbol='EURUSD', timeframe='M1', bar_time='2024-01-02 10:00:00')
+        assert publisher.publish(TOPIC_BAR_CLOSED, symbol='GBPUSD', timeframe='M1', bar_time='2024-01-02 10:00:00')
+        assert publisher.publish(TOPIC_CALENDAR_UPDATED, path='filtered_realtime.csv')
+
+        start = time.monotonic()
+        messages = subscriber.wait(2.0)
+        assert time.monotonic() - start < 1.0
+        assert [m['topic'] for m in messages] == [TOPIC_BAR_CLOSED, TOPIC_BAR_CLOSED, TOPIC_CALENDAR_UPDATED]
+        assert messages[0]['symbol'] == 'EURUSD'
+        assert subscriber.wait(0.05) == []
+    finally:
+        publisher.close()
+        subscriber.close()
@@ -0,0 +1,149 @@
+import time
+
+import pandas as pd
+import pytest
+from omegaconf import OmegaConf
+
+import market_price_data.realtime as realtime
+
+
+@pytest.fixture
+def updater(tmp_path, monkeypatch, fake_mt5):
+    config = OmegaConf.create({
+        'paths': {'data_dir': str(tmp_path)},
+        'logging': {},
+        'execution': {'mt5': {'login': 1}},
+        'realtime': {
+            'enabled': True, 'symbols': ['EURUSD', 'GBPUSD'], 'timeframes': ['M1', 'M5'],
+            'poll_intervals': {'M1': 0.05, 'M5': 0.1}, 'fetch_bars_count': 5,
+            'poll_jitter_fraction': 0.1,
+            'adaptive_polling': {'enabled': False},
+            'session': {'pause_outside_session': False, 'weekly_open': 'SUN 22:00', 'weekly_close': 'FRI 22:00'},
+        },
+    })
+    monkeypatch.setattr(realtime, 'MT5_AVAILABLE', True)
+    monkeypatch.setattr(realtime, 'mt5', fake_mt5)
+    monkeypatch.setattr(realtime, 'load_app_config', lambda *_: config)
+    monkeypatch.setattr(realtime, 'setup_logging', lambda *_, **__: realtime.logging.getLogger('test_realtime'))
+    monkeypatch.setattr(realtime, 'parse_timeframes', lambda *_: {'M1': 1, 'M5': 5})
+    monkeypatch.setattr(realtime, 'initialize_mt5', lambda *_: True)
+    monkeypatch.setattr(realtime, 'shutdown_mt5', lambda *_: None)
+    updater = realtime.RealtimeUpdater()
+    monkeypatch.setattr(updater, '_is_trading_day', lambda: True)
+    return updater
+
+
+def test_single_scheduler_thread_polls_all_streams(updater, fake_mt5, tmp_path):
+    updater.start_updater()
+    try:
+        assert len(updater._threads) == 1
+        time.sleep(0.6)
+    finally:
+        updater.stop_updater()
+
+    assert {name for *_, name in fake_mt5.calls} == {'RealtimeScheduler'}
+    metrics = updater.get_stream_metrics()
+    assert set(metrics) == {'EURUSD-M1', 'EURUSD-M5', 'GBPUSD-M1', 'GBPUSD-M5'}
+    assert all(m['polls'] >= 1 and m['errors'] == 0 for m in metrics.values())
+    assert metrics['EURUSD-M1']['polls'] > metrics['EURUSD-M5']['polls']
+
+    df = pd.read_csv(tmp_path / 'realtime' / 'EURUSD' / 'EURUSD_m1_realtime.csv')
+    assert len(df) == 5
+
+
+def test_delta_writes_patch_tail_and_append(updater, fake_mt5, tmp_path, monkeypatch):
+    updater._init_streams()
+    stream = updater._streams[('EURUSD', 'M1')]
+    filepath = tmp_path / 'realtime' / 'EURUSD' / 'EURUSD_m1_realtime.csv'
+
+    updater._poll_stream(stream)
+    assert stream['writes'] == 1
+
+    updater._poll_stream(stream)  # 数据未变化，不写文件
+    assert stream['writes'] == 1
+
+    # 之后只格式化并原地重写变化的K线
+    formatted = []
+    format_rate_lines = updater._format_rate_lines
+    monkeypatch.setattr(updater, '_format_rate_lines',
+                        lambda rates, start=0: formatted.append(len(rates) - start) or format_rate_lines(rates, start))
+    inode, written = filepath.stat().st_ino, stream['bytes_written']
+    fake_mt5.close = 1.2  # 正在形成的K线收盘价变化，只重写末行
+    updater._poll_stream(stream)
+    assert stream['writes'] == 2 and formatted == [1]
+    assert filepath.stat().st_ino == inode
+    assert stream['bytes_written'] - written < 100
+    df = pd.read_csv(filepath)
+    assert len(df) == 5 and df['close'].iloc[-1] == 1.2 and df['close'].iloc[-2] == 1.1
+
+    fake_mt5.now += 60  # 新K线出现：上一根K线定稿并追加新K线
+    fake_mt5.close = 1.3
+    updater._poll_stream(stream)
+    df = pd.read_csv(filepath)
+    assert len(df) == 6 and df['time'].is_unique
+    assert list(df['close'].iloc[-3:]) == [1.1, 1.3, 1.3]
+    assert df['time'].iloc[-1] == pd.Timestamp(fake_mt5.now // 60 * 60, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+
+
+def test_adaptive_schedule_aligns_to_bar_close(updater):
+    updater.adaptive_polling = True
+    updater.pause_outside_session = True
+    updater.poll_jitter_fraction = 0.0
+    updater._init_streams()
+    m1 = updater._streams[('EURUSD', 'M1')]
+    m5 = updater._streams[('EURUSD', 'M5')]
+    m1['poll_interval'] = m5['poll_interval'] = 30
+    wednesday_noon = pd.Timestamp('2024-01-03 12:00:00', tz='UTC').timestamp()
+
+    # 收盘后 3 秒仍未取得新K线：按 close_retry_interval 紧密重试
+    m1['last_bar_open'] = int(wednesday_noon) - 60
+    assert updater._next_due(m1, 0.0, 100.0, wall_now=wednesday_noon + 3) == pytest.approx(101.0)
+
+    # 已取得新K线：K线中段按轮询间隔放缓
+    m1['last_bar_open'] = int(wednesday_noon)
+    assert updater._next_due(m1, 0.0, 100.0, wall_now=wednesday_noon + 3) == pytest.approx(130.0)
+
+    # 距收盘不足一个轮询间隔：对齐到收盘后 close_delay_seconds
+    m5['last_bar_open'] = int(wednesday_noon)
+    assert updater._next_due(m5, 0.0, 100.0, wall_now=wednesday_noon + 290) == pytest.approx(110.5)
+
+    # 周六休市：暂停到周日 22:00 开市
+    saturday_noon = pd.Timestamp('2024-01-06 12:00:00', tz='UTC').timestamp()
+    assert updater._next_due(m1, 0.0, 100.0, wall_now=saturday_noon) == pytest.approx(100.0 + 34 * 3600 + 0.5)
+
+
+@pytest.mark.parametrize('weekly', [('SUN 22:00', 'FRI 22:00'), (None, None)])
+def test_seconds_until_session_open_matches_minute_scan(updater, weekly):
+    updater._session_open_minute = updater._parse_week_minute(weekly[0])
+    updater._session_close_minute = updater._parse_week_minute(weekly[1])
+    updater._session_holidays = {'2024-01-01', '2024-01-08', '2024-01-09'}
+
+    def scan(now):
+        probe = now.replace(second=0, microsecond=0)
+        while not updater._in_session(probe):
+            probe += pd.Timedelta(minutes=1)
+        return max((probe - now).total_seconds(), 0.0)
+
+    for now in pd.date_range('2023-12-29 20:00:30', '2024-01-10', freq='397min', tz='UTC'):
+        now = now.to_pydatetime()
+        assert updater._seconds_until_session_open(now) == scan(now)
+
+
+def test_delta_writes_roll_over_atomically(updater, fake_mt5, tmp_path):
+    """只有超过 max_file_bars 行时才整体重写 (临时文件 + os.replace) 为最新快照。"""
+    updater._init_streams()
+    updater.max_file_bars = 7
+    stream = updater._streams[('EURUSD', 'M1')]
+    filepath = tmp_path / 'realtime' / 'EURUSD' / 'EURUSD_m1_realtime.csv'
+    updater._poll_stream(stream)
+    inode = filepath.stat().st_ino
+
+    for _ in range(2):
+        fake_mt5.now += 60
+        updater._poll_stream(stream)
+    assert filepath.stat().st_ino == inode and len(pd.read_csv(filepath)) == 7
+
+    fake_mt5.now += 60
+    updater._poll_stream(stream)
+    assert filepath.stat().st_ino != inode and len(pd.read_csv(filepath)) == 5
+    assert not list(filepath.parent.glob('*.tmp_*'))
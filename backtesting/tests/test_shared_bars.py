@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+from core.shared_bars import BAR_DTYPE, SharedBarRing, ring_name
+
+
+def _bars(times, close):
+    bars = np.zeros(len(times), dtype=BAR_DTYPE)
+    bars['time'] = times
+    bars['close'] = close
+    return bars
+
+
+@pytest.fixture
+def writer():
+    ring = SharedBarRing.create(ring_name(f'sstest{os.getpid()}', 'TSLA.OQ', 'm1'), capacity=4)
+    yield ring
+    ring.close(unlink=True)
+
+
+def test_ring_append_tail_update_and_wraparound(writer):
+    assert writer.name.endswith('_TSLA_OQ_M1')
+    reader = SharedBarRing.attach(writer.name)
+    assert reader is not None and reader.read() is not None and len(reader.read()) == 0
+
+    assert writer.write(_bars([60, 120, 180], 1.0)) == (False, 3)
+    seq = reader.sequence
+    assert writer.write(_bars([120, 180], 1.0)) == (False, 0)  # 无变化不写入
+    assert reader.sequence == seq
+
+    assert writer.write(_bars([180, 240], [2.0, 1.5])) == (True, 1)
+    assert writer.write(_bars([240, 300, 360], 3.0)) == (True, 2)
+
+    out = reader.read()
+    assert list(out['time']) == [180, 240, 300, 360]
+    assert list(out['close']) == [2.0, 3.0, 3.0, 3.0]
+    assert list(reader.read(2)['time']) == [300, 360]
+    reader.close()
+
+
+def test_attach_rejects_closed_ring(writer):
+    reader = SharedBarRing.attach(writer.name)
+    writer.close()
+    assert not reader.is_live
+    assert SharedBarRing.attach(writer.name) is None
+    reader.close()
+
+
+def test_provider_attaches_once_and_backs_off(writer, monkeypatch):
+    from omegaconf import OmegaConf
+    from strategies.core.data_providers import MarketDataProvider
+
+    prefix = writer.name[:-len('_TSLA_OQ_M1')]
+    provider = MarketDataProvider(OmegaConf.create({'market_data': {'shared_memory': {
+        'enabled': True, 'name_prefix': prefix, 'reattach_interval_seconds': 60}}}))
+    attach = SharedBarRing.attach
+    attempts = []
+    monkeypatch.setattr(SharedBarRing, 'attach', staticmethod(lambda name: attempts.append(name) or attach(name)))
+
+    ring = provider._get_ring('TSLA.OQ', 'M1')
+    assert ring is not None
+    for _ in range(5):
+        assert provider._get_ring('TSLA.OQ', 'M1') is ring
+    assert len(attempts) == 1
+
+    # 不存在的缓冲区: 失败后在间隔内不再尝试
+    for _ in range(5):
+        assert provider._get_ring('EURUSD', 'M1') is None
+    assert len(attempts) == 2
+
+    # 写入方关闭后断开，间隔内不重连
+    writer.close()
+    assert provider._get_ring('TSLA.OQ', 'M1') is None
+    assert provider._get_ring('TSLA.OQ', 'M1') is None
+    assert len(attempts) == 2
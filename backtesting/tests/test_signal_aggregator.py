@@ -0,0 +1,63 @@
+import logging
+
+import pandas as pd
+
+from strategies.utils.signal_aggregator import SignalAggregator
+
+T0 = pd.Timestamp('2024-01-05 12:00', tz='UTC')
+
+
+def _aggregator(**kwargs):
+    config = {'strategy_weights': {'A': 1.0, 'B': 1.5}, 'default_strategy_weight': 0.5,
+              'resonance_time_window_minutes': 60, 'resonance_threshold': 2.0, 'signal_retain_hours': 2}
+    return SignalAggregator(logging.getLogger('test'), config, **kwargs)
+
+
+def test_window_totals_and_threshold_callback():
+    fired = []
+    agg = _aggregator(on_resonance=lambda symbol, info: fired.append((symbol, info['action'], info['weight'])))
+
+    agg.submit_signal('A', 'EURUSD', 'BUY', T0)
+    agg.submit_signal('C', 'EURUSD', 'SELL', T0 + pd.Timedelta(minutes=5))
+    assert fired == []
+    agg.submit_signal('B', 'EURUSD', 'BUY', T0 + pd.Timedelta(minutes=30))
+    assert fired == [('EURUSD', 'BUY', 2.5)] # 越过阈值时触发一次
+    agg.submit_signal('A', 'EURUSD', 'BUY', T0 + pd.Timedelta(minutes=40))
+    assert len(fired) == 1
+
+    result = agg.check_resonance(T0 + pd.Timedelta(minutes=45))
+    assert result['EURUSD']['weight'] == 3.5 and sorted(result['EURUSD']['strategies']) == ['A', 'B']
+    # 第一个 A 信号移出窗口后权重 2.5，B 信号移出后 1.0 低于阈值
+    assert agg.check_resonance(T0 + pd.Timedelta(minutes=61))['EURUSD']['weight'] == 2.5
+    assert agg.check_resonance(T0 + pd.Timedelta(minutes=91)) == {}
+    # 时间回退时从保留的信号重建窗口
+    assert agg.check_resonance(T0 + pd.Timedelta(minutes=45))['EURUSD']['weight'] == 3.5
+
+    # 乱序提交的信号按时间插入
+    agg.submit_signal('A', 'EURUSD', 'SELL', T0 + pd.Timedelta(minutes=1))
+    sells = agg.get_signals_for_symbol('EURUSD')['SELL']
+    assert [s['strategy'] for s in sells] == ['A', 'C']
+    assert [s['strategy'] for s in agg.get_signals_for_symbol('EURUSD', 15, T0 + pd.Timedelta(minutes=50))['BUY']] == ['A']
+
+    agg.clean_old_signals(T0 + pd.Timedelta(hours=2, minutes=35))
+    assert [s['strategy'] for s in agg.get_all_signals()['EURUSD']['BUY']] == ['A']
+    agg.clean_old_signals(T0 + pd.Timedelta(hours=3))
+    assert agg.get_all_signals() == {}
+
+
+def test_window_weight_is_exact_after_expiry_and_eviction():
+    config = {'strategy_weights': {'A': 0.8, 'B': 0.4}, 'resonance_time_window_minutes': 60,
+              'resonance_threshold': 2.0, 'signal_retain_hours': 2}
+    agg = SignalAggregator(logging.getLogger('test'), config)
+    for minutes, strategy in ((0, 'A'), (10, 'A'), (20, 'B'), (30, 'A')):
+        agg.submit_signal(strategy, 'EURUSD', 'BUY', T0 + pd.Timedelta(minutes=minutes))
+
+    # 第一个 0.8 移出窗口: 0.8 + 0.4 + 0.8 恰好等于阈值 2.0 (从累加和 2.8 中减去 0.8 得到 1.9999999999999998)
+    result = agg.check_resonance(T0 + pd.Timedelta(minutes=65))
+    assert result['EURUSD']['weight'] == 2.0
+
+    # 清理保留信号时窗口也一起移除
+    agg.clean_old_signals(T0 + pd.Timedelta(hours=2, minutes=15))
+    window = agg._signals['EURUSD']['BUY']
+    assert [s.timestamp for s in window.window] == [s.timestamp for s in window.signals]
+    assert window.weight == 0.4 + 0.8 and sorted(window.strategies) == ['A', 'B']
@@ -0,0 +1,77 @@
+import pandas as pd
+
+from strategies.core.records import InvalidationState, SpaceRecord
+from strategies.core.space_book import SpaceBook
+
+T0 = pd.Timestamp('2024-01-02 00:00', tz='UTC')
+
+
+def _space(space_id, high=1.1010, low=1.1000, valid_hours=48, formed=T0):
+    return {'id': space_id, 'space_high': high, 'space_low': low, 'status': 'active',
+            'initial_pulse_end_time': formed,
+            'valid_until': (T0 + pd.Timedelta(hours=valid_hours)).isoformat()}
+
+
+def _step(book, k, high, low, close, n_bars=2):
+    t = T0 + pd.Timedelta(minutes=30 * k)
+    return book.evaluate(t, high, low, close, t, n_bars, 3, 0.1)
+
+
+def test_invalidation_rules_and_compaction():
+    spaces = [_space('sb'), _space('brc', high=1.1030), _space('expiring', valid_hours=0.5), _space('no_time', formed=None)]
+    book = SpaceBook(spaces)
+
+    # 强突破: 收盘价超出上边界两倍高度，第二根K线仍未回到空间内时失效
+    result = _step(book, 1, 1.1050, 1.1040, 1.1045)
+    assert dict(result['invalidated']) == {3: 'error_missing_creation_time'}
+    assert spaces[0]['invalidation_status']['strong_breakout_pending']
+    # 同一根K线也使 'brc' 空间进入等待回踩阶段
+    assert spaces[1]['brc_phase'] == 'waiting_for_retrace' and spaces[1]['brc_initial_price'] == 1.1045
+
+    result = _step(book, 2, 1.1050, 1.1030, 1.1035)
+    assert dict(result['invalidated']) == {0: 'strong_breakout', 2: 'duration_expired'}
+    assert spaces[0]['status'] == 'inactive_cond1_strong_breakout_up_confirmed'
+    assert not spaces[2]['is_valid']
+
+    removed = book.compact()
+    assert len(removed) == 3 and all(s['status'] != 'active' for s in removed)
+    assert [s['id'] for s in spaces] == ['brc']
+
+    # 共享列表中新追加的空间在下次判断时读入
+    spaces.append(_space('late'))
+    result = _step(book, 3, 1.1012, 1.1005, 1.1008)
+    assert spaces[0]['brc_phase'] == 'waiting_for_confirmation' # 第 2 根K线已回踩到缓冲区内
+    assert list(result['eligible']) == [0, 1]
+    result = _step(book, 4, 1.1050, 1.1040, 1.1046) # 收盘超过首次突破价
+    assert result['invalidated'] == [(0, 'breakout_retrace_confirmation')]
+    assert spaces[0]['status'] == 'inactive_cond3_breakout_retrace_confirm_up'
+    # 'late' 空间在同一根K线上开始强突破计数而尚未失效
+    assert list(result['eligible']) == [1]
+
+
+def test_space_records_in_book():
+    record = SpaceRecord(_space('rec', high=1.1030))
+    # 时间字段内部为纳秒整数，按字典读取时为 UTC Timestamp
+    assert record.initial_pulse_end_time == T0.value and record['initial_pulse_end_time'] == T0
+    assert 'brc_phase' not in record and record.get('status') == 'active'
+    book = SpaceBook([record])
+    _step(book, 1, 1.1050, 1.1040, 1.1045)
+    assert record['brc_phase'] == 'waiting_for_retrace'
+    assert isinstance(record['invalidation_status'], InvalidationState)
+
+    restored = SpaceRecord.from_dict(record.to_dict(raw_times=True))
+    assert restored == record and restored.valid_until == record.valid_until
+
+
+def test_record_time_fields_cache_and_fall_back():
+    record = SpaceRecord(_space('rec'))
+    assert record['valid_until'] is record['valid_until'] # 同一纳秒值复用同一 Timestamp
+
+    # 无法解析的时间与原字典一样原样保存和读出，属性视为未设置
+    record['invalidation_time'] = 'n/a'
+    assert record['invalidation_time'] == 'n/a' and record.get('invalidation_time') == 'n/a'
+    assert 'invalidation_time' in record and not hasattr(record, 'invalidation_time')
+    record['invalidation_time'] = T0
+    assert record.invalidation_time == T0.value and dict(record)['invalidation_time'] == T0
+    del record['invalidation_time']
+    assert 'invalidation_time' not in record
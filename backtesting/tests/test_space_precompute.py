@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yaml
+from omegaconf import OmegaConf
+
+from strategies.core.space_precompute import PrecomputedSpaces, load_or_precompute_spaces
+from strategies.event_driven_space_strategy import EventDrivenSpaceStrategy
+
+RULES_PATH = Path(__file__).resolve().parents[2] / 'config' / 'event_mapping.yaml'
+NOW = pd.Timestamp('2024-01-06', tz='UTC')
+
+
+def _strategy():
+    strategy = EventDrivenSpaceStrategy('EventDrivenSpaceStrategy', OmegaConf.create({}), None, None, None)
+    strategy.event_mapping_rules = yaml.safe_load(RULES_PATH.read_text(encoding='utf-8'))['event_mappings']
+    return strategy
+
+
+def _inputs():
+    index = pd.date_range('2024-01-05', periods=48, freq='30min', tz='UTC')
+    rng = np.random.default_rng(1)
+    low = 1.1 + rng.uniform(0, 1e-3, len(index))
+    bars = pd.DataFrame({'open': low, 'high': low + rng.uniform(0, 3e-3, len(index)), 'low': low, 'close': low + 1e-4}, index=index)
+    events = pd.DataFrame({'id': [1, 2, 3], 'title': ['Non-Farm Payrolls', 'CPI m/m', 'Retail Sales'], 'country_code': 'US',
+                           'datetime': pd.to_datetime(['2024-01-05 13:30', '2024-01-05 15:00', '2024-01-05 16:00'], utc=True),
+                           'actual': [250, 0.4, 1.0], 'forecast': [180, 0.3, 0.5]})
+    return events, {'EURUSD': bars, 'XAUUSD': bars}
+
+
+def _spaces(strategy):
+    return {sym: [{k: v for k, v in s.items() if k != 'creation_time'} for s in spaces] for sym, spaces in strategy.active_spaces.items()}
+
+
+def test_precomputed_spaces_match_incremental_construction(tmp_path):
+    events, bars = _inputs()
+    market_data = {sym: {'M30': df} for sym, df in bars.items()}
+
+    reference = _strategy()
+    reference._process_events(events, market_data, NOW)
+
+    strategy = _strategy()
+    precomputed = load_or_precompute_spaces(strategy, events, bars, tmp_path)
+    assert len(list(tmp_path.glob('spaces_*.npz'))) == 1
+    reloaded = load_or_precompute_spaces(strategy, events, bars, tmp_path) # 第二次从缓存文件读取
+    pd.testing.assert_frame_equal(reloaded.table, precomputed.table)
+    assert reloaded.event_keys == precomputed.event_keys
+
+    assert strategy.attach_precomputed_spaces(reloaded)
+    strategy._process_events(events, {}, NOW) # 不需要K线: 全部事件已预计算
+    assert _spaces(strategy) == _spaces(reference)
+    assert sum(len(s) for s in reference.active_spaces.values()) == len(precomputed) > 0
+
+    # 空间定义参数不同的表不被使用
+    other = _strategy()
+    other.space_duration_minutes = 120
+    assert not other.attach_precomputed_spaces(reloaded)
+    assert isinstance(reloaded, PrecomputedSpaces)
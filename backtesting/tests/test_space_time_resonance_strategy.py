@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import yaml
+from omegaconf import OmegaConf
+
+from backtesting.tests.test_event_mapping import RULES_PATH
+from strategies.space_time_resonance_strategy import SpaceTimeResonanceStrategy
+
+
+class RecordingEngine:
+    def __init__(self):
+        self.position_calls = []
+
+    def get_position(self, symbol):
+        self.position_calls.append(symbol)
+        return None
+
+
+def test_bars_flow_through_strategy_and_checkers():
+    config = OmegaConf.create({'strategy_params': {'SpaceTimeResonanceStrategy': {
+        'key_time_enabled': True, 'key_time_hours_after_event': [1]}}})
+    engine = RecordingEngine()
+    strategy = SpaceTimeResonanceStrategy('SpaceTimeResonanceStrategy', config, None, engine, None)
+    strategy.event_mapping_rules = yaml.safe_load(RULES_PATH.read_text(encoding='utf-8'))['event_mappings']
+    strategy.space_duration_minutes = 300
+    assert strategy.child_strategies() == [strategy._rc_checker, strategy._ex_checker]
+
+    index = pd.date_range('2024-01-05 10:00', periods=11, freq='30min', tz='UTC')
+    m30 = pd.DataFrame({'open': 1.101, 'high': 1.102 + np.arange(11) * 1e-4, 'low': 1.1, 'close': 1.101}, index=index)
+    events = pd.DataFrame({'id': ['nfp'], 'title': ['Non-Farm Payrolls'], 'country_code': ['US'],
+                           'datetime': ['2024-01-05 13:30'], 'actual': ['250K'], 'forecast': ['180K']})
+
+    # 14:30 的K线创建空间，15:00 的K线落在空间创建后 1 小时的关键时间窗口内
+    strategy.process_new_data(index[-2], {'EURUSD': {'M30': m30.iloc[:-1]}}, events)
+    assert [space['event_id'] for space in strategy.active_spaces['EURUSD']] == ['nfp']
+    assert engine.position_calls == []
+
+    strategy.process_new_data(index[-1], {'EURUSD': {'M30': m30}}, None)
+    assert engine.position_calls == ['EURUSD']
+    assert strategy._ex_checker.bar_context is strategy.bar_context
@@ -0,0 +1,57 @@
+import time
+from datetime import datetime
+
+from strategies.core.strategy_runner import StrategyRunner
+
+
+class SleepyStrategy:
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.calls = []
+
+    def get_name(self):
+        return self.name
+
+    def process_new_data(self, current_time, market_data, event_data):
+        self.calls.append(current_time)
+        time.sleep(self.seconds)
+
+
+def test_parallel_cycle_bounded_by_slowest_and_deadline():
+    strategies = [SleepyStrategy(f"S{i}", 0.2) for i in range(4)]
+    slow = SleepyStrategy("Slow", 0.6)
+    runner = StrategyRunner(mode='parallel', default_deadline_seconds=1.0, deadlines={'Slow': 0.3})
+    try:
+        start = time.monotonic()
+        results = runner.run(strategies + [slow], datetime(2024, 1, 2, 10), {'M1': {}}, None)
+        elapsed = time.monotonic() - start
+        assert elapsed < 0.5 # 串行需要 1.4 秒
+        assert results['Slow'] == 'timeout'
+        assert all(results[f"S{i}"] == 'ok' for i in range(4))
+
+        # Slow 仍在运行: skip 策略跳过本周期
+        results = runner.run([slow], datetime(2024, 1, 2, 10, 1), {'M1': {}}, None)
+        assert results['Slow'] == 'skipped'
+        time.sleep(0.5)
+        timings = runner.get_timings()
+        assert timings['Slow']['runs'] == 1
+        assert timings['Slow']['timeouts'] == 1
+        assert timings['Slow']['skipped'] == 1
+        assert timings['S0']['last_seconds'] >= 0.2
+    finally:
+        runner.shutdown(wait_running=True)
+
+
+def test_latest_policy_reruns_with_newest_data():
+    slow = SleepyStrategy("Slow", 0.3)
+    runner = StrategyRunner(mode='parallel', default_deadline_seconds=0.05, busy_policy='latest')
+    try:
+        t0, t1, t2 = (datetime(2024, 1, 2, 10, m) for m in range(3))
+        assert runner.run([slow], t0, {}, None)['Slow'] == 'timeout'
+        assert runner.run([slow], t1, {}, None)['Slow'] == 'coalesced'
+        assert runner.run([slow], t2, {}, None)['Slow'] == 'coalesced'
+        time.sleep(0.8)
+        assert slow.calls == [t0, t2]
+    finally:
+        runner.shutdown(wait_running=True)
@@ -0,0 +1,344 @@
+"""
+K线数据质量检查模块
+
+对 OHLC K 线数据做一次性向量化扫描，统计:
+- 时间缺口 (相邻K线间隔超过预期周期的倍数)
+- 重复时间戳
+- 非单调递增的时间戳
+- 零振幅K线 (high == low)
+- 无效 OHLC (high < low 或 open/close 超出 high/low 范围)
+- 空值
+- 收盘价异常跳变 (基于对数收益率的 MAD 稳健 z-score)
+
+对于文件数据，报告会以 JSON 形式保存在数据文件旁 (``<文件名>.quality.json``)，
+以 (文件大小, 修改时间, 最后一条时间戳) 作为指纹；文件未变化时直接返回缓存的报告。
+"""
+
+import os
+import json
+import logging
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 报告格式版本，检查逻辑变化时递增以使旧缓存失效
+REPORT_VERSION = 1
+QUALITY_FILE_SUFFIX = ".quality.json"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_TIMEFRAME_SECONDS = {
+    'M1': 60, 'M5': 300, 'M15': 900, 'M30': 1800,
+    'H1': 3600, 'H4': 14400, 'D1': 86400, 'W1': 604800,
+}
+
+
+def timeframe_to_seconds(timeframe: Optional[str]) -> Optional[int]:
+    """将时间周期字符串 (如 'M30', 'h1') 转换为秒数，未知周期返回 None。"""
+    if not timeframe:
+        return None
+    return _TIMEFRAME_SECONDS.get(str(timeframe).upper())
+
+
+@dataclass
+class DataQualityReport:
+    """
+    单个K线序列的数据质量报告。
+    """
+    rows: int = 0
+    first_time: Optional[str] = None
+    last_time: Optional[str] = None
+    expected_interval_seconds: Optional[int] = None
+    null_count: int = 0
+    duplicate_count: int = 0
+    non_monotonic_count: int = 0
+    gap_count: int = 0
+    max_gap_seconds: float = 0.0
+    zero_range_count: int = 0
+    invalid_ohlc_count: int = 0
+    outlier_count: int = 0
+    params: Dict[str, Any] = field(default_factory=dict)
+    fingerprint: Optional[Dict[str, Any]] = None
+    version: int = REPORT_VERSION
+
+    @property
+    def is_empty(self) -> bool:
+        return self.rows == 0
+
+    @property
+    def has_errors(self) -> bool:
+        """存在会影响回测正确性的问题 (空数据/空值/重复/乱序/无效OHLC)。"""
+        return (self.is_empty or self.null_count > 0 or self.duplicate_count > 0
+                or self.non_monotonic_count > 0 or self.invalid_ohlc_count > 0)
+
+    @property
+    def has_warnings(self) -> bool:
+        """存在值得关注但不致命的问题 (缺口/零振幅/异常跳变)。"""
+        return self.gap_count > 0 or self.zero_range_count > 0 or self.outlier_count > 0
+
+    def summary(self) -> str:
+        """返回单行摘要，便于日志输出。"""
+        return (f"rows={self.rows}, range=[{self.first_time} ~ {self.last_time}], "
+                f"nulls={self.null_count}, duplicates={self.duplicate_count}, "
+                f"non_monotonic={self.non_monotonic_count}, gaps={self.gap_count} "
+                f"(max {self.max_gap_seconds / 60:.1f} min), zero_range={self.zero_range_count}, "
+                f"invalid_ohlc={self.invalid_ohlc_count}, outliers={self.outlier_count}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DataQualityReport":
+        known = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+
+def _time_values_ns(df: pd.DataFrame) -> Optional[np.ndarray]:
+    """从 DataFrame 的 DatetimeIndex 或 'time' 列中取出 int64 纳秒时间戳数组。"""
+    if isinstance(df.index, pd.DatetimeIndex):
+        times = df.index
+    elif 'time' in df.columns:
+        times = pd.DatetimeIndex(pd.to_datetime(df['time'], errors='coerce'))
+    else:
+        return None
+    if times.tz is not None:
+        times = times.tz_convert('UTC').tz_localize(None)
+    return times.as_unit('ns').asi8
+
+
+def analyze_bars(df: pd.DataFrame,
+                 expected_interval_seconds: Optional[int] = None,
+                 gap_multiplier: float = 1.5,
+                 outlier_threshold: float = 10.0) -> DataQualityReport:
+    """
+    对K线 DataFrame 做一次向量化扫描，生成数据质量报告。
+
+    Args:
+        df (pd.DataFrame): K线数据，时间为 DatetimeIndex 或 'time' 列，含 open/high/low/close 列。
+        expected_interval_seconds (Optional[int]): 预期K线间隔(秒)，None 时取相邻间隔的中位数。
+        gap_multiplier (float): 间隔超过 预期间隔*gap_multiplier 计为缺口。
+        outlier_threshold (float): 对数收益率的 MAD 稳健 z-score 超过该值计为异常跳变。
+
+    Returns:
+        DataQualityReport: 质量报告。
+    """
+    report = DataQualityReport(
+        expected_interval_seconds=expected_interval_seconds,
+        params={'gap_multiplier': gap_multiplier, 'outlier_threshold': outlier_threshold},
+    )
+    if df is None or df.empty:
+        return report
+
+    report.rows = int(len(df))
+    price_cols = [c for c in ('open', 'high', 'low', 'close') if c in df.columns]
+    if price_cols:
+        prices = df[price_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        report.null_count = int(np.isnan(prices).any(axis=1).sum())
+
+    times_ns = _time_values_ns(df)
+    if times_ns is not None and len(times_ns) > 0:
+        valid_times = times_ns[times_ns != np.iinfo(np.int64).min]  # 排除 NaT
+        if len(valid_times) > 0:
+            report.first_time = pd.Timestamp(valid_times.min()).strftime(TIME_FORMAT)
+            report.last_time = pd.Timestamp(valid_times.max()).strftime(TIME_FORMAT)
+        if len(valid_times) > 1:
+            diffs = np.diff(valid_times)
+            report.non_monotonic_count = int((diffs < 0).sum())
+            if report.non_monotonic_count == 0:
+                report.duplicate_count = int((diffs == 0).sum())
+                positive_diffs = diffs[diffs > 0]
+            else:
+                sorted_times = np.sort(valid_times)
+                sorted_diffs = np.diff(sorted_times)
+                report.duplicate_count = int((sorted_diffs == 0).sum())
+                positive_diffs = sorted_diffs[sorted_diffs > 0]
+
+            if len(positive_diffs) > 0:
+                interval_ns = (expected_interval_seconds * 1_000_000_000 if expected_interval_seconds
+                               else float(np.median(positive_diffs)))
+                gap_mask = positive_diffs > interval_ns * gap_multiplier
+                report.gap_count = int(gap_mask.sum())
+                if report.gap_count:
+                    report.max_gap_seconds = float(positive_diffs[gap_mask].max()) / 1e9
+
+    if {'open', 'high', 'low', 'close'}.issubset(df.columns):
+        o = df['open'].to_numpy(dtype=np.float64, na_value=np.nan)
+        h = df['high'].to_numpy(dtype=np.float64, na_value=np.nan)
+        l = df['low'].to_numpy(dtype=np.float64, na_value=np.nan)
+        c = df['close'].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid='ignore'):
+            report.zero_range_count = int((h == l).sum())
+            report.invalid_ohlc_count = int(((h < l) | (o > h) | (o < l) | (c > h) | (c < l)).sum())
+
+            if len(c) > 2:
+                log_returns = np.diff(np.log(c[c > 0]))
+                log_returns = log_returns[np.isfinite(log_returns)]
+                if len(log_returns) > 0:
+                    median = np.median(log_returns)
+                    mad = np.median(np.abs(log_returns - median))
+                    if mad > 0:
+                        robust_z = 0.6745 * np.abs(log_returns - median) / mad
+                        report.outlier_count = int((robust_z > outlier_threshold).sum())
+
+    return report
+
+
+def _read_first_timestamp(filepath: Path) -> Optional[str]:
+    """读取 CSV 文件开头 1KB，返回第一条数据行的时间字段 (原始字符串)。"""
+    try:
+        with open(filepath, 'rb') as f:
+            head = f.read(1024).decode('utf-8', errors='ignore')
+    except OSError:
+        return None
+    lines = [line for line in head.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return None
+    return lines[1].split(',', 1)[0].strip()
+
+
+def _read_last_timestamp(filepath: Path) -> Optional[str]:
+    """读取 CSV 文件末尾 1KB，返回最后一行的时间字段 (原始字符串)。"""
+    try:
+        with open(filepath, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 1024))
+            tail = f.read().decode('utf-8', errors='ignore')
+        lines = [line for line in tail.splitlines() if line.strip()]
+        if not lines:
+            return None
+        last_field = lines[-1].split(',', 1)[0].strip()
+        return None if last_field == 'time' else last_field
+    except OSError:
+        return None
+
+
+def _read_price_frame(filepath: Path, fingerprint: Dict[str, Any]) -> Optional[pd.DataFrame]:
+    """读取文件的时间和 OHLC 列；读取失败时返回 None。"""
+    if fingerprint['size'] == 0:
+        return pd.DataFrame()
+    try:
+        df = pd.read_csv(filepath, usecols=lambda c: c in ('time', 'open', 'high', 'low', 'close'))
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    except Exception as e:
+        logger.error(f"读取数据文件失败，无法检查数据质量 {filepath.name}: {e}")
+        return None
+    if 'time' in df.columns:
+        df['time'] = pd.to_datetime(df['time'], format=TIME_FORMAT, errors='coerce')
+    return df
+
+
+def _frame_covers_file(df: pd.DataFrame, filepath: Path, fingerprint: Dict[str, Any]) -> bool:
+    """df 是否为整个文件的数据 (包含 OHLC 列且首尾时间与文件一致)。"""
+    if df.empty or not {'open', 'high', 'low', 'close'}.issubset(df.columns):
+        return False
+    times_ns = _time_values_ns(df)
+    if times_ns is None:
+        return False
+    valid_times = times_ns[times_ns != np.iinfo(np.int64).min]
+    if len(valid_times) == 0:
+        return False
+    return (pd.Timestamp(valid_times.max()).strftime(TIME_FORMAT) == fingerprint['last_timestamp']
+            and pd.Timestamp(valid_times.min()).strftime(TIME_FORMAT) == _read_first_timestamp(filepath))
+
+
+def file_fingerprint(filepath: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """返回数据文件指纹 (size, mtime_ns, last_timestamp)，文件不存在时返回 None。"""
+    filepath = Path(filepath)
+    try:
+        stat = filepath.stat()
+    except OSError:
+        return None
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'last_timestamp': _read_last_timestamp(filepath),
+    }
+
+
+def quality_report_path(filepath: Union[str, Path]) -> Path:
+    """数据文件对应的质量报告缓存路径。"""
+    filepath = Path(filepath)
+    return filepath.with_name(filepath.name + QUALITY_FILE_SUFFIX)
+
+
+def _load_cached_report(report_path: Path, fingerprint: Dict[str, Any],
+                        params: Dict[str, Any]) -> Optional[DataQualityReport]:
+    try:
+        with open(report_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (data.get('version') != REPORT_VERSION or data.get('fingerprint') != fingerprint
+            or data.get('params') != params):
+        return None
+    return DataQualityReport.from_dict(data)
+
+
+def _save_report(report_path: Path, report: DataQualityReport):
+    temp_path = report_path.with_name(report_path.name + '.tmp')
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, report_path)
+    except OSError as e:
+        logger.warning(f"保存数据质量报告失败 {report_path.name}: {e}")
+        if temp_path.exists():
+            try:
+                temp_path.unlink()
+            except OSError:
+                pass
+
+
+def check_file_quality(filepath: Union[str, Path],
+                       expected_interval_seconds: Optional[int] = None,
+                       gap_multiplier: float = 1.5,
+                       outlier_threshold: float = 10.0,
+                       use_cache: bool = True,
+                       df: Optional[pd.DataFrame] = None) -> Optional[DataQualityReport]:
+    """
+    检查K线 CSV 文件的数据质量，文件未变化时直接返回缓存报告。
+
+    报告始终针对整个文件。调用方已经读取了整个文件时 (如回测引擎加载数据后) 可通过 df 传入，
+    缓存未命中时直接分析 df，不再读取文件；df 只是按时间区间或列读取的部分数据时仍读取整个文件
+    分析一次并缓存，之后同一文件的任意区间加载都命中缓存 (无错误的文件报告对其任意区间都成立)。
+
+    Args:
+        filepath (Union[str, Path]): K线 CSV 文件路径 (time,open,high,low,close,... 格式)。
+        expected_interval_seconds (Optional[int]): 预期K线间隔(秒)。
+        gap_multiplier (float): 缺口判定倍数，见 analyze_bars。
+        outlier_threshold (float): 异常跳变阈值，见 analyze_bars。
+        use_cache (bool): 是否读写报告缓存文件。
+        df (Optional[pd.DataFrame]): 已加载的该文件数据 (DatetimeIndex 或 'time' 列)，仅在覆盖整个文件时使用。
+
+    Returns:
+        Optional[DataQualityReport]: 质量报告；文件不存在或无法读取时返回 None。
+    """
+    filepath = Path(filepath)
+    fingerprint = file_fingerprint(filepath)
+    if fingerprint is None:
+        return None
+
+    params = {'gap_multiplier': gap_multiplier, 'outlier_threshold': outlier_threshold}
+    report_path = quality_report_path(filepath)
+    if use_cache:
+        cached = _load_cached_report(report_path, fingerprint, params)
+        if cached is not None and cached.expected_interval_seconds == expected_interval_seconds:
+            logger.debug(f"使用缓存的数据质量报告: {report_path.name}")
+            return cached
+
+    if df is None or not _frame_covers_file(df, filepath, fingerprint):
+        df = _read_price_frame(filepath, fingerprint)
+        if df is None:
+            return None
+
+    report = analyze_bars(df, expected_interval_seconds, gap_multiplier, outlier_threshold)
+    report.fingerprint = fingerprint
+    if use_cache:
+        _save_report(report_path, report)
+    return report
@@ -0,0 +1,144 @@
+"""
+回测热路径的低开销日志
+
+策略在每根K线、每个空间上调用 self.logger.debug(f"...")。f-string 在级别检查之前就已构建，
+即使日志级别是 INFO，格式化 Timestamp、浮点数和字典的开销也一直存在。另外，StrategyBase
+原先把策略 logger 的级别固定为 DEBUG，长回测的性能剖析中字符串构建和日志 I/O 占了很大比例。
+
+FastLogger 包装 logging.Logger (接口与 Logger 相同):
+
+- 级别开关在初始化时缓存为属性 (debug_enabled / info_enabled)，热路径用 ``if log.debug_enabled:``
+  跳过整段日志，关闭时不构建任何字符串；
+- 消息可以是无参函数 (``log.debug(lambda: f"...")``)，只有在级别开启时才调用；
+- every(key, n) / throttle(key, seconds) 对重复消息采样和限频；sampled(key) 按配置的
+  logging.sample_every 采样 (每根K线重复出现的同一条消息只输出第 1 次和之后每第 n 次)。
+
+日志配置档 (logging.profile):
+
+- verbose: 策略 logger 级别 DEBUG (原行为)；
+- normal: INFO；
+- silent: WARNING，回测每根K线路径上的 debug/info 格式化全部跳过。
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+from omegaconf import OmegaConf
+
+PROFILES: Dict[str, int] = {'verbose': logging.DEBUG, 'normal': logging.INFO, 'silent': logging.WARNING}
+DEFAULT_PROFILE = 'verbose'
+
+Message = Union[str, Callable[[], str]]
+
+
+def resolve_profile(config: Any, default: str = DEFAULT_PROFILE) -> str:
+    """从配置的 logging.profile 读取日志配置档；未配置或未知时使用 default。"""
+    profile = OmegaConf.select(config, 'logging.profile', default=None) if config is not None else None
+    if profile is None:
+        return default
+    profile = str(profile).lower()
+    if profile not in PROFILES:
+        logging.getLogger(__name__).warning(f"未知的日志配置档 '{profile}'，使用 {default}。可选: {list(PROFILES)}")
+        return default
+    return profile
+
+
+class FastLogger(logging.LoggerAdapter):
+    """
+    带缓存级别开关、惰性消息和采样/限频的 logger 包装。
+
+    Args:
+        logger (logging.Logger): 被包装的 logger。
+        profile (Optional[str]): 日志配置档；提供时设置 logger 的级别。
+        sample_every (int): sampled() 的采样间隔 (1 表示不采样)。
+    """
+
+    def __init__(self, logger: logging.Logger, profile: Optional[str] = None, sample_every: int = 1):
+        super().__init__(logger, {})
+        self.profile = profile
+        self.sample_every = max(int(sample_every or 1), 1)
+        self._counts: Dict[str, int] = {}
+        self._last_emit: Dict[str, float] = {}
+        if profile is not None:
+            logger.setLevel(PROFILES[profile])
+        self.refresh()
+
+    def refresh(self):
+        """重新缓存级别开关 (logger 级别或处理器配置变化后调用)。"""
+        self.debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
+        self.info_enabled = self.logger.isEnabledFor(logging.INFO)
+
+    def setLevel(self, level: Union[int, str]):
+        self.logger.setLevel(level)
+        self.refresh()
+
+    def set_profile(self, profile: str):
+        self.profile = profile
+        self.setLevel(PROFILES[profile])
+
+    def process(self, msg: Any, kwargs: Dict[str, Any]):
+        return msg, kwargs
+
+    # --- 日志方法 (消息可以是无参函数) ---
+    def debug(self, msg: Message, *args, **kwargs):
+        if self.debug_enabled:
+            self.logger.debug(msg() if callable(msg) else msg, *args, stacklevel=2, **kwargs)
+
+    def info(self, msg: Message, *args, **kwargs):
+        if self.info_enabled:
+            self.logger.info(msg() if callable(msg) else msg, *args, stacklevel=2, **kwargs)
+
+    def warning(self, msg: Message, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(msg() if callable(msg) else msg, *args, stacklevel=2, **kwargs)
+
+    def error(self, msg: Message, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self.logger.error(msg() if callable(msg) else msg, *args, stacklevel=2, **kwargs)
+
+    def exception(self, msg: Message, *args, exc_info=True, **kwargs):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self.logger.error(msg() if callable(msg) else msg, *args, exc_info=exc_info, stacklevel=2, **kwargs)
+
+    def critical(self, msg: Message, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.CRITICAL):
+            self.logger.critical(msg() if callable(msg) else msg, *args, stacklevel=2, **kwargs)
+
+    def log(self, level: int, msg: Message, *args, **kwargs):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg() if callable(msg) else msg, *args, stacklevel=2, **kwargs)
+
+    # --- 采样与限频 ---
+    def every(self, key: str, n: int) -> bool:
+        """key 的第 1 次以及之后每第 n 次调用返回 True (n <= 1 时总是 True)。"""
+        count = self._counts.get(key, 0) + 1
+        self._counts[key] = count
+        return n <= 1 or count % n == 1
+
+    def sampled(self, key: str) -> bool:
+        """按 sample_every 对 key 采样。"""
+        return self.every(key, self.sample_every)
+
+    def throttle(self, key: str, seconds: float) -> bool:
+        """距离 key 上次返回 True 至少 seconds 秒时返回 True。"""
+        now = time.monotonic()
+        last = self._last_emit.get(key)
+        if last is not None and now - last < seconds:
+            return False
+        self._last_emit[key] = now
+        return True
+
+
+def get_fast_logger(name: str, profile: Optional[str] = None, sample_every: int = 1) -> FastLogger:
+    """返回 logging.getLogger(name) 的 FastLogger 包装。"""
+    return FastLogger(logging.getLogger(name), profile, sample_every)
+
+
+def as_fast_logger(logger: Union[logging.Logger, logging.LoggerAdapter, None], name: str = __name__) -> FastLogger:
+    """把传入的 logger 包装为 FastLogger (已是 FastLogger 时原样返回，保留其配置档和采样设置)。"""
+    if isinstance(logger, FastLogger):
+        return logger
+    if isinstance(logger, logging.LoggerAdapter):
+        logger = logger.logger
+    return FastLogger(logger or logging.getLogger(name))
@@ -0,0 +1,110 @@
+"""
+进程间通知通道
+
+RealtimeUpdater 在K线收盘、财经日历文件更新时发布通知，StrategyOrchestrator 订阅后立即运行
+策略周期，而不是等待固定的定时器。
+
+通道使用本机回环地址上的 UDP 数据报 (Windows 与 POSIX 通用)，每条通知是一个 JSON 对象:
+``{"topic": "bar_closed", "ts": <发布时间>, ...}``。发布方不关心是否有订阅方，没有订阅方时通知被丢弃；
+订阅方收到第一条通知后在 coalesce 窗口内继续收集，把一波突发通知合并为一次唤醒。
+"""
+
+import json
+import logging
+import select
+import socket
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TOPIC_BAR_CLOSED = 'bar_closed'
+TOPIC_CALENDAR_UPDATED = 'calendar_updated'
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 47651
+_MAX_DATAGRAM = 65507
+
+
+class NotificationPublisher:
+    """向订阅方发送通知 (非阻塞，发送失败只记录调试日志)。"""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.address = (host, port)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def publish(self, topic: str, **payload: Any) -> bool:
+        message = {'topic': topic, 'ts': time.time(), **payload}
+        try:
+            self._sock.sendto(json.dumps(message, default=str).encode('utf-8'), self.address)
+            return True
+        except OSError as e:
+            logger.debug(f"发布通知 {topic} 失败: {e}")
+            return False
+
+    def close(self):
+        self._sock.close()
+
+
+class NotificationSubscriber:
+    """
+    在本机端口上接收通知。
+
+    Args:
+        host (str): 绑定地址 (应为回环地址)。
+        port (int): 绑定端口，0 表示由系统分配 (见 self.port)。
+        coalesce_seconds (float): 收到第一条通知后继续收集的时间窗口。
+
+    Raises:
+        OSError: 端口已被占用等绑定失败的情况。
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, coalesce_seconds: float = 0.2):
+        self.coalesce_seconds = coalesce_seconds
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.setblocking(False)
+        self.port = self._sock.getsockname()[1]
+
+    def _drain(self, messages: List[Dict[str, Any]]):
+        while True:
+            try:
+                data, _ = self._sock.recvfrom(_MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return # Windows 上可能出现 WSAECONNRESET，忽略
+            try:
+                message = json.loads(data.decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                logger.debug("忽略无法解析的通知数据报。")
+                continue
+            if isinstance(message, dict) and 'topic' in message:
+                messages.append(message)
+
+    def wait(self, timeout: Optional[float]) -> List[Dict[str, Any]]:
+        """
+        等待通知。最多阻塞 timeout 秒；收到通知后再收集 coalesce_seconds 内到达的通知一起返回。
+
+        Returns:
+            List[Dict[str, Any]]: 收到的通知 (超时时为空列表)。
+        """
+        messages: List[Dict[str, Any]] = []
+        ready, _, _ = select.select([self._sock], [], [], timeout)
+        if not ready:
+            return messages
+        self._drain(messages)
+
+        deadline = time.monotonic() + self.coalesce_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([self._sock], [], [], remaining)
+            if ready:
+                self._drain(messages)
+        return messages
+
+    def close(self):
+        self._sock.close()
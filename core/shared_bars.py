@@ -0,0 +1,268 @@
+"""
+实时K线共享内存环形缓冲区
+
+每个 (品种, 时间周期) 对应一块命名共享内存，由 RealtimeUpdater 写入、
+MarketDataProvider 在其他进程中读取，避免通过 CSV 文件做文本格式化和解析。
+
+内存布局:
+- 64 字节头部: magic, 版本, 容量, 记录长度, 状态, 写入进程 PID,
+  序列号 seq, 已写入K线总数 count, 最新K线时间 last_time
+- capacity 条定长记录 (BAR_DTYPE, 64 字节)，第 i 根K线位于槽位 i % capacity
+
+并发控制采用 seqlock: 写入前 seq 加 1 (奇数表示写入中)，写完再加 1；
+读取方在读取前后比较 seq，不一致或为奇数时重试。读取方直接在映射的内存上构造
+NumPy 视图，只复制需要的窗口。
+"""
+
+import logging
+import os
+import re
+import time
+from multiprocessing import shared_memory
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BAR_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<i8'), ('spread', '<i8'), ('real_volume', '<i8'),
+])
+BAR_FIELDS = list(BAR_DTYPE.names)
+
+_HEADER_DTYPE = np.dtype([
+    ('magic', '<u4'), ('version', '<u4'), ('capacity', '<u4'), ('record_size', '<u4'),
+    ('state', '<u4'), ('writer_pid', '<u4'),
+    ('seq', '<u8'), ('count', '<u8'), ('last_time', '<i8'),
+])
+HEADER_SIZE = 64
+MAGIC = 0x53534252 # 'SSBR'
+VERSION = 1
+STATE_LIVE = 1
+STATE_CLOSED = 2
+
+_READ_RETRIES = 100
+
+# 本进程作为写入方创建的共享内存名称 (同进程内的读取方不能取消它们在 resource_tracker 中的登记)
+_OWNED_NAMES = set()
+
+
+def ring_name(prefix: str, symbol: str, timeframe: str) -> str:
+    """构建共享内存名称，只保留字母、数字和下划线 (如 'TSLA.OQ' -> 'TSLA_OQ')。"""
+    raw = f"{prefix}_{symbol.upper()}_{timeframe.upper()}"
+    return re.sub(r'[^A-Za-z0-9_]', '_', raw)
+
+
+def _open_existing(name: str) -> shared_memory.SharedMemory:
+    """
+    以读取方身份打开已有共享内存。
+    Python 3.13 之前打开已有共享内存也会登记到 resource_tracker，进程退出时会被误删，
+    因此读取方需要取消登记。
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, create=False, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name, create=False)
+        if os.name == 'posix' and name not in _OWNED_NAMES:
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            except Exception:
+                pass
+        return shm
+
+
+def to_bar_array(rates: Any) -> np.ndarray:
+    """将 MT5 返回的 rates (结构化数组或元组序列) 转换为 BAR_DTYPE 数组。"""
+    if isinstance(rates, np.ndarray) and rates.dtype.names and set(BAR_FIELDS) <= set(rates.dtype.names):
+        bars = np.empty(len(rates), dtype=BAR_DTYPE)
+        for field in BAR_FIELDS:
+            bars[field] = rates[field]
+        return bars
+    return np.array([tuple(row[:len(BAR_FIELDS)]) for row in rates], dtype=BAR_DTYPE)
+
+
+class SharedBarRing:
+    """
+    单个 (品种, 时间周期) 的共享内存K线环形缓冲区。
+
+    写入方使用 create()，读取方使用 attach()。
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self.name = shm.name
+        self.owner = owner
+        self._header = np.ndarray((1,), dtype=_HEADER_DTYPE, buffer=shm.buf, offset=0)
+        capacity = int(self._header['capacity'][0])
+        self.capacity = capacity
+        self._bars = np.ndarray((capacity,), dtype=BAR_DTYPE, buffer=shm.buf, offset=HEADER_SIZE)
+
+    # --- 创建与连接 ---
+    @classmethod
+    def create(cls, name: str, capacity: int) -> 'SharedBarRing':
+        """创建 (或接管同名的已有) 共享内存缓冲区并清空，供写入方使用。"""
+        size = HEADER_SIZE + capacity * BAR_DTYPE.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # 上次运行遗留的同名共享内存：大小合适则复用，否则删除重建
+            shm = shared_memory.SharedMemory(name=name, create=False)
+            if shm.size < size:
+                shm.close()
+                shm.unlink()
+                shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((1,), dtype=_HEADER_DTYPE, buffer=shm.buf, offset=0)
+        header['seq'] = 1 # 初始化期间保持奇数，读取方会等待
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['capacity'] = capacity
+        header['record_size'] = BAR_DTYPE.itemsize
+        header['writer_pid'] = os.getpid()
+        header['count'] = 0
+        header['last_time'] = np.iinfo(np.int64).min
+        header['state'] = STATE_LIVE
+        header['seq'] = 2
+        del header
+        _OWNED_NAMES.add(name)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> Optional['SharedBarRing']:
+        """连接已有缓冲区 (读取方)。不存在、格式不符或写入方已关闭时返回 None。"""
+        try:
+            shm = _open_existing(name)
+        except (FileNotFoundError, OSError):
+            return None
+        header = np.ndarray((1,), dtype=_HEADER_DTYPE, buffer=shm.buf, offset=0)
+        valid = (
+            shm.size >= HEADER_SIZE
+            and int(header['magic'][0]) == MAGIC
+            and int(header['version'][0]) == VERSION
+            and int(header['record_size'][0]) == BAR_DTYPE.itemsize
+            and int(header['state'][0]) == STATE_LIVE
+            and shm.size >= HEADER_SIZE + int(header['capacity'][0]) * BAR_DTYPE.itemsize
+        )
+        del header
+        if not valid:
+            shm.close()
+            return None
+        return cls(shm, owner=False)
+
+    # --- 状态 ---
+    @property
+    def sequence(self) -> int:
+        """写入序列号，每次写入增加 2；读取方可用它判断数据是否变化。"""
+        return int(self._header['seq'][0])
+
+    @property
+    def is_live(self) -> bool:
+        return int(self._header['state'][0]) == STATE_LIVE
+
+    @property
+    def count(self) -> int:
+        return int(self._header['count'][0])
+
+    # --- 写入 ---
+    def write(self, rates: Any) -> Tuple[bool, int]:
+        """
+        写入最新一批K线 (按时间升序)。
+
+        与最新K线时间相同的K线覆盖最后一个槽位 (正在形成的K线)，更新的K线依次追加，
+        更早的K线忽略。
+
+        Returns:
+            Tuple[bool, int]: (最后一根K线是否被更新, 追加的K线数)。
+        """
+        bars = rates if isinstance(rates, np.ndarray) and rates.dtype == BAR_DTYPE else to_bar_array(rates)
+        if len(bars) == 0:
+            return False, 0
+
+        header = self._header
+        count = int(header['count'][0])
+        last_time = int(header['last_time'][0])
+        times = bars['time']
+
+        tail_update = None
+        if count > 0:
+            pos = int(np.searchsorted(times, last_time))
+            if pos < len(times) and times[pos] == last_time:
+                current = self._bars[(count - 1) % self.capacity]
+                if bars[pos].tobytes() != current.tobytes():
+                    tail_update = bars[pos]
+        new_bars = bars[times > last_time] if count > 0 else bars
+        if len(new_bars) > self.capacity:
+            new_bars = new_bars[-self.capacity:]
+        if tail_update is None and len(new_bars) == 0:
+            return False, 0
+
+        header['seq'] += 1 # 奇数: 写入中
+        try:
+            if tail_update is not None:
+                self._bars[(count - 1) % self.capacity] = tail_update
+            n_new = len(new_bars)
+            if n_new:
+                slots = (count + np.arange(n_new)) % self.capacity
+                self._bars[slots] = new_bars
+                header['count'] = count + n_new
+                header['last_time'] = int(new_bars['time'][-1])
+        finally:
+            header['seq'] += 1
+        return tail_update is not None, len(new_bars)
+
+    # --- 读取 ---
+    def read(self, n_bars: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        按时间顺序复制最近 n_bars 根K线 (默认全部可用K线)。
+
+        Returns:
+            Optional[np.ndarray]: BAR_DTYPE 数组；多次重试仍未读到一致数据时返回 None。
+        """
+        header = self._header
+        for attempt in range(_READ_RETRIES):
+            seq_before = int(header['seq'][0])
+            if seq_before % 2:
+                time.sleep(0 if attempt < 10 else 0.0005)
+                continue
+            count = int(header['count'][0])
+            available = min(count, self.capacity)
+            n = available if n_bars is None else min(n_bars, available)
+            if n <= 0:
+                out = np.empty(0, dtype=BAR_DTYPE)
+            else:
+                start = (count - n) % self.capacity
+                end = start + n
+                if end <= self.capacity:
+                    out = self._bars[start:end].copy()
+                else:
+                    out = np.concatenate((self._bars[start:], self._bars[:end - self.capacity]))
+            if int(header['seq'][0]) == seq_before:
+                return out
+        logger.warning(f"共享内存 {self.name} 多次读取均不一致，放弃本次读取。")
+        return None
+
+    # --- 关闭 ---
+    def close(self, unlink: bool = False):
+        """
+        释放本进程的映射。写入方关闭前会将状态标记为已关闭，读取方据此重新连接；
+        unlink=True 时 (仅写入方) 同时删除共享内存名称。
+        """
+        if self._shm is None:
+            return
+        if self.owner:
+            self._header['state'] = STATE_CLOSED
+            if unlink:
+                try:
+                    self._shm.unlink()
+                except FileNotFoundError:
+                    pass
+                _OWNED_NAMES.discard(self.name)
+        self._header = None
+        self._bars = None
+        try:
+            self._shm.close()
+        except BufferError:
+            logger.debug(f"共享内存 {self.name} 仍有视图引用，未能立即释放映射。")
+        self._shm = None
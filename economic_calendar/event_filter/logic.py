@@ -198,34 +198,22 @@ def keyword_match(text: str, keywords: List[str]) -> bool:
     Returns:
         bool: 是否匹配
     """
-    # --- 添加调试: 打印原始输入 ---
-    # print(f"DEBUG [Matcher]: Original Text: '{text}'")
-    # --- 调试结束 ---
-
     normalized_text = normalize_text(text)
+    # 每个事件、每组关键词都会调用，调试输出只在 DEBUG 级别开启时构建
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
     if not normalized_text:
-        # --- 添加调试: 打印标准化结果和空文本跳过 ---
-        print(f"DEBUG [Matcher]: Normalized Text: '{normalized_text}' -> Skipping (empty)")
-        # --- 调试结束 ---
+        if debug_enabled:
+            logger.debug(f"[Matcher] Normalized Text: '{normalized_text}' -> Skipping (empty)")
         return False
 
     # 编译关键词列表为正则表达式模式
     pattern = create_keyword_pattern(keywords)
-    # --- 修改：移除 potential_match 检查，强制打印 ---
-    # 为了减少日志量，只在文本可能包含关键词时打印详细信息 (启发式)
-    # potential_match = any(kw.lower() in normalized_text for kw in keywords if len(kw)>1) # 简单检查
-    # if potential_match:
-    print(f"DEBUG [Matcher]: Normalized Text: '{normalized_text}'")
-    print(f"DEBUG [Matcher]: Pattern: '{pattern.pattern}'")
-    # --- 修改结束 ---
 
     # 使用search()在文本中查找模式
     match_result = pattern.search(normalized_text)
 
-    # --- 修改：移除 potential_match 检查，强制打印 ---
-    # if potential_match:
-    print(f"DEBUG [Matcher]: Match Result: {bool(match_result)}")
-    # --- 修改结束 ---
+    if debug_enabled:
+        logger.debug(f"[Matcher] Normalized Text: '{normalized_text}' | Pattern: '{pattern.pattern}' | Match Result: {bool(match_result)}")
 
     return bool(match_result)
 
@@ -9,6 +9,10 @@ import logging
 import sys
 from datetime import datetime, timedelta, timezone
 import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 import pytz # For robust timezone handling
 from pathlib import Path
@@ -29,6 +33,7 @@ try:
         get_utc_timezone,
         MT5_AVAILABLE
     )
+    from core.data_quality import check_file_quality
     if MT5_AVAILABLE:
         from core.utils import mt5 # Import the mt5 object if available
     else:
@@ -46,6 +51,7 @@ except ImportError as e:
     def shutdown_mt5(*args, **kwargs): pass
     def get_filepath(*args, **kwargs): return Path()
     def get_utc_timezone(*args, **kwargs): return timezone.utc
+    def check_file_quality(*args, **kwargs): return None
 
 class HistoryUpdater:
     """
@@ -71,6 +77,9 @@ class HistoryUpdater:
         self.filename_pattern: str = ""
         self.base_data_dir: Path = Path()
         self.timezone: pytz.BaseTzInfo = get_utc_timezone() # Use pytz for robust timezone handling
+        # MT5 terminal calls are serialised through this gate (see _mt5_gate)
+        self._mt5_lock = threading.Lock()
+        self._last_mt5_request: float = 0.0
 
         try:
             # 1. 加载配置
@@ -124,6 +133,9 @@ class HistoryUpdater:
             self.retry_attempts: int = 3
             self.retry_delay_seconds: int = 60
             self.verify_integrity: bool = True
+            self.refetch_last_bar: bool = True
+            self.pipeline_workers: int = 4
+            self.min_request_interval_ms: int = 0
 
             if self.config:
                 try:
@@ -132,7 +144,11 @@ class HistoryUpdater:
                     self.retry_attempts = OmegaConf.select(self.config, "historical.retry_attempts", default=3)
                     self.retry_delay_seconds = OmegaConf.select(self.config, "historical.retry_delay_seconds", default=60)
                     self.verify_integrity = OmegaConf.select(self.config, "historical.verify_integrity", default=True)
+                    self.refetch_last_bar = OmegaConf.select(self.config, "historical.refetch_last_bar", default=True)
+                    self.pipeline_workers = max(1, int(OmegaConf.select(self.config, "historical.pipeline_workers", default=4)))
+                    self.min_request_interval_ms = OmegaConf.select(self.config, "historical.min_request_interval_ms", default=0)
                     self.logger.info(f"分块/重试配置: batch_size={self.batch_size_days}d, delay={self.delay_between_requests_ms}ms, retries={self.retry_attempts}, retry_delay={self.retry_delay_seconds}s")
+                    self.logger.info(f"流水线配置: workers={self.pipeline_workers}, min_request_interval={self.min_request_interval_ms}ms")
                 except Exception as e:
                     self.logger.warning(f"加载分块/重试配置时出错: {e}. 将使用默认值。")
             # ------------------------
@@ -167,38 +183,21 @@ class HistoryUpdater:
 
             if mt5_initialized:
                 self.logger.info("MT5 连接成功。")
-                # --- 修改：调用 update_symbol_timeframe ---
-                total_updated_count = 0
-                total_failed_items = []
-                for symbol_raw in self.symbols:
-                    symbol_upper = symbol_raw.upper()
-                    self.logger.info(f"--- 开始处理品种: {symbol_upper} ---")
-                    for tf_str, tf_mt5 in self.timeframes_mt5.items():
-                         tf_lower = tf_str.lower()
-                         self.logger.info(f"-- 开始处理时间周期: {tf_str} --")
-                         try:
-                             # 调用核心更新函数
-                             success = self.update_symbol_timeframe(symbol_upper, tf_str, tf_lower, tf_mt5)
-                             if success:
-                                 total_updated_count += 1
-                                 self.logger.info(f"成功更新 {symbol_upper} {tf_str}")
-                             else:
-                                 total_failed_items.append(f"{symbol_upper}:{tf_str}")
-                                 self.logger.warning(f"更新 {symbol_upper} {tf_str} 失败或无需更新。")
-                         except Exception as item_e:
-                              self.logger.error(f"处理 {symbol_upper} {tf_str} 时发生意外错误: {item_e}", exc_info=True)
-                              total_failed_items.append(f"{symbol_upper}:{tf_str}(Exception)")
-                         self.logger.info(f"-- 时间周期处理结束: {tf_str} --")
-                    self.logger.info(f"--- 品种处理结束: {symbol_upper} ---")
-                
+                cycle_start = time.monotonic()
+                items = [
+                    (symbol_raw.upper(), tf_str, tf_str.lower(), tf_mt5)
+                    for symbol_raw in self.symbols
+                    for tf_str, tf_mt5 in self.timeframes_mt5.items()
+                ]
+                total_updated_count, total_failed_items = self._run_pipeline(items)
+
                 # 记录总结信息
-                self.logger.info("所有品种和时间周期处理完毕。")
+                self.logger.info(f"所有品种和时间周期处理完毕，耗时 {time.monotonic() - cycle_start:.2f}s。")
                 self.logger.info(f"成功更新项数: {total_updated_count}")
                 if total_failed_items:
                      self.logger.warning(f"失败或跳过的项 ({len(total_failed_items)}): {', '.join(total_failed_items)}")
                 else:
                      self.logger.info("所有处理项均成功完成（或无需更新）。")
-                # --------------------------------------------
             else:
                 self.logger.error("无法初始化 MT5 连接，更新周期中止。")
         except Exception as e:
@@ -208,6 +207,86 @@ class HistoryUpdater:
                 shutdown_mt5(self.logger)
             self.logger.info("历史数据更新周期结束。")
 
+    def _run_pipeline(self, items: List[Tuple[str, str, str, Any]]) -> Tuple[int, List[str]]:
+        """
+        Runs the update for all (symbol, timeframe) items as a two-stage pipeline.
+
+        The calling thread is the fetch stage: it talks to MT5 one item at a time.
+        Each fetched item is handed to a worker pool that builds the DataFrame,
+        merges it into the CSV file and verifies it, so CPU/disk work overlaps
+        with the next MT5 request. At most 2 * pipeline_workers fetched items
+        are held in memory at once.
+
+        Args:
+            items: (symbol_upper, timeframe_name, timeframe_lower, timeframe_mt5) tuples.
+
+        Returns:
+            Tuple[int, List[str]]: Number of successfully updated items and the failed item labels.
+        """
+        updated_count = 0
+        failed_items: List[str] = []
+        pending: Dict[Any, str] = {}
+        max_in_flight = self.pipeline_workers * 2
+
+        def collect(done_futures):
+            nonlocal updated_count
+            for future in done_futures:
+                label = pending.pop(future)
+                try:
+                    success = future.result()
+                except Exception as item_e:
+                    self.logger.error(f"处理 {label} 时发生意外错误: {item_e}", exc_info=True)
+                    failed_items.append(f"{label}(Exception)")
+                    continue
+                if success:
+                    updated_count += 1
+                    self.logger.info(f"成功更新 {label}")
+                else:
+                    failed_items.append(label)
+                    self.logger.warning(f"更新 {label} 失败或无需更新。")
+
+        with ThreadPoolExecutor(max_workers=self.pipeline_workers, thread_name_prefix='HistoryWriter') as pool:
+            for symbol, tf_name, tf_lower, tf_mt5 in items:
+                label = f"{symbol}:{tf_name}"
+                try:
+                    job = self._fetch_stage(symbol, tf_name, tf_lower, tf_mt5)
+                except Exception as fetch_e:
+                    self.logger.error(f"获取 {label} 数据时发生意外错误: {fetch_e}", exc_info=True)
+                    failed_items.append(f"{label}(Exception)")
+                    continue
+                if job is None:
+                    failed_items.append(label)
+                    self.logger.warning(f"更新 {label} 失败或无需更新。")
+                    continue
+
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[pool.submit(self._process_stage, job)] = label
+
+            if pending:
+                done, _ = wait(pending)
+                collect(done)
+
+        return updated_count, failed_items
+
+    @contextmanager
+    def _mt5_gate(self):
+        """
+        Serialises MT5 terminal calls and enforces historical.min_request_interval_ms
+        between consecutive requests. The MetaTrader5 package is not safe to call
+        from several threads at once.
+        """
+        with self._mt5_lock:
+            if self.min_request_interval_ms:
+                wait_seconds = self._last_mt5_request + self.min_request_interval_ms / 1000.0 - time.monotonic()
+                if wait_seconds > 0:
+                    time.sleep(wait_seconds)
+            try:
+                yield
+            finally:
+                self._last_mt5_request = time.monotonic()
+
     def _get_mt5_config_section(self) -> Optional[DictConfig]:
         """Safely gets the execution.mt5 config section."""
         if not self.config:
@@ -220,6 +299,7 @@ class HistoryUpdater:
         """
         Handles the complete update process for a single symbol and timeframe.
         Determines start time, fetches data in chunks, updates file, verifies.
+        Runs both pipeline stages (_fetch_stage, _process_stage) back to back.
 
         Args:
             symbol (str): Symbol name (UPPERCASE).
@@ -230,56 +310,97 @@ class HistoryUpdater:
         Returns:
             bool: True if update was successful, False otherwise.
         """
+        job = self._fetch_stage(symbol, timeframe_name, timeframe_lower, timeframe_mt5)
+        if job is None:
+            return False
+        return self._process_stage(job)
+
+    def _fetch_stage(self, symbol: str, timeframe_name: str, timeframe_lower: str, timeframe_mt5: Any) -> Optional[Dict[str, Any]]:
+        """
+        Pipeline stage 1: determines the fetch range and downloads raw MT5 rates.
+        Only this stage talks to the MT5 terminal.
+
+        Returns:
+            Optional[Dict[str, Any]]: A job for _process_stage ('raw_chunks' is None when the
+                                      file is already up-to-date), or None if fetching failed.
+        """
         self.logger.debug(f"Starting update for {symbol} {timeframe_name}")
-        
+
         # 1. Get File Path (ensuring correct case)
         try:
              filepath = self._get_data_filepath(symbol, timeframe_lower)
              self.logger.info(f"Target data file: {filepath}")
         except Exception as path_e:
              self.logger.error(f"Failed to get filepath for {symbol} {timeframe_name}: {path_e}", exc_info=True)
-             return False
+             return None
 
-        # 2. Determine Start Time for Fetching
+        # 2. Determine Start Time for Fetching (after rolling back any interrupted incremental write)
+        try:
+            self._recover_interrupted_write(filepath)
+        except Exception as recover_e:
+            self.logger.error(f"Failed to recover interrupted write for {filepath.name}: {recover_e}", exc_info=True)
+            return None
         start_dt_utc = self._get_fetch_start_time(filepath, timeframe_name)
         if start_dt_utc is None:
              self.logger.error(f"Could not determine fetch start time for {symbol} {timeframe_name}. Skipping.")
-             return False
-        
+             return None
+
         now_utc = datetime.now(self.timezone)
+        job = {'symbol': symbol, 'timeframe_name': timeframe_name, 'filepath': filepath,
+               'start_dt_utc': start_dt_utc, 'end_dt_utc': now_utc, 'raw_chunks': None}
         # Don't fetch if the start time is very recent (e.g., within the last minute of the current time)
         # This avoids unnecessary fetches if the data is already up-to-date.
-        if start_dt_utc >= now_utc - timedelta(minutes=1): 
+        if start_dt_utc >= now_utc - timedelta(minutes=1):
              self.logger.info(f"Data for {symbol} {timeframe_name} appears up-to-date (calculated start time {start_dt_utc} is very recent). Skipping fetch.")
-             # Optionally run verification even if no fetch needed
-             if self.verify_integrity and filepath.exists():
-                  try:
-                      self._verify_data_integrity(filepath)
-                  except Exception as verify_e:
-                       self.logger.warning(f"Integrity verification failed for up-to-date file {filepath.name}: {verify_e}", exc_info=True)
-             return True # Consider it success if up-to-date
+             return job
 
         self.logger.info(f"Fetching data for {symbol} {timeframe_name} from {start_dt_utc} up to {now_utc}")
-        
+
         # 3. Fetch Data in Chunks
         try:
-            # --- Call the chunked fetch method ---
-            all_new_data = self._fetch_historical_data_chunked(symbol, timeframe_mt5, start_dt_utc, now_utc)
-            # ------------------------------------
+            raw_chunks = self._fetch_raw_chunks(symbol, timeframe_mt5, start_dt_utc, now_utc)
         except Exception as fetch_e:
              self.logger.error(f"Critical error during chunked fetch for {symbol} {timeframe_name}: {fetch_e}", exc_info=True)
-             return False # Fetching failed critically
+             return None # Fetching failed critically
+
+        if raw_chunks is None:
+            self.logger.warning(f"Fetching data failed for {symbol} {timeframe_name} after retries (returned None). Skipping file update.")
+            return None
+        job['raw_chunks'] = raw_chunks
+        return job
+
+    def _process_stage(self, job: Dict[str, Any]) -> bool:
+        """
+        Pipeline stage 2: builds the DataFrame from raw rates, merges it into the
+        data file and verifies the result. Never calls MT5, so it can run on a worker thread.
+
+        Returns:
+            bool: True if update was successful (or nothing needed updating), False otherwise.
+        """
+        symbol = job['symbol']
+        timeframe_name = job['timeframe_name']
+        filepath = job['filepath']
+
+        if job['raw_chunks'] is None:
+             # Optionally run verification even if no fetch needed
+             if self.verify_integrity and filepath.exists():
+                  try:
+                      self._verify_data_integrity(filepath, timeframe_name)
+                  except Exception as verify_e:
+                       self.logger.warning(f"Integrity verification failed for up-to-date file {filepath.name}: {verify_e}", exc_info=True)
+             return True # Consider it success if up-to-date
 
         # 4. Process Fetch Results
+        all_new_data = self._rates_to_dataframe(job['raw_chunks'], symbol)
         if all_new_data is None:
-            self.logger.warning(f"Fetching data failed for {symbol} {timeframe_name} after retries (returned None). Skipping file update.")
-            return False # Fetching failed
+            self.logger.warning(f"Processing fetched data failed for {symbol} {timeframe_name}. Skipping file update.")
+            return False
         if all_new_data.empty:
-            self.logger.info(f"No new data returned from MT5 for {symbol} {timeframe_name} in range {start_dt_utc} to {now_utc}. File update not needed.")
+            self.logger.info(f"No new data returned from MT5 for {symbol} {timeframe_name} in range {job['start_dt_utc']} to {job['end_dt_utc']}. File update not needed.")
             # Optionally run verification on existing file
             if self.verify_integrity and filepath.exists():
                   try:
-                       self._verify_data_integrity(filepath)
+                       self._verify_data_integrity(filepath, timeframe_name)
                   except Exception as verify_e:
                        self.logger.warning(f"Integrity verification failed for existing file {filepath.name} (no new data): {verify_e}", exc_info=True)
             return True # Success, just no new data
@@ -296,11 +417,11 @@ class HistoryUpdater:
         # 6. Verify Data Integrity (Optional)
         if self.verify_integrity:
              try:
-                 self._verify_data_integrity(filepath)
+                 self._verify_data_integrity(filepath, timeframe_name)
              except Exception as verify_e:
                   # Log warning but don't mark the update as failed just for verification error
                   self.logger.warning(f"Integrity verification failed after updating file {filepath.name}: {verify_e}", exc_info=True)
-            
+
         self.logger.info(f"Successfully updated data for {symbol} {timeframe_name}.")
         return True
 
@@ -456,8 +577,11 @@ class HistoryUpdater:
                             return self._get_default_start_time(timeframe_name)
 
                     if last_dt_utc:
-                        # Start fetching from the second *after* the last recorded time
-                        next_dt_utc = last_dt_utc + timedelta(seconds=1)
+                        # Start fetching from the last recorded bar itself when refetch_last_bar is enabled,
+                        # so a bar that was still forming at the previous update gets its final values
+                        # (_update_historical_file then rewrites only that tail row).
+                        # Otherwise start from the second *after* the last recorded time.
+                        next_dt_utc = last_dt_utc if getattr(self, 'refetch_last_bar', False) else last_dt_utc + timedelta(seconds=1)
                         self.logger.info(f"Last timestamp found: {last_dt_utc}. Fetching from: {next_dt_utc}")
                         return next_dt_utc
                     else:
@@ -552,12 +676,26 @@ class HistoryUpdater:
                                      critical failure occurs during fetching that prevents completion.
                                      Returns an empty DataFrame if no data is found in the range.
         """
+        raw_chunks = self._fetch_raw_chunks(symbol, timeframe_mt5, start_dt_utc, end_dt_utc)
+        if raw_chunks is None:
+            return None
+        return self._rates_to_dataframe(raw_chunks, symbol)
+
+    def _fetch_raw_chunks(self, symbol: str, timeframe_mt5: Any, start_dt_utc: datetime, end_dt_utc: datetime) -> Optional[List[Any]]:
+        """
+        Downloads the range from MT5 chunk by chunk and returns the raw rate arrays
+        untouched, leaving conversion to _rates_to_dataframe (pipeline stage 2).
+
+        Returns:
+            Optional[List[Any]]: Non-empty chunks as returned by MT5 (possibly an empty list),
+                                 or None if a chunk could not be fetched after retries.
+        """
         if not self.mt5_library_available or mt5 is None:
             self.logger.error("Cannot fetch data: MT5 library not available.")
             return None
             
         self.logger.info(f"Starting chunked fetch for {symbol} TF={timeframe_mt5} from {start_dt_utc} to {end_dt_utc}...")
-        all_rates_list = [] # Use a list to collect chunk data (tuples)
+        raw_chunks = []
         current_start_dt = start_dt_utc
         total_bars_fetched = 0
 
@@ -572,44 +710,20 @@ class HistoryUpdater:
             self.logger.debug(f"Fetching chunk: {symbol} from {current_start_dt} to {chunk_end_dt}")
 
             # --- Call MT5 API with retries ---
-            rates_tuple = self._fetch_single_chunk_with_retries(symbol, timeframe_mt5, current_start_dt, chunk_end_dt)
+            rates = self._fetch_single_chunk_with_retries(symbol, timeframe_mt5, current_start_dt, chunk_end_dt)
             
-            if rates_tuple is None:
+            if rates is None:
                 self.logger.error(f"Failed to fetch chunk for {symbol} from {current_start_dt} after retries. Aborting fetch for this symbol/timeframe.")
                 return None # Indicate critical failure for this fetch operation
 
-            if rates_tuple is not None and len(rates_tuple) > 0: # Check if MT5 returned data
-                # --- NEW: Explicitly convert to list of standard tuples if it's a numpy array ---
-                processed_rates = []
-                # We need to import numpy for isinstance check
-                import numpy as np 
-                if isinstance(rates_tuple, np.ndarray): # Check if it's a NumPy array
-                    # Convert structured array to list of tuples
-                    processed_rates = [tuple(row) for row in rates_tuple] 
-                    self.logger.debug(f"Converted NumPy array chunk ({len(processed_rates)} records) to list of tuples.")
-                else: 
-                    # Assume it's already an iterable of tuples or similar records
-                    # Use list() for safer conversion than map if rates_tuple structure is uncertain
-                    try:
-                       processed_rates = [tuple(item) for item in rates_tuple]
-                       self.logger.debug(f"Processed non-NumPy chunk ({len(processed_rates)} records) to list of tuples.")
-                    except TypeError as te:
-                         self.logger.error(f"Could not convert chunk data to list of tuples for {symbol}: {te}", exc_info=True)
-                         return None # Treat as critical failure if conversion fails
-                # -----------------------------------------------------------------------------
-
-                all_rates_list.extend(processed_rates) # Extend with the processed list
-                total_bars_fetched += len(processed_rates)
-                
-                # --- Determine the next start time (using processed_rates or original rates_tuple?) ---
-                # It's safer to use the original rates_tuple here if possible, 
-                # as indexing might be different on the processed list vs structured array.
-                # Let's assume rates_tuple[-1][0] works on the MT5 return structure directly.
+            if len(rates) > 0: # Check if MT5 returned data
+                raw_chunks.append(rates)
+                total_bars_fetched += len(rates)
                 try:
-                    last_time_in_chunk_sec = rates_tuple[-1][0]
+                    last_time_in_chunk_sec = int(rates[-1][0])
                     last_dt_in_chunk = datetime.fromtimestamp(last_time_in_chunk_sec, tz=self.timezone)
                     current_start_dt = last_dt_in_chunk + timedelta(seconds=1) 
-                    self.logger.debug(f"Chunk fetched successfully. {len(processed_rates)} bars processed. Last time: {last_dt_in_chunk}. Next start: {current_start_dt}")
+                    self.logger.debug(f"Chunk fetched successfully. {len(rates)} bars. Last time: {last_dt_in_chunk}. Next start: {current_start_dt}")
                 except (IndexError, TypeError, ValueError) as e:
                      self.logger.error(f"Could not determine next start time from last bar of chunk for {symbol}: {e}. Falling back to advancing by chunk size.", exc_info=True)
                      current_start_dt = chunk_end_dt 
@@ -622,18 +736,32 @@ class HistoryUpdater:
             if self.delay_between_requests_ms > 0 and current_start_dt < end_dt_utc:
                  time.sleep(self.delay_between_requests_ms / 1000.0)
 
-        # --- Post-processing after all chunks --- (DataFrame creation part)
-        if not all_rates_list:
-            self.logger.info(f"Finished chunked fetch for {symbol}. No data found in the entire range.")
-            return pd.DataFrame() # Return empty DataFrame
-
         self.logger.info(f"Finished chunked fetch for {symbol}. Total bars fetched across all chunks: {total_bars_fetched}.")
-        
+        return raw_chunks
+
+    def _rates_to_dataframe(self, raw_chunks: List[Any], symbol: str) -> Optional[pd.DataFrame]:
+        """
+        Converts raw MT5 rate chunks into a single DataFrame with a UTC 'time' column,
+        sorted by time with duplicates removed. MT5 structured arrays are converted
+        column-wise; other record sequences go through tuples.
+
+        Returns:
+            Optional[pd.DataFrame]: The combined DataFrame (empty if there are no rates),
+                                     or None if the chunks cannot be converted.
+        """
+        expected_columns = ['time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume']
+        if not raw_chunks:
+            return pd.DataFrame()
+
         try:
-            # Now create the DataFrame from the list of standard tuples
-            expected_columns = ['time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume']
-            all_rates_df = pd.DataFrame(all_rates_list, columns=expected_columns)
-            
+            frames = []
+            for rates in raw_chunks:
+                if isinstance(rates, np.ndarray) and rates.dtype.names and set(expected_columns) <= set(rates.dtype.names):
+                    frames.append(pd.DataFrame(rates)[expected_columns])
+                else:
+                    frames.append(pd.DataFrame([tuple(item) for item in rates], columns=expected_columns))
+            all_rates_df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
             # Convert time column
             all_rates_df['time'] = pd.to_datetime(all_rates_df['time'], unit='s', utc=True)
 
@@ -653,9 +781,8 @@ class HistoryUpdater:
         except Exception as e:
             self.logger.error(f"Error processing fetched data into DataFrame for {symbol}: {e}", exc_info=True)
             return None # Indicate critical failure during processing
-        # --- End of DataFrame creation part ---
 
-    def _fetch_single_chunk_with_retries(self, symbol: str, timeframe_mt5: Any, start_dt: datetime, end_dt: datetime) -> Optional[List[Tuple]]:
+    def _fetch_single_chunk_with_retries(self, symbol: str, timeframe_mt5: Any, start_dt: datetime, end_dt: datetime) -> Optional[Any]:
         """
         Fetches a single chunk of data from MT5 using copy_rates_range with retry logic.
 
@@ -666,8 +793,8 @@ class HistoryUpdater:
             end_dt (datetime): End datetime (timezone-aware UTC).
 
         Returns:
-            Optional[List[Tuple]]: A list of rate tuples if successful (can be empty), 
-                                   or None if all retry attempts fail.
+            Optional[Any]: The rates as returned by MT5 (usually a NumPy structured array,
+                           can be empty), or None if all retry attempts fail.
         """
         if not self.mt5_library_available or mt5 is None:
             self.logger.error("Cannot fetch chunk: MT5 library not available.")
@@ -695,15 +822,16 @@ class HistoryUpdater:
 
                  # Core MT5 API call
                  self.logger.debug(f"Calling copy_rates_range for {symbol}, tf={timeframe_mt5}, start={start_dt}, end={end_dt} (Attempt {attempt})")
-                 rates = mt5.copy_rates_range(symbol, timeframe_mt5, start_dt, end_dt)
+                 with self._mt5_gate():
+                     rates = mt5.copy_rates_range(symbol, timeframe_mt5, start_dt, end_dt)
+                     error_code = mt5.last_error() if rates is None else None
 
                  if rates is not None:
-                     # Success: MT5 returned a result (list of tuples, possibly empty)
+                     # Success: MT5 returned a result (possibly empty)
                      self.logger.debug(f"copy_rates_range returned {len(rates)} bars for {symbol} ({start_dt} to {end_dt}).")
-                     return list(rates) # Ensure it's a list
+                     return rates
                  else:
                      # Failure: MT5 API call returned None
-                     error_code = mt5.last_error()
                      self.logger.error(f"mt5.copy_rates_range failed for {symbol} ({start_dt} to {end_dt}) on attempt {attempt}. Error: {error_code}")
                      # Specific handling for certain potentially recoverable errors?
                      # e.g., if error_code suggests a temporary issue vs. invalid symbol
@@ -719,11 +847,219 @@ class HistoryUpdater:
         return None
 
 
+    def _read_file_tail(self, filepath: Path, buffer_size: int = 4096) -> Optional[Dict[str, Any]]:
+        """
+        Reads the header and the last data line of a CSV file without loading the whole file.
+
+        Returns:
+            Optional[Dict[str, Any]]: {'columns': header column list,
+                                       'last_time': UTC pd.Timestamp of the last row,
+                                       'last_line_offset': byte offset where the last row starts,
+                                       'size': file size,
+                                       'ends_with_newline': bool}
+                                      or None if the file is missing, empty or cannot be parsed.
+        """
+        try:
+            size = filepath.stat().st_size
+            if size == 0:
+                return None
+            with open(filepath, 'rb') as f:
+                header = f.readline().decode('utf-8', errors='ignore').strip()
+                f.seek(max(0, size - buffer_size))
+                tail = f.read()
+        except OSError:
+            return None
+
+        columns = [c.strip() for c in header.split(',')]
+        if not columns or columns[0] != 'time':
+            return None
+
+        ends_with_newline = tail.endswith(b'\n')
+        body = tail.rstrip(b'\r\n')
+        newline_pos = body.rfind(b'\n')
+        if newline_pos < 0:
+            return None # Only a header line, or a single line longer than the buffer
+        last_line_offset = size - len(tail) + newline_pos + 1
+        last_line = body[newline_pos + 1:].decode('utf-8', errors='ignore')
+        if last_line.split(',', 1)[0].strip() == 'time':
+            return None # Header only
+        last_time = pd.to_datetime(last_line.split(',', 1)[0], format='%Y-%m-%d %H:%M:%S', utc=True, errors='coerce')
+        if pd.isna(last_time):
+            return None
+        return {'columns': columns, 'last_time': last_time, 'last_line_offset': last_line_offset,
+                'size': size, 'ends_with_newline': ends_with_newline}
+
+    @staticmethod
+    def _same_row_values(stored_line: bytes, new_line: bytes) -> bool:
+        """
+        Compares two CSV rows of the same header field by field. Numbers are compared by value
+        (the file may hold '893.00000' or '0.0' where the freshly formatted row has '893' or '0');
+        other fields and empty fields must match exactly.
+        """
+        stored = stored_line.decode('utf-8', errors='ignore').rstrip('\r\n').split(',')
+        new = new_line.decode('utf-8', errors='ignore').split(',')
+        if len(stored) != len(new):
+            return False
+        for old_value, new_value in zip(stored, new):
+            old_value, new_value = old_value.strip(), new_value.strip()
+            if old_value == new_value:
+                continue
+            try:
+                if float(old_value) != float(new_value):
+                    return False
+            except ValueError:
+                return False
+        return True
+
+    @staticmethod
+    def _journal_path(filepath: Path) -> Path:
+        """Journal written before an incremental in-place write (see _try_incremental_update)."""
+        return filepath.with_name(filepath.name + '.journal')
+
+    def _recover_interrupted_write(self, filepath: Path) -> bool:
+        """
+        Rolls back an incremental write that was interrupted (process crash or power loss).
+
+        The journal holds the byte offset where the write started and the bytes that were
+        replaced from that offset to the end of the file. It is published atomically
+        (temp file + os.replace) before the data file is touched and removed once the write
+        has been fsynced, so an existing journal means the data file may hold a truncated or
+        partial tail: restoring the saved bytes at the offset brings back the previous content.
+        The next update cycle then re-fetches the same bars.
+
+        Returns:
+            bool: True if a journal was found and the file was restored.
+        """
+        journal = self._journal_path(filepath)
+        if not journal.exists():
+            return False
+        data = journal.read_bytes()
+        offset_line, _, replaced_tail = data.partition(b'\n')
+        with open(filepath, 'r+b') as f:
+            f.seek(int(offset_line))
+            f.truncate()
+            f.write(replaced_tail)
+            f.flush()
+            os.fsync(f.fileno())
+        journal.unlink()
+        self.logger.warning(f"Recovered {filepath.name} from an interrupted incremental write (restored {len(replaced_tail)} bytes at offset {int(offset_line)}).")
+        return True
+
+    def _write_journal(self, filepath: Path, offset: int, replaced_tail: bytes):
+        """Atomically publishes the rollback journal for a write starting at offset."""
+        journal = self._journal_path(filepath)
+        temp_journal = journal.with_name(journal.name + '.tmp')
+        try:
+            with open(temp_journal, 'wb') as f:
+                f.write(str(offset).encode('ascii') + b'\n' + replaced_tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_journal, journal)
+        except Exception:
+            temp_journal.unlink(missing_ok=True)
+            raise
+
+    def _try_incremental_update(self, filepath: Path, new_data: pd.DataFrame) -> bool:
+        """
+        Writes new bars without rewriting the whole file when possible:
+        - New bars strictly after the file's last timestamp -> append only the new rows.
+        - First new bar equals the file's last timestamp (that bar was still forming when
+          it was written) -> replace the last row with the refreshed bar and append newer bars.
+          If the refreshed bar has the same values as the stored row (compared as parsed
+          numbers, so '893.00000' in the file equals 893 from MT5) it is left untouched, and
+          nothing is written at all when there are no newer bars.
+        Rows are written in the file's own column order. Header columns MT5 does not return
+        (e.g. 'volume' in older files) are left empty, exactly as the full rewrite's merge
+        leaves them. Anything else (bars older than the last row, new columns the header
+        lacks, or a file without OHLC columns) needs the full rewrite path.
+
+        Crash safety: the bytes that will be replaced (the old last row, or nothing for a pure
+        append) are saved to a journal before the file is truncated; the journal is removed after
+        the write is fsynced. If the write raises, the old tail is restored immediately; if the
+        process dies mid-write, _recover_interrupted_write restores it on the next cycle.
+
+        Returns:
+            bool: True if the file is up to date (updated incrementally or already identical),
+                  False if a full rewrite is required.
+        """
+        tail = self._read_file_tail(filepath)
+        if tail is None:
+            return False
+        columns = tail['columns']
+        extra_columns = [c for c in new_data.columns if c not in columns]
+        if extra_columns or not {'time', 'open', 'high', 'low', 'close'}.issubset(columns):
+            self.logger.debug(f"File header {columns} of {filepath.name} does not match new data columns {list(new_data.columns)}. Full rewrite needed.")
+            return False
+
+        times = new_data['time']
+        if times.dt.tz is None:
+            times = times.dt.tz_localize('UTC')
+        else:
+            times = times.dt.tz_convert('UTC')
+        order = times.argsort(kind='stable')
+        new_rows = new_data.iloc[order].assign(time=times.iloc[order])
+        new_rows = new_rows.drop_duplicates(subset=['time'], keep='last')
+
+        first_new_time = new_rows['time'].iloc[0]
+        last_time = tail['last_time']
+        if first_new_time > last_time:
+            offset = tail['size']
+        elif first_new_time == last_time:
+            offset = tail['last_line_offset']
+        else:
+            self.logger.info(f"New data for {filepath.name} starts at {first_new_time}, before the file's last bar {last_time}. Full rewrite needed.")
+            return False
+
+        new_rows = new_rows.reindex(columns=columns)
+        new_rows['time'] = new_rows['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        payload = new_rows.to_csv(index=False, header=False, float_format='%.5f', lineterminator='\n').encode('utf-8')
+
+        with open(filepath, 'r+b') as f:
+            f.seek(offset)
+            replaced_tail = f.read()
+
+            if offset < tail['size']:
+                # Refreshing the last bar: skip it when the stored row is unchanged
+                first_line_end = payload.index(b'\n') + 1
+                if self._same_row_values(replaced_tail, payload[:first_line_end - 1]):
+                    payload = payload[first_line_end:]
+                    if not payload:
+                        self.logger.debug(f"Last bar of {filepath.name} is unchanged and there are no newer bars. Nothing to write.")
+                        return True
+                    offset = tail['size']
+                    replaced_tail = b''
+            if offset == tail['size'] and not tail['ends_with_newline']:
+                payload = b'\n' + payload
+
+            self._write_journal(filepath, offset, replaced_tail)
+            try:
+                f.seek(offset)
+                f.truncate()
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            except Exception:
+                # Restore the previous content so the file is never left with partial rows
+                f.seek(offset)
+                f.truncate()
+                f.write(replaced_tail)
+                f.flush()
+                os.fsync(f.fileno())
+                self._journal_path(filepath).unlink()
+                raise
+        self._journal_path(filepath).unlink()
+
+        action = "Rewrote last bar and appended" if replaced_tail else "Appended"
+        self.logger.info(f"{action} {len(new_rows)} rows to {filepath.name} (incremental update).")
+        return True
+
     def _update_historical_file(self, filepath: Path, new_data: pd.DataFrame):
         """
-        Updates the historical data CSV file atomically by writing to a temporary file
-        and then replacing the original file.
-        Merges new data with existing data if the file already exists.
+        Updates the historical data CSV file.
+        When the new bars follow the file's last timestamp (optionally refreshing that last,
+        previously forming bar), only the new rows are written (see _try_incremental_update).
+        Otherwise the data is merged with the existing file and written atomically to a
+        temporary file which then replaces the original.
 
         Args:
             filepath (Path): The absolute path to the target CSV file.
@@ -738,6 +1074,14 @@ class HistoryUpdater:
             self.logger.info(f"No new data provided for {filepath.name}, skipping file update.")
             return
 
+        self._recover_interrupted_write(filepath)
+        if filepath.exists() and filepath.stat().st_size > 0 and pd.api.types.is_datetime64_any_dtype(new_data['time']):
+            try:
+                if self._try_incremental_update(filepath, new_data):
+                    return
+            except Exception as inc_e:
+                self.logger.warning(f"Incremental update failed for {filepath.name}: {inc_e}. Falling back to full rewrite.", exc_info=True)
+
         self.logger.info(f"Starting atomic update for file: {filepath.name}")
         temp_filepath = filepath.with_suffix(f'{filepath.suffix}.tmp') # e.g., EURUSD_m1.csv.tmp
         final_df = pd.DataFrame()
@@ -914,14 +1258,19 @@ class HistoryUpdater:
             raise # Re-raise the exception to signal failure
 
 
-    def _verify_data_integrity(self, filepath: Path):
+    def _verify_data_integrity(self, filepath: Path, timeframe_name: Optional[str] = None):
         """
-        Performs basic data integrity checks on the CSV file:
-        - Checks for duplicate timestamps.
-        - Checks for significant time gaps between consecutive bars.
+        Performs data integrity checks on the CSV file via the shared data-quality
+        scanner (core.data_quality):
+        - Duplicate and non-monotonic timestamps.
+        - Time gaps, zero-range bars, invalid OHLC and price outliers (logged as warnings).
+
+        The report is cached next to the file and keyed by (size, mtime, last timestamp),
+        so an unchanged file is not re-read.
 
         Args:
             filepath (Path): The absolute path to the CSV file to verify.
+            timeframe_name (Optional[str]): Timeframe of the file (e.g. 'M1'), used for gap detection.
         """
         if not self.verify_integrity:
              self.logger.debug(f"Integrity verification is disabled in config. Skipping for {filepath.name}.")
@@ -933,46 +1282,27 @@ class HistoryUpdater:
 
         self.logger.info(f"Starting integrity verification for: {filepath.name}...")
         try:
-            # Modified read_csv: Specify date format explicitly
-            df = pd.read_csv(
-                filepath,
-                parse_dates=['time'], # Instruct pandas to parse the time column
-                # Add format specifier to eliminate warning and ensure consistency
-                date_format='%Y-%m-%d %H:%M:%S' 
-            )
-
-            if df.empty or 'time' not in df.columns or not pd.api.types.is_datetime64_any_dtype(df['time']): # Check if parsing failed or column missing/wrong type
-                 self.logger.warning(f"File {filepath.name} is empty or time column missing/invalid after parsing. Skipping integrity check.")
-                 return True # Treat as OK for now, maybe just an empty file
-
-            # Check for duplicates based on the 'time' column
-            duplicates = df[df.duplicated(subset=['time'], keep=False)]
-            if not duplicates.empty:
-                self.logger.warning(f"Data integrity issue in {filepath.name}: Found {len(duplicates)} duplicate timestamp entries.")
-                self.logger.debug(f"Duplicate timestamps found:\\n{duplicates.to_string()}")
-                # Depending on policy, you might want to return False or attempt cleaning
-                # For now, just log it
-                # return False 
-
-            # Check if data is sorted by time
-            if not df['time'].is_monotonic_increasing:
-                self.logger.warning(f"Data integrity issue in {filepath.name}: Data is not sorted chronologically by time.")
-                # Find where sorting fails
-                diffs = df['time'].diff()
-                first_unsorted = diffs[diffs < pd.Timedelta(0)].first_valid_index()
-                if first_unsorted is not None and first_unsorted > 0:
-                     self.logger.debug(f"First unsorted data point occurs around index {first_unsorted}:\\n{df.iloc[first_unsorted-1:first_unsorted+2]}")
-                # return False
+            expected_interval = self._get_interval_seconds(timeframe_name) if timeframe_name else None
+            gap_multiplier = OmegaConf.select(self.config, "historical.integrity_gap_multiplier", default=1.5) if self.config else 1.5
+            report = check_file_quality(filepath, expected_interval_seconds=expected_interval, gap_multiplier=gap_multiplier)
+
+            if report is None:
+                self.logger.warning(f"Integrity check failed: File {filepath.name} could not be read.")
+                return False
+            if report.is_empty:
+                self.logger.info(f"Integrity check: File {filepath.name} is empty. Skipping checks.")
+                return True # Empty file is considered OK
+
+            if report.duplicate_count > 0:
+                self.logger.warning(f"Data integrity issue in {filepath.name}: Found {report.duplicate_count} duplicate timestamp entries.")
+            if report.non_monotonic_count > 0:
+                self.logger.warning(f"Data integrity issue in {filepath.name}: Data is not sorted chronologically by time ({report.non_monotonic_count} backward steps).")
+            if report.has_warnings or report.invalid_ohlc_count > 0 or report.null_count > 0:
+                self.logger.debug(f"Data quality details for {filepath.name}: {report.summary()}")
 
             self.logger.info(f"Integrity verification finished for: {filepath.name}. No critical issues detected.")
             return True
 
-        except FileNotFoundError:
-            self.logger.warning(f"Integrity check failed: File {filepath.name} not found (perhaps deleted?).")
-            return False # File missing is an issue
-        except pd.errors.EmptyDataError:
-             self.logger.info(f"Integrity check: File {filepath.name} is empty. Skipping checks.")
-             return True # Empty file is considered OK
         except Exception as e:
             self.logger.error(f"Error during integrity verification for {filepath.name}: {e}", exc_info=True)
             return False # Any other error means integrity check failed
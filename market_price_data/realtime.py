@@ -1,8 +1,11 @@
+import heapq
 import logging
+import random
 import time
 import threading
 from pathlib import Path
 from typing import Optional, List, Dict, Any
+import numpy as np
 import pandas as pd
 from omegaconf import DictConfig, OmegaConf
 from datetime import datetime, timedelta
@@ -23,6 +26,10 @@ try:
         MT5_AVAILABLE,
         get_utc_timezone
     )
+    from core.data_quality import timeframe_to_seconds
+    from core.shared_bars import SharedBarRing, ring_name
+    from core.notifications import NotificationPublisher, TOPIC_BAR_CLOSED, TOPIC_CALENDAR_UPDATED
+    from core.metrics import REGISTRY as METRICS_REGISTRY, start_metrics_server
     if MT5_AVAILABLE:
         from core.utils import mt5 # Import the mt5 object if available
     else:
@@ -42,6 +49,17 @@ except ImportError:
     def parse_timeframes(*args, **kwargs): return {}
     def get_filepath(*args, **kwargs): return Path()
     def get_utc_timezone(): import pytz; return pytz.utc
+    def timeframe_to_seconds(*args, **kwargs): return None
+    SharedBarRing = None
+    def ring_name(prefix, symbol, timeframe): return f"{prefix}_{symbol.upper()}_{timeframe.upper()}"
+    NotificationPublisher = None
+    TOPIC_BAR_CLOSED = 'bar_closed'
+    TOPIC_CALENDAR_UPDATED = 'calendar_updated'
+    METRICS_REGISTRY = None
+    def start_metrics_server(*args, **kwargs): return None
+
+_WEEKDAY_NAMES = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+_MINUTES_PER_WEEK = 7 * 24 * 60
 
 # Define PID file and stop flag file relative to base_data_dir
 PID_FILENAME = "realtime_updater.pid"
@@ -50,14 +68,17 @@ STOP_FLAG_FILENAME = "STOP_REALTIME.flag"
 class RealtimeUpdater:
     """
     负责持续监控和更新来自 MetaTrader 5 的实时 K 线数据。
-    为每个 品种-时间周期 组合启动一个单独的监控线程。
+    所有 品种-时间周期 数据流由单个调度线程轮询：按下次到期时间维护一个最小堆，
+    每轮取出所有到期的数据流依次请求 MT5，并带随机抖动重新排期。
     """
-    def __init__(self, config_rel_path: str = "market_price_data/config/updater.yaml"):
+    def __init__(self, config_rel_path: str = "market_price_data/config/updater.yaml",
+                 config: Optional[DictConfig] = None):
         """
         初始化 RealtimeUpdater。
 
         Args:
             config_rel_path (str): 模块特定配置文件的相对路径。
+            config (Optional[DictConfig]): 已合并的配置；提供时不再从 config_rel_path 加载 (如回放工具)。
         """
         self.logger = logging.getLogger('RealtimeUpdater_Init') # 临时 logger
         self.config: Optional[DictConfig] = None
@@ -72,7 +93,39 @@ class RealtimeUpdater:
         self.poll_intervals: Dict[str, int] = {}
         self.default_poll_interval_seconds: int = 60
         self.fetch_bars_count: int = 100
-
+        self.poll_jitter_fraction: float = 0.1
+        self.metrics_log_interval_seconds: int = 300
+        self.max_file_bars: int = 1000
+        # 共享内存K线环形缓冲区 (见 core.shared_bars)，CSV 文件作为持久化副产物保留
+        self.shm_enabled: bool = False
+        self.shm_name_prefix: str = "ssbars"
+        self.shm_capacity: int = 1000
+        # K线收盘 / 财经日历更新通知 (见 core.notifications)
+        self.notifications_enabled: bool = False
+        self.calendar_check_interval_seconds: float = 5.0
+        self.calendar_live_path: Optional[Path] = None
+        self._publisher = None
+        self._calendar_mtime: Optional[int] = None
+        # Prometheus 指标 (见 core.metrics)
+        self._metrics_server = None
+        self._metric_families: Optional[Dict[str, Any]] = None
+        # 收盘对齐的自适应轮询与交易时段
+        self.adaptive_polling: bool = True
+        self.close_delay_seconds: float = 0.5
+        self.close_retry_interval_seconds: float = 1.0
+        self.close_retry_window_seconds: float = 15.0
+        self.server_time_refresh_seconds: int = 600
+        self.pause_outside_session: bool = True
+        self._session_open_minute: Optional[int] = None
+        self._session_close_minute: Optional[int] = None
+        self._session_holidays: set = set()
+        self._server_time_offset: float = 0.0 # MT5 服务器时间 - 本机 UTC 时间 (秒)
+
+        # 每个 (symbol, timeframe) 数据流的状态与延迟指标，由调度线程维护
+        self._streams: Dict[tuple, Dict[str, Any]] = {}
+        self._schedule: List[tuple] = [] # (due_monotonic, seq, stream_key) 最小堆
+        self._schedule_seq: int = 0
+        self._metrics_lock = threading.Lock()
         self._threads: List[threading.Thread] = []
         self._stop_event = threading.Event()
         self.mt5_initialized: bool = False # Track MT5 connection state
@@ -81,7 +134,7 @@ class RealtimeUpdater:
 
         try:
             # 1. 加载配置
-            self.config = load_app_config(config_rel_path)
+            self.config = config if config is not None else load_app_config(config_rel_path)
             if not self.config:
                 self.logger.error("配置加载失败，RealtimeUpdater 初始化中止。")
                 return
@@ -112,6 +165,39 @@ class RealtimeUpdater:
             )
             self.default_poll_interval_seconds = OmegaConf.select(self.config, "realtime.default_poll_interval_seconds", default=60)
             self.fetch_bars_count = OmegaConf.select(self.config, "realtime.fetch_bars_count", default=100)
+            self.poll_jitter_fraction = OmegaConf.select(self.config, "realtime.poll_jitter_fraction", default=0.1)
+            self.metrics_log_interval_seconds = OmegaConf.select(self.config, "realtime.metrics_log_interval_seconds", default=300)
+            self.max_file_bars = max(self.fetch_bars_count, OmegaConf.select(self.config, "realtime.max_file_bars", default=1000))
+            self.shm_enabled = bool(OmegaConf.select(self.config, "market_data.shared_memory.enabled", default=False)) and SharedBarRing is not None
+            self.shm_name_prefix = OmegaConf.select(self.config, "market_data.shared_memory.name_prefix", default="ssbars")
+            self.shm_capacity = max(self.fetch_bars_count, OmegaConf.select(self.config, "market_data.shared_memory.capacity", default=1000))
+            if METRICS_REGISTRY is not None:
+                self._metric_families = {
+                    'fetch': METRICS_REGISTRY.histogram('realtime_fetch_seconds', 'MT5 copy_rates_from_pos latency per stream', ('symbol', 'timeframe')),
+                    'write': METRICS_REGISTRY.histogram('realtime_write_seconds', 'Shared memory + CSV write latency per stream', ('symbol', 'timeframe')),
+                    'polls': METRICS_REGISTRY.counter('realtime_polls_total', 'Polls per stream', ('symbol', 'timeframe')),
+                    'errors': METRICS_REGISTRY.counter('realtime_poll_errors_total', 'Failed polls per stream', ('symbol', 'timeframe')),
+                    'bytes': METRICS_REGISTRY.counter('realtime_bytes_written_total', 'Bytes written to realtime CSV files per stream', ('symbol', 'timeframe')),
+                    'bar_age': METRICS_REGISTRY.gauge('realtime_bar_age_seconds', 'Seconds since the newest bar opened (server time) at the last poll', ('symbol', 'timeframe')),
+                    'lag': METRICS_REGISTRY.gauge('realtime_schedule_lag_seconds', 'Delay between due time and actual poll', ('symbol', 'timeframe')),
+                }
+            self.notifications_enabled = bool(OmegaConf.select(self.config, "notifications.enabled", default=False)) and NotificationPublisher is not None
+            self.calendar_check_interval_seconds = OmegaConf.select(self.config, "realtime.calendar_check_interval_seconds", default=5.0)
+            # 与 EconomicCalendarProvider 使用相同的实时筛选日历文件路径
+            self.calendar_live_path = (
+                self.base_data_dir
+                / OmegaConf.select(self.config, "economic_calendar.paths.filtered_live_dir", default="calendar/filtered/live")
+                / OmegaConf.select(self.config, "economic_calendar.files.filtered_live_csv", default="filtered_realtime.csv")
+            )
+            self.adaptive_polling = OmegaConf.select(self.config, "realtime.adaptive_polling.enabled", default=True)
+            self.close_delay_seconds = OmegaConf.select(self.config, "realtime.adaptive_polling.close_delay_seconds", default=0.5)
+            self.close_retry_interval_seconds = OmegaConf.select(self.config, "realtime.adaptive_polling.close_retry_interval_seconds", default=1.0)
+            self.close_retry_window_seconds = OmegaConf.select(self.config, "realtime.adaptive_polling.close_retry_window_seconds", default=15.0)
+            self.server_time_refresh_seconds = OmegaConf.select(self.config, "realtime.adaptive_polling.server_time_refresh_seconds", default=600)
+            self.pause_outside_session = OmegaConf.select(self.config, "realtime.session.pause_outside_session", default=True)
+            self._session_open_minute = self._parse_week_minute(OmegaConf.select(self.config, "realtime.session.weekly_open", default=None))
+            self._session_close_minute = self._parse_week_minute(OmegaConf.select(self.config, "realtime.session.weekly_close", default=None))
+            self._session_holidays = set(str(d) for d in OmegaConf.select(self.config, "realtime.session.holidays", default=[]) or [])
 
             if not self.symbols or not self.timeframes_str:
                 self.logger.warning("配置中未指定有效的 realtime symbols 或 timeframes。")
@@ -141,15 +227,69 @@ class RealtimeUpdater:
             self.config = None
             self.updater_enabled = False
 
+    def _parse_week_minute(self, value: Optional[str]) -> Optional[int]:
+        """将 'SUN 22:00' 形式的周内时间 (UTC) 解析为自周一 00:00 起的分钟数，无法解析时返回 None。"""
+        if not value:
+            return None
+        try:
+            day_str, hm_str = str(value).split()
+            hour, minute = (int(x) for x in hm_str.split(':'))
+            return _WEEKDAY_NAMES.index(day_str.upper()[:3]) * 1440 + hour * 60 + minute
+        except (ValueError, TypeError):
+            self.logger.warning(f"无法解析交易时段时间 '{value}'，应为 'SUN 22:00' 格式。")
+            return None
+
+    def _in_weekly_window(self, now_utc: datetime) -> bool:
+        """判断给定 UTC 时间是否处于周交易窗口内 (不考虑节假日)。"""
+        if self._session_open_minute is None or self._session_close_minute is None:
+            return now_utc.weekday() < 5
+        week_minute = now_utc.weekday() * 1440 + now_utc.hour * 60 + now_utc.minute
+        if self._session_open_minute <= self._session_close_minute:
+            return self._session_open_minute <= week_minute < self._session_close_minute
+        return week_minute >= self._session_open_minute or week_minute < self._session_close_minute
+
+    def _in_session(self, now_utc: datetime) -> bool:
+        """
+        判断给定 UTC 时间是否处于交易时段。
+
+        配置了 realtime.session.weekly_open/weekly_close 时按周交易窗口判断 (支持跨周末，
+        如外汇的 'SUN 22:00' 至 'FRI 22:00')，否则按周一至周五判断；
+        realtime.session.holidays 中的日期 (UTC, 'YYYY-MM-DD') 全天休市。
+        """
+        if now_utc.strftime('%Y-%m-%d') in self._session_holidays:
+            return False
+        return self._in_weekly_window(now_utc)
+
+    def _seconds_until_session_open(self, now_utc: datetime) -> float:
+        """
+        返回距下一个交易时段开始的秒数，当前处于交易时段时返回 0。
+
+        直接计算候选开市时刻: 周交易窗口的下一个开始时刻 (未配置时为周一 00:00)；
+        候选时刻落在节假日时从次日 00:00 起重新计算。
+        """
+        if self._in_session(now_utc):
+            return 0.0
+        open_minute = self._session_open_minute if self._session_close_minute is not None else None
+        if open_minute is None:
+            open_minute = 0 # 周一 00:00
+        probe = now_utc
+        for _ in range(len(self._session_holidays) + 2):
+            if not self._in_weekly_window(probe):
+                floor = probe.replace(second=0, microsecond=0)
+                week_minute = floor.weekday() * 1440 + floor.hour * 60 + floor.minute
+                probe = floor + timedelta(minutes=(open_minute - week_minute) % _MINUTES_PER_WEEK)
+            if probe.strftime('%Y-%m-%d') not in self._session_holidays:
+                return (probe - now_utc).total_seconds()
+            probe = probe.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        return float(self.default_poll_interval_seconds)
+
     def _is_trading_day(self) -> bool:
-        """检查当前日期是否为交易日（简单示例：周一至周五）。"""
-        today = dt.date.today()
-        # 周一到周五 (weekday() 返回 0-6)
-        if today.weekday() >= 5: # 周六或周日
-            self.logger.info(f"今天是 {today.strftime('%A')}，非交易日。")
+        """检查当前时间是否处于交易时段 (见 _in_session)。"""
+        now_utc = datetime.now(get_utc_timezone())
+        if not self._in_session(now_utc):
+            self.logger.info(f"当前时间 {now_utc.strftime('%A %H:%M')} UTC 不在交易时段内。")
             return False
-        # 在此可以添加更复杂的节假日检查逻辑
-        self.logger.debug(f"今天是 {today.strftime('%A')}，交易日。")
+        self.logger.debug(f"当前时间 {now_utc.strftime('%A %H:%M')} UTC 处于交易时段。")
         return True
 
     def _write_pid_file(self):
@@ -218,27 +358,35 @@ class RealtimeUpdater:
         # 3. 写入 PID 文件
         self._write_pid_file()
 
-        # 4. 启动监控线程
-        self.logger.info("MT5 连接成功，开始启动监控线程...")
+        # 4. 建立数据流并启动调度线程
+        self.logger.info("MT5 连接成功，开始建立数据流调度...")
         self._threads = [] # Clear previous threads if any
+        self._init_streams()
+        if not self._streams:
+            self.logger.error("没有可用的数据流，实时更新器启动失败。")
+            return
 
-        for symbol_raw in self.symbols:
-            symbol_upper = symbol_raw.upper()
-            for tf_str, tf_mt5 in self.timeframes_mt5.items():
-                thread = threading.Thread(
-                    target=self._monitor_symbol_timeframe,
-                    args=(symbol_upper, tf_str, tf_mt5),
-                    daemon=True # 设置为守护线程，主程序退出时它们也会退出
-                )
-                thread.start()
-                self._threads.append(thread)
-                self.logger.info(f"已启动监控线程: {symbol_upper} - {tf_str}")
+        if self.notifications_enabled:
+            host = OmegaConf.select(self.config, "notifications.host", default="127.0.0.1")
+            port = OmegaConf.select(self.config, "notifications.port", default=47651)
+            self._publisher = NotificationPublisher(host, port)
+            self._calendar_mtime = self._get_calendar_mtime()
+            self.logger.info(f"通知通道已启用: udp://{host}:{port}")
+
+        if OmegaConf.select(self.config, "metrics.enabled", default=False) and self._metrics_server is None:
+            self._metrics_server = start_metrics_server(
+                OmegaConf.select(self.config, "metrics.realtime_port", default=9101),
+                OmegaConf.select(self.config, "metrics.host", default="127.0.0.1"),
+            )
 
-        self.logger.info(f"所有 {len(self._threads)} 个监控线程已启动。")
+        thread = threading.Thread(target=self._scheduler_loop, name="RealtimeScheduler", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        self.logger.info(f"调度线程已启动，共 {len(self._streams)} 个数据流。")
 
     def stop_updater(self):
         """
-        停止所有监控线程，关闭 MT5 连接，并删除 PID 文件。
+        停止调度线程，关闭 MT5 连接，并删除 PID 文件。
         """
         if not self.updater_enabled:
             return # Nothing to stop if not enabled
@@ -251,7 +399,7 @@ class RealtimeUpdater:
         self._stop_event.set() # Signal threads to stop
 
         # 等待所有线程结束
-        self.logger.info(f"等待 {len(self._threads)} 个监控线程退出...")
+        self.logger.info(f"等待 {len(self._threads)} 个调度线程退出...")
         active_threads = []
         for thread in self._threads:
             if thread.is_alive():
@@ -270,134 +418,450 @@ class RealtimeUpdater:
             shutdown_mt5(self.logger)
             self.mt5_initialized = False
 
+        # 关闭并删除共享内存缓冲区 (读取方会看到已关闭状态并重新连接)
+        self._close_rings()
+        if self._publisher is not None:
+            self._publisher.close()
+            self._publisher = None
+        if self._metrics_server is not None:
+            self._metrics_server.shutdown()
+            self._metrics_server.server_close()
+            self._metrics_server = None
+
         # 删除 PID 文件
         self._delete_pid_file()
 
         self.logger.info("实时数据更新器已停止。")
 
-    def _monitor_symbol_timeframe(self, symbol: str, timeframe_str: str, timeframe_mt5: Any):
+    def _get_stream_filepath(self, symbol: str, timeframe_str: str) -> Path:
+        """根据配置的目录和文件模式构建数据流的实时文件路径。"""
+        # 使用 posix 风格的 '/' 组合目录和文件模式，get_filepath 内部会处理 Path 对象
+        full_relative_pattern = f"{self.data_dir_pattern}/{self.filename_pattern}"
+        filepath = get_filepath(
+            base_data_dir=str(self.base_data_dir),
+            relative_path_pattern=full_relative_pattern,
+            symbol=symbol,
+            timeframe=timeframe_str.lower()
+        )
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        return filepath
+
+    def _init_streams(self):
+        """为每个 品种-时间周期 组合建立数据流状态，并将首轮轮询错开排入调度堆。"""
+        self._close_rings()
+        self._streams = {}
+        self._schedule = []
+        now = time.monotonic()
+        for symbol_raw in self.symbols:
+            symbol_upper = symbol_raw.upper()
+            for tf_str, tf_mt5 in self.timeframes_mt5.items():
+                key = (symbol_upper, tf_str.upper())
+                try:
+                    filepath = self._get_stream_filepath(symbol_upper, tf_str)
+                except Exception as path_e:
+                    self.logger.error(f"数据流 [{symbol_upper}-{tf_str}] 获取文件路径时出错: {path_e}", exc_info=True)
+                    continue
+
+                poll_interval = self.poll_intervals.get(tf_str.upper(), self.default_poll_interval_seconds)
+                self._streams[key] = {
+                    'symbol': symbol_upper,
+                    'timeframe': tf_str.upper(),
+                    'timeframe_mt5': tf_mt5,
+                    'filepath': filepath,
+                    'poll_interval': poll_interval,
+                    'timeframe_seconds': timeframe_to_seconds(tf_str),
+                    'last_bar_open': None, # 最新K线开盘时间 (服务器时间戳)
+                    # --- 指标 ---
+                    'polls': 0,
+                    'errors': 0,
+                    'writes': 0,
+                    'bytes_written': 0,
+                    'file_state': None, # 上次写入的末行信息，用于增量写入
+                    'ring': self._create_ring(symbol_upper, tf_str),
+                    'last_poll_utc': None,
+                    'last_bar_time': None,
+                    'last_fetch_seconds': 0.0,
+                    'last_schedule_lag_seconds': 0.0,
+                    'max_schedule_lag_seconds': 0.0,
+                    'metrics': self._stream_metrics(symbol_upper, tf_str.upper()),
+                }
+                self.logger.info(f"数据流 [{symbol_upper}-{tf_str}] 轮询间隔 {poll_interval} 秒，写入: {filepath}")
+                # 首轮在一个间隔内随机错开，避免所有数据流同时请求 MT5
+                self._push_schedule(now + random.uniform(0, min(poll_interval, 5)), key)
+
+    def _stream_metrics(self, symbol: str, timeframe_str: str) -> Optional[Dict[str, Any]]:
+        """取得数据流对应的带标签指标 (缓存在数据流状态中，轮询时不再查找标签)。"""
+        if self._metric_families is None:
+            return None
+        return {name: family.labels(symbol, timeframe_str) for name, family in self._metric_families.items()}
+
+    def _create_ring(self, symbol: str, timeframe_str: str) -> Optional[Any]:
+        """为数据流创建共享内存环形缓冲区，未启用或创建失败时返回 None (仅写 CSV)。"""
+        if not self.shm_enabled:
+            return None
+        name = ring_name(self.shm_name_prefix, symbol, timeframe_str)
+        try:
+            ring = SharedBarRing.create(name, self.shm_capacity)
+            self.logger.info(f"数据流 [{symbol}-{timeframe_str}] 共享内存缓冲区: {name} (容量 {self.shm_capacity})")
+            return ring
+        except Exception as shm_e:
+            self.logger.warning(f"数据流 [{symbol}-{timeframe_str}] 创建共享内存 {name} 失败，仅写入 CSV: {shm_e}")
+            return None
+
+    def _close_rings(self):
+        for stream in self._streams.values():
+            ring = stream.get('ring')
+            if ring is not None:
+                try:
+                    ring.close(unlink=True)
+                except Exception as shm_e:
+                    self.logger.warning(f"关闭共享内存 {ring.name} 时出错: {shm_e}")
+                stream['ring'] = None
+
+    def _get_calendar_mtime(self) -> Optional[int]:
+        try:
+            return self.calendar_live_path.stat().st_mtime_ns if self.calendar_live_path else None
+        except OSError:
+            return None
+
+    def _check_calendar_updated(self):
+        """实时筛选日历文件变化时发布 calendar_updated 通知。"""
+        mtime = self._get_calendar_mtime()
+        if mtime is not None and mtime != self._calendar_mtime:
+            self.logger.info(f"检测到财经日历文件更新: {self.calendar_live_path}")
+            self._publisher.publish(TOPIC_CALENDAR_UPDATED, path=str(self.calendar_live_path))
+        self._calendar_mtime = mtime
+
+    def _push_schedule(self, due: float, key: tuple):
+        self._schedule_seq += 1
+        heapq.heappush(self._schedule, (due, self._schedule_seq, key))
+
+    def _next_due(self, stream: Dict[str, Any], due: float, now: float, wall_now: Optional[float] = None) -> float:
         """
-        监控单个 symbol-timeframe 组合的后台任务。
+        计算数据流的下次轮询时间 (monotonic 秒)。
+
+        - 交易时段外暂停到下一个开市时刻；
+        - 未启用自适应轮询时：固定间隔加随机抖动，落后时从当前时间重新计算；
+        - 启用时按服务器时间对齐K线收盘：收盘后 close_retry_window_seconds 内尚未获取到新K线
+          则每 close_retry_interval_seconds 紧密轮询；K线中段按配置的轮询间隔放缓，
+          但不晚于下一次收盘后 close_delay_seconds。
         """
-        thread_name = f"{symbol}-{timeframe_str}"
-        self.logger.info(f"线程 [{thread_name}] 开始监控...")
-        
-        # 获取此时间周期的轮询间隔
-        poll_interval = self.poll_intervals.get(timeframe_str.upper(), self.default_poll_interval_seconds)
-        self.logger.info(f"线程 [{thread_name}] 使用轮询间隔: {poll_interval} 秒")
-        
-        timeframe_lower = timeframe_str.lower()
+        interval = stream['poll_interval']
+        jitter = random.uniform(-self.poll_jitter_fraction, self.poll_jitter_fraction) * interval
+        wall_now = time.time() if wall_now is None else wall_now
 
-        try:
-            # 1. 组合目录和文件模式
-            #    确保使用 posix 风格的路径分隔符 '/' 进行组合，即使在 Windows 上，
-            #    因为 get_filepath 内部会处理 Path 对象。
-            #    使用 os.path.join 可能在 Windows 上产生反斜杠，这里需要明确。
-            #    更健壮的方式是让 get_filepath 接受目录模式和文件模式分开传递，但现在先按现有函数签名修改调用处。
-            full_relative_pattern = f"{self.data_dir_pattern}/{self.filename_pattern}"
-
-            # 2. 调用 get_filepath，使用正确的参数名和组合后的模式
-            filepath = get_filepath(
-                base_data_dir=str(self.base_data_dir), # 使用正确的参数名 base_data_dir
-                relative_path_pattern=full_relative_pattern, # 传递组合后的完整模式
-                symbol=symbol,
-                timeframe=timeframe_lower # 传递小写时间周期给 format
-            )
-            # --- 结束修正 ---
+        if self.pause_outside_session:
+            pause = self._seconds_until_session_open(datetime.fromtimestamp(wall_now, get_utc_timezone()))
+            if pause > 0:
+                return now + pause + self.close_delay_seconds + abs(jitter)
 
-            self.logger.info(f"线程 [{thread_name}] 将数据写入: {filepath}")
-            
-            # Ensure parent directory exists (get_filepath should handle this, but double check)
-            filepath.parent.mkdir(parents=True, exist_ok=True) 
+        tf_seconds = stream.get('timeframe_seconds')
+        if not self.adaptive_polling or not tf_seconds or tf_seconds > 86400:
+            return max(due + interval, now) + jitter
 
-        except Exception as path_e:
-             self.logger.error(f"线程 [{thread_name}] 获取文件路径时出错: {path_e}", exc_info=True)
-             return # Exit thread if path cannot be determined
+        server_now = wall_now + self._server_time_offset
+        current_open = server_now // tf_seconds * tf_seconds
+        caught_current_bar = stream['last_bar_open'] is not None and stream['last_bar_open'] >= current_open
+        if not caught_current_bar and server_now - current_open < self.close_retry_window_seconds:
+            return now + self.close_retry_interval_seconds
 
-        # --- Monitoring Loop ---
-        last_log_time = time.monotonic()
-        log_interval = 300 # Log activity every 5 minutes
+        next_close_poll = now + (current_open + tf_seconds - server_now) + self.close_delay_seconds
+        return min(now + interval + jitter, next_close_poll)
+
+    def _refresh_server_time_offset(self):
+        """
+        通过最新报价估计 MT5 服务器时间与本机 UTC 时间的偏移。
+        报价时间在行情清淡时会滞后，而服务器时区偏移总是 30 分钟的整数倍，因此取整到 1800 秒。
+        """
+        if mt5 is None or not hasattr(mt5, 'symbol_info_tick') or not self.symbols:
+            return
+        try:
+            tick = mt5.symbol_info_tick(self.symbols[0].upper())
+            if tick is not None and getattr(tick, 'time', 0):
+                offset = round((tick.time - time.time()) / 1800) * 1800
+                if offset != self._server_time_offset:
+                    self.logger.info(f"MT5 服务器时间偏移: {offset} 秒")
+                self._server_time_offset = offset
+        except Exception as tick_e:
+            self.logger.warning(f"获取服务器时间失败，沿用偏移 {self._server_time_offset} 秒: {tick_e}")
+
+    def _scheduler_loop(self):
+        """单线程调度循环：取出所有到期的数据流依次轮询，然后等待下一个到期时间或停止信号。"""
+        self.logger.info("调度线程开始运行...")
+        last_metrics_log = time.monotonic()
+        last_server_time_refresh = time.monotonic()
+        last_calendar_check = time.monotonic()
+        self._refresh_server_time_offset()
 
         while not self._stop_event.is_set():
             try:
-                start_fetch_time = time.monotonic()
-                
-                # Periodically log thread activity
-                current_time = time.monotonic()
-                if current_time - last_log_time >= log_interval:
-                     self.logger.debug(f"线程 [{thread_name}] 仍在运行...")
-                     last_log_time = current_time
-
-                # Check MT5 connection (optional, adds overhead)
-                # if not self.mt5_initialized or not mt5.terminal_info().connected:
-                #     self.logger.warning(f"线程 [{thread_name}] 检测到 MT5 连接丢失。尝试重新连接...")
-                #     # Attempt reconnection logic here? Or rely on main thread?
-                #     # For now, just skip this fetch cycle
-                #     self._stop_event.wait(poll_interval) # Wait before next check
-                #     continue
-
-                # 获取最新 K 线
-                now_utc = datetime.now(get_utc_timezone())
-                # MT5 copy_rates_from_pos 获取从指定位置开始的 K 线
-                # 我们想要最新的 self.fetch_bars_count 条
-                rates = mt5.copy_rates_from_pos(symbol, timeframe_mt5, 0, self.fetch_bars_count)
-
-                if rates is None:
-                    error_code = mt5.last_error()
-                    self.logger.error(f"线程 [{thread_name}] 调用 copy_rates_from_pos 失败。错误: {error_code}")
-                elif len(rates) == 0:
-                    self.logger.debug(f"线程 [{thread_name}] 未获取到新的实时 K 线。")
-                else:
-                    # 成功获取数据
-                    self.logger.debug(f"线程 [{thread_name}] 成功获取 {len(rates)} 条实时 K 线。")
-                    
-                    # --- 处理和写入数据 ---
-                    try:
-                        # 直接将 MT5 返回的 rates (通常是 numpy 结构化数组或元组列表) 转换为 DataFrame
-                        # 与 history.py 保持一致，先转为元组列表
-                        processed_rates = []
-                        import numpy as np
-                        if isinstance(rates, np.ndarray):
-                            processed_rates = [tuple(row) for row in rates]
-                        else:
-                            try:
-                                processed_rates = [tuple(item) for item in rates]
-                            except TypeError:
-                                 self.logger.error(f"线程 [{thread_name}] 无法将 MT5 返回的数据转换为元组列表。", exc_info=True)
-                                 processed_rates = [] # Skip writing
-
-                        if processed_rates:
-                            expected_columns = ['time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume']
-                            new_data_df = pd.DataFrame(processed_rates, columns=expected_columns)
-                            
-                            # 将时间戳转换为 'YYYY-MM-DD HH:MM:SS' 字符串格式写入
-                            new_data_df['time'] = pd.to_datetime(new_data_df['time'], unit='s', utc=True).dt.strftime('%Y-%m-%d %H:%M:%S')
-
-                            # 写入 CSV (覆盖模式，因为这是实时文件的最新快照)
-                            temp_filepath = filepath.with_suffix(f'{filepath.suffix}.tmp_{thread_name}')
-                            new_data_df.to_csv(temp_filepath, index=False, header=True, encoding='utf-8', float_format='%.5f')
-                            os.replace(temp_filepath, filepath)
-                            self.logger.info(f"线程 [{thread_name}] 已更新实时数据文件: {filepath.name} ({len(new_data_df)} 条)")
-                    
-                    except Exception as write_e:
-                         self.logger.error(f"线程 [{thread_name}] 处理或写入实时数据时出错: {write_e}", exc_info=True)
-                         # Clean up temp file if error occurred during replace
-                         if 'temp_filepath' in locals() and temp_filepath.exists():
-                             try:
-                                  temp_filepath.unlink()
-                             except OSError: pass # Ignore unlink error
-
-                fetch_duration = time.monotonic() - start_fetch_time
-                # Wait for the remaining interval time
-                wait_time = max(0, poll_interval - fetch_duration)
-                self._stop_event.wait(wait_time) # Wait for stop signal or timeout
-
+                now = time.monotonic()
+                due_items = []
+                while self._schedule and self._schedule[0][0] <= now:
+                    due, _, key = heapq.heappop(self._schedule)
+                    due_items.append((due, key))
+
+                for due, key in due_items:
+                    if self._stop_event.is_set():
+                        break
+                    stream = self._streams[key]
+                    poll_start = time.monotonic()
+                    self._poll_stream(stream, schedule_lag=poll_start - due)
+                    self._push_schedule(self._next_due(stream, due, time.monotonic()), key)
+
+                now = time.monotonic()
+                if self.adaptive_polling and now - last_server_time_refresh >= self.server_time_refresh_seconds:
+                    self._refresh_server_time_offset()
+                    last_server_time_refresh = now
+                if now - last_metrics_log >= self.metrics_log_interval_seconds:
+                    self._log_stream_metrics()
+                    last_metrics_log = now
+                if self._publisher is not None and now - last_calendar_check >= self.calendar_check_interval_seconds:
+                    self._check_calendar_updated()
+                    last_calendar_check = now
+
+                wait_time = (self._schedule[0][0] - now) if self._schedule else 1.0
+                if self._publisher is not None:
+                    wait_time = min(wait_time, max(0.0, last_calendar_check + self.calendar_check_interval_seconds - now))
+                if wait_time > 0:
+                    self._stop_event.wait(wait_time)
             except Exception as loop_e:
-                self.logger.error(f"线程 [{thread_name}] 监控循环中发生意外错误: {loop_e}", exc_info=True)
-                # Avoid busy-looping on error, wait before retrying
-                self._stop_event.wait(poll_interval) # Wait for the standard interval
+                self.logger.error(f"调度循环中发生意外错误: {loop_e}", exc_info=True)
+                self._stop_event.wait(1.0) # Avoid busy-looping on error
+
+        self.logger.info("调度线程收到停止信号，正在退出...")
+
+    def _poll_stream(self, stream: Dict[str, Any], schedule_lag: float = 0.0):
+        """轮询单个数据流一次：获取最新 K 线并写入实时文件，同时更新延迟指标。"""
+        stream_name = f"{stream['symbol']}-{stream['timeframe']}"
+        start_fetch_time = time.monotonic()
+        fetch_seconds = write_seconds = None
+        bytes_before = stream['bytes_written']
+        rates = None
+        try:
+            rates = mt5.copy_rates_from_pos(stream['symbol'], stream['timeframe_mt5'], 0, self.fetch_bars_count)
+            fetch_seconds = time.monotonic() - start_fetch_time
+            if rates is None:
+                error_code = mt5.last_error()
+                self.logger.error(f"数据流 [{stream_name}] 调用 copy_rates_from_pos 失败。错误: {error_code}")
+            elif len(rates) == 0:
+                self.logger.debug(f"数据流 [{stream_name}] 未获取到新的实时 K 线。")
+            else:
+                self.logger.debug(f"数据流 [{stream_name}] 成功获取 {len(rates)} 条实时 K 线。")
+                # 先发布到共享内存 (低延迟通道)，再写 CSV (持久化副产物)
+                write_start = time.monotonic()
+                if stream['ring'] is not None:
+                    stream['ring'].write(rates)
+                self._write_realtime_bars(stream, rates)
+                write_seconds = time.monotonic() - write_start
+        except Exception as poll_e:
+            rates = None
+            self.logger.error(f"数据流 [{stream_name}] 轮询或写入实时数据时出错: {poll_e}", exc_info=True)
+
+        with self._metrics_lock:
+            stream['polls'] += 1
+            if rates is None:
+                stream['errors'] += 1
+            elif len(rates) > 0:
+                previous_bar_open = stream['last_bar_open']
+                stream['last_bar_open'] = int(rates[-1][0])
+                stream['last_bar_time'] = pd.Timestamp(stream['last_bar_open'], unit='s', tz='UTC')
+                # 出现新K线即表示上一根K线已收盘 (数据已写入共享内存和 CSV)
+                if self._publisher is not None and previous_bar_open is not None and stream['last_bar_open'] > previous_bar_open:
+                    self._publisher.publish(
+                        TOPIC_BAR_CLOSED,
+                        symbol=stream['symbol'],
+                        timeframe=stream['timeframe'],
+                        bar_time=previous_bar_open,
+                    )
+            stream['last_poll_utc'] = datetime.now(get_utc_timezone())
+            stream['last_fetch_seconds'] = time.monotonic() - start_fetch_time
+            stream['last_schedule_lag_seconds'] = max(0.0, schedule_lag)
+            stream['max_schedule_lag_seconds'] = max(stream['max_schedule_lag_seconds'], schedule_lag)
+
+        metrics = stream['metrics']
+        if metrics is not None:
+            metrics['polls'].inc()
+            metrics['lag'].set(max(0.0, schedule_lag))
+            if rates is None:
+                metrics['errors'].inc()
+            if fetch_seconds is not None:
+                metrics['fetch'].observe(fetch_seconds)
+            if write_seconds is not None:
+                metrics['write'].observe(write_seconds)
+                metrics['bytes'].inc(stream['bytes_written'] - bytes_before)
+            if stream['last_bar_open'] is not None:
+                metrics['bar_age'].set(time.time() + self._server_time_offset - stream['last_bar_open'])
+
+    def poll_all_once(self) -> List[Dict[str, Any]]:
+        """
+        不经过调度线程，依次轮询所有数据流一次 (供回放工具等外部驱动使用)。
+
+        Returns:
+            List[Dict[str, Any]]: 本次出现新K线 (即上一根K线已收盘) 的数据流对应的 bar_closed 通知内容，
+                                  格式与 NotificationSubscriber.wait 返回的消息相同。
+        """
+        if not self._streams:
+            self._init_streams()
+        closed = []
+        for stream in self._streams.values():
+            previous_bar_open = stream['last_bar_open']
+            self._poll_stream(stream)
+            if previous_bar_open is not None and (stream['last_bar_open'] or 0) > previous_bar_open:
+                closed.append({
+                    'topic': TOPIC_BAR_CLOSED,
+                    'symbol': stream['symbol'],
+                    'timeframe': stream['timeframe'],
+                    'bar_time': previous_bar_open,
+                })
+        return closed
+
+    @staticmethod
+    def _format_rate_lines(rates: Any, start: int = 0) -> List[str]:
+        """将 rates[start:] 格式化为 CSV 行 (时间为 'YYYY-MM-DD HH:MM:SS' UTC，价格保留 5 位小数)。"""
+        lines = []
+        for row in rates[start:]:
+            time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(row[0])))
+            lines.append(
+                f"{time_str},{row[1]:.5f},{row[2]:.5f},{row[3]:.5f},{row[4]:.5f},"
+                f"{int(row[5])},{int(row[6])},{int(row[7])}\n"
+            )
+        return lines
 
-        self.logger.info(f"线程 [{thread_name}] 收到停止信号，正在退出...")
+    def _replace_file(self, filepath: Path, content: bytes, stream_name: str):
+        """以临时文件 + os.replace 原子地写入文件，读取方只会看到完整的旧文件或新文件。"""
+        temp_filepath = filepath.with_suffix(f"{filepath.suffix}.tmp_{stream_name}")
+        try:
+            with open(temp_filepath, 'wb') as f:
+                f.write(content)
+            os.replace(temp_filepath, filepath)
+        except Exception:
+            if temp_filepath.exists():
+                try:
+                    temp_filepath.unlink()
+                except OSError:
+                    pass # Ignore unlink error
+            raise
+
+    def _write_realtime_bars(self, stream: Dict[str, Any], rates: Any):
+        """
+        将 MT5 返回的最新 K 线写入实时文件，只写入变化的部分。
+
+        数据流在内存中保存上次写入的末行 (时间、内容、字节偏移)。新一批数据中：
+        - 末行时间之后的 K 线直接追加到文件尾；
+        - 与末行时间相同的 K 线 (通常是正在形成的 K 线) 内容变化时，截断文件末行并重写；
+        - 没有任何变化时不写文件。
+        截断后的文件总是以完整的行结束，新内容以一次 write 写入且以换行结束，CSV 回退路径上的
+        读取方 (MarketDataProvider.load_realtime_data) 丢弃没有换行结尾的末行，不会读到写了一半的K线。
+        首次写入、文件被外部修改、数据不连续或文件超过 realtime.max_file_bars 行时，
+        整体重写最新快照 (临时文件 + os.replace)。
+        """
+        filepath = stream['filepath']
+        stream_name = f"{stream['symbol']}-{stream['timeframe']}"
+        times = np.fromiter((int(row[0]) for row in rates), dtype=np.int64, count=len(rates))
+        state = stream.get('file_state')
+
+        if state is not None:
+            try:
+                current_size = filepath.stat().st_size
+            except OSError:
+                current_size = None
+            idx = int(np.searchsorted(times, state['last_time']))
+            if current_size == state['size'] and idx < len(times) and times[idx] == state['last_time']:
+                lines = self._format_rate_lines(rates, idx)
+                tail_changed = lines[0] != state['last_line']
+                new_lines = lines[1:]
+                if not tail_changed and not new_lines:
+                    return # Nothing changed since the last write
+                if state['rows'] + len(new_lines) <= self.max_file_bars:
+                    payload_lines = lines if tail_changed else new_lines
+                    payload = ''.join(payload_lines).encode('utf-8')
+                    try:
+                        with open(filepath, 'r+b') as f:
+                            if tail_changed:
+                                f.seek(state['tail_offset'])
+                                f.truncate()
+                            else:
+                                f.seek(0, os.SEEK_END)
+                            write_offset = f.tell()
+                            f.write(payload)
+                    except Exception:
+                        stream['file_state'] = None # 下次整体重写
+                        raise
+                    state.update({
+                        'last_time': int(times[-1]),
+                        'last_line': lines[-1],
+                        'size': write_offset + len(payload),
+                        'tail_offset': write_offset + len(payload) - len(payload_lines[-1].encode('utf-8')),
+                        'rows': state['rows'] + len(new_lines),
+                    })
+                    stream['writes'] += 1
+                    stream['bytes_written'] += len(payload)
+                    self.logger.debug(f"数据流 [{stream_name}] 更新 {filepath.name}: 末行{'已重写' if tail_changed else '未变'}, 追加 {len(new_lines)} 条")
+                    return
+
+        # --- 整体重写最新快照 ---
+        lines = self._format_rate_lines(rates)
+        header = ','.join(['time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume']) + '\n'
+        content = (header + ''.join(lines)).encode('utf-8')
+        try:
+            self._replace_file(filepath, content, stream_name)
+        except Exception:
+            stream['file_state'] = None
+            raise
+        stream['file_state'] = {
+            'last_time': int(times[-1]),
+            'last_line': lines[-1],
+            'size': len(content),
+            'tail_offset': len(content) - len(lines[-1].encode('utf-8')),
+            'rows': len(lines),
+        }
+        stream['writes'] += 1
+        stream['bytes_written'] += len(content)
+        self.logger.info(f"数据流 [{stream_name}] 已重写实时数据文件: {filepath.name} ({len(lines)} 条)")
+
+    def get_stream_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        返回每个数据流的轮询/延迟指标。
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 以 "SYMBOL-TF" 为键，包含 polls, errors, writes, bytes_written,
+            last_poll_utc, last_bar_time, staleness_seconds (距上次轮询的秒数),
+            last_fetch_seconds, last/max_schedule_lag_seconds (实际轮询相对计划时间的延迟)。
+        """
+        now_utc = datetime.now(get_utc_timezone())
+        metrics = {}
+        with self._metrics_lock:
+            for stream in self._streams.values():
+                last_poll = stream['last_poll_utc']
+                metrics[f"{stream['symbol']}-{stream['timeframe']}"] = {
+                    'polls': stream['polls'],
+                    'errors': stream['errors'],
+                    'writes': stream['writes'],
+                    'bytes_written': stream['bytes_written'],
+                    'last_poll_utc': last_poll,
+                    'last_bar_time': stream['last_bar_time'],
+                    'staleness_seconds': (now_utc - last_poll).total_seconds() if last_poll else None,
+                    'last_fetch_seconds': stream['last_fetch_seconds'],
+                    'last_schedule_lag_seconds': stream['last_schedule_lag_seconds'],
+                    'max_schedule_lag_seconds': stream['max_schedule_lag_seconds'],
+                }
+        return metrics
+
+    def _log_stream_metrics(self):
+        """定期汇总记录各数据流的延迟指标。"""
+        metrics = self.get_stream_metrics()
+        if not metrics:
+            return
+        worst_name, worst = max(metrics.items(), key=lambda item: item[1]['max_schedule_lag_seconds'])
+        total_polls = sum(m['polls'] for m in metrics.values())
+        total_errors = sum(m['errors'] for m in metrics.values())
+        self.logger.info(
+            f"数据流指标: {len(metrics)} 个数据流, 轮询 {total_polls} 次, 失败 {total_errors} 次, "
+            f"最大调度延迟 {worst['max_schedule_lag_seconds']:.3f}s ({worst_name})"
+        )
+        for name, m in metrics.items():
+            self.logger.debug(f"数据流 [{name}] 指标: {m}")
 
 
 if __name__ == '__main__':
@@ -500,10 +964,10 @@ if __name__ == '__main__':
     # --- Start the updater ---
     try:
         updater.start_updater()
-        # Keep the main thread alive while background threads run
+        # Keep the main thread alive while the scheduler thread runs
         # Check for stop event periodically in the main thread too
         if updater.mt5_initialized and updater._threads: # Check if threads actually started
-             main_logger.info("主进程进入等待状态。监控线程正在后台运行...")
+             main_logger.info("主进程进入等待状态。调度线程正在后台运行...")
              main_logger.info(f"要停止，请在 {updater.base_data_dir} 目录下创建 {STOP_FLAG_FILENAME} 文件。")
              while not updater._stop_event.is_set():
                   # Check for the stop flag file periodically in the main thread as well
@@ -520,7 +984,7 @@ if __name__ == '__main__':
                   time.sleep(5) # Check every 5 seconds
              main_logger.info("主进程退出。")
         else:
-             main_logger.warning("未能成功启动监控线程或 MT5 连接失败。请检查日志。")
+             main_logger.warning("未能成功启动调度线程或 MT5 连接失败。请检查日志。")
 
     except KeyboardInterrupt:
          main_logger.info("收到 KeyboardInterrupt (Ctrl+C)。正在停止更新器...")
@@ -82,6 +82,43 @@ async def fetch_market_prices(symbol: str, timeframe: str | None = None, date_fr
 
 # --- 结束新增 API 端点 ---
 
+# --- 运行指标 (Prometheus 文本格式) ---
+# RealtimeUpdater / StrategyOrchestrator 各自在本机端口提供 /metrics (见 core/metrics.py 和 config/common.yaml 的 metrics 段)，
+# 这里把本进程的指标与这些端点的输出合并为一个抓取目标。
+import urllib.request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+try:
+    from core import metrics as core_metrics
+    from core.utils import load_app_config
+    from omegaconf import OmegaConf
+    _metrics_config = load_app_config("config/common.yaml")
+    _metrics_host = OmegaConf.select(_metrics_config, "metrics.host", default="127.0.0.1")
+    METRICS_TARGETS = [
+        f"http://{_metrics_host}:{OmegaConf.select(_metrics_config, key, default=default)}/metrics"
+        for key, default in (("metrics.realtime_port", 9101), ("metrics.orchestrator_port", 9102))
+    ]
+except Exception as e:
+    print(f"WARN: Could not load metrics configuration: {e}")
+    core_metrics = None
+    METRICS_TARGETS = []
+
+def _collect_metrics() -> str:
+    parts = [core_metrics.REGISTRY.render()] if core_metrics else []
+    for url in METRICS_TARGETS:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                parts.append(resp.read().decode("utf-8"))
+        except OSError:
+            parts.append(f"# target {url} unavailable\n")
+    return "".join(parts)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def fetch_metrics():
+    """汇总实时更新器与策略调度器的 Prometheus 指标。"""
+    return PlainTextResponse(await run_in_threadpool(_collect_metrics), media_type="text/plain; version=0.0.4")
+
 
 # 如果直接运行此文件，则启动 uvicorn 服务器 (用于开发)
 if __name__ == "__main__":
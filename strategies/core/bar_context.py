@@ -0,0 +1,98 @@
+"""
+每根K线共享的特征上下文
+
+组合策略 (如 KeyTimeWeightTurningPointStrategy 内部的 _ex_checker、SpaceTimeResonanceStrategy 的
+_rc_checker/_ex_checker) 原先各自向数据提供者请求同一品种、同一根K线的窗口和指标，
+对相同的数据重复调用 get_window / get_historical_prices / get_indicator。
+
+BarContext 由回测引擎或策略执行器在每个时间点创建一次，经 StrategyBase.bind_bar_context
+传给策略及其组合的子策略。窗口、历史区间、指标和派生特征在上下文内按参数记忆，
+同一时间点内第二个请求相同数据的策略直接复用结果。上下文只在一个时间点内有效，
+下一个时间点创建新的上下文，因此记忆的值不需要失效处理。
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import pandas as pd
+
+_MISSING = object()
+
+
+def _time_key(value: Any) -> Optional[int]:
+    """把时间转换为 UTC 纳秒整数作为记忆键 (naive 视为 UTC)。"""
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    return ts.as_unit('ns').value
+
+
+class BarContext:
+    """
+    一个时间点内共享的窗口、历史区间和指标 (带记忆)。
+
+    Args:
+        current_time: 本时间点 (UTC)。
+        data_provider: 数据提供者 (get_window / get_historical_prices / get_indicator)。
+        market_data (Dict): 本时间点传给策略的市场数据 (只读)。
+    """
+
+    def __init__(self, current_time: Any, data_provider: Any, market_data: Optional[Dict[str, Any]] = None):
+        self.current_time = current_time
+        self.time_key = _time_key(current_time)
+        self.data_provider = data_provider
+        self.market_data = market_data
+        self._memo: Dict[Hashable, Any] = {}
+        self._windows: Dict[tuple, tuple] = {} # (symbol, tf, end_ns) -> (请求的最大根数, DataFrame)
+        self._lock = threading.Lock() # 并行执行器中多个策略共享同一个上下文
+        self.hits = 0
+        self.misses = 0
+
+    def is_for(self, current_time: Any) -> bool:
+        return self.time_key == _time_key(current_time)
+
+    def memo(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """返回 key 对应的记忆值，不存在时调用 compute() 计算并记住 (None 也会被记住)。"""
+        with self._lock:
+            value = self._memo.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            return self._memo.setdefault(key, value)
+
+    def window(self, symbol: str, timeframe: str, end_time: Any, n_bars: int) -> Optional[pd.DataFrame]:
+        """
+        end_time (含) 之前最近的 n_bars 根K线 (data_provider.get_window 的记忆版本)。
+        同一结束时间只向数据提供者请求一次最大的根数，较短的请求从中取尾部切片。
+        """
+        if n_bars <= 0:
+            return None
+        key = (symbol.upper(), timeframe.upper(), _time_key(end_time))
+        with self._lock:
+            cached = self._windows.get(key)
+        if cached is not None and cached[0] >= n_bars:
+            with self._lock:
+                self.hits += 1
+            df = cached[1]
+            return df if df is None or len(df) <= n_bars else df.iloc[len(df) - n_bars:]
+        df = self.data_provider.get_window(symbol, timeframe, end_time, n_bars)
+        with self._lock:
+            self.misses += 1
+            if cached is None or cached[0] < n_bars:
+                self._windows[key] = (n_bars, df)
+        return df
+
+    def historical_prices(self, symbol: str, start_time: Any, end_time: Any, timeframe: str) -> Optional[pd.DataFrame]:
+        """data_provider.get_historical_prices 的记忆版本 (按品种、周期和时间区间)。"""
+        key = ('historical_prices', symbol.upper(), timeframe.upper(), _time_key(start_time), _time_key(end_time))
+        return self.memo(key, lambda: self.data_provider.get_historical_prices(
+            symbol=symbol, start_time=start_time, end_time=end_time, timeframe=timeframe))
+
+    def indicator(self, symbol: str, timeframe: str, name: str, as_of: Any = None, **params) -> Optional[float]:
+        """data_provider.get_indicator 的记忆版本。"""
+        key = ('indicator', symbol.upper(), timeframe.upper(), name, _time_key(as_of), tuple(sorted(params.items())))
+        return self.memo(key, lambda: self.data_provider.get_indicator(symbol, timeframe, name, as_of=as_of, **params))
@@ -1,10 +1,17 @@
 import pandas as pd
+import numpy as np
+import io
 import os
 import logging
-from typing import List, Optional, Dict, Any
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
 from pathlib import Path # Import Path
 from omegaconf import OmegaConf, DictConfig # Import DictConfig
 from core.utils import get_filepath, setup_logging # 从core模块导入 setup_logging
+from core.shared_bars import BAR_FIELDS, SharedBarRing, ring_name
+from strategies.core.indicators import IndicatorRegistry
+from strategies.core.market_state import MarketStateStore
 import yaml # Import yaml for loading specs
 import pytz # 确保导入 pytz
 import datetime # Import datetime for timezone comparison
@@ -64,13 +71,23 @@ logger = logging.getLogger(__name__) # Use __name__ for module-level logger
 # ----------------------
 # 财经日历数据提供者
 # ----------------------
+def _utc_now() -> pd.Timestamp:
+    return pd.Timestamp.now(tz='UTC')
+
+
 class EconomicCalendarProvider:
     """
     为策略模块提供统一的财经日历数据访问接口。
+
+    Args:
+        config (DictConfig): 全局配置。
+        clock (Optional[Callable[[], pd.Timestamp]]): 返回当前 UTC 时间的函数 (get_upcoming_events 的时间基准)，
+            默认为系统时间；回放时传入回放时钟 (见 set_clock)。
     """
-    def __init__(self, config: DictConfig):
+    def __init__(self, config: DictConfig, clock: Optional[Callable[[], pd.Timestamp]] = None):
         self.config = config
         self.logger = logging.getLogger(self.__class__.__name__) # Get instance logger
+        self.clock: Callable[[], pd.Timestamp] = clock or _utc_now
 
         # Use OmegaConf.select for safer access and defaults
         # Assume base_data_dir is resolved correctly before passing config
@@ -87,6 +104,11 @@ class EconomicCalendarProvider:
 
         self._add_strategy_metadata_hook = None
 
+        # 已解析事件的缓存: path -> {'signature': (size, mtime_ns), 'df', 'sorted_times', 'order'}
+        # 文件被日历流程重写 (大小或修改时间变化) 时才重新加载
+        self._events_cache: Dict[str, Dict[str, Any]] = {}
+        self._events_cache_lock = threading.Lock()
+
         # ---> 尝试注册钩子
         if add_strategy_metadata is not None:
             self.register_metadata_hook(add_strategy_metadata)
@@ -100,24 +122,79 @@ class EconomicCalendarProvider:
         self.logger.info(f" - Live events path: {self.live_filtered_path}")
         self.logger.info(f" - History events path: {self.history_filtered_path}")
 
+    def set_clock(self, clock: Optional[Callable[[], pd.Timestamp]]):
+        """设置当前时间函数 (None 恢复为系统时间)。"""
+        self.clock = clock or _utc_now
+
     def register_metadata_hook(self, hook_function):
         """注册一个函数，用于在返回数据前添加策略元数据。"""
         self._add_strategy_metadata_hook = hook_function
+        self._events_cache.clear() # 已缓存的数据是用旧钩子处理的
         self.logger.info(f"Registered metadata hook: {hook_function.__name__}")
 
+    @staticmethod
+    def _file_signature(path: str) -> Optional[tuple]:
+        """返回文件的 (大小, 修改时间 ns)，文件不存在时返回 None。"""
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        return (stat_result.st_size, stat_result.st_mtime_ns)
+
+    def _get_cached_entry(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        返回 path 对应的缓存项，文件签名变化 (或尚未缓存) 时重新加载。
+        文件不存在时返回 None；文件存在但没有有效事件时缓存项的 'df' 为 None。
+        """
+        signature = self._file_signature(path)
+        if signature is None:
+            self.logger.warning(f"过滤事件文件未找到: {path}")
+            with self._events_cache_lock:
+                self._events_cache.pop(path, None)
+            return None
+
+        with self._events_cache_lock:
+            entry = self._events_cache.get(path)
+            if entry is not None and entry['signature'] == signature:
+                return entry
+
+            df = self._load_events(path)
+            entry = {'signature': signature, 'df': df, 'sorted_times': None, 'order': None}
+            if df is not None and 'datetime' in df.columns and pd.api.types.is_datetime64_any_dtype(df['datetime']):
+                # 预先按时间排序，窗口查询用 searchsorted 完成
+                times = df['datetime'].dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+                order = np.argsort(times, kind='stable')
+                entry['sorted_times'] = times[order]
+                entry['order'] = order
+            self._events_cache[path] = entry
+            return entry
+
     def get_filtered_events(self, live: bool = True, **kwargs) -> Optional[pd.DataFrame]:
         """
         读取预处理和筛选后的事件数据。
         使用 economic_calendar 模块的 load_input_file 函数。
 
+        解析后的 DataFrame (UTC 时间，已应用元数据钩子) 按文件 (大小, 修改时间) 缓存，
+        只有日历流程重写文件后才重新加载；返回的是缓存的副本 (日历数据量很小)，调用方修改不会影响缓存。
+
         Args:
             live (bool): True 读取实时筛选数据，False 读取历史筛选数据。
-            **kwargs: 传递给 load_input_file 的额外参数 (如果有的话)。
+            **kwargs: 传递给 load_input_file 的额外参数 (如果有的话)，提供时不使用缓存。
 
         Returns:
             Optional[pd.DataFrame]: 包含事件数据的 DataFrame，如果文件不存在或加载失败则返回 None。
         """
         path = self.live_filtered_path if live else self.history_filtered_path
+        if kwargs:
+            return self._load_events(path, **kwargs)
+
+        entry = self._get_cached_entry(path)
+        if entry is None or entry['df'] is None:
+            return None
+        return entry['df'].copy()
+
+    def _load_events(self, path: str, **kwargs) -> Optional[pd.DataFrame]:
+        """从 path 加载事件，解析 datetime 并转换为 UTC，然后应用元数据钩子。"""
         self.logger.debug(f"尝试从以下路径加载已过滤事件: {path}")
 
         if load_input_file is None:
@@ -126,7 +203,7 @@ class EconomicCalendarProvider:
 
         try:
             # 调用 economic_calendar.data.loader 中的函数加载
-            df = load_input_file(path)
+            df = load_input_file(path, **kwargs)
             if df is None or df.empty:
                  # Changed from warning to debug as it might be normal
                  self.logger.debug(f"从 {path} 加载的事件为空或不存在。")
@@ -196,7 +273,7 @@ class EconomicCalendarProvider:
 
     def get_upcoming_events(self, lookahead_window: str = "24h") -> Optional[pd.DataFrame]:
         """
-        获取未来指定时间窗口内的事件。
+        获取未来指定时间窗口内的事件 ("当前" 由 self.clock 决定)。
 
         Args:
             lookahead_window (str): 时间窗口字符串 (e.g., "24h", "1d").
@@ -204,22 +281,26 @@ class EconomicCalendarProvider:
         Returns:
             Optional[pd.DataFrame]: 未来事件的数据，如果出错则返回 None。
         """
-        live_events = self.get_filtered_events(live=True)
-        if live_events is None or live_events.empty: # Check for empty df
+        entry = self._get_cached_entry(self.live_filtered_path)
+        if entry is None or entry['df'] is None or entry['df'].empty: # Check for empty df
             self.logger.debug("无法获取未来事件：没有实时事件数据。")
             return None
 
-        now = pd.Timestamp.now(tz='UTC')
+        now = self.clock()
         try:
             future_limit = now + pd.Timedelta(lookahead_window)
             # Ensure datetime column exists and is correct type before filtering
-            if 'datetime' not in live_events.columns or not pd.api.types.is_datetime64_any_dtype(live_events['datetime']):
+            if entry['sorted_times'] is None:
                 self.logger.error("无法获取未来事件: 'datetime' 列缺失或无效。")
                 return None
 
-            upcoming = live_events[(live_events['datetime'] > now) & (live_events['datetime'] <= future_limit)]
+            # 在预排序的时间数组上二分查找 (now, future_limit] 窗口
+            sorted_times = entry['sorted_times']
+            start = np.searchsorted(sorted_times, now.value, side='right')
+            end = np.searchsorted(sorted_times, future_limit.value, side='right')
+            upcoming = entry['df'].iloc[entry['order'][start:end]]
             self.logger.debug(f"找到 {len(upcoming)} 个在未来 {lookahead_window} 内的事件。")
-            return upcoming.sort_values(by='datetime')
+            return upcoming
         except Exception as e:
             self.logger.error(f"计算未来事件时出错: {e}", exc_info=True)
             return None
@@ -258,11 +339,30 @@ class MarketDataProvider:
         if get_filepath is None:
             self.logger.error("初始化失败：'get_filepath' 函数不可用。路径生成将失败。")
 
+        # --- 内存K线窗口缓存 (供 get_window 使用) ---
+        # 回测: register_bars 注册的数据 {(SYMBOL, TF): {'df': 按时间排序的 DataFrame, 'index_ns': int64 纳秒数组}}
+        self._window_cache: Dict[tuple, Dict[str, Any]] = {}
+        self._window_lock = threading.Lock()
+        # 实盘: 增量市场状态 (首次使用时创建，或通过 attach_market_state 与 StrategyOrchestrator 共用)
+        self._market_state: Optional[MarketStateStore] = None
+        self._rt_paths: Dict[tuple, Optional[Path]] = {} # realtime_version 使用，避免每次调用 get_filepath (会创建目录)
+
+        # --- 实时K线共享内存 (由 RealtimeUpdater 写入，见 core.shared_bars) ---
+        self.shm_enabled = OmegaConf.select(config, 'market_data.shared_memory.enabled', default=False)
+        self.shm_name_prefix = OmegaConf.select(config, 'market_data.shared_memory.name_prefix', default='ssbars')
+        self._rings: Dict[tuple, SharedBarRing] = {}
+        self._ring_frames: Dict[tuple, tuple] = {} # {(SYMBOL, TF): (sequence, DataFrame)}
+        self._ring_lock = threading.Lock()
+        # 连接失败 (写入方未运行、回测中) 后在该间隔内不再尝试连接，避免每次查询都打开共享内存
+        self.shm_reattach_interval = OmegaConf.select(config, 'market_data.shared_memory.reattach_interval_seconds', default=5.0)
+        self._ring_retry_at: Dict[tuple, float] = {} # {(SYMBOL, TF): 下次允许尝试连接的 time.monotonic()}
+
         self.logger.info("MarketDataProvider initialized.")
         self.logger.info(f" - MT5 Connected: {self.mt5_connected}")
         self.logger.info(f" - Base data directory: {self.base_data_dir}")
         self.logger.info(f" - Historical path pattern: {self.hist_dir_pattern}/{self.hist_filename_pattern}")
         self.logger.info(f" - Realtime path pattern: {self.rt_dir_pattern}/{self.rt_filename_pattern}")
+        self.logger.info(f" - Realtime shared memory: {self.shm_enabled} (prefix: {self.shm_name_prefix})")
 
     def _initialize_mt5(self):
         """ Initialize MT5 connection based on config. """
@@ -469,9 +569,41 @@ class MarketDataProvider:
              self.logger.error(f"为 {symbol} {timeframe} 生成实时文件路径时出错: {e}")
              return None
 
+    @staticmethod
+    def _wanted_columns(columns: Optional[List[str]]) -> Optional[set]:
+        """
+        请求列名的小写集合 (None 表示全部列)。MT5 数据中 tick_volume 会被重命名为 volume，
+        两者视为同一列: 请求其中任意一个时两者都保留。
+        """
+        if not columns:
+            return None
+        wanted = {c.lower() for c in columns}
+        if wanted & {'volume', 'tick_volume'}:
+            wanted.update(('volume', 'tick_volume'))
+        return wanted
+
+    @classmethod
+    def _select_columns(cls, df: pd.DataFrame, columns: Optional[List[str]] = None,
+                        downcast_float32: bool = False) -> pd.DataFrame:
+        """
+        只保留请求的列 (成交量别名见 _wanted_columns)，并可选地将浮点列降为 float32 以节省内存。
+        """
+        wanted = cls._wanted_columns(columns)
+        if wanted:
+            keep = [c for c in df.columns if c in wanted]
+            if len(keep) != len(df.columns):
+                df = df[keep]
+        if downcast_float32:
+            float_cols = [c for c in df.columns if pd.api.types.is_float_dtype(df[c]) and df[c].dtype != 'float32']
+            if float_cols:
+                df = df.astype({c: 'float32' for c in float_cols})
+        return df
+
     def load_from_cache(self, symbol: str, timeframe: str, 
                         start_time: Optional[pd.Timestamp] = None, 
-                        end_time: Optional[pd.Timestamp] = None) -> Optional[pd.DataFrame]:
+                        end_time: Optional[pd.Timestamp] = None,
+                        columns: Optional[List[str]] = None,
+                        downcast_float32: bool = False) -> Optional[pd.DataFrame]:
         """
         尝试从缓存 (历史数据 CSV 文件) 加载指定品种和时间周期的数据。
         --- 修改: 添加了 start_time 和 end_time 参数以支持读取时过滤 ---
@@ -481,6 +613,8 @@ class MarketDataProvider:
             timeframe (str): 时间周期 (e.g., "H1", "M15")。
             start_time (Optional[pd.Timestamp]): 开始时间 (时区感知 UTC)，用于过滤。
             end_time (Optional[pd.Timestamp]): 结束时间 (时区感知 UTC)，用于过滤。
+            columns (Optional[List[str]]): 只读取这些列 (time 列总是读取)，None 表示全部列。
+            downcast_float32 (bool): 是否以 float32 读取价格列。
 
         Returns:
             Optional[pd.DataFrame]: OHLCV 数据 (UTC 时间索引)，如果缓存不存在或读取失败则返回 None。
@@ -502,13 +636,18 @@ class MarketDataProvider:
         first_chunk_logged = False
         try:
             chunksize = 100000 
+            wanted_columns = self._wanted_columns(columns)
+            read_dtype = {'volume': 'float64'}
+            if downcast_float32:
+                read_dtype.update({c: 'float32' for c in ('open', 'high', 'low', 'close', 'volume')})
 
             for i, chunk in enumerate(pd.read_csv(
                 filepath,
                 index_col='time',
                 parse_dates=True,
                 date_format='%Y-%m-%d %H:%M:%S', 
-                dtype={'volume': 'float64'},
+                dtype=read_dtype,
+                usecols=(lambda c: c.lower() == 'time' or c.lower() in wanted_columns) if wanted_columns else None,
                 chunksize=chunksize, 
                 low_memory=False 
             )):
@@ -606,9 +745,65 @@ class MarketDataProvider:
             self.logger.error(f"[DP.load_from_cache] 从缓存文件 {filepath} 分块读取或过滤数据时发生未预期的错误: {e}", exc_info=True)
             return None
 
+    def _get_ring(self, symbol: str, timeframe: str) -> Optional[SharedBarRing]:
+        """
+        返回品种/周期的共享内存缓冲区。连接只建立一次并复用；写入方关闭后断开。
+        连接失败或断开后在 reattach_interval_seconds 内直接返回 None，之后才再次尝试连接。
+        """
+        key = (symbol.upper(), timeframe.upper())
+        with self._ring_lock:
+            ring = self._rings.get(key)
+            if ring is not None:
+                if ring.is_live:
+                    return ring
+                self.logger.info(f"共享内存 {ring.name} 已被写入方关闭，{self.shm_reattach_interval} 秒后尝试重新连接。")
+                ring.close()
+                self._rings.pop(key, None)
+                self._ring_frames.pop(key, None)
+                self._ring_retry_at[key] = time.monotonic() + self.shm_reattach_interval
+                return None
+            if time.monotonic() < self._ring_retry_at.get(key, 0.0):
+                return None
+            ring = SharedBarRing.attach(ring_name(self.shm_name_prefix, symbol, timeframe))
+            if ring is None:
+                self._ring_retry_at[key] = time.monotonic() + self.shm_reattach_interval
+                return None
+            self._ring_retry_at.pop(key, None)
+            self._rings[key] = ring
+            return ring
+
+    def load_realtime_from_shm(self, symbol: str, timeframe: str) -> Optional[pd.DataFrame]:
+        """
+        从共享内存环形缓冲区读取指定品种和时间周期的实时K线。
+
+        直接在映射的内存上读取定长记录，不经过 CSV 格式化/解析；缓冲区序列号未变化时返回上次构建的
+        DataFrame (调用方应视为只读)。
+
+        Returns:
+            Optional[pd.DataFrame]: 与 load_realtime_data 相同格式的数据 (UTC 时间索引)；
+                                    共享内存不可用或为空时返回 None。
+        """
+        ring = self._get_ring(symbol, timeframe)
+        if ring is None:
+            return None
+        key = (symbol.upper(), timeframe.upper())
+        sequence = ring.sequence
+        cached = self._ring_frames.get(key)
+        if cached is not None and cached[0] == sequence:
+            return cached[1]
+
+        bars = ring.read()
+        if bars is None or len(bars) == 0:
+            return None
+        index = pd.DatetimeIndex(pd.to_datetime(bars['time'], unit='s', utc=True), name='time')
+        df = pd.DataFrame({field: bars[field] for field in BAR_FIELDS[1:]}, index=index)
+        self._ring_frames[key] = (sequence, df)
+        return df
+
     def load_realtime_data(self, symbol: str, timeframe: str) -> Optional[pd.DataFrame]:
         """
-        尝试从实时数据 CSV 文件加载指定品种和时间周期的数据。
+        加载指定品种和时间周期的实时数据。
+        启用共享内存时优先从 RealtimeUpdater 的共享内存缓冲区读取，不可用时回退到实时数据 CSV 文件。
 
         Args:
             symbol (str): 交易品种代码。
@@ -617,6 +812,12 @@ class MarketDataProvider:
         Returns:
             Optional[pd.DataFrame]: OHLCV 数据 (UTC 时间索引)，如果文件不存在或读取失败则返回 None。
         """
+        if self.shm_enabled:
+            shm_df = self.load_realtime_from_shm(symbol, timeframe)
+            if shm_df is not None:
+                self.logger.debug(f"从共享内存加载 {symbol} {timeframe} 实时数据 {len(shm_df)} 条。")
+                return shm_df
+
         filepath = self._get_rt_filepath(symbol, timeframe)
         if filepath is None:
             self.logger.error(f"无法为 {symbol} {timeframe} 获取实时文件路径。")
@@ -625,9 +826,16 @@ class MarketDataProvider:
         self.logger.debug(f"尝试从以下路径加载实时数据 {symbol} {timeframe}: {filepath}")
         if filepath.exists() and filepath.stat().st_size > 0:
             try:
+                # RealtimeUpdater 在文件末尾原地截断/追加完整的行: 没有换行结尾的末行是正在写入的内容，丢弃
+                with open(filepath, 'rb') as f:
+                    raw = f.read()
+                raw = raw[:raw.rfind(b'\n') + 1]
+                if not raw:
+                    self.logger.debug(f"实时数据文件 {filepath} 中没有完整的行。")
+                    return None
                 # Use consistent reading parameters with load_from_cache
                 df = pd.read_csv(
-                     filepath,
+                     io.BytesIO(raw),
                      index_col='time',
                      parse_dates=True,
                      date_format='%Y-%m-%d %H:%M:%S', # Specify format
@@ -712,7 +920,9 @@ class MarketDataProvider:
                  self.logger.error(f"合并 {symbol} {timeframe} 的历史和实时数据时出错: {e}", exc_info=True)
                  return None # Return None on merge error
 
-    def get_historical_prices(self, symbol: str, start_time: pd.Timestamp, end_time: pd.Timestamp, timeframe: str) -> Optional[pd.DataFrame]:
+    def get_historical_prices(self, symbol: str, start_time: pd.Timestamp, end_time: pd.Timestamp, timeframe: str,
+                              columns: Optional[List[str]] = None,
+                              downcast_float32: bool = False) -> Optional[pd.DataFrame]:
         """
         获取指定时间范围内的历史价格数据 (UTC 时间索引)。
         会合并历史和实时缓存以获取最完整的数据。
@@ -723,6 +933,8 @@ class MarketDataProvider:
             start_time (pd.Timestamp): 开始时间 (时区感知)。
             end_time (pd.Timestamp): 结束时间 (时区感知)。
             timeframe (str): 时间周期。
+            columns (Optional[List[str]]): 只返回这些列，None 表示全部列。
+            downcast_float32 (bool): 是否将浮点列降为 float32。
 
         Returns:
             Optional[pd.DataFrame]: 指定范围内的 OHLCV 数据 (UTC 时间索引)。
@@ -810,7 +1022,7 @@ class MarketDataProvider:
                 if data_df is not None and not data_df.empty:
                     self.logger.info(f"[DP.get_historical_prices] 从 MT5 获取到 {len(data_df)} 条 {symbol} {timeframe} 数据 (已确保UTC)。")
                     # MT5 数据应该是 UTC，并已处理好
-                    return data_df
+                    return self._select_columns(data_df, columns, downcast_float32)
             except Exception as mt5_e:
                 self.logger.error(f"[DP.get_historical_prices] 从 MT5 获取 {symbol} {timeframe} 数据时出错: {mt5_e}。将尝试从缓存加载。", exc_info=True)
                 data_df = None # Ensure it's None to fallback
@@ -821,7 +1033,8 @@ class MarketDataProvider:
         # (data_df is None or data_df.empty) implies we need to load from cache
         if data_df is None or data_df.empty: # Check for empty df as well
             self.logger.debug(f"[DP.get_historical_prices] 调用 load_from_cache for {symbol} {timeframe} with start={start_time_utc}, end={end_time_utc}")
-            data_df = self.load_from_cache(symbol, timeframe, start_time_utc, end_time_utc)
+            data_df = self.load_from_cache(symbol, timeframe, start_time_utc, end_time_utc,
+                                           columns=columns, downcast_float32=downcast_float32)
             if data_df is not None and not data_df.empty:
                  self.logger.info(f"[DP.get_historical_prices] 从缓存成功加载 {len(data_df)} 条 {symbol} {timeframe} 数据。")
             else:
@@ -845,6 +1058,117 @@ class MarketDataProvider:
         self.logger.info(f"[DP.get_historical_prices] 最终返回 {len(final_df)} 条 {symbol} {timeframe} 数据。")
         return final_df
 
+    # --- 内存K线窗口 ---
+    @staticmethod
+    def _to_utc_ns(ts: Any) -> int:
+        """将时间转换为 UTC 纳秒整数 (naive 时间视为 UTC)。"""
+        ts = pd.Timestamp(ts)
+        if ts.tzinfo is None:
+            ts = ts.tz_localize('UTC')
+        return ts.value
+
+    def realtime_version(self, symbol: str, timeframe: str) -> Optional[tuple]:
+        """
+        实时数据的版本: 共享内存可用时为其序列号，否则为实时 CSV 的 (修改时间, 大小)；
+        没有实时数据时返回 None。MarketStateStore 据此跳过未变化的实时数据。
+        """
+        if self.shm_enabled:
+            ring = self._get_ring(symbol, timeframe)
+            if ring is not None and ring.count > 0:
+                return ('shm', ring.sequence)
+        key = (symbol.upper(), timeframe.upper())
+        if key not in self._rt_paths:
+            self._rt_paths[key] = self._get_rt_filepath(symbol, timeframe)
+        path = self._rt_paths[key]
+        if path is None:
+            return None
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return ('file', stat.st_mtime_ns, stat.st_size)
+
+    def attach_market_state(self, store: Optional[MarketStateStore]):
+        """
+        使用外部的增量市场状态 (通常为 StrategyOrchestrator 的 MarketStateStore) 作为实盘 get_window 的数据来源，
+        同一份K线只保存和更新一次。None 表示改用自己的实例。
+        """
+        with self._window_lock:
+            self._market_state = store
+
+    def _live_bars(self, symbol: str, timeframe: str) -> Optional[pd.DataFrame]:
+        """实盘K线: 增量市场状态的视图。实时数据版本变化时只追加新K线，首次使用时完整加载一次。"""
+        with self._window_lock:
+            if self._market_state is None:
+                self._market_state = MarketStateStore(self, logger=self.logger)
+            store = self._market_state
+        store.update(symbol, timeframe)
+        return store.view(symbol, timeframe)
+
+    def register_bars(self, symbol: str, timeframe: str, df: pd.DataFrame):
+        """
+        将已加载的K线数据注册到窗口缓存 (回测引擎加载数据后调用)。
+        数据只在此处排序一次，之后 get_window 通过二分查找切片。
+        """
+        if df is None or df.empty:
+            return
+        if not isinstance(df.index, pd.DatetimeIndex):
+            self.logger.warning(f"register_bars: {symbol} {timeframe} 的索引不是 DatetimeIndex，已忽略。")
+            return
+        if df.index.tz is None:
+            df = df.tz_localize('UTC')
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        entry = {'df': df, 'index_ns': df.index.as_unit('ns').asi8}
+        with self._window_lock:
+            self._window_cache[(symbol.upper(), timeframe.upper())] = entry
+
+    def invalidate_window_cache(self, symbol: Optional[str] = None, timeframe: Optional[str] = None):
+        """清除 register_bars 注册的窗口缓存 (不指定参数时清除全部)。"""
+        with self._window_lock:
+            if symbol is None and timeframe is None:
+                self._window_cache.clear()
+                return
+            for key in list(self._window_cache.keys()):
+                if (symbol is None or key[0] == symbol.upper()) and (timeframe is None or key[1] == timeframe.upper()):
+                    del self._window_cache[key]
+
+    def get_window(self, symbol: str, timeframe: str, end_time: Any, n_bars: int) -> Optional[pd.DataFrame]:
+        """
+        返回 end_time (含) 之前最近的 n_bars 根K线。
+
+        通过对内存中已排序的时间索引做二分查找 (searchsorted) 定位，不排序。
+        回测中数据由 register_bars 预先注册，不访问文件；实盘中数据来自增量市场状态 (见 MarketStateStore，
+        可与调度器共用)，每次调用只检查实时数据版本 (共享内存序列号，或实时文件的一次 stat)，
+        版本变化时只读取实时数据并追加新K线，不重新读取历史文件。
+        返回的是内存数据的切片视图，调用方应视为只读 (pandas>=3 的 Copy-on-Write 保证对其修改不会写回缓存)。
+
+        Args:
+            symbol (str): 交易品种。
+            timeframe (str): 时间周期。
+            end_time (Any): 窗口结束时间 (UTC，naive 视为 UTC)。
+            n_bars (int): K线数量。
+
+        Returns:
+            Optional[pd.DataFrame]: 最多 n_bars 行的数据；无数据时返回 None。
+        """
+        if n_bars <= 0:
+            return None
+        end_ns = self._to_utc_ns(end_time)
+        entry = self._window_cache.get((symbol.upper(), timeframe.upper()))
+        if entry is not None:
+            df, end_pos = entry['df'], int(np.searchsorted(entry['index_ns'], end_ns, side='right'))
+        else:
+            df = self._live_bars(symbol, timeframe)
+            if df is None or df.empty:
+                return None
+            # 在视图自身精度的时间戳上查找，避免每次转换整个索引 (向下取整，与 side='right' 一致)
+            unit_ns = pd.Timedelta(1, unit=df.index.unit).value
+            end_pos = int(np.searchsorted(df.index.asi8, end_ns // unit_ns, side='right'))
+        if end_pos == 0:
+            return None
+        return df.iloc[max(0, end_pos - n_bars):end_pos]
+
     def get_latest_prices(self, symbols: List[str], timeframe: str) -> Optional[Dict[str, pd.Series]]:
         """
         获取指定品种列表和 *指定时间周期* 的最新可用价格数据 (该时间周期合并数据的最后一行)。
@@ -943,6 +1267,7 @@ class DataProvider:
         self.logger = logging.getLogger(self.__class__.__name__) # Get instance logger
         self.economic_provider = EconomicCalendarProvider(config)
         self.market_provider = MarketDataProvider(config)
+        self.indicators = IndicatorRegistry(self.logger)
         self.logger.info("DataProvider facade initialized.")
 
     def get_filtered_events(self, live: bool = True, **kwargs) -> Optional[pd.DataFrame]:
@@ -953,9 +1278,36 @@ class DataProvider:
         """获取未来的财经日历事件。"""
         return self.economic_provider.get_upcoming_events(lookahead_window)
 
-    def get_historical_prices(self, symbol: str, start_time: pd.Timestamp, end_time: pd.Timestamp, timeframe: str) -> Optional[pd.DataFrame]:
-        """获取历史市场价格数据 (UTC 时间索引)。"""
-        return self.market_provider.get_historical_prices(symbol, start_time, end_time, timeframe)
+    def set_clock(self, clock: Optional[Callable[[], pd.Timestamp]]):
+        """设置日历查询使用的当前时间函数 (回放时为回放时钟，None 恢复为系统时间)。"""
+        self.economic_provider.set_clock(clock)
+
+    def get_historical_prices(self, symbol: str, start_time: pd.Timestamp, end_time: pd.Timestamp, timeframe: str,
+                              columns: Optional[List[str]] = None,
+                              downcast_float32: bool = False) -> Optional[pd.DataFrame]:
+        """获取历史市场价格数据 (UTC 时间索引)，可只加载指定列并降为 float32。"""
+        return self.market_provider.get_historical_prices(symbol, start_time, end_time, timeframe,
+                                                          columns=columns, downcast_float32=downcast_float32)
+
+    def get_window(self, symbol: str, timeframe: str, end_time: Any, n_bars: int) -> Optional[pd.DataFrame]:
+        """获取 end_time (含) 之前最近的 n_bars 根K线 (二分查找内存索引，只读视图，见 MarketDataProvider.get_window)。"""
+        return self.market_provider.get_window(symbol, timeframe, end_time, n_bars)
+
+    def register_bars(self, symbol: str, timeframe: str, df: pd.DataFrame):
+        """将已加载的K线注册到 get_window 使用的内存缓存。"""
+        self.market_provider.register_bars(symbol, timeframe, df)
+
+    def attach_market_state(self, store: Optional[MarketStateStore]):
+        """实盘 get_window 使用调度器的增量市场状态 (见 MarketDataProvider.attach_market_state)。"""
+        self.market_provider.attach_market_state(store)
+
+    def update_indicators(self, symbol: str, timeframe: str, bars: pd.DataFrame, until: Any = None) -> int:
+        """将新的已收盘K线送入共享的增量指标 (见 strategies.core.indicators)。"""
+        return self.indicators.feed(symbol, timeframe, bars, until=until)
+
+    def get_indicator(self, symbol: str, timeframe: str, name: str, as_of: Any = None, **params) -> Optional[float]:
+        """查询共享增量指标的最新值 (如 'vwap'、'atr'、'rsi'、'rolling_high'、'rolling_low')。"""
+        return self.indicators.value(symbol, timeframe, name, as_of=as_of, **params)
 
     def get_latest_prices(self, symbols: List[str], timeframe: str) -> Optional[Dict[str, pd.Series]]:
         """获取最新的市场价格数据 (Series name 为 UTC 时间戳)。"""
@@ -0,0 +1,214 @@
+"""
+编译后的事件映射规则索引
+
+EventDrivenSpaceStrategy._map_event_to_symbol 原先对每个事件遍历 event_mapping.yaml 中的全部规则，
+每条规则都要重新转换国家代码和关键词的大小写、逐个关键词做子串扫描，并重新解析结果条件字符串。
+
+EventMappingIndex 在策略初始化时把规则编译一次:
+
+- 国家代码 -> 规则列表 的哈希索引 (事件只与本国家的规则比较)；
+- 每个国家一个多模式关键词匹配器 (一个正则在标题上扫描一遍，找出所有出现的关键词)；
+- 预先解析的结果条件 (如 "A > F" 解析为 (操作数, 运算符, 操作数))；
+- 按 (事件 id, 标题, 国家, 实际值, 预期值, 前值) 缓存映射结果，回测中重复出现的同一事件直接返回。
+"""
+
+import logging
+import math
+import operator
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    '>=': operator.ge, '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+    '>': operator.gt, '<': operator.lt,
+}
+_OPERAND = r'([AFP]|[-+]?\d+(?:\.\d+)?)'
+_CONDITION_RE = re.compile(rf'^\s*{_OPERAND}\s*(>=|<=|==|!=|>|<)\s*{_OPERAND}\s*$', re.IGNORECASE)
+_SUFFIXES = {'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+_VALID_DIRECTIONS = ("BUY", "SELL", "HOLD", "NONE")
+
+
+def parse_event_value(value: Any) -> Optional[float]:
+    """把日历中的数值 (如 5.2、"5.2%"、"250K"、"1,234") 转换为浮点数；缺失或无法解析时返回 None。"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if math.isnan(value) else float(value)
+    text = str(value).strip().replace(',', '').replace('%', '')
+    if not text or text.lower() in ('nan', 'none', 'null', '-'):
+        return None
+    scale = 1.0
+    if text[-1].upper() in _SUFFIXES:
+        scale = _SUFFIXES[text[-1].upper()]
+        text = text[:-1]
+    try:
+        return float(text) * scale
+    except ValueError:
+        return None
+
+
+def compile_condition(condition: str) -> Optional[Tuple[str, Callable[[float, float], bool], str]]:
+    """把 "A > F" 这类结果条件解析为 (左操作数, 比较函数, 右操作数)；格式不支持时返回 None。"""
+    match = _CONDITION_RE.match(str(condition))
+    if match is None:
+        return None
+    left, op, right = match.groups()
+    return left.upper(), _OPERATORS[op], right.upper()
+
+
+def evaluate_condition(predicate: Tuple[str, Callable[[float, float], bool], str],
+                       actual: Any, forecast: Any, previous: Any) -> bool:
+    """用 A/F/P 的值计算预解析的条件；所需数值缺失时视为不成立 (结果为 bad)。"""
+    values = {'A': actual, 'F': forecast, 'P': previous}
+    left, op, right = predicate
+    lhs = parse_event_value(values[left]) if left in values else float(left)
+    rhs = parse_event_value(values[right]) if right in values else float(right)
+    if lhs is None or rhs is None:
+        return False
+    return op(lhs, rhs)
+
+
+class _CompiledRule:
+    __slots__ = ('rule_id', 'predicate', 'condition', 'reactions', 'match_all_titles')
+
+    def __init__(self, rule_id, predicate, condition, reactions, match_all_titles):
+        self.rule_id = rule_id
+        self.predicate = predicate
+        self.condition = condition
+        self.reactions = reactions
+        self.match_all_titles = match_all_titles
+
+
+class _CountryBucket:
+    """一个国家代码下的规则及其关键词匹配器。"""
+
+    def __init__(self):
+        self.rules: List[Tuple[int, _CompiledRule]] = []
+        self.keyword_rules: Dict[str, set] = {} # 关键词 -> 规则序号集合
+        self.always: set = set() # 没有关键词的规则序号 (匹配任何标题)
+        self.matcher: Optional[re.Pattern] = None
+        self.matched_rules: Dict[str, set] = {}
+
+    def build(self):
+        keywords = sorted(self.keyword_rules, key=len, reverse=True)
+        if keywords:
+            # 零宽前瞻在每个位置尝试匹配，因此重叠的关键词也都能找到；同一位置报告最长的关键词，
+            # 以它为前缀的较短关键词在同一位置必然也出现，所以把前缀关键词的规则并入
+            self.matcher = re.compile('(?=(' + '|'.join(re.escape(kw) for kw in keywords) + '))')
+        for kw in keywords:
+            rules = set()
+            for other, other_rules in self.keyword_rules.items():
+                if kw.startswith(other):
+                    rules |= other_rules
+            self.matched_rules[kw] = rules
+
+    def match(self, title: str) -> List[Tuple[int, _CompiledRule]]:
+        hits = set(self.always)
+        if self.matcher is not None:
+            for kw in self.matcher.findall(title):
+                hits |= self.matched_rules[kw]
+        return [entry for entry in self.rules if entry[0] in hits]
+
+
+class EventMappingIndex:
+    """
+    event_mapping.yaml 规则的编译索引。
+
+    Args:
+        rules (List[Dict]): event_mappings 规则列表 (按配置顺序，映射结果也按此顺序)。
+        logger: 日志记录器。
+        cache_size (int): 映射结果缓存的最大条目数，超过后清空重建。
+    """
+
+    def __init__(self, rules: List[Dict], logger: Optional[logging.Logger] = None, cache_size: int = 100000):
+        self.logger = logger or logging.getLogger(__name__)
+        self.cache_size = cache_size
+        self._buckets: Dict[str, _CountryBucket] = {}
+        self._cache: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._compile(rules or [])
+
+    def __len__(self) -> int:
+        return self.rule_count
+
+    def _compile(self, rules: List[Dict]):
+        self.rule_count = 0
+        for order, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                continue
+            rule_id = rule.get('id', 'unknown_rule')
+            condition = rule.get('outcome_is_good_condition')
+            reactions = self._compile_reactions(rule_id, rule.get('symbols_and_reactions') or [])
+            predicate = compile_condition(condition) if condition else None
+            if condition and predicate is None:
+                self.logger.warning(f"Event mapping rule '{rule_id}': unsupported outcome_is_good_condition '{condition}'. Expected e.g. 'A > F'.")
+            keywords = {str(kw).lower() for kw in rule.get('title_keywords') or [] if str(kw)}
+            compiled = _CompiledRule(rule_id, predicate, condition, reactions, not keywords)
+            self.rule_count += 1
+            for cc in {str(cc).upper() for cc in rule.get('country_codes') or []}:
+                bucket = self._buckets.setdefault(cc, _CountryBucket())
+                bucket.rules.append((order, compiled))
+                if not keywords:
+                    bucket.always.add(order)
+                for kw in keywords:
+                    bucket.keyword_rules.setdefault(kw, set()).add(order)
+        for bucket in self._buckets.values():
+            bucket.build()
+
+    def _compile_reactions(self, rule_id: str, reactions: List[Dict]) -> List[Tuple[str, str, str]]:
+        """预先规范化每个品种的反应方向: [(symbol, direction_if_good, direction_if_bad)]。"""
+        compiled = []
+        for reaction in reactions:
+            symbol = reaction.get('symbol') if isinstance(reaction, dict) else None
+            if not symbol:
+                self.logger.warning(f"Event mapping rule '{rule_id}': reaction missing symbol. Skipping.")
+                continue
+            compiled.append((symbol, str(reaction.get('direction_if_good', '') or '').upper(),
+                             str(reaction.get('direction_if_bad', '') or '').upper()))
+        return compiled
+
+    @staticmethod
+    def _cache_value(value: Any) -> Any:
+        # NaN 之间不相等，统一为 None 以便缓存命中
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return None
+        return value if isinstance(value, (int, float, str)) else str(value)
+
+    def map_event(self, event_data: Dict[str, Any], log_id: str = '') -> List[Dict[str, Any]]:
+        """
+        返回事件对应的交易机会列表 [{'symbol', 'suggested_direction', 'base_currency_outcome', 'rule_id'}]，
+        与原逐条规则匹配的结果相同 (按规则顺序、每条规则内按品种顺序)。
+        """
+        title = str(event_data.get('title', '')).lower()
+        country = str(event_data.get('country_code', '')).upper()
+        actual, forecast, previous = event_data.get('actual'), event_data.get('forecast'), event_data.get('previous')
+        key = (self._cache_value(event_data.get('id')), title, country,
+               self._cache_value(actual), self._cache_value(forecast), self._cache_value(previous))
+        cached = self._cache.get(key)
+        if cached is not None:
+            return [dict(entry) for entry in cached]
+
+        results: List[Dict[str, Any]] = []
+        bucket = self._buckets.get(country)
+        for _, rule in (bucket.match(title) if bucket is not None else []):
+            if not rule.condition or not rule.reactions:
+                self.logger.warning(f"Rule '{rule.rule_id}' for event '{log_id}' is missing 'outcome_is_good_condition' ('{rule.condition}') or 'symbols_and_reactions'. Skipping rule.")
+                continue
+            if rule.predicate is None:
+                continue
+            is_good = evaluate_condition(rule.predicate, actual, forecast, previous)
+            outcome_label = "good" if is_good else "bad"
+            for symbol, if_good, if_bad in rule.reactions:
+                direction = if_good if is_good else if_bad
+                if direction not in _VALID_DIRECTIONS:
+                    if direction:
+                        self.logger.warning(f"Rule '{rule.rule_id}', Symbol {symbol}: Invalid suggested direction '{direction}'. Must be BUY, SELL, HOLD, or NONE.")
+                    continue
+                if direction in ("HOLD", "NONE"):
+                    continue
+                results.append({'symbol': symbol, 'suggested_direction': direction,
+                                'base_currency_outcome': outcome_label, 'rule_id': rule.rule_id})
+
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key] = results
+        return [dict(entry) for entry in results]
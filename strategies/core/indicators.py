@@ -0,0 +1,344 @@
+"""
+流式增量指标
+
+策略原先在每根K线上对最近 N 根K线的切片重新计算指标 (如 tail(period) 求 VWAP、tail(lookback).max()/min()
+求区间极值)，同一指标在一次回测中被从头计算成千上万次。这里的指标只保存增量状态，每根新K线 O(1) 更新:
+
+- vwap: 滚动窗口内 典型价格×成交量 与 成交量 的累加和 (环形缓冲区减去移出窗口的K线)。
+- atr: Wilder 平滑的真实波幅 (前 period 根取简单平均作为初值)。
+- rsi: Wilder 平滑的平均涨跌幅 (与 TA-Lib RSI 的算法一致)。
+- rolling_high / rolling_low: 单调双端队列维护的滚动最高价 / 最低价 (均摊 O(1))。
+
+IndicatorRegistry 按 (品种, 时间周期, 指标名, 参数) 保存指标实例，由回测引擎或策略调度器在每个周期
+调用 feed() 送入新K线 (只处理比已送入的最新K线更新的行)，策略通过 value() 查询。
+首次请求某个指标时用已送入的K线预热一次，之后只做增量更新。只应送入已收盘的K线。
+
+value() 的 as_of 可以是K线开盘时间 (回测: 当前时间点即已送入的最新K线)，也可以是实盘的墙钟时间
+(调度器只送入到 last_closed_bar_time(当前时间) 的K线，例如 10:00:02 时 M30 最新收盘K线的开盘时间为 09:30)。
+"""
+
+import logging
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+
+from core.data_quality import timeframe_to_seconds
+
+
+class StreamingIndicator:
+    """增量指标基类: update() 送入一根已收盘K线，value 为最新值 (数据不足时为 None)。"""
+
+    def __init__(self, period: int = 14):
+        if int(period) < 1:
+            raise ValueError(f"{type(self).__name__} 的 period 必须为正整数，收到 {period}")
+        self.period = int(period)
+        self.count = 0
+
+    def update(self, high: float, low: float, close: float, volume: float):
+        raise NotImplementedError
+
+    @property
+    def value(self) -> Optional[float]:
+        raise NotImplementedError
+
+
+class RollingVWAP(StreamingIndicator):
+    """最近 period 根K线的成交量加权平均价 (典型价格 = (high + low + close) / 3)。"""
+
+    def __init__(self, period: int = 14):
+        super().__init__(period)
+        self._pv = np.zeros(self.period)
+        self._vol = np.zeros(self.period)
+        self._sum_pv = 0.0
+        self._sum_vol = 0.0
+
+    def update(self, high, low, close, volume):
+        slot = self.count % self.period
+        pv = (high + low + close) / 3.0 * volume
+        self._sum_pv += pv - self._pv[slot]
+        self._sum_vol += volume - self._vol[slot]
+        self._pv[slot] = pv
+        self._vol[slot] = volume
+        self.count += 1
+        if slot == self.period - 1:
+            # 每转一圈重新求和一次，避免浮点误差累积
+            self._sum_pv = float(self._pv.sum())
+            self._sum_vol = float(self._vol.sum())
+
+    @property
+    def value(self):
+        if self.count < self.period or self._sum_vol <= 0:
+            return None
+        return self._sum_pv / self._sum_vol
+
+
+class WilderATR(StreamingIndicator):
+    """Wilder 平滑的平均真实波幅。"""
+
+    def __init__(self, period: int = 14):
+        super().__init__(period)
+        self._prev_close: Optional[float] = None
+        self._atr: Optional[float] = None
+        self._seed_sum = 0.0
+
+    def update(self, high, low, close, volume=0.0):
+        if self._prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self.count += 1
+        if self._atr is None:
+            self._seed_sum += tr
+            if self.count == self.period:
+                self._atr = self._seed_sum / self.period
+        else:
+            self._atr += (tr - self._atr) / self.period
+
+    @property
+    def value(self):
+        return self._atr
+
+
+class WilderRSI(StreamingIndicator):
+    """Wilder 平滑的相对强弱指数 (需要 period + 1 根K线)。"""
+
+    def __init__(self, period: int = 14):
+        super().__init__(period)
+        self._prev_close: Optional[float] = None
+        self._avg_gain: Optional[float] = None
+        self._avg_loss: Optional[float] = None
+        self._seed_gain = 0.0
+        self._seed_loss = 0.0
+
+    def update(self, high, low, close, volume=0.0):
+        prev, self._prev_close = self._prev_close, close
+        if prev is None:
+            return
+        self.count += 1
+        change = close - prev
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self._avg_gain is None:
+            self._seed_gain += gain
+            self._seed_loss += loss
+            if self.count == self.period:
+                self._avg_gain = self._seed_gain / self.period
+                self._avg_loss = self._seed_loss / self.period
+        else:
+            self._avg_gain += (gain - self._avg_gain) / self.period
+            self._avg_loss += (loss - self._avg_loss) / self.period
+
+    @property
+    def value(self):
+        if self._avg_gain is None:
+            return None
+        if self._avg_loss == 0:
+            return 100.0 if self._avg_gain > 0 else 50.0
+        return 100.0 - 100.0 / (1.0 + self._avg_gain / self._avg_loss)
+
+
+class _RollingExtreme(StreamingIndicator):
+    """单调双端队列维护最近 period 根K线的极值 (队首为当前极值)。"""
+
+    _field = 'high'
+
+    def __init__(self, period: int = 20):
+        super().__init__(period)
+        self._deque: deque = deque() # (序号, 值)
+
+    def _dominates(self, new: float, old: float) -> bool:
+        raise NotImplementedError
+
+    def update(self, high, low, close, volume=0.0):
+        x = high if self._field == 'high' else low
+        dq = self._deque
+        while dq and self._dominates(x, dq[-1][1]):
+            dq.pop()
+        dq.append((self.count, x))
+        self.count += 1
+        if dq[0][0] <= self.count - 1 - self.period:
+            dq.popleft()
+
+    @property
+    def value(self):
+        if self.count < self.period:
+            return None
+        return self._deque[0][1]
+
+
+class RollingHigh(_RollingExtreme):
+    """最近 period 根K线的最高价。"""
+
+    _field = 'high'
+
+    def _dominates(self, new, old):
+        return new >= old
+
+
+class RollingLow(_RollingExtreme):
+    """最近 period 根K线的最低价。"""
+
+    _field = 'low'
+
+    def _dominates(self, new, old):
+        return new <= old
+
+
+INDICATORS: Dict[str, Type[StreamingIndicator]] = {
+    'vwap': RollingVWAP,
+    'atr': WilderATR,
+    'rsi': WilderRSI,
+    'rolling_high': RollingHigh,
+    'rolling_low': RollingLow,
+}
+
+
+# MT5 的周线从周日 00:00 开始 (纪元 1970-01-01 是周四)
+_WEEK_ORIGIN = pd.Timestamp('1970-01-04', tz='UTC')
+
+
+def _utc(value: Any) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts
+
+
+def last_closed_bar_time(now: Any, timeframe: str) -> Optional[pd.Timestamp]:
+    """
+    now 时刻最新一根已收盘K线的开盘时间 (UTC): 将 now 向下取整到时间周期，再减去一根K线。
+
+    Returns:
+        Optional[pd.Timestamp]: 开盘时间；未知时间周期时为 None。
+    """
+    tf_seconds = timeframe_to_seconds(timeframe)
+    if not tf_seconds:
+        return None
+    now_ts = _utc(now)
+    bar = pd.Timedelta(seconds=tf_seconds)
+    if tf_seconds == 604800:
+        return _WEEK_ORIGIN + ((now_ts - _WEEK_ORIGIN) // bar) * bar - bar
+    return now_ts.floor(bar) - bar
+
+
+class IndicatorRegistry:
+    """
+    按 (品种, 时间周期, 指标名, 参数) 共享增量指标实例。
+
+    Args:
+        logger: 日志记录器，默认使用模块日志。
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        # (SYMBOL, TF) -> {'frame': 最近一次送入的 DataFrame, 'last_ns': 已送入的最新K线时间, 'indicators': {key: 指标}}
+        self._series: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    @staticmethod
+    def _index_ns(index: pd.DatetimeIndex) -> np.ndarray:
+        if index.tz is None:
+            index = index.tz_localize('UTC')
+        return index.as_unit('ns').asi8
+
+    @staticmethod
+    def _columns(frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        volume_col = 'volume' if 'volume' in frame.columns else 'tick_volume'
+        volume = frame[volume_col].to_numpy(dtype=float) if volume_col in frame.columns else np.zeros(len(frame))
+        return (frame['high'].to_numpy(dtype=float), frame['low'].to_numpy(dtype=float),
+                frame['close'].to_numpy(dtype=float), volume)
+
+    @staticmethod
+    def _feed_rows(indicators, frame: pd.DataFrame):
+        if frame.empty or not indicators:
+            return
+        highs, lows, closes, volumes = IndicatorRegistry._columns(frame)
+        for h, l, c, v in zip(highs.tolist(), lows.tolist(), closes.tolist(), volumes.tolist()):
+            if math.isnan(c):
+                continue
+            for indicator in indicators:
+                indicator.update(h, l, c, v)
+
+    def feed(self, symbol: str, timeframe: str, bars: pd.DataFrame, until: Any = None) -> int:
+        """
+        送入 (品种, 时间周期) 的K线，只处理比已送入的最新K线更新的行。
+
+        Args:
+            bars (pd.DataFrame): 按时间升序、包含 high/low/close (及 volume 或 tick_volume) 的K线。
+            until (Any): 只送入开盘时间不晚于 until 的K线 (用于排除仍在形成的K线)，None 表示全部。
+
+        Returns:
+            int: 新送入的K线数。
+        """
+        if bars is None or bars.empty:
+            return 0
+        key = (symbol.upper(), timeframe.upper())
+        times = self._index_ns(bars.index)
+        end = len(times)
+        if until is not None:
+            end = int(np.searchsorted(times, _utc(until).value, side='right'))
+        with self._lock:
+            series = self._series.setdefault(key, {'frame': None, 'last_ns': None, 'indicators': {}})
+            start = 0 if series['last_ns'] is None else int(np.searchsorted(times[:end], series['last_ns'], side='right'))
+            if end <= start:
+                return 0
+            if series['last_ns'] is not None and start == 0 and times[0] > series['last_ns']:
+                self.logger.debug(f"[Indicators] {symbol} {timeframe} 送入的K线与已送入的K线之间可能存在缺口。")
+            self._feed_rows(series['indicators'].values(), bars.iloc[start:end])
+            series['frame'] = bars.iloc[:end]
+            series['last_ns'] = int(times[end - 1])
+            return end - start
+
+    def get(self, symbol: str, timeframe: str, name: str, **params) -> StreamingIndicator:
+        """返回共享的指标实例；首次请求时创建并用已送入的K线预热。"""
+        cls = INDICATORS.get(name)
+        if cls is None:
+            raise ValueError(f"未知的指标 '{name}'，可用: {sorted(INDICATORS)}")
+        series_key = (symbol.upper(), timeframe.upper())
+        indicator_key = (name, tuple(sorted(params.items())))
+        with self._lock:
+            series = self._series.setdefault(series_key, {'frame': None, 'last_ns': None, 'indicators': {}})
+            indicator = series['indicators'].get(indicator_key)
+            if indicator is None:
+                indicator = cls(**params)
+                if series['frame'] is not None:
+                    self._feed_rows([indicator], series['frame'])
+                series['indicators'][indicator_key] = indicator
+            return indicator
+
+    def value(self, symbol: str, timeframe: str, name: str, as_of: Any = None, **params) -> Optional[float]:
+        """
+        查询指标的最新值。
+
+        Args:
+            as_of (Any): 期望的最新K线时间 (K线开盘时间，或实盘当前时间，此时期望的是当时最新已收盘K线)；
+                已送入的最新K线与之不符时返回 None (调用方应回退到自行计算)。
+
+        Returns:
+            Optional[float]: 指标值；数据不足或时间不匹配时为 None。
+        """
+        indicator = self.get(symbol, timeframe, name, **params)
+        if as_of is not None:
+            last_ns = self.last_time_ns(symbol, timeframe)
+            if last_ns is None:
+                return None
+            as_of_ts = _utc(as_of)
+            if last_ns != as_of_ts.value:
+                closed = last_closed_bar_time(as_of_ts, timeframe)
+                if closed is None or last_ns != closed.value:
+                    return None
+        return indicator.value
+
+    def last_time_ns(self, symbol: str, timeframe: str) -> Optional[int]:
+        """已送入的最新K线时间 (UTC 纳秒)，尚未送入时为 None。"""
+        series = self._series.get((symbol.upper(), timeframe.upper()))
+        return None if series is None else series['last_ns']
+
+    def reset(self, symbol: Optional[str] = None, timeframe: Optional[str] = None):
+        """丢弃指标状态 (不指定参数时丢弃全部)，例如回测重新开始或数据重新加载时。"""
+        with self._lock:
+            for key in list(self._series):
+                if (symbol is None or key[0] == symbol.upper()) and (timeframe is None or key[1] == timeframe.upper()):
+                    del self._series[key]
@@ -0,0 +1,290 @@
+"""
+策略调度器的增量市场状态
+
+StrategyOrchestrator 原先在每个周期对每个 (品种, 时间周期) 调用 get_combined_prices，
+重新读取并合并完整的历史数据，周期耗时随历史长度增长。MarketStateStore 在启动时对每个
+(品种, 时间周期) 完整加载一次，之后每个周期只从实时数据 (共享内存或实时 CSV，长度有限)
+中取出比已知最新K线更新的K线追加到内存中，并覆盖仍在形成的最后一根K线。
+
+数据按列保存在预分配的 NumPy 缓冲区中 (容量倍增，扩容时分配新缓冲区)，
+snapshot() 返回与原先相同的 Dict[时间周期, Dict[品种, DataFrame]] 结构，
+其中的 DataFrame 直接引用这些缓冲区 (调用方应视为只读)。追加只写入视图范围之外的槽位；
+仍在形成的最后一根K线变化而当前缓冲区已经发布过视图时，切换到同样大小的备用缓冲区
+(双缓冲，内存占用加倍)，只补写自上次切换以来变化的行 (新K线和之前的末行)，已收盘的K线不再复制。
+因此上一次 snapshot() 返回的视图在下一次更新期间保持不变 (并行执行器中仍在读取的策略不受影响)；
+更早的视图只有最后一根 (形成中的) K线可能被更新为较新的值。
+
+数据提供者实现 realtime_version(symbol, timeframe) 时 (共享内存序列号或实时文件修改时间)，
+版本未变化的 update() 不读取实时数据，直接返回。所有方法都持有同一把锁，调度器和
+MarketDataProvider.get_window (实盘中共用同一个实例) 可以在不同线程中调用。
+
+实时数据 (共享内存或实时 CSV) 的列通常少于历史文件 (如历史文件有 volume)。增量更新只比较
+两者共有的列，实时数据缺少的列在新K线中填充缺失值；只有缺少策略必需的 OHLC 列时才重新完整加载。
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_MIN_CAPACITY = 1024
+REQUIRED_COLUMNS = ('open', 'high', 'low', 'close')
+
+
+class MarketStateStore:
+    """
+    按 (品种, 时间周期) 维护增量更新的K线数据。
+
+    Args:
+        market_provider: MarketDataProvider 实例 (需要 get_combined_prices 和 load_realtime_data，
+            可选 realtime_version)。
+        max_bars (int): 每个 (品种, 时间周期) 最多保留的K线数，0 表示不限制。
+        logger: 日志记录器，默认使用模块日志。
+    """
+
+    def __init__(self, market_provider: Any, max_bars: int = 0, logger: Optional[logging.Logger] = None):
+        self.market_provider = market_provider
+        self.max_bars = max(int(max_bars or 0), 0)
+        self.logger = logger or logging.getLogger(__name__)
+        self._states: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    # --- 缓冲区管理 ---
+    @staticmethod
+    def _to_int_times(index: pd.DatetimeIndex, unit: str) -> np.ndarray:
+        """将 DatetimeIndex 转换为指定精度 (与初始加载的数据一致) 的 UTC 整数时间戳数组。"""
+        if index.tz is None:
+            index = index.tz_localize('UTC')
+        return index.as_unit(unit).asi8
+
+    def _allocate(self, state: Dict[str, Any], n_rows: int):
+        """
+        分配能容纳 n_rows 根K线的新缓冲区并复制现有 (保留窗口内的) 数据。
+        总是分配新数组，已经返回给策略的视图不会被改写；备用缓冲区的位置随之失效，一并丢弃。
+        """
+        start, length = state['start'], state['length']
+        keep = length - start
+        capacity = max(_MIN_CAPACITY, 2 * max(n_rows, keep))
+        if self.max_bars:
+            capacity = max(min(capacity, 2 * self.max_bars), n_rows)
+        times = np.empty(capacity, dtype=np.int64)
+        times[:keep] = state['times'][start:length]
+        data = {}
+        for col, arr in state['data'].items():
+            new_arr = np.empty(capacity, dtype=arr.dtype)
+            new_arr[:keep] = arr[start:length]
+            data[col] = new_arr
+        state.update(times=times, data=data, start=0, length=keep, published=False, spare=None)
+
+    def _swap_buffers(self, state: Dict[str, Any]):
+        """
+        切换到备用缓冲区 (当前缓冲区已经发布过视图而形成中的K线需要改写时)。
+        备用缓冲区只补写自上次切换以来变化的行；首次切换 (或扩容后) 才完整复制一次。
+        """
+        start, length = state['start'], state['length']
+        spare = state['spare']
+        if spare is None:
+            capacity = len(state['times'])
+            spare = {
+                'times': np.empty(capacity, dtype=np.int64),
+                'data': {col: np.empty(capacity, dtype=arr.dtype) for col, arr in state['data'].items()},
+                'synced': start,
+            }
+        lo = max(spare['synced'], start)
+        spare['times'][lo:length] = state['times'][lo:length]
+        for col, arr in state['data'].items():
+            spare['data'][col][lo:length] = arr[lo:length]
+        # 切换后只有末行会在新的当前缓冲区中改写，旧缓冲区在此之前的行仍然有效
+        state['spare'] = {'times': state['times'], 'data': state['data'], 'synced': length - 1}
+        state.update(times=spare['times'], data=spare['data'], published=False)
+
+    @staticmethod
+    def _missing_value(dtype: np.dtype) -> Any:
+        """实时数据缺少的列在新K线中的填充值。"""
+        if dtype.kind in 'fc':
+            return np.nan
+        if dtype.kind == 'M':
+            return np.datetime64('NaT')
+        return 0 if dtype.kind in 'iub' else None
+
+    @staticmethod
+    def _differs(old: Any, new: Any) -> bool:
+        """两个值是否不同 (两者都是缺失值时视为相同)。"""
+        if old == new:
+            return False
+        return not (pd.isna(old) and pd.isna(new))
+
+    def _append(self, state: Dict[str, Any], times: np.ndarray, frame: pd.DataFrame):
+        """在缓冲区末尾追加K线 (frame 的行与 times 对应，frame 缺少的列填充缺失值)。"""
+        n_new = len(times)
+        if state['length'] + n_new > len(state['times']):
+            self._allocate(state, state['length'] - state['start'] + n_new)
+        pos = state['length']
+        state['times'][pos:pos + n_new] = times
+        for col, arr in state['data'].items():
+            if col in frame.columns:
+                arr[pos:pos + n_new] = frame[col].to_numpy()
+            else:
+                arr[pos:pos + n_new] = self._missing_value(arr.dtype)
+        state['length'] = pos + n_new
+        if self.max_bars and state['length'] - state['start'] > self.max_bars:
+            state['start'] = state['length'] - self.max_bars
+
+    def _realtime_version(self, symbol: str, timeframe: str) -> Any:
+        version_of = getattr(self.market_provider, 'realtime_version', None)
+        return version_of(symbol, timeframe) if version_of is not None else None
+
+    # --- 加载与更新 ---
+    def seed(self, symbol: str, timeframe: str) -> bool:
+        """
+        使用 get_combined_prices 完整加载 (或重新加载) 一个 (品种, 时间周期)。
+
+        Returns:
+            bool: 是否加载到数据。
+        """
+        with self._lock:
+            return self._seed(symbol, timeframe)
+
+    def _seed(self, symbol: str, timeframe: str) -> bool:
+        key = (symbol, timeframe)
+        version = self._realtime_version(symbol, timeframe) # 读取前取版本: 读取期间的更新在下次 update 中处理
+        df = self.market_provider.get_combined_prices(symbol, timeframe)
+        if df is None or df.empty:
+            self._states.pop(key, None)
+            return False
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        if self.max_bars and len(df) > self.max_bars:
+            df = df.iloc[-self.max_bars:]
+
+        state = {
+            'columns': list(df.columns),
+            'unit': df.index.unit,
+            'times': np.empty(0, dtype=np.int64),
+            'data': {col: np.empty(0, dtype=df[col].to_numpy().dtype) for col in df.columns},
+            'start': 0,
+            'length': 0,
+            'view': None,
+            'published': False, # 当前缓冲区是否已经通过 view() 交给调用方
+            'spare': None, # 备用缓冲区 (times, data, synced: 此前的行与当前缓冲区一致)
+            'rt_version': version, # 最近一次处理的实时数据版本
+        }
+        self._allocate(state, len(df))
+        self._append(state, self._to_int_times(df.index, state['unit']), df)
+        self._states[key] = state
+        self.logger.debug(f"[MarketState] 已加载 {symbol} {timeframe} 完整数据 {len(df)} 条。")
+        return True
+
+    def update(self, symbol: str, timeframe: str) -> int:
+        """
+        用实时数据增量更新一个 (品种, 时间周期)；尚未加载时先完整加载。
+
+        实时数据版本未变化时直接返回；实时数据的第一根K线晚于已知最新K线 (中间可能缺失K线，如更新器重启)
+        或缺少 OHLC 列时重新完整加载；只比较两者共有的列。
+
+        Returns:
+            int: 新追加的K线数。
+        """
+        with self._lock:
+            return self._update(symbol, timeframe)
+
+    def _update(self, symbol: str, timeframe: str) -> int:
+        key = (symbol, timeframe)
+        state = self._states.get(key)
+        if state is None:
+            self._seed(symbol, timeframe)
+            return 0
+
+        version = self._realtime_version(symbol, timeframe)
+        if version is not None and version == state['rt_version']:
+            return 0
+        state['rt_version'] = version
+
+        rt_df = self.market_provider.load_realtime_data(symbol, timeframe)
+        if rt_df is None or rt_df.empty:
+            return 0
+        if not rt_df.index.is_monotonic_increasing:
+            rt_df = rt_df.sort_index()
+        missing_required = [col for col in REQUIRED_COLUMNS if col in state['columns'] and col not in rt_df.columns]
+        if missing_required:
+            self.logger.warning(f"[MarketState] {symbol} {timeframe} 实时数据缺少必需列 {missing_required}，重新完整加载。")
+            self._seed(symbol, timeframe)
+            return 0
+        shared_columns = [col for col in state['columns'] if col in rt_df.columns]
+
+        rt_times = self._to_int_times(rt_df.index, state['unit'])
+        last_time = state['times'][state['length'] - 1]
+        if rt_times[0] > last_time:
+            self.logger.info(f"[MarketState] {symbol} {timeframe} 实时数据与内存数据之间可能存在缺口，重新完整加载。")
+            self._seed(symbol, timeframe)
+            return 0
+
+        changed = False
+        pos = int(np.searchsorted(rt_times, last_time))
+        if pos < len(rt_times) and rt_times[pos] == last_time:
+            # 覆盖仍在形成的最后一根K线 (仅在数值变化时)；已发布的缓冲区先切换到备用缓冲区，不改写策略持有的视图
+            tail_values = {col: rt_df[col].iat[pos] for col in shared_columns}
+            tail = state['length'] - 1
+            if any(self._differs(state['data'][col][tail], value) for col, value in tail_values.items()):
+                if state['published']:
+                    self._swap_buffers(state)
+                for col, value in tail_values.items():
+                    state['data'][col][tail] = value
+                changed = True
+            pos += 1
+
+        n_new = len(rt_times) - pos
+        if n_new > 0:
+            self._append(state, rt_times[pos:], rt_df.iloc[pos:])
+            changed = True
+        if changed:
+            state['view'] = None
+        return max(n_new, 0)
+
+    # --- 视图 ---
+    def view(self, symbol: str, timeframe: str) -> Optional[pd.DataFrame]:
+        """返回 (品种, 时间周期) 当前数据的 DataFrame 视图 (UTC 时间索引)，未加载时返回 None。"""
+        with self._lock:
+            return self._view(symbol, timeframe)
+
+    def _view(self, symbol: str, timeframe: str) -> Optional[pd.DataFrame]:
+        state = self._states.get((symbol, timeframe))
+        if state is None:
+            return None
+        if state['view'] is None:
+            start, length = state['start'], state['length']
+            index = pd.DatetimeIndex(state['times'][start:length].view(f"M8[{state['unit']}]"), copy=False, name='time').tz_localize('UTC')
+            state['view'] = pd.DataFrame(
+                {col: state['data'][col][start:length] for col in state['columns']},
+                index=index,
+                copy=False,
+            )
+            state['published'] = True
+        return state['view']
+
+    def snapshot(self, symbols: List[str], timeframes: List[str]) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """
+        更新所有 (品种, 时间周期) 并返回 {时间周期: {品种: DataFrame}}，结构与 get_combined_prices 组装的结果相同。
+        单个组合更新失败时沿用其上一次的数据。
+        """
+        market_data: Dict[str, Dict[str, pd.DataFrame]] = {}
+        for tf in timeframes:
+            market_data[tf] = {}
+            for sym in symbols:
+                try:
+                    self.update(sym, tf)
+                except Exception as e:
+                    self.logger.error(f"[MarketState] 增量更新 {sym} {tf} 时出错: {e}", exc_info=True)
+                df = self.view(sym, tf)
+                if df is not None and not df.empty:
+                    market_data[tf][sym] = df
+                else:
+                    self.logger.warning(f"未能获取 {sym} ({tf}) 的价格数据。")
+        return market_data
+
+    def clear(self):
+        """丢弃所有内存数据 (下次更新时重新完整加载)。"""
+        with self._lock:
+            self._states.clear()
@@ -0,0 +1,214 @@
+"""
+紧凑的空间、信号和失效状态记录
+
+活跃空间、空间失效状态、S2 待确认检查和聚合器中的信号原先都是以字符串为键的字典，时间以 ISO 字符串保存，
+一次回测会创建成千上万个。这里的记录类型用 __slots__ 保存固定字段 (没有每个实例的 __dict__)，
+时间字段在内部保存为 int64 UTC 纳秒 (attribute 访问直接得到整数，SpaceBook 等向量化代码无需解析)。
+
+为便于迁移，记录实现 MutableMapping 接口: record['valid_until']、get、setdefault、in、update、
+dict(record) 等与原字典用法相同，时间字段经字典接口读出时为 UTC pd.Timestamp (按纳秒值缓存，
+重复读取同一时间不再构造新对象)。热路径应直接使用属性 (record.creation_time 为纳秒整数)。
+未声明的键保存在按需创建的附加字典中，子类或旧代码写入的其他键仍然可用。
+时间字段写入无法解析为时间的值时 (原字典接受任意值)，原值同样保存在附加字典中、经字典接口原样读出，
+此时该字段没有属性值 (属性访问与 SpaceBook 等向量化代码视其为未设置)。
+"""
+
+from collections.abc import Mapping, MutableMapping
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def to_ns(value: Any) -> Optional[int]:
+    """时间 (Timestamp、datetime、ISO 字符串或纳秒整数，naive 视为 UTC) 转换为 UTC 纳秒；None/NaT 返回 None。"""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts is pd.NaT:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return ts.value
+
+
+@lru_cache(maxsize=65536)
+def _timestamp(value: int) -> pd.Timestamp:
+    return pd.Timestamp(value, tz='UTC')
+
+
+def from_ns(value: Optional[int]) -> Optional[pd.Timestamp]:
+    """UTC 纳秒转换为 UTC pd.Timestamp (Timestamp 不可变，按纳秒值缓存)。"""
+    return None if value is None else _timestamp(value)
+
+
+_MISSING = object()
+
+
+class Record(MutableMapping):
+    """
+    __slots__ 记录的基类。子类声明 FIELDS (同时作为 __slots__)、TIME_FIELDS (内部保存纳秒整数的字段)
+    和 NESTED (字段 -> 记录类型，写入字典时自动转换)。
+
+    未赋值的字段视为不存在 (与字典缺少该键相同)，赋值为 None 的字段存在且值为 None。
+    """
+
+    __slots__ = ('_extra',)
+    FIELDS: Tuple[str, ...] = ()
+    TIME_FIELDS: FrozenSet[str] = frozenset()
+    NESTED: Dict[str, type] = {}
+    _FIELD_SET: FrozenSet[str] = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+    def __init__(self, data: Optional[Mapping] = None, **fields: Any):
+        self._extra: Optional[Dict[str, Any]] = None
+        if data is not None:
+            for key, value in data.items():
+                self[key] = value
+        for key, value in fields.items():
+            self[key] = value
+
+    # --- 字典接口 ---
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return _timestamp(value) if key in self.TIME_FIELDS and value is not None else value
+        extra = self._extra
+        if extra is not None and key in extra:
+            return extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self._FIELD_SET:
+            if key in self.TIME_FIELDS:
+                try:
+                    value = to_ns(value)
+                except (TypeError, ValueError):
+                    # 无法解析的时间按原值保存在附加字典中 (见模块说明)
+                    if hasattr(self, key):
+                        delattr(self, key)
+                    self._set_extra(key, value)
+                    return
+            elif key in self.NESTED and isinstance(value, Mapping) and not isinstance(value, self.NESTED[key]):
+                value = self.NESTED[key](value)
+            setattr(self, key, value)
+            if self._extra and key in self._extra:
+                del self._extra[key]
+        else:
+            self._set_extra(key, value)
+
+    def _set_extra(self, key: str, value: Any):
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in self._FIELD_SET and hasattr(self, key):
+            delattr(self, key)
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self.FIELDS:
+            if hasattr(self, name):
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._FIELD_SET and hasattr(self, key):
+            return True
+        return self._extra is not None and key in self._extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return _timestamp(value) if key in self.TIME_FIELDS and value is not None else value
+        extra = self._extra
+        return default if extra is None else extra.get(key, default)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    # --- 复制与检查点 ---
+    def copy(self) -> 'Record':
+        """浅复制 (与 dict.copy 相同，嵌套记录和附加字典的值共享)。"""
+        clone = type(self).__new__(type(self))
+        for name in self.FIELDS:
+            if hasattr(self, name):
+                setattr(clone, name, getattr(self, name))
+        clone._extra = dict(self._extra) if self._extra else None
+        return clone
+
+    def to_dict(self, raw_times: bool = False) -> Dict[str, Any]:
+        """
+        转换为普通字典 (嵌套记录也转换)。raw_times=True 时时间字段保留纳秒整数，
+        适合检查点保存；from_dict 可从两种形式恢复。
+        """
+        result = {}
+        for key in self:
+            if raw_times and key in self.TIME_FIELDS and hasattr(self, key):
+                value = getattr(self, key)
+            else:
+                value = self[key]
+            result[key] = value.to_dict(raw_times) if isinstance(value, Record) else value
+        return result
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> 'Record':
+        return cls(data)
+
+
+class InvalidationState(Record):
+    """空间的强突破失效状态 (SpaceBook 写回的 invalidation_status)。"""
+
+    FIELDS = ('strong_breakout_pending', 'strong_breakout_direction', 'bars_since_strong_breakout')
+    __slots__ = FIELDS
+
+
+class SpaceRecord(Record):
+    """一个事件空间: 边界、有效期、来源事件以及失效判断状态。"""
+
+    FIELDS = (
+        'id', 'symbol', 'event_id', 'event_title', 'rule_id', 'suggested_direction',
+        'space_high', 'space_low', 'space_height_pips', 'initial_direction',
+        'event_time', 'initial_pulse_end_time', 'valid_until', 'creation_time',
+        'status', 'is_valid', 'invalidation_reason', 'invalidation_time', 'invalidation_status',
+        'sb_pending_confirmation_direction', 'sb_pending_confirmation_level',
+        'osc_boundary_crossings',
+        'brc_phase', 'brc_state', 'brc_direction', 'brc_confirmation_level', 'brc_initial_price',
+        'brc_retrace_achieved_price', 'brc_retrace_target_high', 'brc_retrace_target_low',
+    )
+    __slots__ = FIELDS
+    TIME_FIELDS = frozenset({'event_time', 'initial_pulse_end_time', 'valid_until', 'creation_time', 'invalidation_time'})
+    NESTED = {'invalidation_status': InvalidationState}
+
+
+class SignalRecord(Record):
+    """聚合器中的一个策略信号。"""
+
+    FIELDS = ('timestamp', 'strategy', 'weight', 'metadata')
+    __slots__ = FIELDS
+    TIME_FIELDS = frozenset({'timestamp'})
+
+
+class PendingS2Check(Record):
+    """SpaceTimeResonanceStrategy 中等待价格回到空间内的 S2 检查。"""
+
+    FIELDS = ('recorded_time_s2', 'key_time_point_s2', 'breakout_direction_s2',
+              'upper_bound_s2', 'lower_bound_s2', 'event_name_s2')
+    __slots__ = FIELDS
+    TIME_FIELDS = frozenset({'recorded_time_s2', 'key_time_point_s2'})
@@ -0,0 +1,306 @@
+"""
+按列存储的活跃空间与向量化失效判断
+
+EventDrivenSpaceStrategy 原先在每根K线上逐个遍历品种的活跃空间，对每个空间依次调用强突破、震荡、
+突破-回踩-确认三个检查 (每个检查都是多次字典读写)，最后再用列表推导重建 active_spaces[symbol]。
+事件密集的日子里几十个空间重叠时，每根K线的开销随空间数线性增长。
+
+SpaceBook 为一个品种保存所有活跃空间的数值状态 (上下边界、高度、有效期、形成时间、强突破/震荡/
+突破回踩的状态和计数) 为 NumPy 数组，evaluate() 对一根新K线一次性计算所有失效规则；
+只有状态发生变化的空间才把状态写回对应的字典 (字典仍是策略和子类读取空间信息的接口)。
+空间通常是 SpaceRecord (见 strategies.core.records)，时间字段直接以纳秒整数读入，无需解析。
+
+spaces 列表与 strategy.active_spaces[symbol] 是同一个列表对象: 其他代码直接追加到该列表的新空间
+会在下次 evaluate() 时被读入数组；compact() 在有空间失效时原地删除失效的字典并返回它们 (策略据此清理按空间保存的其他状态)。
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from strategies.core.records import InvalidationState, SpaceRecord
+
+_NO_TIME = np.iinfo(np.int64).max
+
+# 突破-回踩-确认 (BRC) 阶段编码，与字典中的 brc_phase 值对应
+BRC_PHASES = (None, 'waiting_for_retrace', 'waiting_for_confirmation')
+
+_FLOAT_COLUMNS = ('high', 'low', 'brc_initial', 'brc_retrace')
+_INT_COLUMNS = ('valid_until', 'formed_at')
+_SMALL_INT_COLUMNS = ('sb_dir', 'sb_bars', 'osc_crossings', 'brc_phase', 'brc_dir')
+
+
+def _to_ns(value: Any, default: int) -> int:
+    """时间 (Timestamp、datetime 或 ISO 字符串，naive 视为 UTC) 转换为 UTC 纳秒；无法解析时返回 default。"""
+    if value is None:
+        return default
+    try:
+        ts = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return default
+    if ts is pd.NaT:
+        return default
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return ts.value
+
+
+class SpaceBook:
+    """
+    一个品种的活跃空间的列式视图。
+
+    Args:
+        spaces (List[Dict[str, Any]]): 空间字典列表 (原地维护，通常是 strategy.active_spaces[symbol])。
+    """
+
+    def __init__(self, spaces: List[Dict[str, Any]]):
+        self.spaces = spaces
+        self._n = 0
+        self._retrace_buffer_ratio = 0.0
+        self._cols: Dict[str, np.ndarray] = {}
+        for name in _FLOAT_COLUMNS:
+            self._cols[name] = np.empty(0, dtype=np.float64)
+        for name in _INT_COLUMNS:
+            self._cols[name] = np.empty(0, dtype=np.int64)
+        for name in _SMALL_INT_COLUMNS:
+            self._cols[name] = np.empty(0, dtype=np.int32)
+        self._cols['active'] = np.empty(0, dtype=bool)
+        self._ingest()
+
+    def __len__(self) -> int:
+        return self._n
+
+    # --- 读入 ---
+    def _grow(self, capacity: int):
+        for name, arr in self._cols.items():
+            new_arr = np.empty(capacity, dtype=arr.dtype)
+            new_arr[:self._n] = arr[:self._n]
+            self._cols[name] = new_arr
+
+    def _ingest(self):
+        """把 spaces 中尚未读入数组的字典 (列表末尾新追加的) 读入数组。"""
+        n_total = len(self.spaces)
+        if n_total <= self._n:
+            return
+        if n_total > len(self._cols['high']):
+            self._grow(max(16, 2 * n_total))
+        c = self._cols
+        for i in range(self._n, n_total):
+            space = self.spaces[i]
+            status = space.get('invalidation_status') or {}
+            c['high'][i] = space.get('space_high', space.get('high', np.nan))
+            c['low'][i] = space.get('space_low', space.get('low', np.nan))
+            if isinstance(space, SpaceRecord):
+                # 记录的时间字段已是纳秒整数
+                valid_until = getattr(space, 'valid_until', None)
+                formed_at = getattr(space, 'initial_pulse_end_time', None)
+                c['valid_until'][i] = _NO_TIME if valid_until is None else valid_until
+                c['formed_at'][i] = -1 if formed_at is None else formed_at
+            else:
+                c['valid_until'][i] = _to_ns(space.get('valid_until'), _NO_TIME)
+                formed_at = space.get('initial_pulse_end_time')
+                c['formed_at'][i] = _to_ns(formed_at, -1) if isinstance(formed_at, pd.Timestamp) else -1
+            c['active'][i] = space.get('status', 'active') == 'active'
+            c['sb_dir'][i] = status.get('strong_breakout_direction', 0) if status.get('strong_breakout_pending') else 0
+            c['sb_bars'][i] = status.get('bars_since_strong_breakout', 0)
+            c['osc_crossings'][i] = space.get('osc_boundary_crossings', 0) or 0
+            phase = space.get('brc_phase')
+            c['brc_phase'][i] = BRC_PHASES.index(phase) if phase in BRC_PHASES else 0
+            c['brc_dir'][i] = space.get('brc_direction', 0) or 0
+            initial = space.get('brc_initial_price')
+            c['brc_initial'][i] = np.nan if initial is None else initial
+            retrace = space.get('brc_retrace_achieved_price')
+            c['brc_retrace'][i] = np.nan if retrace is None else retrace
+        self._n = n_total
+
+    # --- 判断 ---
+    def evaluate(self, bar_time: pd.Timestamp, high: float, low: float, close: float,
+                 current_time: pd.Timestamp, strong_breakout_n_bars: int, oscillation_m_times: int,
+                 retrace_buffer_ratio: float, check_rules: bool = True) -> Dict[str, Any]:
+        """
+        用一根新K线一次性判断所有空间的失效条件 (与原逐个空间的检查逻辑相同):
+
+        0. 形成时间缺失 -> error_missing_creation_time；K线不晚于形成时间的空间本K线不参与。
+        1. 有效期已过 -> duration_expired。
+        2. 强突破: 收盘价超出边界两倍空间高度后开始计数，连续 N 根未回到空间内 -> strong_breakout。
+        3. 震荡: 边界穿越次数达到 M -> oscillation。
+        4. 突破-回踩-确认: 突破 (超出缓冲) -> 回踩缓冲区 -> 收盘超过首次突破价 -> breakout_retrace_confirmation；
+           期间反向越过对侧边界则重置。
+
+        Args:
+            check_rules (bool): False 时只判断 0 和 1 (无法取得点值时，原逻辑不做其余检查)。
+
+        Returns:
+            Dict[str, Any]: {'eligible': 本K线参与判断且仍有效的空间下标数组,
+                             'invalidated': [(下标, 原因), ...]}
+        """
+        self._ingest()
+        self._retrace_buffer_ratio = retrace_buffer_ratio
+        n = self._n
+        result: Dict[str, Any] = {'eligible': np.empty(0, dtype=np.intp), 'invalidated': []}
+        if n == 0:
+            return result
+        c = {name: arr[:n] for name, arr in self._cols.items()}
+        bar_ns = _to_ns(bar_time, 0)
+        now_ns = _to_ns(current_time, 0)
+
+        missing_formation = c['active'] & (c['formed_at'] < 0)
+        eligible = c['active'] & ~missing_formation & (bar_ns > c['formed_at'])
+        invalid_reason = np.zeros(n, dtype=np.int8) # 0: 有效
+        detail: Dict[int, str] = {}
+        changed = np.zeros(n, dtype=bool)
+        for i in np.flatnonzero(missing_formation):
+            detail[int(i)] = 'error_missing_creation_time'
+
+        # 1. 有效期
+        expired = eligible & (now_ns > c['valid_until'])
+        invalid_reason[expired] = 1
+        live = eligible & ~expired
+
+        if check_rules:
+            space_high, space_low = c['high'], c['low']
+            height = space_high - space_low
+
+            # 2. 强突破
+            n_confirm = max(1, int(strong_breakout_n_bars))
+            sb_dir, sb_bars = c['sb_dir'], c['sb_bars']
+            pending = live & (sb_dir != 0)
+            returned = pending & (((sb_dir == 1) & (low < space_high)) | ((sb_dir == -1) & (high > space_low)))
+            sb_bars[pending] += 1
+            sb_confirmed = pending & ~returned & (sb_bars >= n_confirm)
+            sb_dir_before = sb_dir.copy()
+            sb_dir[returned] = 0
+            sb_bars[returned] = 0
+
+            fresh = live & (sb_dir_before == 0)
+            up = fresh & (close > space_high) & ((close - space_high) > 2 * height)
+            down = fresh & ~up & (close < space_low) & ((space_low - close) > 2 * height)
+            sb_dir[up] = 1
+            sb_dir[down] = -1
+            sb_bars[up | down] = 1
+            sb_immediate = (up | down) & (n_confirm == 1)
+            changed |= pending | up | down
+            sb_invalid = sb_confirmed | sb_immediate
+            for i in np.flatnonzero(sb_invalid):
+                direction = 'up' if sb_dir_before[i] == 1 or up[i] else 'down'
+                detail[int(i)] = f"cond1_strong_breakout_{direction}_confirmed" + ('_immediate' if sb_immediate[i] else '')
+            invalid_reason[sb_invalid] = 2
+            live &= ~sb_invalid
+
+            # 3. 震荡
+            osc_invalid = live & (c['osc_crossings'] >= oscillation_m_times)
+            for i in np.flatnonzero(osc_invalid):
+                detail[int(i)] = 'oscillation'
+            invalid_reason[osc_invalid] = 3
+            live &= ~osc_invalid
+
+            # 4. 突破-回踩-确认 (按本K线开始时的阶段判断，每根K线最多推进一个阶段)
+            buffer = retrace_buffer_ratio * height
+            phase, brc_dir, initial = c['brc_phase'], c['brc_dir'], c['brc_initial']
+            p0 = live & (phase == 0)
+            p1 = live & (phase == 1)
+            p2 = live & (phase == 2)
+
+            start_up = p0 & (close > space_high + buffer)
+            start_down = p0 & ~start_up & (close < space_low - buffer)
+            started = start_up | start_down
+            phase[started] = 1
+            brc_dir[start_up] = 1
+            brc_dir[start_down] = -1
+            initial[started] = close
+
+            retrace_up = p1 & (brc_dir == 1) & (low <= space_high + buffer)
+            retrace_down = p1 & (brc_dir == -1) & (high >= space_low - buffer)
+            retraced = retrace_up | retrace_down
+            reset_p1 = p1 & ~retraced & (((brc_dir == 1) & (close < space_low)) | ((brc_dir == -1) & (close > space_high)))
+            phase[retraced] = 2
+            c['brc_retrace'][retrace_up] = low
+            c['brc_retrace'][retrace_down] = high
+
+            no_initial = p2 & np.isnan(initial)
+            confirm_up = p2 & ~no_initial & (brc_dir == 1) & (close > initial)
+            confirm_down = p2 & ~no_initial & (brc_dir == -1) & (close < initial)
+            confirmed = confirm_up | confirm_down
+            reset_p2 = p2 & ~no_initial & ~confirmed & (((brc_dir == 1) & (close < space_low)) | ((brc_dir == -1) & (close > space_high)))
+            reset = reset_p1 | reset_p2 | no_initial
+            phase[reset] = 0
+            brc_dir[reset] = 0
+            initial[reset_p1 | reset_p2] = np.nan
+            changed |= started | retraced | reset
+            for i in np.flatnonzero(confirmed):
+                detail[int(i)] = f"cond3_breakout_retrace_confirm_{'up' if confirm_up[i] else 'down'}"
+            invalid_reason[confirmed] = 4
+            live &= ~confirmed
+
+        # --- 只把状态变化的空间写回字典 ---
+        reasons = {1: 'duration_expired', 2: 'strong_breakout', 3: 'oscillation', 4: 'breakout_retrace_confirmation'}
+        current_iso = pd.Timestamp(current_time).isoformat()
+        for i in np.flatnonzero(changed & (invalid_reason == 0)):
+            self._write_state(int(i))
+        for i in np.flatnonzero(missing_formation):
+            space = self.spaces[i]
+            space['is_valid'] = False
+            space['status'] = 'inactive_error_missing_creation_time'
+            space['invalidation_reason'] = 'error_missing_creation_time'
+            space['invalidation_time'] = current_time
+            c['active'][i] = False
+            result['invalidated'].append((int(i), 'error_missing_creation_time'))
+        for i in np.flatnonzero(invalid_reason):
+            i = int(i)
+            code = int(invalid_reason[i])
+            self._write_state(i)
+            space = self.spaces[i]
+            space['is_valid'] = False
+            space['status'] = f"inactive_{detail.get(i, reasons[code])}"
+            space['invalidation_reason'] = reasons[code]
+            space['invalidation_time'] = current_iso
+            c['active'][i] = False
+            result['invalidated'].append((i, reasons[code]))
+        result['eligible'] = np.flatnonzero(live)
+        return result
+
+    def _write_state(self, i: int):
+        c = self._cols
+        space = self.spaces[i]
+        sb_dir = int(c['sb_dir'][i])
+        space['invalidation_status'] = InvalidationState(
+            strong_breakout_pending=sb_dir != 0,
+            strong_breakout_direction=sb_dir,
+            bars_since_strong_breakout=int(c['sb_bars'][i]),
+        )
+        space['brc_phase'] = BRC_PHASES[int(c['brc_phase'][i])]
+        space['brc_direction'] = int(c['brc_dir'][i])
+        initial = c['brc_initial'][i]
+        space['brc_initial_price'] = None if np.isnan(initial) else float(initial)
+        retrace = c['brc_retrace'][i]
+        if not np.isnan(retrace):
+            space['brc_retrace_achieved_price'] = float(retrace)
+        if space['brc_phase'] is not None:
+            buffer = self._retrace_buffer_ratio * (c['high'][i] - c['low'][i])
+            space['brc_retrace_target_high'] = float(c['high'][i] + buffer)
+            space['brc_retrace_target_low'] = float(c['low'][i] - buffer)
+
+    # --- 整理 ---
+    def sync_status(self, indices: np.ndarray):
+        """重新读取指定空间字典的 status (交易逻辑等可能直接修改字典使空间失效)。"""
+        active = self._cols['active']
+        for i in indices:
+            active[i] = self.spaces[i].get('status', 'active') == 'active'
+
+    def compact(self) -> List[Dict[str, Any]]:
+        """原地删除已失效的空间 (字典和数组行)，返回被删除的空间。"""
+        n = self._n
+        if n == 0:
+            return []
+        keep = self._cols['active'][:n].copy()
+        n_keep = int(keep.sum())
+        if n_keep == n:
+            return []
+        for name, arr in self._cols.items():
+            arr[:n_keep] = arr[:n][keep]
+        tail = self.spaces[n:] # evaluate 之后追加、尚未读入的空间
+        removed = [s for s, k in zip(self.spaces[:n], keep) if not k]
+        self.spaces[:] = [s for s, k in zip(self.spaces[:n], keep) if k] + tail
+        self._n = n_keep
+        return removed
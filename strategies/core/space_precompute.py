@@ -0,0 +1,231 @@
+"""
+事件空间的离线预计算
+
+事件空间 (以事件所在K线的高低点为边界) 只取决于事件时间、映射规则、主周期K线和空间定义参数
+(主周期、空间持续时间、最小空间高度)，与关键时间、止损止盈等交易参数无关。参数扫描中每次回测
+都在主循环里逐根K线重新构建同样的空间。
+
+这里对一个日期范围内的全部事件一次性计算空间表 (每个品种一次 searchsorted 定位事件所在K线)，
+以 .npz 紧凑表保存到缓存目录，文件名由空间定义参数、映射规则、事件集合和K线数据的指纹决定；
+回测时把表交给策略 (attach_precomputed_spaces)，已预计算的事件直接从表中生成空间，跳过映射和构建。
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 空间表的列: 字符串列、int64 时间列 (UTC 纳秒) 和浮点/整数列
+_STR_COLUMNS = ('symbol', 'event_id', 'event_title', 'suggested_direction', 'rule_id')
+_TIME_COLUMNS = ('event_time', 'initial_pulse_end_time', 'valid_until')
+_NUM_COLUMNS = ('space_high', 'space_low', 'space_height_pips', 'initial_direction')
+SPACE_COLUMNS = _STR_COLUMNS + _TIME_COLUMNS + _NUM_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+def space_definition_params(strategy: Any) -> Dict[str, Any]:
+    """决定空间构建结果的策略参数 (交易参数不在其中)。"""
+    return {
+        'primary_timeframe': str(strategy.primary_timeframe),
+        'space_duration_minutes': float(strategy.space_duration_minutes),
+        'min_space_height_pips': float(strategy.min_space_height_pips),
+    }
+
+
+def build_symbol_spaces(symbol: str, opportunities: pd.DataFrame, bars: pd.DataFrame, pip_size: float,
+                        space_duration_minutes: float, min_space_height_pips: float) -> pd.DataFrame:
+    """
+    为一个品种的交易机会 (symbol, event_id, event_title, event_time, suggested_direction, rule_id) 向量化构建空间。
+
+    事件时间一次 searchsorted 定位到所在 (或之前最近) 的K线，以其高低点为边界；
+    早于第一根K线或高度不足 min_space_height_pips 的事件被丢弃。
+
+    Returns:
+        pd.DataFrame: SPACE_COLUMNS 列 (时间列为 UTC Timestamp)，按 opportunities 的顺序。
+    """
+    bar_times = pd.DatetimeIndex(bars.index)
+    bar_times = bar_times.tz_localize('UTC') if bar_times.tz is None else bar_times.tz_convert('UTC')
+    highs = bars['high'].to_numpy(dtype=float)
+    lows = bars['low'].to_numpy(dtype=float)
+    if 'open' in bars.columns and 'close' in bars.columns:
+        moves = bars['close'].to_numpy(dtype=float) - bars['open'].to_numpy(dtype=float)
+    else:
+        moves = np.zeros(len(bars))
+    if not bar_times.is_monotonic_increasing:
+        order = np.argsort(bar_times.asi8, kind='stable')
+        bar_times, highs, lows, moves = bar_times[order], highs[order], lows[order], moves[order]
+
+    event_times = pd.DatetimeIndex(opportunities['event_time'])
+    positions = np.searchsorted(bar_times.as_unit('ns').asi8, event_times.as_unit('ns').asi8, side='right') - 1
+    found = positions >= 0
+    pos = positions[found]
+    heights = (highs[pos] - lows[pos]) / pip_size
+    keep = heights >= min_space_height_pips
+
+    table = opportunities.loc[found].loc[keep].copy()
+    pos = pos[keep]
+    table['symbol'] = symbol
+    table['initial_pulse_end_time'] = bar_times[pos]
+    table['valid_until'] = bar_times[pos] + pd.Timedelta(minutes=space_duration_minutes)
+    table['space_high'] = highs[pos]
+    table['space_low'] = lows[pos]
+    table['space_height_pips'] = heights[keep]
+    table['initial_direction'] = np.sign(moves[pos]).astype(int)
+    return table.reindex(columns=list(SPACE_COLUMNS))
+
+
+def _fingerprint(*parts: Any) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+
+class PrecomputedSpaces:
+    """
+    预计算的空间表。
+
+    Args:
+        table (pd.DataFrame): SPACE_COLUMNS 列的空间表。
+        params (Dict[str, Any]): 构建时的空间定义参数 (space_definition_params)。
+        event_keys (Iterable[str]): 已预计算的事件键 (event_id@event_time 纳秒)，包括没有生成空间的事件。
+    """
+
+    def __init__(self, table: pd.DataFrame, params: Dict[str, Any], event_keys: Iterable[str]):
+        self.table = table.reset_index(drop=True)
+        for col in _TIME_COLUMNS:
+            self.table[col] = pd.to_datetime(self.table[col], utc=True).dt.as_unit('ns')
+        self.params = dict(params)
+        self.event_keys = set(event_keys)
+        self._rows_by_key: Dict[str, List[int]] = {}
+        keys = self.make_keys(self.table['event_id'], self.table['event_time']) if not self.table.empty else []
+        for row, key in enumerate(keys):
+            self._rows_by_key.setdefault(key, []).append(row)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @staticmethod
+    def make_keys(event_ids: Iterable[str], event_times: Iterable[Any]) -> List[str]:
+        times = pd.DatetimeIndex(event_times)
+        times = times.tz_localize('UTC') if times.tz is None else times.tz_convert('UTC')
+        return [f"{event_id}@{ns}" for event_id, ns in zip(event_ids, times.as_unit('ns').asi8)]
+
+    def covers(self, key: str) -> bool:
+        return key in self.event_keys
+
+    def rows_for(self, key: str) -> pd.DataFrame:
+        """返回某个已预计算事件的空间行 (没有生成空间时为空表)。"""
+        return self.table.iloc[self._rows_by_key.get(key, [])]
+
+    # --- 持久化 ---
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays: Dict[str, np.ndarray] = {}
+        for col in _STR_COLUMNS:
+            arrays[col] = self.table[col].fillna('').astype(str).to_numpy(dtype=str)
+        for col in _TIME_COLUMNS:
+            arrays[col] = pd.DatetimeIndex(self.table[col]).as_unit('ns').asi8 if len(self.table) else np.empty(0, dtype=np.int64)
+        for col in _NUM_COLUMNS:
+            arrays[col] = self.table[col].to_numpy(dtype=np.int8 if col == 'initial_direction' else float)
+        arrays['__event_keys__'] = np.array(sorted(self.event_keys), dtype=str)
+        arrays['__params__'] = np.array(json.dumps(self.params, sort_keys=True))
+        tmp_path = path.with_name(path.name + '.tmp.npz')
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'PrecomputedSpaces':
+        with np.load(Path(path), allow_pickle=False) as data:
+            table = pd.DataFrame({col: data[col].astype(object) for col in _STR_COLUMNS})
+            for col in _TIME_COLUMNS:
+                table[col] = pd.to_datetime(data[col], utc=True)
+            for col in _NUM_COLUMNS:
+                table[col] = data[col]
+            table['initial_direction'] = table['initial_direction'].astype(int)
+            params = json.loads(str(data['__params__']))
+            event_keys = data['__event_keys__'].tolist()
+        return cls(table, params, event_keys)
+
+
+def precompute_spaces(strategy: Any, events_df: pd.DataFrame, bars_by_symbol: Dict[str, pd.DataFrame],
+                      processing_time: Optional[pd.Timestamp] = None) -> PrecomputedSpaces:
+    """
+    一次性计算事件集合的全部空间 (使用策略自身的事件规范化和映射规则，结果与回测中逐步构建的空间相同)。
+
+    Args:
+        strategy: EventDrivenSpaceStrategy 实例。
+        events_df (pd.DataFrame): 回测区间内的全部事件 (包含 datetime 列)。
+        bars_by_symbol (Dict[str, pd.DataFrame]): 品种 -> 主周期K线。
+        processing_time: 事件缺少时间时使用的时间，默认当前时间。
+    """
+    params = space_definition_params(strategy)
+    processing_time = processing_time or pd.Timestamp.now(tz='UTC')
+    if 'datetime' in events_df.columns:
+        # 没有时间的事件在回测中以处理时间构建空间，不做预计算
+        events_df = events_df[pd.to_datetime(events_df['datetime'], errors='coerce', utc=True, format='mixed').notna()]
+    else:
+        events_df = events_df.iloc[0:0]
+    events = strategy._normalize_events(events_df, processing_time)
+    opportunities = strategy._map_events_to_opportunities(events)
+    tables = []
+    usable_symbols = set()
+    for symbol, group in opportunities.groupby('symbol', sort=False):
+        bars = bars_by_symbol.get(symbol)
+        pip_size = strategy._get_pip_size(symbol)
+        if bars is None or bars.empty or not pip_size:
+            continue
+        usable_symbols.add(symbol)
+        tables.append(build_symbol_spaces(symbol, group, bars, pip_size,
+                                          params['space_duration_minutes'], params['min_space_height_pips']))
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=list(SPACE_COLUMNS))
+    # 没有对应K线的品种的事件不算已预计算，回测中仍按原路径处理
+    skipped_events = set(opportunities.loc[~opportunities['symbol'].isin(usable_symbols), 'event_id'])
+    keys = [key for key, event_id in zip(PrecomputedSpaces.make_keys(events['event_id'], events['event_time']), events['event_id'])
+            if event_id not in skipped_events]
+    return PrecomputedSpaces(table, params, keys)
+
+
+def load_or_precompute_spaces(strategy: Any, events_df: pd.DataFrame, bars_by_symbol: Dict[str, pd.DataFrame],
+                              cache_dir: Path, processing_time: Optional[pd.Timestamp] = None) -> PrecomputedSpaces:
+    """
+    从缓存目录加载空间表，不存在时预计算并保存。缓存文件名由空间定义参数、映射规则、事件集合
+    (id、时间、标题、国家、A/F/P) 和各品种主周期K线的指纹决定，任何一项变化都会生成新表。
+    """
+    params = space_definition_params(strategy)
+    event_cols = [c for c in ('id', 'datetime', 'title', 'country_code', 'actual', 'forecast', 'previous') if c in events_df.columns]
+    bar_parts = []
+    for symbol in sorted(bars_by_symbol):
+        bars = bars_by_symbol[symbol]
+        if bars is None or bars.empty:
+            continue
+        bar_parts.extend([symbol, pd.DatetimeIndex(bars.index).asi8,
+                          bars['high'].to_numpy(dtype=float), bars['low'].to_numpy(dtype=float)])
+    key = _fingerprint(params, strategy.event_mapping_rules,
+                       pd.util.hash_pandas_object(events_df[event_cols].astype(str), index=True).to_numpy(),
+                       *bar_parts)
+    path = Path(cache_dir) / f"spaces_{key}.npz"
+    if path.exists():
+        try:
+            spaces = PrecomputedSpaces.load(path)
+            logger.info(f"已从缓存加载预计算空间表: {path} ({len(spaces)} 个空间)")
+            return spaces
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取预计算空间表 {path} 失败，将重新计算: {e}")
+    spaces = precompute_spaces(strategy, events_df, bars_by_symbol, processing_time)
+    try:
+        spaces.save(path)
+        logger.info(f"预计算空间表已保存: {path} ({len(spaces)} 个空间, {len(spaces.event_keys)} 个事件)")
+    except OSError as e:
+        logger.warning(f"保存预计算空间表 {path} 失败: {e}")
+    return spaces
@@ -9,6 +9,8 @@ from decimal import Decimal, InvalidOperation
 
 # --- 添加 Order 类及相关枚举的导入 ---
 from strategies.live.order import Order, OrderSide, OrderType, OrderStatus
+from strategies.core.bar_context import BarContext
+from core.fast_logging import FastLogger, get_fast_logger, resolve_profile
 # ------------------------------------
 
 # MODIFIED: Added os, importlib.util, re for config file loading
@@ -25,6 +27,9 @@ class StrategyBase(ABC):
     所有具体策略都应继承此类并实现 process_new_data 方法。
     该基类提供了与执行引擎交互、管理订单和更新持仓的基础结构。
     """
+    # 策略默认使用的K线列 (spread/real_volume 等不加载)
+    DEFAULT_DATA_COLUMNS: List[str] = ['open', 'high', 'low', 'close', 'tick_volume']
+
     def __init__(self, 
                  strategy_id: str,
                  app_config: DictConfig,
@@ -50,8 +55,11 @@ class StrategyBase(ABC):
         self.execution_engine = execution_engine
         self.risk_manager = risk_manager
         
-        self.logger = logging.getLogger(self.strategy_id)
-        self.logger.setLevel(logging.DEBUG) # Ensure DEBUG logs are processed by this logger
+        # 日志配置档 (logging.profile: verbose/normal/silent) 决定策略 logger 的级别；
+        # FastLogger 缓存级别开关，热路径用 self.logger.debug_enabled 跳过消息构建
+        self.log_profile = resolve_profile(app_config)
+        self.log_sample_every = OmegaConf.select(app_config, 'logging.sample_every', default=1) if app_config is not None else 1
+        self.logger = self._make_logger(self.strategy_id)
 
         # 1. Get base parameters from app_config.strategy_params.[strategy_id]
         base_params = OmegaConf.create({})
@@ -102,8 +110,14 @@ class StrategyBase(ABC):
         self.config = self.params
 
         self.positions: Dict[str, Any] = {} # 用于存储策略视角的持仓信息
+        # 当前时间点的共享特征上下文 (由引擎/执行器经 bind_bar_context 传入，见 strategies.core.bar_context)
+        self.bar_context: Optional[BarContext] = None
         self.logger.info(f"Strategy '{self.strategy_id}' initialized. Final params: {OmegaConf.to_container(self.params) if self.params else '{}'}")
 
+    def _make_logger(self, name: str) -> FastLogger:
+        """按本策略的日志配置档创建 logger (子类改用其他 logger 名称时使用)。"""
+        return get_fast_logger(name, self.log_profile, self.log_sample_every)
+
     def get_required_timeframes(self) -> List[str]:
         """
         返回策略执行所需的时间框架列表。
@@ -128,6 +142,26 @@ class StrategyBase(ABC):
         self.logger.debug(f"Strategy '{self.strategy_id}' using default primary_timeframe: M30 (not found in strategy or engine config).")
         return ["M30"]
 
+    def get_data_requirements(self) -> Dict[str, Dict[str, Any]]:
+        """
+        返回策略实际使用的数据声明，供回测引擎按需加载。
+
+        格式: {timeframe: {'columns': [...], 'lookback_bars': Optional[int]}}
+        - 时间框架来自 get_required_timeframes()。
+        - columns 默认为 DEFAULT_DATA_COLUMNS，可通过参数 'data_columns' 覆盖。
+        - lookback_bars 为回测开始前需要预加载的K线数量，可通过参数 'lookback_bars' 设置；
+          None 表示由引擎的 data_padding_days 决定。
+        子策略可覆盖此方法，为不同时间框架声明不同的列和回看深度。
+        """
+        columns = self.params.get('data_columns') or self.DEFAULT_DATA_COLUMNS
+        if not isinstance(columns, list):
+            columns = list(columns)
+        lookback_bars = self.params.get('lookback_bars')
+        return {
+            tf: {'columns': list(columns), 'lookback_bars': lookback_bars}
+            for tf in self.get_required_timeframes()
+        }
+
     def _to_snake_case(self, name: str) -> str:
         """Converts a PascalCase or camelCase string to snake_case."""
         if not name:
@@ -224,6 +258,47 @@ class StrategyBase(ABC):
         """
         pass
 
+    # --- 共享特征上下文 ---
+    def child_strategies(self) -> List['StrategyBase']:
+        """本策略组合的子策略 (如 _ex_checker、_rc_checker)，扫描实例属性得到。"""
+        return [value for value in vars(self).values() if isinstance(value, StrategyBase) and value is not self]
+
+    def bind_bar_context(self, context: Optional[BarContext]) -> None:
+        """设置当前时间点的共享上下文，并传给组合的子策略 (每个时间点扫描一次子策略属性)。"""
+        self.bar_context = context
+        for child in self.child_strategies():
+            child.bind_bar_context(context)
+
+    def _ensure_bar_context(self, current_time: datetime,
+                            market_data: Optional[Dict[str, Any]] = None) -> BarContext:
+        """返回 current_time 的上下文；引擎/执行器没有传入时由策略自己创建 (并传给子策略)。"""
+        context = self.bar_context
+        if context is None or not context.is_for(current_time):
+            context = BarContext(current_time, self.data_provider, market_data)
+            self.bind_bar_context(context)
+        return context
+
+    def _get_window(self, symbol: str, timeframe: str, end_time: Any, n_bars: int) -> Optional[pd.DataFrame]:
+        """data_provider.get_window，经共享上下文记忆 (调用方需先确认数据提供者支持 get_window)。"""
+        if self.bar_context is not None:
+            return self.bar_context.window(symbol, timeframe, end_time, n_bars)
+        return self.data_provider.get_window(symbol, timeframe, end_time, n_bars)
+
+    def _get_historical_prices(self, symbol: str, start_time: Any, end_time: Any, timeframe: str) -> Optional[pd.DataFrame]:
+        """data_provider.get_historical_prices，经共享上下文记忆。"""
+        if self.bar_context is not None:
+            return self.bar_context.historical_prices(symbol, start_time, end_time, timeframe)
+        return self.data_provider.get_historical_prices(symbol=symbol, start_time=start_time,
+                                                        end_time=end_time, timeframe=timeframe)
+
+    def _get_indicator(self, symbol: str, timeframe: str, name: str, as_of: Any = None, **params) -> Optional[float]:
+        """共享增量指标的值，经共享上下文记忆；数据提供者不支持指标时返回 None。"""
+        if not hasattr(self.data_provider, 'get_indicator'):
+            return None
+        if self.bar_context is not None:
+            return self.bar_context.indicator(symbol, timeframe, name, as_of=as_of, **params)
+        return self.data_provider.get_indicator(symbol, timeframe, name, as_of=as_of, **params)
+
     def update_positions(self, executed_order: Order) -> None:
         """
         根据已执行的订单更新内部持仓状态。
@@ -13,6 +13,16 @@ from omegaconf import OmegaConf, DictConfig
 from typing import Optional, Dict, List, Any
 from datetime import datetime
 from .risk_manager import RiskManagerBase, get_risk_manager # 导入风险管理器
+from .indicators import last_closed_bar_time
+from .market_state import MarketStateStore
+from .strategy_runner import SerializedProxy, StrategyRunner
+from core.notifications import NotificationSubscriber, TOPIC_CALENDAR_UPDATED
+from core import metrics
+
+# 周期耗时指标 (见 core.metrics)
+_CYCLE_SECONDS = metrics.histogram('orchestrator_cycle_seconds', 'Total run_cycle duration')
+_PHASE_SECONDS = metrics.histogram('orchestrator_phase_seconds', 'run_cycle duration per phase', ('phase',))
+_CYCLES_TOTAL = metrics.counter('orchestrator_cycles_total', 'Strategy cycles by trigger', ('trigger',))
 
 class StrategyOrchestrator:
     """
@@ -34,6 +44,9 @@ class StrategyOrchestrator:
         self.risk_manager: Optional[RiskManagerBase] = None # 初始化为 None
         self.strategies: List[StrategyBase] = []
         self.running = False
+        # 通知驱动: 仅在日历更新通知或心跳周期时重新加载事件
+        self._subscriber: Optional[NotificationSubscriber] = None
+        self._latest_events: Optional[pd.DataFrame] = None
 
         # 设置日志
         log_filename = OmegaConf.select(config, "logging.orchestrator_log_filename", default="strategy_orchestrator.log")
@@ -41,6 +54,34 @@ class StrategyOrchestrator:
         self.logger = setup_logging(config.logging, log_filename, logger_name='StrategyOrchestrator') 
 
         self.logger.info("初始化 StrategyOrchestrator...")
+
+        # 增量市场状态: 启动时完整加载一次，之后每个周期只追加新K线
+        self.market_state: Optional[MarketStateStore] = None
+        if OmegaConf.select(config, "orchestrator.market_state.enabled", default=True):
+            self.market_state = MarketStateStore(
+                self.data_provider.market_provider,
+                max_bars=OmegaConf.select(config, "orchestrator.market_state.max_bars", default=0),
+                logger=self.logger,
+            )
+            # 策略的 get_window 直接使用同一份增量市场状态，不再单独加载和更新
+            if hasattr(self.data_provider, 'attach_market_state'):
+                self.data_provider.attach_market_state(self.market_state)
+
+        # 策略执行器: sequential 依次运行 / parallel 线程池并行运行 (各策略有截止时间)
+        exec_cfg = OmegaConf.select(config, "orchestrator.execution", default=None) or OmegaConf.create({})
+        self.strategy_runner = StrategyRunner(
+            mode=exec_cfg.get("mode", "sequential"),
+            max_workers=exec_cfg.get("max_workers", 0),
+            default_deadline_seconds=exec_cfg.get("default_deadline_seconds", 60),
+            deadlines=OmegaConf.to_container(exec_cfg.deadlines) if exec_cfg.get("deadlines") else {},
+            busy_policy=exec_cfg.get("busy_policy", "skip"),
+            logger=self.logger,
+            data_provider=self.data_provider,
+        )
+        if self.strategy_runner.mode == "parallel" and exec_cfg.get("serialize_execution_engine", True) and self.execution_engine is not None:
+            # 并行运行时串行化执行引擎调用 (策略和风险管理器持有的都是包装后的引擎)
+            self.execution_engine = SerializedProxy(self.execution_engine)
+
         self._initialize_risk_manager()
         self._load_strategies()
 
@@ -146,13 +187,71 @@ class StrategyOrchestrator:
         else:
             self.logger.info(f"策略加载完成。共加载 {len(self.strategies)} 个策略: {[s.get_name() for s in self.strategies]}")
 
-    def run_cycle(self) -> None:
+    def _load_full_market_data(self, symbols: List[str], timeframes: List[str]) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """未启用增量市场状态时，通过 get_combined_prices 完整加载所有品种/时间框架的数据。"""
+        market_data: Dict[str, Dict[str, pd.DataFrame]] = {}
+        for tf in timeframes:
+            market_data[tf] = {}
+            for sym in symbols:
+                # 调用 get_combined_prices 获取该 symbol/timeframe 的完整数据
+                combined_df = self.data_provider.market_provider.get_combined_prices(sym, tf)
+                if combined_df is not None and not combined_df.empty:
+                    market_data[tf][sym] = combined_df
+                    self.logger.debug(f"成功获取 {sym} ({tf}) 的合并数据，共 {len(combined_df)} 条。")
+                else:
+                    self.logger.warning(f"未能获取 {sym} ({tf}) 的合并价格数据。")
+        return market_data
+
+    def _seed_market_state(self) -> None:
+        """启动时完整加载所有品种/时间框架到增量市场状态。"""
+        if self.market_state is None:
+            return
+        symbols = list(OmegaConf.select(self.config, "realtime.symbols", default=[]))
+        timeframes = list(OmegaConf.select(self.config, "realtime.timeframes", default=[]))
+        seed_start = time.monotonic()
+        loaded = 0
+        for tf in timeframes:
+            for sym in symbols:
+                try:
+                    loaded += self.market_state.seed(sym, tf)
+                except Exception as seed_e:
+                    self.logger.error(f"初始化 {sym} ({tf}) 市场状态时出错: {seed_e}", exc_info=True)
+        self.logger.info(f"市场状态初始化完成: {loaded}/{len(symbols) * len(timeframes)} 个 (Symbol, Timeframe) 组合，耗时 {time.monotonic() - seed_start:.2f} 秒。")
+
+    def _update_indicators(self, market_data: Dict[str, Dict[str, pd.DataFrame]], current_time: datetime):
+        """将已收盘的新K线送入数据提供者的共享增量指标 (仍在形成的最后一根K线不送入)。"""
+        if not hasattr(self.data_provider, 'update_indicators'):
+            return
+        for tf, symbol_data in market_data.items():
+            # 与策略查询时的 as_of=current_time 对齐: 只送入到当前时间最新已收盘K线 (见 last_closed_bar_time)
+            closed_until = last_closed_bar_time(current_time, tf)
+            if closed_until is None:
+                continue
+            for sym, df in symbol_data.items():
+                try:
+                    self.data_provider.update_indicators(sym, tf, df, until=closed_until)
+                except Exception as ind_e:
+                    self.logger.error(f"更新 {sym} ({tf}) 增量指标时出错: {ind_e}", exc_info=True)
+
+    def run_cycle(self, notifications: Optional[List[Dict[str, Any]]] = None,
+                  current_time: Optional[datetime] = None) -> None:
         """
         执行一个策略运行周期。
         获取所有相关品种和时间框架的最新数据，并将其传递给每个策略。
+
+        Args:
+            notifications: 触发本周期的通知 (见 core.notifications)；None 或空列表表示定时心跳周期。
+            current_time: 传给策略的当前时间 (UTC)，默认为系统时间；回放时为回放时钟时间。
         """
-        current_time = datetime.utcnow()
-        self.logger.debug(f"开始执行策略周期: {current_time.isoformat()}")
+        if current_time is None:
+            current_time = datetime.utcnow()
+        cycle_start = time.perf_counter()
+        _CYCLES_TOTAL.labels('notification' if notifications else 'heartbeat').inc()
+        if notifications:
+            topics = sorted({n.get('topic') for n in notifications})
+            self.logger.debug(f"开始执行策略周期 (由 {len(notifications)} 条通知触发: {topics}): {current_time.isoformat()}")
+        else:
+            self.logger.debug(f"开始执行策略周期: {current_time.isoformat()}")
 
         market_data: Dict[str, Dict[str, pd.DataFrame]] = {}
         latest_events: Optional[pd.DataFrame] = None
@@ -169,26 +268,37 @@ class StrategyOrchestrator:
                  self.logger.warning("配置中未指定 'realtime.timeframes'，无法获取市场价格数据。")
             else:
                 self.logger.debug(f"尝试为 Symbols={symbols} 和 Timeframes={timeframes} 获取合并价格数据...")
-                for tf in timeframes:
-                    market_data[tf] = {}
-                    for sym in symbols:
-                        # 调用 get_combined_prices 获取该 symbol/timeframe 的完整数据
-                        combined_df = self.data_provider.market_provider.get_combined_prices(sym, tf)
-                        if combined_df is not None and not combined_df.empty:
-                            market_data[tf][sym] = combined_df
-                            self.logger.debug(f"成功获取 {sym} ({tf}) 的合并数据，共 {len(combined_df)} 条。")
-                        else:
-                            self.logger.warning(f"未能获取 {sym} ({tf}) 的合并价格数据。")
+                if self.market_state is not None:
+                    # 增量更新内存中的市场状态，只追加比已知最新K线更新的K线
+                    market_data = self.market_state.snapshot(symbols, timeframes)
+                else:
+                    market_data = self._load_full_market_data(symbols, timeframes)
                 self.logger.info(f"已获取 {sum(len(tf_data) for tf_data in market_data.values())} 个 (Symbol, Timeframe) 组合的价格数据。")
+                self._update_indicators(market_data, current_time)
 
-            # 1.2 获取最新事件 (逻辑保持不变)
-            self.logger.debug("尝试获取最新过滤事件数据...")
-            latest_events = self.data_provider.get_filtered_events(live=True)
-            if latest_events is not None and not latest_events.empty:
-                self.logger.debug(f"获取到 {len(latest_events)} 个最新事件。")
+            phase_start = time.perf_counter()
+            _PHASE_SECONDS.labels('market_data').observe(phase_start - cycle_start)
+
+            # 1.2 获取最新事件
+            # 由K线收盘通知触发的周期沿用上次加载的事件；心跳周期、日历更新通知或未启用通知通道时重新加载
+            reload_events = (
+                self._subscriber is None
+                or not notifications
+                or any(n.get('topic') == TOPIC_CALENDAR_UPDATED for n in notifications)
+            )
+            if reload_events:
+                self.logger.debug("尝试获取最新过滤事件数据...")
+                latest_events = self.data_provider.get_filtered_events(live=True)
+                if latest_events is not None and not latest_events.empty:
+                    self.logger.debug(f"获取到 {len(latest_events)} 个最新事件。")
+                else:
+                    self.logger.debug("当前周期没有新的事件数据。")
+                    latest_events = None # Ensure it's None if empty
+                self._latest_events = latest_events
             else:
-                self.logger.debug("当前周期没有新的事件数据。")
-                latest_events = None # Ensure it's None if empty
+                latest_events = self._latest_events
+
+            _PHASE_SECONDS.labels('events').observe(time.perf_counter() - phase_start)
 
         except Exception as data_e:
             self.logger.error(f"获取数据时发生错误: {data_e}", exc_info=True)
@@ -199,55 +309,106 @@ class StrategyOrchestrator:
             self.logger.warning("没有加载策略，跳过执行。")
             return
 
-        for strategy in self.strategies:
-            strategy_name = strategy.get_name()
-            self.logger.debug(f"执行策略: {strategy_name}...")
-            try:
-                # 传递包含所有时间框架数据的嵌套字典 market_data
-                # 注意：需要稍后修改 StrategyBase.process_new_data 的签名
-                strategy.process_new_data(current_time, market_data, latest_events)
-                self.logger.debug(f"策略 {strategy_name} 执行完成。")
-            except Exception as strategy_e:
-                self.logger.error(f"执行策略 {strategy_name} 时发生错误: {strategy_e}", exc_info=True)
+        # 依次或并行运行所有策略 (见 orchestrator.execution)
+        phase_start = time.perf_counter()
+        results = self.strategy_runner.run(self.strategies, current_time, market_data, latest_events)
+        phase_end = time.perf_counter()
+        _PHASE_SECONDS.labels('strategies').observe(phase_end - phase_start)
+        _CYCLE_SECONDS.observe(phase_end - cycle_start)
+        failed = {name: status for name, status in results.items() if status != 'ok'}
+        if failed:
+            self.logger.info(f"本周期未正常完成的策略: {failed}")
         
         self.logger.debug(f"策略周期执行完毕: {datetime.utcnow().isoformat()}")
 
-    def start(self) -> None:
+    def _create_subscriber(self) -> Optional[NotificationSubscriber]:
+        """按 notifications 配置订阅 K线收盘/日历更新通知；未启用或端口不可用时返回 None (仅使用定时器)。"""
+        if not OmegaConf.select(self.config, "notifications.enabled", default=False):
+            return None
+        host = OmegaConf.select(self.config, "notifications.host", default="127.0.0.1")
+        port = OmegaConf.select(self.config, "notifications.port", default=47651)
+        coalesce_ms = OmegaConf.select(self.config, "notifications.coalesce_ms", default=200)
+        try:
+            subscriber = NotificationSubscriber(host, port, coalesce_seconds=coalesce_ms / 1000.0)
+            self.logger.info(f"已订阅通知通道 udp://{host}:{port}，收到通知时立即运行策略周期。")
+            return subscriber
+        except OSError as sub_e:
+            self.logger.warning(f"无法订阅通知通道 udp://{host}:{port}: {sub_e}。仅使用定时周期。")
+            return None
+
+    def _wait_for_next_cycle(self, wait_seconds: float) -> List[Dict[str, Any]]:
+        """
+        等待下一个周期: 收到通知时立即返回通知列表，否则等到心跳间隔结束返回空列表。
+        每次最多阻塞 1 秒以便及时响应 stop()。
+        """
+        deadline = time.monotonic() + wait_seconds
+        while self.running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self._subscriber is not None:
+                notifications = self._subscriber.wait(min(remaining, 1.0))
+                if notifications:
+                    return notifications
+            else:
+                time.sleep(min(remaining, 1.0))
+        return []
+
+    def start(self, interval_seconds: Optional[float] = None) -> None:
         """
         启动策略执行循环。
+
+        启用 notifications 时，收到 RealtimeUpdater 的 K线收盘/日历更新通知后立即运行策略周期 (突发通知合并为一次)，
+        orchestrator.run_interval_seconds 仅作为兜底心跳；否则按固定间隔运行。
+
+        Args:
+            interval_seconds: 心跳间隔 (秒)，默认读取 orchestrator.run_interval_seconds。
         """
-        interval_seconds = OmegaConf.select(self.config, "orchestrator.run_interval_seconds", default=60)
+        if interval_seconds is None:
+            interval_seconds = OmegaConf.select(self.config, "orchestrator.run_interval_seconds", default=60)
         if not self.strategies:
             self.logger.error("没有加载任何策略，无法启动执行循环。")
             return
 
         self.logger.info(f"启动策略执行循环，运行间隔: {interval_seconds} 秒...")
         self.running = True
+        self._seed_market_state()
+        self._subscriber = self._create_subscriber()
+        metrics_server = None
+        if OmegaConf.select(self.config, "metrics.enabled", default=False):
+            metrics_server = metrics.start_metrics_server(
+                OmegaConf.select(self.config, "metrics.orchestrator_port", default=9102),
+                OmegaConf.select(self.config, "metrics.host", default="127.0.0.1"),
+            )
+        notifications: List[Dict[str, Any]] = []
 
-        while self.running:
-            cycle_start_time = time.monotonic()
-            try:
-                self.run_cycle()
-            except Exception as cycle_e:
-                 self.logger.critical(f"策略运行周期 run_cycle 发生严重错误: {cycle_e}", exc_info=True)
-                 # Consider stopping or adding a cooldown period on critical errors
-                 # self.stop()
-
-            cycle_end_time = time.monotonic()
-            elapsed = cycle_end_time - cycle_start_time
-            sleep_time = interval_seconds - elapsed
-
-            if sleep_time > 0:
-                self.logger.debug(f"周期执行耗时 {elapsed:.2f} 秒，休眠 {sleep_time:.2f} 秒...")
-                # Use interruptible sleep
-                for _ in range(int(sleep_time)):
-                    if not self.running:
-                        break
-                    time.sleep(1)
-                if self.running and sleep_time % 1 > 0:
-                     time.sleep(sleep_time % 1)
-            else:
-                self.logger.warning(f"周期执行耗时 {elapsed:.2f} 秒，超过设定的间隔 {interval_seconds} 秒！")
+        try:
+            while self.running:
+                cycle_start_time = time.monotonic()
+                try:
+                    self.run_cycle(notifications)
+                except Exception as cycle_e:
+                     self.logger.critical(f"策略运行周期 run_cycle 发生严重错误: {cycle_e}", exc_info=True)
+                     # Consider stopping or adding a cooldown period on critical errors
+                     # self.stop()
+
+                elapsed = time.monotonic() - cycle_start_time
+                sleep_time = interval_seconds - elapsed
+
+                if sleep_time > 0:
+                    self.logger.debug(f"周期执行耗时 {elapsed:.2f} 秒，等待通知或 {sleep_time:.2f} 秒心跳...")
+                    notifications = self._wait_for_next_cycle(sleep_time)
+                else:
+                    self.logger.warning(f"周期执行耗时 {elapsed:.2f} 秒，超过设定的间隔 {interval_seconds} 秒！")
+                    notifications = []
+        finally:
+            if self._subscriber is not None:
+                self._subscriber.close()
+                self._subscriber = None
+            self.strategy_runner.shutdown(wait_running=False)
+            if metrics_server is not None:
+                metrics_server.shutdown()
+                metrics_server.server_close()
 
         self.logger.info("策略执行循环已停止。")
 
@@ -0,0 +1,259 @@
+"""
+策略执行器
+
+StrategyOrchestrator 原先在每个周期依次调用每个策略的 process_new_data，一个慢策略会拖慢所有策略。
+StrategyRunner 支持两种模式:
+
+- sequential: 依次运行 (原行为)，只记录耗时和超时。
+- parallel: 在线程池中并行运行所有策略，各策略共享同一份只读的市场数据快照；
+  周期最多等待到各策略的截止时间，周期耗时取决于最慢的策略而不是所有策略耗时之和。
+
+Python 线程无法被强制终止，超过截止时间的策略会在后台继续运行直到完成；
+下一周期该策略仍在运行时按 busy_policy 处理:
+- skip: 跳过该策略本周期的运行。
+- latest: 记住本周期的数据，上一次运行结束后立即用最新一次的数据补跑一次 (多次积压只保留最新)。
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from core import metrics
+from strategies.core.bar_context import BarContext
+
+BUSY_POLICIES = ('skip', 'latest')
+
+_EVALUATION_SECONDS = metrics.histogram('strategy_evaluation_seconds', 'process_new_data duration per strategy', ('strategy',))
+_RUNS_TOTAL = metrics.counter('strategy_runs_total', 'Strategy cycle outcomes', ('strategy', 'status'))
+
+
+class SerializedProxy:
+    """
+    将对象的所有方法调用串行化 (共享一把可重入锁)。
+    并行模式下用于包装执行引擎: MT5 接口 (如 last_error) 依赖进程级全局状态，不能被多个线程同时调用。
+    """
+
+    def __init__(self, target: Any, lock: Optional[threading.RLock] = None):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_lock', lock or threading.RLock())
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        lock = self._lock
+
+        def serialized(*args, **kwargs):
+            with lock:
+                return attr(*args, **kwargs)
+        return serialized
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._target, name, value)
+
+
+class StrategyRunner:
+    """
+    按 sequential/parallel 模式运行策略，并记录每个策略每个周期的耗时。
+
+    Args:
+        mode (str): 'sequential' 或 'parallel'。
+        max_workers (int): 并行模式的线程数，0 表示每个策略一个线程。
+        default_deadline_seconds (float): 默认的策略截止时间 (秒)。
+        deadlines (Dict[str, float]): 按策略名覆盖的截止时间。
+        busy_policy (str): 策略仍在运行上一周期时的处理方式 ('skip' 或 'latest')。
+        logger: 日志记录器。
+        data_provider: 数据提供者；提供时每个周期创建一个所有策略共享的 BarContext。
+    """
+
+    def __init__(self, mode: str = 'sequential', max_workers: int = 0,
+                 default_deadline_seconds: float = 60.0,
+                 deadlines: Optional[Dict[str, float]] = None,
+                 busy_policy: str = 'skip',
+                 logger: Optional[logging.Logger] = None,
+                 data_provider: Any = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.data_provider = data_provider
+        self.mode = mode if mode in ('sequential', 'parallel') else 'sequential'
+        if self.mode != mode:
+            self.logger.warning(f"未知的策略执行模式 '{mode}'，使用 sequential。")
+        self.busy_policy = busy_policy if busy_policy in BUSY_POLICIES else 'skip'
+        if self.busy_policy != busy_policy:
+            self.logger.warning(f"未知的 busy_policy '{busy_policy}'，使用 skip。")
+        self.max_workers = max(int(max_workers or 0), 0)
+        self.default_deadline_seconds = float(default_deadline_seconds)
+        self.deadlines = {name: float(seconds) for name, seconds in (deadlines or {}).items()}
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.RLock() # 已完成的 Future 会在 add_done_callback 中同步调用回调
+        self._inflight: Dict[str, Future] = {}
+        self._pending: Dict[str, Tuple[Any, tuple]] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    # --- 统计 ---
+    def deadline_for(self, name: str) -> float:
+        return self.deadlines.get(name, self.default_deadline_seconds)
+
+    def _stat(self, name: str) -> Dict[str, Any]:
+        stat = self._stats.get(name)
+        if stat is None:
+            stat = {
+                'runs': 0, 'errors': 0, 'timeouts': 0, 'skipped': 0, 'coalesced': 0,
+                'last_seconds': None, 'max_seconds': 0.0, 'total_seconds': 0.0,
+                'last_status': None, 'last_cycle_time': None,
+            }
+            self._stats[name] = stat
+        return stat
+
+    def get_timings(self) -> Dict[str, Dict[str, Any]]:
+        """返回每个策略的运行统计 (次数、错误、超时、跳过、耗时) 的副本。"""
+        with self._lock:
+            return {name: dict(stat) for name, stat in self._stats.items()}
+
+    # --- 执行 ---
+    @staticmethod
+    def _snapshot(market_data: Dict[str, Dict[str, pd.DataFrame]]) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """为每个策略复制外层字典 (DataFrame 本身共享)，策略修改字典不会影响其他策略。"""
+        return {tf: dict(symbols) for tf, symbols in market_data.items()}
+
+    def _execute(self, strategy: Any, name: str, current_time: datetime,
+                 market_data: Dict[str, Dict[str, pd.DataFrame]], event_data: Optional[pd.DataFrame],
+                 context: Optional[BarContext] = None) -> str:
+        """运行单个策略并记录耗时；返回 'ok' 或 'error'。"""
+        status = 'ok'
+        start = time.perf_counter()
+        try:
+            if context is not None and hasattr(strategy, 'bind_bar_context'):
+                strategy.bind_bar_context(context)
+            strategy.process_new_data(current_time, market_data, event_data)
+        except Exception as strategy_e:
+            status = 'error'
+            self.logger.error(f"执行策略 {name} 时发生错误: {strategy_e}", exc_info=True)
+        elapsed = time.perf_counter() - start
+        _EVALUATION_SECONDS.labels(name).observe(elapsed)
+        _RUNS_TOTAL.labels(name, status).inc()
+        deadline = self.deadline_for(name)
+        with self._lock:
+            stat = self._stat(name)
+            stat['runs'] += 1
+            stat['errors'] += status == 'error'
+            stat['last_seconds'] = elapsed
+            stat['max_seconds'] = max(stat['max_seconds'], elapsed)
+            stat['total_seconds'] += elapsed
+            stat['last_status'] = status
+            stat['last_cycle_time'] = current_time
+        if elapsed > deadline:
+            self.logger.warning(f"策略 {name} 耗时 {elapsed:.2f} 秒，超过截止时间 {deadline:.2f} 秒。")
+        else:
+            self.logger.debug(f"策略 {name} 执行完成，耗时 {elapsed:.3f} 秒。")
+        return status
+
+    def run(self, strategies: List[Any], current_time: datetime,
+            market_data: Dict[str, Dict[str, pd.DataFrame]], event_data: Optional[pd.DataFrame]) -> Dict[str, str]:
+        """
+        运行一个周期的所有策略。
+
+        Returns:
+            Dict[str, str]: 策略名 -> 本周期状态 ('ok', 'error', 'timeout', 'skipped', 'coalesced')。
+        """
+        # 本周期所有策略共享的特征上下文 (窗口、指标按参数记忆)
+        context = BarContext(current_time, self.data_provider, market_data) if self.data_provider is not None else None
+        if self.mode == 'parallel':
+            return self._run_parallel(strategies, current_time, market_data, event_data, context)
+
+        results = {}
+        for strategy in strategies:
+            name = strategy.get_name()
+            self.logger.debug(f"执行策略: {name}...")
+            results[name] = self._execute(strategy, name, current_time, self._snapshot(market_data), event_data, context)
+        return results
+
+    def _ensure_executor(self, n_strategies: int) -> ThreadPoolExecutor:
+        if self._executor is None:
+            workers = self.max_workers or max(n_strategies, 1)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Strategy')
+            self.logger.info(f"策略并行执行线程池已创建，线程数: {workers}。")
+        return self._executor
+
+    def _submit(self, strategy: Any, name: str, args: tuple) -> Future:
+        """提交策略运行；结束时如有积压的最新数据 (busy_policy='latest') 则立即补跑。调用方需持有 self._lock。"""
+        future = self._executor.submit(self._execute, strategy, name, *args)
+        self._inflight[name] = future
+        future.add_done_callback(lambda _f, s=strategy, n=name: self._on_done(s, n))
+        return future
+
+    def _on_done(self, strategy: Any, name: str):
+        with self._lock:
+            pending = self._pending.pop(name, None)
+            if pending is None or self._executor is None:
+                return
+            try:
+                self.logger.debug(f"策略 {name} 上一次运行结束，使用积压的最新数据补跑。")
+                self._submit(strategy, name, pending[1])
+            except RuntimeError:
+                pass # 线程池已关闭
+
+    def _run_parallel(self, strategies: List[Any], current_time: datetime,
+                      market_data: Dict[str, Dict[str, pd.DataFrame]], event_data: Optional[pd.DataFrame],
+                      context: Optional[BarContext] = None) -> Dict[str, str]:
+        self._ensure_executor(len(strategies))
+        results: Dict[str, str] = {}
+        deadlines: Dict[Future, Tuple[str, float]] = {}
+        cycle_start = time.monotonic()
+
+        with self._lock:
+            for strategy in strategies:
+                name = strategy.get_name()
+                args = (current_time, self._snapshot(market_data), event_data, context)
+                inflight = self._inflight.get(name)
+                if inflight is not None and not inflight.done():
+                    stat = self._stat(name)
+                    if self.busy_policy == 'latest':
+                        self._pending[name] = (strategy, args)
+                        stat['coalesced'] += 1
+                        _RUNS_TOTAL.labels(name, 'coalesced').inc()
+                        results[name] = 'coalesced'
+                        self.logger.warning(f"策略 {name} 仍在运行上一周期，本周期数据将在其结束后补跑。")
+                    else:
+                        stat['skipped'] += 1
+                        _RUNS_TOTAL.labels(name, 'skipped').inc()
+                        results[name] = 'skipped'
+                        self.logger.warning(f"策略 {name} 仍在运行上一周期，跳过本周期。")
+                    continue
+                future = self._submit(strategy, name, args)
+                deadlines[future] = (name, cycle_start + self.deadline_for(name))
+
+        pending = set(deadlines)
+        while pending:
+            now = time.monotonic()
+            expired = {f for f in pending if deadlines[f][1] <= now}
+            for future in expired:
+                name = deadlines[future][0]
+                results[name] = 'timeout'
+                with self._lock:
+                    self._stat(name)['timeouts'] += 1
+                _RUNS_TOTAL.labels(name, 'timeout').inc()
+                self.logger.warning(f"策略 {name} 超过截止时间 {self.deadline_for(name):.2f} 秒仍未完成，将在后台继续运行。")
+            pending -= expired
+            if not pending:
+                break
+            timeout = min(deadlines[f][1] for f in pending) - now
+            done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                results[deadlines[future][0]] = future.result()
+
+        self.logger.debug(f"并行策略周期完成，耗时 {time.monotonic() - cycle_start:.3f} 秒: {results}")
+        return results
+
+    def shutdown(self, wait_running: bool = False):
+        """关闭线程池；wait_running=False 时不等待仍在运行的策略。"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._pending.clear()
+        if executor is not None:
+            executor.shutdown(wait=wait_running, cancel_futures=True)
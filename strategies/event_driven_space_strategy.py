@@ -2,15 +2,20 @@
 import logging
 import os
 import re
+import numpy as np
 import pandas as pd
 import pytz
 import yaml
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Union, Tuple
 
 from omegaconf import DictConfig, OmegaConf
 
 from strategies.core.strategy_base import StrategyBase
+from strategies.core.space_book import SpaceBook
+from strategies.core.records import InvalidationState, SpaceRecord
+from strategies.core.event_mapping import EventMappingIndex, parse_event_value
+from strategies.core.space_precompute import PrecomputedSpaces, build_symbol_spaces, space_definition_params
 from strategies.config import DEFAULT_CONFIG # 导入默认配置
 # The following imports are presumed safe as they were fine in engine.py individually
 # and are expected by StrategyBase or its typical usage pattern.
@@ -46,12 +51,16 @@ class EventDrivenSpaceStrategy(StrategyBase):
         )
         
         self.strategy_name = "EventDrivenSpaceStrategy_MD_Compliant" # Changed name for clarity
-        self.logger = logging.getLogger(self.strategy_name)
+        self.logger = self._make_logger(self.strategy_name)
         
         self.primary_timeframe = self.params.get('primary_timeframe', 'M30')
         # active_spaces: Dict[symbol, List[space_info_dict]]
         # space_info_dict will store all details about a space, including its state for expiry conditions
         self.active_spaces: Dict[str, List[Dict]] = {}
+        # 每个品种活跃空间的列式视图 (与 active_spaces[symbol] 共享同一个列表)，失效规则按列向量化判断
+        self._space_books: Dict[str, SpaceBook] = {}
+        # 离线预计算的空间表 (attach_precomputed_spaces)，参数扫描中跳过空间构建
+        self.precomputed_spaces: Optional[PrecomputedSpaces] = None
         
         # Parameters for space invalidation (can be moved to config / self.params)
         # self.space_invalidate_strong_breakout_multiplier = self.params.get('space_invalidate_strong_breakout_multiplier', 2.0) # Commented out, to be reviewed
@@ -85,6 +94,9 @@ class EventDrivenSpaceStrategy(StrategyBase):
                 self.logger.error("CRITICAL: Event mapping rules not found in merged configuration under 'event_mapping.event_mappings'. Strategy cannot map events to symbols.")
         except Exception as e:
             self.logger.error(f"An unexpected error occurred while loading event mapping rules from merged configuration: {e}", exc_info=True)
+        # 规则在初始化时编译为 国家 -> 规则 的索引、关键词匹配器和预解析的结果条件
+        self.event_mapping_index = EventMappingIndex(self.event_mapping_rules, self.logger)
+        self._event_mapping_index_source = self.event_mapping_rules
 
 
         # Parameters from config
@@ -177,42 +189,55 @@ class EventDrivenSpaceStrategy(StrategyBase):
         This method is typically called by the backtesting/live trading framework.
         """
         current_processing_time = pd.Timestamp.now(tz='UTC') # Internal processing timestamp
-        self.logger.debug(f"[{self.strategy_id}] process_new_data ENTRY. Framework time: {current_time}, Processing time: {current_processing_time}. Events: {'Yes' if latest_events is not None and not latest_events.empty else 'No'}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}] process_new_data ENTRY. Framework time: {current_time}, Processing time: {current_processing_time}. Events: {'Yes' if latest_events is not None and not latest_events.empty else 'No'}")
 
         # Plan Item 2.4 (was 5.2.1): Ensure current_time is UTC (already present)
         if current_time.tzinfo is None:
-            self.logger.debug(f"Framework current_time (input: {current_time}) is naive. Assuming UTC and localizing.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"Framework current_time (input: {current_time}) is naive. Assuming UTC and localizing.")
             current_time = current_time.tz_localize('UTC')
         elif str(current_time.tzinfo).upper() != 'UTC' and current_time.tzinfo != pytz.UTC: # Added pytz.UTC check
-            self.logger.debug(f"Framework current_time (input: {current_time}, tz: {current_time.tzinfo}) is not UTC. Converting to UTC.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"Framework current_time (input: {current_time}, tz: {current_time.tzinfo}) is not UTC. Converting to UTC.")
             current_time = current_time.tz_convert('UTC')
         else:
-            self.logger.debug(f"Framework current_time (input: {current_time}) is already UTC.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"Framework current_time (input: {current_time}) is already UTC.")
+
+        # 本时间点的共享上下文 (引擎/执行器未传入时自行创建)，组合的子策略复用其中的窗口和指标
+        self._ensure_bar_context(current_time, market_data)
 
         # 1. 处理新事件，更新博弈空间
         if latest_events is not None and not latest_events.empty:
             # Pass market_data to _process_events for boundary calculation
-            self.logger.debug(f"[{self.strategy_id}] Calling _process_events for {len(latest_events)} events.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_id}] Calling _process_events for {len(latest_events)} events.")
             self._process_events(latest_events, market_data, current_time) 
 
         # 2. 处理每个品种的K线数据，并检查空间失效条件
-        self.logger.debug(f"[{self.strategy_id}] Iterating market_data for bar processing. Symbols: {list(market_data.keys())}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}] Iterating market_data for bar processing. Symbols: {list(market_data.keys())}")
         for symbol, symbol_market_data in market_data.items():
             if not symbol_market_data or self.primary_timeframe not in symbol_market_data:
-                self.logger.debug(f"[{self.strategy_name}-{symbol}] No market data for primary timeframe {self.primary_timeframe} at {current_time}")
+                if self.logger.debug_enabled:
+                    self.logger.debug(f"[{self.strategy_name}-{symbol}] No market data for primary timeframe {self.primary_timeframe} at {current_time}")
                 continue
             
             primary_tf_data = symbol_market_data[self.primary_timeframe]
             if primary_tf_data.empty:
-                self.logger.debug(f"[{self.strategy_name}-{symbol}] Primary timeframe {self.primary_timeframe} data is empty at {current_time}")
+                if self.logger.debug_enabled:
+                    self.logger.debug(f"[{self.strategy_name}-{symbol}] Primary timeframe {self.primary_timeframe} data is empty at {current_time}")
                 continue
 
             # Plan Item 2.5 (was 5.2.2): Ensure primary_tf_data.index is UTC
             if primary_tf_data.index.tzinfo is None:
-                self.logger.debug(f"Primary TF data index for symbol {symbol} is naive. Assuming UTC and localizing.")
+                if self.logger.debug_enabled:
+                    self.logger.debug(f"Primary TF data index for symbol {symbol} is naive. Assuming UTC and localizing.")
                 primary_tf_data.index = primary_tf_data.index.tz_localize('UTC')
             elif str(primary_tf_data.index.tzinfo).upper() != 'UTC':
-                 self.logger.debug(f"Primary TF data index for symbol {symbol} is not UTC ({primary_tf_data.index.tzinfo}). Converting to UTC.")
+                 if self.logger.debug_enabled:
+                     self.logger.debug(f"Primary TF data index for symbol {symbol} is not UTC ({primary_tf_data.index.tzinfo}). Converting to UTC.")
                  primary_tf_data.index = primary_tf_data.index.tz_convert('UTC')
             # else: # No need for an else log here, can be verbose
                 # self.logger.debug(f"Primary TF data index for symbol {symbol} is already UTC.")
@@ -246,7 +271,8 @@ class EventDrivenSpaceStrategy(StrategyBase):
             current_bar_df.index = [current_time if hasattr(current_bar_series, 'name') and pd.isna(current_bar_series.name) else current_bar_series.name]
             
             # Now process the bar - checks invalidation, does trading decisions
-            self.logger.debug(f"[{self.strategy_id}] _process_bar for {symbol} at {current_time}. Bar info: {current_bar_df}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_id}] _process_bar for {symbol} at {current_time}. Bar info: {current_bar_df}")
             self._process_bar(symbol, current_bar_df, current_time, primary_tf_data)
             
         # 3. 检查跨策略信号共振
@@ -257,7 +283,7 @@ class EventDrivenSpaceStrategy(StrategyBase):
             
             # 定期清理旧信号（每天一次）
             if hasattr(self, 'last_signal_cleanup') and (current_time - self.last_signal_cleanup).total_seconds() > 86400:
-                self.signal_aggregator.clean_old_signals()
+                self.signal_aggregator.clean_old_signals(current_time)
                 self.last_signal_cleanup = current_time
             elif not hasattr(self, 'last_signal_cleanup'):
                 self.last_signal_cleanup = current_time
@@ -349,87 +375,21 @@ class EventDrivenSpaceStrategy(StrategyBase):
         event_id_from_data = event_data.get('id')
         event_log_id = str(event_id_from_data) if event_id_from_data is not None else f"event_at_{event_data.get('datetime', 'unknown_time')}"
 
-        self.logger.debug(f"[{self.strategy_id}] _map_event_to_symbol ENTRY for event_log_id: {event_log_id}, title: {event_title}, country: {event_country_code}")
-
-        actual_val = event_data.get('actual') 
-        forecast_val = event_data.get('forecast')
-        previous_val = event_data.get('previous')
-
-        logger.debug(f"[{self.strategy_id}] Mapping event (ID: {event_log_id}): Title='{event_title}', Country='{event_country_code}', A='{actual_val}', F='{forecast_val}', P='{previous_val}'")
-
-        for rule in self.event_mapping_rules:
-            rule_id = rule.get('id', 'unknown_rule')
-            rule_country_codes = [cc.upper() for cc in rule.get('country_codes', [])]
-            rule_title_keywords = [kw.lower() for kw in rule.get('title_keywords', [])]
-            outcome_condition = rule.get('outcome_is_good_condition')
-            symbols_reactions = rule.get('symbols_and_reactions', [])
-            
-            # impacted_currency = rule.get('impacted_currency', '') # Available if needed
-
-            if event_country_code not in rule_country_codes:
-                continue
-
-            title_match = False
-            if not rule_title_keywords: 
-                title_match = True 
-            else:
-                for keyword in rule_title_keywords:
-                    if keyword in event_title:
-                        title_match = True
-                        break
-            
-            if not title_match:
-                continue
-            
-            logger.debug(f"[{self.strategy_id}] Rule '{rule_id}' matched event country/title for event '{event_log_id}'.")
-
-            if not outcome_condition or not symbols_reactions:
-                logger.warning(f"[{self.strategy_id}] Rule '{rule_id}' for event '{event_log_id}' is missing 'outcome_is_good_condition' ('{outcome_condition}') or 'symbols_and_reactions'. Skipping rule.")
-                continue
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}] _map_event_to_symbol ENTRY for event_log_id: {event_log_id}, title: {event_title}, country: {event_country_code}")
 
-            is_good_outcome = self._evaluate_outcome_condition(outcome_condition, actual_val, forecast_val, previous_val)
-            outcome_label = "good" if is_good_outcome else "bad"
-            logger.debug(f"[{self.strategy_id}] Rule '{rule_id}', Event '{event_log_id}': Condition '{outcome_condition}' -> '{outcome_label}' (A='{actual_val}', F='{forecast_val}', P='{previous_val}')")
+        logger.debug(f"[{self.strategy_id}] Mapping event (ID: {event_log_id}): Title='{event_title}', Country='{event_country_code}', A='{event_data.get('actual')}', F='{event_data.get('forecast')}', P='{event_data.get('previous')}'")
 
-            for reaction in symbols_reactions:
-                symbol = reaction.get('symbol')
-                direction_if_good = str(reaction.get('direction_if_good', '')).upper()
-                direction_if_bad = str(reaction.get('direction_if_bad', '')).upper()
+        if self._event_mapping_index_source is not self.event_mapping_rules: # 规则列表被替换时重新编译
+            self.event_mapping_index = EventMappingIndex(self.event_mapping_rules, self.logger)
+            self._event_mapping_index_source = self.event_mapping_rules
+        matched_symbols_and_directions = self.event_mapping_index.map_event(event_data, event_log_id)
+        for result_entry in matched_symbols_and_directions:
+            if self.logger.info_enabled:
+                self.logger.info(f"Event {event_log_id} ('{event_title}') mapped to {result_entry['symbol']} with direction {result_entry['suggested_direction']} (base currency outcome: {result_entry['base_currency_outcome']}) by rule '{result_entry['rule_id']}'.")
 
-                if not symbol:
-                    logger.warning(f"[{self.strategy_id}] Rule '{rule_id}', Event '{event_log_id}': Reaction missing symbol. Skipping.")
-                    continue
-                
-                suggested_direction = None
-                if is_good_outcome:
-                    if not direction_if_good:
-                        logger.debug(f"[{self.strategy_id}] Rule '{rule_id}', Symbol {symbol}: Missing 'direction_if_good' for good outcome.")
-                        continue
-                    suggested_direction = direction_if_good
-                else: 
-                    if not direction_if_bad:
-                        logger.debug(f"[{self.strategy_id}] Rule '{rule_id}', Symbol {symbol}: Missing 'direction_if_bad' for bad outcome.")
-                        continue
-                    suggested_direction = direction_if_bad
-                
-                if suggested_direction not in ["BUY", "SELL", "HOLD", "NONE"]:
-                     logger.warning(f"[{self.strategy_id}] Rule '{rule_id}', Symbol {symbol}: Invalid suggested direction '{suggested_direction}'. Must be BUY, SELL, HOLD, or NONE.")
-                     continue 
-                
-                if suggested_direction in ["HOLD", "NONE"] or not suggested_direction: # Also catch empty string
-                    logger.info(f"[{self.strategy_id}] Rule '{rule_id}', Event '{event_log_id}', Symbol {symbol}: Suggested direction is '{suggested_direction}'. No trade signal generated.")
-                    continue
-
-                result_entry = {
-                    'symbol': symbol,
-                    'suggested_direction': suggested_direction,
-                    'base_currency_outcome': outcome_label,
-                    'rule_id': rule_id
-                }
-                matched_symbols_and_directions.append(result_entry)
-                self.logger.info(f"Event {event_log_id} ('{event_title}') mapped to {symbol} with direction {suggested_direction} (base currency outcome: {outcome_label}) by rule '{rule_id}'.")
-
-        self.logger.debug(f"[{self.strategy_id}] _map_event_to_symbol EXIT for event_log_id: {event_log_id}. Found {len(matched_symbols_and_directions)} matches.")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}] _map_event_to_symbol EXIT for event_log_id: {event_log_id}. Found {len(matched_symbols_and_directions)} matches.")
         return matched_symbols_and_directions
 
     def _get_pip_size(self, symbol: str) -> Optional[float]:
@@ -494,7 +454,8 @@ class EventDrivenSpaceStrategy(StrategyBase):
         """获取指定品种在给定时间点之前的最近N条M30 K线数据"""
         # This method uses self.data_provider to fetch historical data.
         # Ensure data_provider is correctly initialized and accessible.
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] _get_recent_m30_bars ENTRY. current_bar_time: {current_bar_time}, num_bars: {num_bars}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] _get_recent_m30_bars ENTRY. current_bar_time: {current_bar_time}, num_bars: {num_bars}")
 
         if self.data_provider is None:
             self.logger.error(f"[{self.strategy_id}-{symbol}] Data provider is not available. Cannot fetch M30 bars.")
@@ -504,16 +465,21 @@ class EventDrivenSpaceStrategy(StrategyBase):
             self.logger.warning(f"[{self.strategy_id}-{symbol}] num_bars requested for _get_recent_m30_bars must be positive, got {num_bars}.")
             return None
 
-        lookback_timedelta = pd.Timedelta(minutes=(num_bars + 4) * 30) 
-        start_time_utc = current_bar_time - lookback_timedelta
-
         try:
-            hist_df = self.data_provider.get_historical_prices(
-                symbol=symbol,
-                start_time_utc=start_time_utc,
-                end_time_utc=current_bar_time, 
-                timeframe=self.primary_timeframe 
-            )
+            # 优先使用内存窗口 (二分查找，无排序、无磁盘读取)
+            if hasattr(self.data_provider, 'get_window'):
+                hist_df = self._get_window(symbol, self.primary_timeframe, current_bar_time, num_bars)
+                if hist_df is None or hist_df.empty:
+                    self.logger.warning(f"[{self.strategy_id}-{symbol}] No {self.primary_timeframe} bars available at or before {current_bar_time}.")
+                    return None
+                # 回测开头的每根K线都会命中，按 logging.sample_every 采样
+                if len(hist_df) < num_bars and self.logger.sampled(f"insufficient_m30:{symbol}"):
+                    self.logger.warning(f"[{self.strategy_id}-{symbol}] Insufficient M30 data: got {len(hist_df)}, needed {num_bars} up to {current_bar_time}.")
+                return hist_df
+
+            lookback_timedelta = pd.Timedelta(minutes=(num_bars + 4) * 30) 
+            start_time_utc = current_bar_time - lookback_timedelta
+            hist_df = self._get_historical_prices(symbol, start_time_utc, current_bar_time, self.primary_timeframe)
 
             if hist_df is None or hist_df.empty:
                 self.logger.warning(f"[{self.strategy_id}-{symbol}] No historical M30 data returned by data_provider for range {start_time_utc} to {current_bar_time}.")
@@ -521,7 +487,7 @@ class EventDrivenSpaceStrategy(StrategyBase):
 
             hist_df = hist_df.sort_index(ascending=True)
 
-            if len(hist_df) < num_bars:
+            if len(hist_df) < num_bars and self.logger.sampled(f"insufficient_m30:{symbol}"):
                 self.logger.warning(f"[{self.strategy_id}-{symbol}] Insufficient M30 data: got {len(hist_df)}, needed {num_bars} for range {start_time_utc} to {current_bar_time}.")
                 return hist_df # Return what we have
 
@@ -532,167 +498,163 @@ class EventDrivenSpaceStrategy(StrategyBase):
             return None
 
     def _process_events(self, events_df: pd.DataFrame, market_data: Dict[str, Dict[str, pd.DataFrame]], current_processing_time: pd.Timestamp):
-        self.logger.debug(f"[{self.strategy_id}] ENTERING _process_events. Number of events: {len(events_df)}, Current Time: {current_processing_time}") # P2.I.1.2 Log
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}] ENTERING _process_events. Number of events: {len(events_df)}, Current Time: {current_processing_time}") # P2.I.1.2 Log
         """
         Processes new economic events to identify tradable opportunities and create/update spaces.
         """
-        self.logger.debug(f"[{self.strategy_id}] _process_events ENTRY. Processing {len(events_df)} events at {current_processing_time}.")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}] _process_events ENTRY. Processing {len(events_df)} events at {current_processing_time}.")
 
         # Filter events based on impact, currency, and keywords as per parameters
         if events_df.empty:
-            self.logger.debug(f"[{self.strategy_id}] No new events to process at {current_processing_time}.")
-            self.logger.debug(f"[{self.strategy_id}] EXITING _process_events due to empty events_df.") # P2.I.1.2 Log
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_id}] No new events to process at {current_processing_time}.")
+                self.logger.debug(f"[{self.strategy_id}] EXITING _process_events due to empty events_df.") # P2.I.1.2 Log
             return
 
-        for index, event in events_df.iterrows():
-            event_dict = event.to_dict()
-            event_log_id = str(event_dict.get('id', f"event_idx_{index}"))
-            self.logger.debug(f"[{self.strategy_id}] Processing event: {event_log_id} - {event_dict.get('title')}")
-
-            mapped_opportunities = self._map_event_to_symbol(event_dict)
-
-            if not mapped_opportunities:
-                self.logger.debug(f"[{self.strategy_id}] Event {event_log_id} did not map to any opportunity.")
-                continue
+        # 整个事件表一次性规范化并映射到品种，再按目标品种分组，每个品种只取一次M30数据
+        events = self._normalize_events(events_df, current_processing_time)
+        if self.precomputed_spaces is not None:
+            events = self._create_precomputed_spaces(events, current_processing_time)
+        opportunities = self._map_events_to_opportunities(events)
+        if opportunities.empty:
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_id}] None of the {len(events_df)} events mapped to an opportunity.")
+        for symbol, group in opportunities.groupby('symbol', sort=False):
+            self._create_spaces_for_symbol(symbol, group, market_data, current_processing_time)
+
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}] _process_events EXIT.")
+
+    def _normalize_events(self, events_df: pd.DataFrame, current_processing_time: pd.Timestamp) -> pd.DataFrame:
+        """
+        一次性规范化事件表: event_id (缺失时为 event_idx_<行号>)、UTC 的 event_time (缺失或无法解析时为当前处理时间)
+        以及数值化的 actual / forecast / previous (如 "250K"、"0.4%")。
+        """
+        events = events_df.copy()
+        if 'id' in events.columns:
+            ids = events['id']
+            events['event_id'] = [str(v) if pd.notna(v) else f"event_idx_{idx}" for idx, v in zip(events.index, ids)]
+        else:
+            events['event_id'] = [f"event_idx_{idx}" for idx in events.index]
 
-            for opportunity in mapped_opportunities:
+        if 'datetime' in events.columns:
+            event_times = pd.to_datetime(events['datetime'], errors='coerce', utc=True, format='mixed')
+        else:
+            event_times = pd.Series(pd.NaT, index=events.index, dtype='datetime64[ns, UTC]')
+        missing_times = event_times.isna()
+        if missing_times.any():
+            self.logger.warning(f"[{self.strategy_id}] {int(missing_times.sum())} events have no parsable datetime (e.g. {events.loc[missing_times, 'event_id'].iloc[0]}). Using current_processing_time: {current_processing_time}")
+            event_times = event_times.where(~missing_times, current_processing_time)
+        events['event_time'] = event_times
+
+        for col in ('actual', 'forecast', 'previous'):
+            if col in events.columns:
+                events[col] = events[col].map(parse_event_value).astype(float)
+        return events
+
+    def _map_events_to_opportunities(self, events: pd.DataFrame) -> pd.DataFrame:
+        """把规范化后的事件映射为交易机会表 (每个 事件 x 品种 一行: symbol, event_id, event_title, event_time, suggested_direction, rule_id)。"""
+        rows = []
+        for record, event_time in zip(events.to_dict('records'), events['event_time']):
+            event_log_id = record['event_id']
+            for opportunity in self._map_event_to_symbol(record):
                 symbol = opportunity.get('symbol')
                 if not symbol:
                     self.logger.warning(f"[{self.strategy_id}] Mapped opportunity for event {event_log_id} is missing 'symbol'. Skipping.")
                     continue
-                
-                # Manage active spaces: only allow a certain number of spaces per event or overall
-                active_spaces_for_symbol = self.active_spaces.get(symbol, [])
-                
-                # This logic is a bit simplified, needs to consider if existing spaces are from *this* event
-                # or if the limit is per-symbol regardless of event.
-                # For now, assuming a simple count per symbol based on active_spaces.
-                # A more robust approach would tag spaces with their originating event_id.
-                
-                # Example check: if len(active_spaces_for_symbol) >= self.max_active_spaces_per_event:
-                # self.logger.info(f"Max active spaces ({self.max_active_spaces_per_event}) reached for {symbol} from event {event_log_id}. Not creating new space.")
-                # continue
-                # For P0, let's assume we create a space if mapped. Limit management is for later.
+                rows.append((symbol, event_log_id, record.get('title', 'N/A'), event_time,
+                             opportunity.get('suggested_direction'), opportunity.get('rule_id')))
+        return pd.DataFrame(rows, columns=['symbol', 'event_id', 'event_title', 'event_time', 'suggested_direction', 'rule_id'])
+
+    def _create_spaces_for_symbol(self, symbol: str, opportunities: pd.DataFrame,
+                                  market_data: Dict[str, Dict[str, pd.DataFrame]], current_processing_time: pd.Timestamp):
+        """用品种的同一份M30数据为该品种的所有事件创建空间 (事件时间一次 searchsorted 定位到所在K线)。"""
+        m30_data = market_data.get(symbol, {}).get(self.primary_timeframe)
+        if m30_data is None or m30_data.empty:
+            self.logger.warning(f"No {self.primary_timeframe} data available for {symbol} to calculate spaces for {len(opportunities)} events ({', '.join(opportunities['event_id'])}). Cannot create spaces.")
+            return
+        pip_size = self._get_pip_size(symbol)
+        if not pip_size:
+            self.logger.warning(f"[{self.strategy_id}-{symbol}] No pip size available. Cannot create spaces for {len(opportunities)} events.")
+            return
 
-                self.logger.info(f"Event {event_log_id} mapped to {symbol}. Proceeding to calculate space boundaries.")
-                
-                # Fetch M30 data for space calculation
-                event_time_utc_series = event.get('datetime') 
-                if pd.isna(event_time_utc_series):
-                    self.logger.warning(f"Event {event_log_id} for {symbol} has no datetime. Using current_processing_time: {current_processing_time}")
-                    event_time_utc = current_processing_time
-                else:
-                    # Ensure event_time_utc is a Timestamp and timezone-aware (UTC)
-                    if not isinstance(event_time_utc_series, pd.Timestamp):
-                        try:
-                            event_time_utc = pd.Timestamp(event_time_utc_series)
-                        except Exception as e_ts:
-                            self.logger.error(f"Could not parse event datetime '{event_time_utc_series}' for event {event_log_id}. Error: {e_ts}. Using current processing time.")
-                            event_time_utc = current_processing_time
-                    else:
-                        event_time_utc = event_time_utc_series
-
-                    if event_time_utc.tzinfo is None:
-                        event_time_utc = event_time_utc.tz_localize('UTC')
-                    elif str(event_time_utc.tzinfo).upper() != 'UTC':
-                        event_time_utc = event_time_utc.tz_convert('UTC')
-                
-                # Use the market_data passed into this function
-                symbol_market_data = market_data.get(symbol, {})
-                m30_data_for_space_calc = symbol_market_data.get(self.primary_timeframe)
+        self.logger.info(f"[{self.strategy_id}-{symbol}] Calculating spaces for {len(opportunities)} mapped events.")
+        spaces = build_symbol_spaces(symbol, opportunities, m30_data, pip_size, self.space_duration_minutes, self.min_space_height_pips)
+        skipped = set(opportunities['event_id']) - set(spaces['event_id'])
+        if skipped:
+            self.logger.warning(f"Could not calculate space boundaries for {symbol} from events {sorted(skipped)} (before the first {self.primary_timeframe} bar or below {self.min_space_height_pips} pips).")
+        self._add_spaces_from_table(spaces, current_processing_time)
+
+    def _add_spaces_from_table(self, spaces: pd.DataFrame, current_processing_time: pd.Timestamp):
+        """把空间表 (space_precompute.SPACE_COLUMNS) 的行转换为空间记录 (SpaceRecord) 并加入 active_spaces。"""
+        for row in spaces.to_dict('records'):
+            symbol = row['symbol']
+            space_details = SpaceRecord(
+                space_high=float(row['space_high']),
+                space_low=float(row['space_low']),
+                space_height_pips=float(row['space_height_pips']),
+                valid_until=row['valid_until'],
+                # 空间由初始脉冲K线形成，之后的K线才参与失效判断和交易逻辑
+                initial_pulse_end_time=row['initial_pulse_end_time'],
+                initial_direction=int(row['initial_direction']),
+                # Add originating event details to space_details
+                event_id=row['event_id'],
+                event_title=row['event_title'],
+                event_time=row['event_time'],
+                symbol=symbol, # ensure symbol is in space_details
+                creation_time=current_processing_time, # Add space creation time
+            )
+            # Initialize invalidation state for the new space
+            self._initialize_space_invalidation_state(space_details) # P0 - Step 4.1
 
-                if m30_data_for_space_calc is None or m30_data_for_space_calc.empty:
-                    self.logger.warning(f"No {self.primary_timeframe} data available for {symbol} at event time {event_time_utc} to calculate space for event {event_log_id}. Cannot create space.")
-                    continue
-                
-                # Ensure m30_data_for_space_calc index is UTC (similar to process_new_data)
-                if m30_data_for_space_calc.index.tzinfo is None:
-                    m30_data_for_space_calc.index = m30_data_for_space_calc.index.tz_localize('UTC')
-                elif str(m30_data_for_space_calc.index.tzinfo).upper() != 'UTC':
-                    m30_data_for_space_calc.index = m30_data_for_space_calc.index.tz_convert('UTC')
-
-                space_details = self._calculate_space_boundaries_from_initial_move(symbol, event_time_utc, m30_data_for_space_calc)
-
-                if space_details:
-                    # Add originating event details to space_details
-                    space_details['event_id'] = event_log_id
-                    space_details['event_title'] = event_dict.get('title', 'N/A')
-                    space_details['event_time'] = event_time_utc.isoformat()
-                    space_details['symbol'] = symbol # ensure symbol is in space_details
-                    space_details['creation_time'] = current_processing_time.isoformat() # Add space creation time
-
-                    # Initialize invalidation state for the new space
-                    self._initialize_space_invalidation_state(space_details) # P0 - Step 4.1
-
-                    if symbol not in self.active_spaces:
-                        self.active_spaces[symbol] = []
-                    
-                    # Check if a similar space (e.g., from the same event or very close in time/price) already exists
-                    # This is a placeholder for more advanced duplicate/overlap checking.
-                    # For now, we add it if calculable.
-                    self.active_spaces[symbol].append(space_details)
-                    self.logger.info(f"New space created for {symbol} from event {event_log_id}: High={space_details['space_high']:.5f}, Low={space_details['space_low']:.5f}, Valid until={space_details['valid_until']}")
-                else:
-                    self.logger.warning(f"Could not calculate space boundaries for {symbol} from event {event_log_id}.")
+            self.active_spaces.setdefault(symbol, []).append(space_details)
+            self._on_space_added(space_details)
+            if self.logger.info_enabled:
+                self.logger.info(f"New space created for {symbol} from event {row['event_id']}: High={space_details['space_high']:.5f}, Low={space_details['space_low']:.5f}, Height={space_details['space_height_pips']:.2f} pips, Valid until={space_details['valid_until']}")
 
-        self.logger.debug(f"[{self.strategy_id}] _process_events EXIT.")
+    def attach_precomputed_spaces(self, precomputed: Optional[PrecomputedSpaces]) -> bool:
+        """
+        使用离线预计算的空间表 (见 strategies.core.space_precompute)。表的空间定义参数与本策略不一致时不使用。
+
+        Returns:
+            bool: 是否已启用该表。
+        """
+        if precomputed is not None and precomputed.params != space_definition_params(self):
+            self.logger.warning(f"[{self.strategy_id}] Precomputed spaces were built with {precomputed.params}, strategy uses {space_definition_params(self)}. Ignoring precomputed spaces.")
+            precomputed = None
+        self.precomputed_spaces = precomputed
+        return precomputed is not None
+
+    def _create_precomputed_spaces(self, events: pd.DataFrame, current_processing_time: pd.Timestamp) -> pd.DataFrame:
+        """为已预计算的事件直接从空间表创建空间，返回未被预计算覆盖的事件。"""
+        keys = PrecomputedSpaces.make_keys(events['event_id'], events['event_time'])
+        covered = np.array([self.precomputed_spaces.covers(key) for key in keys], dtype=bool)
+        for key in (k for k, c in zip(keys, covered) if c):
+            self._add_spaces_from_table(self.precomputed_spaces.rows_for(key), current_processing_time)
+        return events.loc[~covered]
 
     def _calculate_space_boundaries_from_initial_move(self, symbol: str, event_time_utc: pd.Timestamp, m30_data: pd.DataFrame) -> Optional[Dict[str, Any]]:
         self.logger.debug(f"[{self.strategy_id}-{symbol}] _calculate_space_boundaries_from_initial_move ENTRY. Event time: {event_time_utc}")
-        # Find the M30 bar that contains or immediately follows the event time
-        # Ensure m30_data index is sorted if not already
-        if not m30_data.index.is_monotonic_increasing:
-            m30_data = m30_data.sort_index()
-
-        if event_time_utc not in m30_data.index:
-            # Try to find the nearest preceding bar if direct match fails (e.g. event time is off-market)
-            try:
-                loc = m30_data.index.get_loc(event_time_utc, method='ffill')
-                event_time_on_bar = m30_data.index[loc]
-                self.logger.debug(f"[{self.strategy_id}-{symbol}] Event time {event_time_utc} not directly in M30 index. Using ffill, mapped to bar at {event_time_on_bar}.")
-                event_time_utc = event_time_on_bar # Adjust event_time_utc to an actual bar time
-            except KeyError:
-                self.logger.error(f"[{self.strategy_id}-{symbol}] _calculate_space_boundaries: Event time {event_time_utc} not in M30 data index and ffill failed. Data range: {m30_data.index.min()}-{m30_data.index.max()}")
-                return None        
-        
-        start_idx = m30_data.index.get_loc(event_time_utc) # No method needed now as we ensured it or ffilled
-
-        # Plan item 2.1.3 (refined check): If start_idx refers to a bar that is too late in a very short df
-        if start_idx >= len(m30_data):
-             self.logger.warning(f"[{self.strategy_id}-{symbol}] _calculate_space_boundaries: Event time {event_time_utc} maps to an index beyond available bars after ffill. len(m30_data)={len(m30_data)}, start_idx={start_idx}")
-             return None
-
-        initial_move_bar = m30_data.iloc[start_idx]
-        if initial_move_bar.empty:
-            self.logger.warning(f"No M30 bar found at or immediately after event time {event_time_utc} for {symbol}. Cannot determine initial move.")
+        pip_size = self._get_pip_size(symbol)
+        if m30_data is None or m30_data.empty or not pip_size:
             return None
-
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] Initial move bar for event at {event_time_utc} identified as bar at {initial_move_bar.name}")
-
-        # Define space boundaries based on this bar's high and low
-        space_high = initial_move_bar['high'].iloc[0]
-        space_low = initial_move_bar['low'].iloc[0]
-        space_height_pips = (space_high - space_low) / self._get_pip_size(symbol)
-
-        self.logger.info(f"[{self.strategy_id}-{symbol}] Calculated initial space: High={space_high:.5f}, Low={space_low:.5f}, Height={space_height_pips:.2f} pips. Min height: {self.min_space_height_pips} pips.")
-
-        if space_height_pips < self.min_space_height_pips:
-            self.logger.info(f"Calculated space height {space_height_pips:.2f} pips for {symbol} is less than minimum {self.min_space_height_pips} pips. Space not created.")
-            self.logger.debug(f"[{self.strategy_id}-{symbol}] _calculate_space_boundaries_from_initial_move EXIT due to insufficient height.")
+        # The M30 bar that contains the event time (or the nearest preceding bar) defines the space
+        opportunity = pd.DataFrame({'symbol': [symbol], 'event_id': [''], 'event_title': [''], 'suggested_direction': [''],
+                                    'rule_id': [''], 'event_time': pd.DatetimeIndex([pd.Timestamp(event_time_utc)])})
+        spaces = build_symbol_spaces(symbol, opportunity, m30_data, pip_size, self.space_duration_minutes, self.min_space_height_pips)
+        if spaces.empty:
+            self.logger.info(f"[{self.strategy_id}-{symbol}] No space for event at {event_time_utc}: before the first M30 bar or height below {self.min_space_height_pips} pips.")
             return None
-
-        # Calculate valid_until time
-        event_bar_time_utc = initial_move_bar.name
-        valid_until = event_bar_time_utc + timedelta(minutes=self.space_duration_minutes)
-
-        space_details = {
-            "space_high": space_high,
-            "space_low": space_low,
-            "space_height_pips": space_height_pips,
-            "valid_until": valid_until.isoformat()
+        row = spaces.iloc[0]
+        return {
+            "space_high": float(row['space_high']),
+            "space_low": float(row['space_low']),
+            "space_height_pips": float(row['space_height_pips']),
+            "valid_until": row['valid_until'].isoformat(),
+            "initial_pulse_end_time": row['initial_pulse_end_time'],
         }
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] _calculate_space_boundaries_from_initial_move EXIT. Space details created.")
-        return space_details
 
     def _check_and_handle_space_invalidation(self, space: Dict[str, Any], bar_data: pd.Series, current_processing_time: pd.Timestamp) -> bool:
         """
@@ -961,62 +923,77 @@ class EventDrivenSpaceStrategy(StrategyBase):
         return False # Should not be reached if phase is one of the above
 
     def _process_bar(self, symbol: str, current_bar_df: pd.DataFrame, current_processing_time: pd.Timestamp, all_symbol_m30_data: pd.DataFrame):
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] ENTERING _process_bar. Current Time: {current_processing_time}, Bar Time: {current_bar_df['time'].iloc[0] if not current_bar_df.empty else 'N/A'}") # P2.I.1.2 Log
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] ENTERING _process_bar. Current Time: {current_processing_time}, Bar Time: {current_bar_df.index[0] if not current_bar_df.empty else 'N/A'}") # P2.I.1.2 Log
         """
         Processes a new bar for a given symbol:
         - Checks for space invalidation.
         - Calls trading logic for valid spaces.
         """
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] _process_bar ENTRY for time {current_processing_time}. Bar timestamp: {current_bar_df['time'].iloc[0]}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] _process_bar ENTRY for time {current_processing_time}. Bar timestamp: {current_bar_df.index[0]}")
         current_bar_series = current_bar_df.iloc[0]
 
         # Retrieve active spaces for the current symbol
-        active_spaces_for_symbol = self.active_spaces.get(symbol, [])
-        
-        # Iterate over a copy for safe modification if needed, though direct status update is common.
-        # The actual removal/filtering of inactive spaces can be done here or periodically.
-        for space in active_spaces_for_symbol[:]: # Iterate copy
-            if space['status'] != 'active':
-                continue
+        active_spaces_for_symbol = self.active_spaces.get(symbol)
+        if not active_spaces_for_symbol:
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_id}-{symbol}] _process_bar EXIT. No active spaces.")
+            return
 
-            space_id = space.get('id', 'unknown_space')
-            space_formation_end_time = space.get('initial_pulse_end_time')
+        # The book shares the list object with active_spaces[symbol]; rebuild it if the list was replaced
+        book = self._space_books.get(symbol)
+        if book is None or book.spaces is not active_spaces_for_symbol:
+            book = SpaceBook(active_spaces_for_symbol)
+            self._space_books[symbol] = book
+
+        # Evaluate all invalidation rules for every space of the symbol against this bar in one pass
+        result = book.evaluate(
+            current_bar_series.name,
+            current_bar_series['high'], current_bar_series['low'], current_bar_series['close'],
+            current_processing_time,
+            self.strong_breakout_N_bars, self.oscillation_M_times, self.retrace_confirmation_buffer_ratio,
+            check_rules=self._get_pip_size(symbol) is not None,
+        )
 
-            if not isinstance(space_formation_end_time, pd.Timestamp):
-                self.logger.error(f"[{symbol}-{space_id}] Space is missing a valid 'initial_pulse_end_time'. Marking as error and skipping.")
-                space['status'] = 'inactive_error_missing_creation_time'
-                space['invalidation_reason'] = 'error_missing_creation_time'
-                space['invalidation_time'] = current_processing_time
-                continue
-            
-            if current_bar_series.name <= space_formation_end_time:
-                # self.logger.debug(f"[{symbol}-{space_id}] Skipping bar at {current_bar_series.name} as it is not strictly after space formation end time {space_formation_end_time}.")
-                continue
-            
+        for idx, reason in result['invalidated']:
+            space = active_spaces_for_symbol[idx]
+            space_id = space.get('id', 'unknown_space')
+            if self.logger.info_enabled:
+                self.logger.info(f"[{symbol}-{space_id}] Space became inactive. Reason: {reason}. Status: {space.get('status')}.")
+            if space.get('trade_active') and space.get('entry_order_id'):
+                self.logger.info(f"[{symbol}-{space_id}] Space invalidated with an active trade (Order ID: {space['entry_order_id']}). Position should be closed.")
+                # Actual trade closing logic needs to be implemented here or via signal to ExecutionEngine
+                # e.g., self.execution_engine.close_trade_for_space(space_id, reason=space.get('invalidation_reason'))
+
+        eligible = result['eligible']
+        for idx in eligible:
+            space = active_spaces_for_symbol[idx]
             space['last_bar_time'] = current_bar_series.name
             space['last_close_price'] = current_bar_series['close']
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_id}-{symbol}] Space {space.get('id', 'unknown_space')} remains active. Processing trading logic.") # P2.I.1.2 Log
+            self._execute_trading_logic(symbol, current_bar_df.copy(), space, active_spaces_for_symbol) # Pass a copy of current_bar_df
+
+        # Clean up invalidated spaces for the symbol (trading logic may also have deactivated spaces)
+        book.sync_status(eligible)
+        removed = book.compact()
+        if removed:
+            self._on_spaces_removed(removed)
+            if not active_spaces_for_symbol:
+                del self.active_spaces[symbol] # Remove symbol entry if no valid spaces left
+                del self._space_books[symbol]
 
-            is_invalidated = self._check_and_handle_space_invalidation(space, current_bar_series, current_processing_time)
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] _process_bar EXIT. Active spaces for symbol: {len(self.active_spaces.get(symbol, []))}") # P2.I.1.2 Log
 
-            if is_invalidated:
-                self.logger.info(f"[{symbol}-{space_id}] Space became inactive. Reason: {space.get('invalidation_reason', 'unknown')}. Status: {space.get('status')}.")
-                if space.get('trade_active') and space.get('entry_order_id'):
-                    self.logger.info(f"[{symbol}-{space_id}] Space invalidated with an active trade (Order ID: {space['entry_order_id']}). Position should be closed.")
-                    # Actual trade closing logic needs to be implemented here or via signal to ExecutionEngine
-                    # e.g., self.execution_engine.close_trade_for_space(space_id, reason=space.get('invalidation_reason'))
-            else:
-                self.logger.debug(f"[{self.strategy_id}-{symbol}] Space {space_id} remains active. Processing trading logic.") # P2.I.1.2 Log
-                self._execute_trading_logic(symbol, current_bar_df.copy(), space, self.active_spaces[symbol]) # Pass a copy of current_bar_df
-        
-        # Clean up invalidated spaces for the symbol
-        # 计算已失效的空间数量
-        num_invalidated = len([s for s in self.active_spaces.get(symbol, []) if s.get('status') != 'active'])
-        if num_invalidated > 0:
-            self.active_spaces[symbol] = [s for s in self.active_spaces[symbol] if s['status'] == 'active']
-            if not self.active_spaces[symbol]:
-                del self.active_spaces[symbol] # Remove symbol entry if no valid spaces left
+    def _on_space_added(self, space: dict) -> None:
+        """新空间加入 active_spaces 后调用 (子类可登记按空间保存的状态，例如关键时间点)。"""
+        pass
 
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] _process_bar EXIT. Active spaces for symbol: {len(self.active_spaces.get(symbol, []))}") # P2.I.1.2 Log
+    def _on_spaces_removed(self, spaces: List[dict]) -> None:
+        """失效或到期的空间从 active_spaces 删除后调用 (子类据此丢弃按空间保存的状态)。"""
+        pass
 
     def _execute_trading_logic(self, symbol: str, current_bar: pd.DataFrame, space_info: dict, all_symbol_spaces: list):
         # Implement trading logic based on the current bar and space_info
@@ -1024,26 +1001,37 @@ class EventDrivenSpaceStrategy(StrategyBase):
         # and the current bar data.
         # This is a placeholder and should be replaced with the actual implementation of trading logic.
         event_id = space_info.get('event_id', 'N/A')
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] _execute_trading_logic ENTRY for space (event {event_id}). Bar time: {current_bar['time'].iloc[0]}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] _execute_trading_logic ENTRY for space (event {event_id}). Bar time: {current_bar['time'].iloc[0]}")
         # self.logger.debug(f"Space details: {space_info}") # Can be very verbose
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] _execute_trading_logic EXIT (placeholder). No action taken.")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] _execute_trading_logic EXIT (placeholder). No action taken.")
         pass
 
     def _initialize_space_invalidation_state(self, space: dict):
         symbol = space.get('symbol', 'UnknownSymbol')
         event_id = space.get('event_id', 'N/A') # Assuming event_id is added to space dict
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] _initialize_space_invalidation_state ENTRY for space (event {event_id})")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] _initialize_space_invalidation_state ENTRY for space (event {event_id})")
         # For Strong Breakout
         space['sb_pending_confirmation_direction'] = None # 'UP' or 'DOWN'
         space['sb_pending_confirmation_level'] = None   # Price level that was broken
         space['brc_confirmation_level'] = None          # Price level that needs to be broken for confirmation
 
+        # Oscillation / breakout-retrace-confirmation state (evaluated column-wise by SpaceBook)
+        space.setdefault('status', 'active')
+        space['invalidation_status'] = InvalidationState()
+        space['osc_boundary_crossings'] = 0
+        space['brc_phase'] = None
+        space['brc_state'] = None
+
         # General state
         space['is_valid'] = True
         space['invalidation_reason'] = None
         space['invalidation_time'] = None
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] Initialized invalidation state for space (event {event_id}): sb_dir={space['sb_pending_confirmation_direction']}, osc_cross={space['osc_boundary_crossings']}, brc_state={space['brc_state']}")
-        self.logger.debug(f"[{self.strategy_id}-{symbol}] _initialize_space_invalidation_state EXIT.")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] Initialized invalidation state for space (event {event_id}): sb_dir={space['sb_pending_confirmation_direction']}, osc_cross={space['osc_boundary_crossings']}, brc_state={space['brc_state']}")
+            self.logger.debug(f"[{self.strategy_id}-{symbol}] _initialize_space_invalidation_state EXIT.")
 
     def _submit_signal(self, symbol: str, action: str, timestamp: datetime, 
                       confidence: float = 1.0, metadata: Dict[str, Any] = None) -> None:
@@ -1059,7 +1047,8 @@ class EventDrivenSpaceStrategy(StrategyBase):
         """
         # 检查是否启用信号聚合器
         if not self.use_signal_aggregator:
-            self.logger.debug(f"[{self.strategy_name}] 信号聚合器已禁用，不提交信号")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_name}] 信号聚合器已禁用，不提交信号")
             return
             
         # 检查信号聚合器是否已初始化
@@ -1077,6 +1066,7 @@ class EventDrivenSpaceStrategy(StrategyBase):
                 confidence=confidence,
                 metadata=metadata
             )
-            self.logger.debug(f"[{self.strategy_name}] 信号已提交到聚合器: {symbol} {action}, 置信度={confidence:.2f}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_name}] 信号已提交到聚合器: {symbol} {action}, 置信度={confidence:.2f}")
         except Exception as e:
             self.logger.error(f"[{self.strategy_name}] 提交信号到聚合器时发生错误: {e}", exc_info=True)
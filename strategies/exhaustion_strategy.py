@@ -94,9 +94,21 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
         self.logger.info(f"[{self.strategy_name}-{self.strategy_id}] Signal Aggregator enabled: {self.use_signal_aggregator}")
         self.logger.info(f"[{self.strategy_name}-{self.strategy_id}] Initialization complete.")
 
+    def get_data_requirements(self) -> Dict[str, Dict[str, Any]]:
+        """衰竭检测只使用 OHLC，回看深度由 exhaustion_lookback / RSI 参数决定。"""
+        requirements = super().get_data_requirements()
+        lookback_needed = max(self.exhaustion_lookback, self.rsi_period + self.rsi_divergence_lookback) + 5
+        for tf_requirement in requirements.values():
+            if not self.params.get('data_columns'):
+                tf_requirement['columns'] = ['open', 'high', 'low', 'close']
+            tf_requirement['lookback_bars'] = max(tf_requirement.get('lookback_bars') or 0, lookback_needed)
+        return requirements
+
     def _execute_trading_logic(self, symbol: str, current_bar: dict, space_info: dict, all_symbol_spaces: list):
-        self.logger.info(f"[{self.strategy_name}-{self.strategy_id}][{symbol}] ENTER _execute_trading_logic. Space ID: {space_info.get('id', 'N/A')}, Event: {space_info.get('event_name', 'UnknownEvent')}, Bar Time: {current_bar.get('time')}")
-        self.logger.debug(f"[{self.strategy_name}-{self.strategy_id}][{symbol}] _execute_trading_logic: Current bar details: Open={current_bar.get('open')}, High={current_bar.get('high')}, Low={current_bar.get('low')}, Close={current_bar.get('close')}")
+        if self.logger.info_enabled:
+            self.logger.info(f"[{self.strategy_name}-{self.strategy_id}][{symbol}] ENTER _execute_trading_logic. Space ID: {space_info.get('id', 'N/A')}, Event: {space_info.get('event_name', 'UnknownEvent')}, Bar Time: {current_bar.get('time')}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_name}-{self.strategy_id}][{symbol}] _execute_trading_logic: Current bar details: Open={current_bar.get('open')}, High={current_bar.get('high')}, Low={current_bar.get('low')}, Close={current_bar.get('close')}")
         """
         执行衰竭策略的交易逻辑。
 
@@ -111,7 +123,8 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
         high_price = current_bar['high']
         low_price = current_bar['low']
         space_id = space_info.get('id', 'N/A')
-        self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Executing trading logic for Space ID {space_id}. Bar: {current_bar}, Space: {space_info.get('event_name', 'N/A')}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Executing trading logic for Space ID {space_id}. Bar: {current_bar}, Space: {space_info.get('event_name', 'N/A')}")
         
         # Plan Item 1.2.1 & 1.2.2: Unify boundary key names
         # upper_bound = space_info['upper_bound'] 
@@ -125,36 +138,41 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
             return
 
         event_name = space_info.get('event_name', space_info.get('event_title', 'N/A')) # Try event_title as fallback if event_name missing
-        self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Space ID {space_id}: UpperBound={upper_bound:.5f}, LowerBound={lower_bound:.5f}, Event='{event_name}'")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Space ID {space_id}: UpperBound={upper_bound:.5f}, LowerBound={lower_bound:.5f}, Event='{event_name}'")
 
         # 检查是否有持仓
         # Plan Item 1.1: Fix position acquisition
         # position = None # 假设无持仓 <- This was the bug
         position = self.execution_engine.get_position(symbol)
-        self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Current position for {symbol}: {position}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Current position for {symbol}: {position}")
 
         # if position is None: # Original check, might need adjustment based on how get_position returns for no position
         # Adjusted check for no active position or zero volume
         if position is None or position.get('volume', 0.0) == 0.0:
-            self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] No active position for {symbol}. Checking for exhaustion signals for Space ID {space_id}.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] No active position for {symbol}. Checking for exhaustion signals for Space ID {space_id}.")
             # 获取近期 K 线用于形态判断
             try:
                 # 需要的回看期数 = 形态判断期数 + (可选)指标计算期数
                 lookback_needed = max(self.exhaustion_lookback, self.rsi_period + self.rsi_divergence_lookback if 'talib' in sys.modules else self.exhaustion_lookback)
-                start_query_time = current_time - pd.Timedelta(minutes=30 * (lookback_needed + 5)) # 加一点缓冲
-                self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Fetching historical data for exhaustion check: start_time={start_query_time}, end_time={current_time}, lookback_needed={lookback_needed}")
-                recent_bars_df = self.data_provider.get_historical_prices(
-                    symbol=symbol,
-                    start_time=start_query_time,
-                    end_time=current_time,
-                    timeframe='M30'
-                )
+                if hasattr(self.data_provider, 'get_window'):
+                    # 内存窗口: 二分查找取最近 lookback_needed 根K线，无排序、无磁盘读取
+                    recent_bars_df = self._get_window(symbol, 'M30', current_time, lookback_needed)
+                else:
+                    start_query_time = current_time - pd.Timedelta(minutes=30 * (lookback_needed + 5)) # 加一点缓冲
+                    if self.logger.debug_enabled:
+                        self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Fetching historical data for exhaustion check: start_time={start_query_time}, end_time={current_time}, lookback_needed={lookback_needed}")
+                    recent_bars_df = self._get_historical_prices(symbol, start_query_time, current_time, 'M30')
                 if recent_bars_df is None or len(recent_bars_df) < self.exhaustion_lookback:
-                    self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Insufficient historical data for Space ID {space_id}. Have {len(recent_bars_df) if recent_bars_df is not None else 0}, need {self.exhaustion_lookback}.")
+                    if self.logger.debug_enabled:
+                        self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Insufficient historical data for Space ID {space_id}. Have {len(recent_bars_df) if recent_bars_df is not None else 0}, need {self.exhaustion_lookback}.")
                     return
                 # 确保包含当前 K 线
                 if current_time not in recent_bars_df.index:
-                     self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Current bar time {current_time} not in historical index. Appending current bar.")
+                     if self.logger.debug_enabled:
+                         self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Current bar time {current_time} not in historical index. Appending current bar.")
                      current_bar_series = pd.Series(current_bar, name=current_time)
                      current_bar_df = pd.DataFrame([current_bar_series])
                      current_bar_df.index = [current_time]
@@ -163,22 +181,23 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
                               try:
                                   current_bar_df[col] = current_bar_df[col].astype(recent_bars_df[col].dtype)
                               except Exception: pass
-                     recent_bars_df = pd.concat([recent_bars_df, current_bar_df[recent_bars_df.columns]])
-                recent_bars_df = recent_bars_df.sort_index().tail(lookback_needed) # 取所需的回看数据
+                     recent_bars_df = pd.concat([recent_bars_df, current_bar_df[recent_bars_df.columns]]).sort_index()
+                recent_bars_df = recent_bars_df.tail(lookback_needed) # 取所需的回看数据 (get_window 结果已排序)
 
             except Exception as e:
                 self.logger.error(f"[{self.strategy_name}-{symbol}-{current_time}] Error getting historical data for exhaustion check on Space ID {space_id}: {e}", exc_info=True)
                 return
 
             # --- 识别衰竭形态 ---
-            self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Checking for exhaustion patterns for Space ID {space_id}.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Checking for exhaustion patterns for Space ID {space_id}.")
             sell_signal = self._check_bearish_exhaustion(recent_bars_df, upper_bound, symbol, current_time, space_id)
             buy_signal = self._check_bullish_exhaustion(recent_bars_df, lower_bound, symbol, current_time, space_id)
 
             # --- 入场逻辑 ---
             if sell_signal:
                 self.logger.info(f"[{self.strategy_name}-{symbol}-{current_time}] Bearish exhaustion signal detected at {upper_bound:.5f} for Space ID {space_id} (Event: '{event_name}')")
-                exhaustion_high = recent_bars_df['high'].tail(self.exhaustion_lookback).max()
+                exhaustion_high = self._rolling_extreme(symbol, 'high', recent_bars_df, current_time)
                 pip_size = super()._get_pip_size(symbol) # 明确调用父类方法
                 if pip_size is None:
                     self.logger.warning(f"[{self.strategy_name}-{symbol}-{current_time}] Pip size not found for {symbol} on Space ID {space_id}. Cannot calculate SL/TP accurately.")
@@ -194,7 +213,7 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
 
             elif buy_signal:
                 self.logger.info(f"[{self.strategy_name}-{symbol}-{current_time}] Bullish exhaustion signal detected at {lower_bound:.5f} for Space ID {space_id} (Event: '{event_name}')")
-                exhaustion_low = recent_bars_df['low'].tail(self.exhaustion_lookback).min()
+                exhaustion_low = self._rolling_extreme(symbol, 'low', recent_bars_df, current_time)
                 pip_size = super()._get_pip_size(symbol) # 明确调用父类方法
                 if pip_size is None:
                     self.logger.warning(f"[{self.strategy_name}-{symbol}-{current_time}] Pip size not found for {symbol} on Space ID {space_id}. Cannot calculate SL/TP accurately.")
@@ -208,10 +227,24 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
                 # 下单
                 self._place_order(symbol, OrderSide.BUY, current_bar, stop_loss_price, take_profit_price, f"Exh_Buy_{event_name[:10]}")
             else:
-                self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] No exhaustion signal detected for Space ID {space_id}.")
+                if self.logger.debug_enabled:
+                    self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] No exhaustion signal detected for Space ID {space_id}.")
         else:
-            self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Position for {symbol} is not zero ({position.get('volume', 0.0)}). Skipping entry logic for Space ID {space_id}.")
-        self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Finished trading logic for Space ID {space_id}.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Position for {symbol} is not zero ({position.get('volume', 0.0)}). Skipping entry logic for Space ID {space_id}.")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_name}-{symbol}-{current_time}] Finished trading logic for Space ID {space_id}.")
+
+    def _rolling_extreme(self, symbol: str, side: str, recent_bars_df: pd.DataFrame, current_time: datetime) -> float:
+        """
+        最近 exhaustion_lookback 根 M30 K线的最高价 (side='high') 或最低价 (side='low')。
+        优先使用数据提供者的共享增量指标 (已送入到 current_time 时，经本时间点的共享上下文记忆)，否则对 recent_bars_df 计算。
+        """
+        value = self._get_indicator(symbol, 'M30', f'rolling_{side}', as_of=current_time, period=self.exhaustion_lookback)
+        if value is not None:
+            return value
+        column = recent_bars_df[side].tail(self.exhaustion_lookback)
+        return column.max() if side == 'high' else column.min()
 
     def _check_bearish_exhaustion(self, bars_df: pd.DataFrame, upper_bound: float, symbol: str, current_time: datetime, space_id: str) -> bool:
         """
@@ -219,20 +252,25 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
         (需要根据具体形态规则实现)
         """
         log_prefix = f"[{self.strategy_name}-{symbol}-{current_time}-SpaceID:{space_id}-BearishExhCheck]"
-        self.logger.debug(f"{log_prefix} Checking near upper_bound {upper_bound:.5f}. Available bars: {len(bars_df)}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Checking near upper_bound {upper_bound:.5f}. Available bars: {len(bars_df)}")
         if len(bars_df) < self.exhaustion_lookback:
-            self.logger.debug(f"{log_prefix} Insufficient data ({len(bars_df)} < {self.exhaustion_lookback}) for Space ID {space_id}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Insufficient data ({len(bars_df)} < {self.exhaustion_lookback}) for Space ID {space_id}")
             return False
 
         recent_bars = bars_df.tail(self.exhaustion_lookback)
         last_bar = recent_bars.iloc[-1]
-        self.logger.debug(f"{log_prefix} Recent bars (last {self.exhaustion_lookback}) for Space ID {space_id}:\n{recent_bars.to_string(max_rows=5)}")
-        self.logger.debug(f"{log_prefix} Last bar for Space ID {space_id}: H={last_bar['high']:.5f}, L={last_bar['low']:.5f}, O={last_bar['open']:.5f}, C={last_bar['close']:.5f}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Recent bars (last {self.exhaustion_lookback}) for Space ID {space_id}:\n{recent_bars.to_string(max_rows=5)}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Last bar for Space ID {space_id}: H={last_bar['high']:.5f}, L={last_bar['low']:.5f}, O={last_bar['open']:.5f}, C={last_bar['close']:.5f}")
 
         # 1. K线接近或触及上界
         max_high_recent = recent_bars['high'].max()
         touched_upper = max_high_recent >= upper_bound
-        self.logger.debug(f"{log_prefix} Max high in recent bars for Space ID {space_id}: {max_high_recent:.5f}. Touched upper bound? {touched_upper}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Max high in recent bars for Space ID {space_id}: {max_high_recent:.5f}. Touched upper bound? {touched_upper}")
         if not touched_upper:
             # self.logger.debug(f"{log_prefix} Not touched upper bound {upper_bound:.5f}. Max high: {max_high_recent:.5f}") # Redundant
             return False
@@ -247,7 +285,8 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
         lower_wick = max(0, lower_wick)
 
         is_pin_bar = upper_wick > body_size * 2 and upper_wick > lower_wick * 2 and last_bar['high'] >= upper_bound
-        self.logger.debug(f"{log_prefix} Pin Bar Check for Space ID {space_id}: Body={body_size:.5f}, UpperWick={upper_wick:.5f}, LowerWick={lower_wick:.5f}, LastHigh>=Bound? {last_bar['high'] >= upper_bound}. IsPinBar? {is_pin_bar}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Pin Bar Check for Space ID {space_id}: Body={body_size:.5f}, UpperWick={upper_wick:.5f}, LowerWick={lower_wick:.5f}, LastHigh>=Bound? {last_bar['high'] >= upper_bound}. IsPinBar? {is_pin_bar}")
         if is_pin_bar:
             self.logger.info(f"{log_prefix} Bearish Pin Bar detected at upper bound for Space ID {space_id}.")
             return True
@@ -263,12 +302,14 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
             # 发生在价格高位 (接近上边界)
             at_highs = last_bar['high'] >= upper_bound or prev_bar['high'] >= upper_bound
             is_bearish_engulfing = is_curr_bearish and is_prev_bullish and engulfs_prev_body and at_highs
-            self.logger.debug(f"{log_prefix} Bearish Engulfing Check for Space ID {space_id}: CurrBearish? {is_curr_bearish}, PrevBullish? {is_prev_bullish}, Engulfs? {engulfs_prev_body}, AtHighs? {at_highs}. IsBearishEngulfing? {is_bearish_engulfing}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Bearish Engulfing Check for Space ID {space_id}: CurrBearish? {is_curr_bearish}, PrevBullish? {is_prev_bullish}, Engulfs? {engulfs_prev_body}, AtHighs? {at_highs}. IsBearishEngulfing? {is_bearish_engulfing}")
             if is_bearish_engulfing:
                 self.logger.info(f"{log_prefix} Bearish Engulfing pattern detected at upper bound for Space ID {space_id}.")
                 return True
         else:
-            self.logger.debug(f"{log_prefix} Not enough bars for Bearish Engulfing check (need 2, have {len(recent_bars)}) for Space ID {space_id}.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Not enough bars for Bearish Engulfing check (need 2, have {len(recent_bars)}) for Space ID {space_id}.")
 
         # 规则 c: 多次尝试突破失败 (例如，连续几根K线的最高价无法显著超越前期高点，且收盘回落)
         # 简化: 检查最近N根K线中，是否有M根K线的最高价接近上边界，但收盘价均低于上边界一个阈值
@@ -280,12 +321,14 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
                 if bar_to_check['high'] >= upper_bound - threshold_distance and bar_to_check['close'] < upper_bound - (threshold_distance * 0.5):
                     bars_near_upper += 1
             failed_breakouts = bars_near_upper >= 2 # Example: 2 out of 3 bars show failed attempts
-            self.logger.debug(f"{log_prefix} Failed Breakouts Check for Space ID {space_id}: BarsNearUpper={bars_near_upper} (threshold_dist={threshold_distance:.5f}). FailedBreakouts? {failed_breakouts}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Failed Breakouts Check for Space ID {space_id}: BarsNearUpper={bars_near_upper} (threshold_dist={threshold_distance:.5f}). FailedBreakouts? {failed_breakouts}")
             if failed_breakouts:
                 self.logger.info(f"{log_prefix} Multiple failed breakout attempts detected at upper bound for Space ID {space_id}.")
                 return True
         else:
-            self.logger.debug(f"{log_prefix} Not enough bars for Failed Breakouts check (need 3, have {len(recent_bars)}) for Space ID {space_id}.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Not enough bars for Failed Breakouts check (need 3, have {len(recent_bars)}) for Space ID {space_id}.")
 
         # (可选) 规则 d: RSI 背离 (需要 TA-Lib)
         # if 'talib' in sys.modules and len(recent_bars) >= self.rsi_period + self.rsi_divergence_lookback:
@@ -294,7 +337,8 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
         #     # (实现细节省略，需要比较最近的几个价格高点和对应的RSI值)
         #     self.logger.debug(f"{log_prefix} RSI divergence check (not fully implemented) for Space ID {space_id}.")
 
-        self.logger.debug(f"{log_prefix} No bearish exhaustion pattern met for Space ID {space_id}.")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} No bearish exhaustion pattern met for Space ID {space_id}.")
         return False
 
     def _check_bullish_exhaustion(self, bars_df: pd.DataFrame, lower_bound: float, symbol: str, current_time: datetime, space_id: str) -> bool:
@@ -303,20 +347,25 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
         (需要根据具体形态规则实现)
         """
         log_prefix = f"[{self.strategy_name}-{symbol}-{current_time}-SpaceID:{space_id}-BullishExhCheck]"
-        self.logger.debug(f"{log_prefix} Checking near lower_bound {lower_bound:.5f}. Available bars: {len(bars_df)}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Checking near lower_bound {lower_bound:.5f}. Available bars: {len(bars_df)}")
         if len(bars_df) < self.exhaustion_lookback:
-            self.logger.debug(f"{log_prefix} Insufficient data ({len(bars_df)} < {self.exhaustion_lookback}) for Space ID {space_id}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Insufficient data ({len(bars_df)} < {self.exhaustion_lookback}) for Space ID {space_id}")
             return False
 
         recent_bars = bars_df.tail(self.exhaustion_lookback)
         last_bar = recent_bars.iloc[-1]
-        self.logger.debug(f"{log_prefix} Recent bars (last {self.exhaustion_lookback}) for Space ID {space_id}:\n{recent_bars.to_string(max_rows=5)}")
-        self.logger.debug(f"{log_prefix} Last bar for Space ID {space_id}: H={last_bar['high']:.5f}, L={last_bar['low']:.5f}, O={last_bar['open']:.5f}, C={last_bar['close']:.5f}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Recent bars (last {self.exhaustion_lookback}) for Space ID {space_id}:\n{recent_bars.to_string(max_rows=5)}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Last bar for Space ID {space_id}: H={last_bar['high']:.5f}, L={last_bar['low']:.5f}, O={last_bar['open']:.5f}, C={last_bar['close']:.5f}")
 
         # 1. K线接近或触及下界
         min_low_recent = recent_bars['low'].min()
         touched_lower = min_low_recent <= lower_bound
-        self.logger.debug(f"{log_prefix} Min low in recent bars for Space ID {space_id}: {min_low_recent:.5f}. Touched lower bound? {touched_lower}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Min low in recent bars for Space ID {space_id}: {min_low_recent:.5f}. Touched lower bound? {touched_lower}")
         if not touched_lower:
             # self.logger.debug(f"{log_prefix} 未触及下界 {lower_bound:.5f}。最低价: {min_low_recent:.5f}") # Redundant
             return False
@@ -330,7 +379,8 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
         lower_wick = max(0, lower_wick)
 
         is_pin_bar = lower_wick > body_size * 2 and lower_wick > upper_wick * 2 and last_bar['low'] <= lower_bound
-        self.logger.debug(f"{log_prefix} Pin Bar Check for Space ID {space_id}: Body={body_size:.5f}, UpperWick={upper_wick:.5f}, LowerWick={lower_wick:.5f}, LastLow<=Bound? {last_bar['low'] <= lower_bound}. IsPinBar? {is_pin_bar}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Pin Bar Check for Space ID {space_id}: Body={body_size:.5f}, UpperWick={upper_wick:.5f}, LowerWick={lower_wick:.5f}, LastLow<=Bound? {last_bar['low'] <= lower_bound}. IsPinBar? {is_pin_bar}")
         if is_pin_bar:
             self.logger.info(f"{log_prefix} Bullish Pin Bar detected at lower bound for Space ID {space_id}.")
             return True
@@ -346,12 +396,14 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
             # 发生在价格低位 (接近下边界)
             at_lows = last_bar['low'] <= lower_bound or prev_bar['low'] <= lower_bound
             is_bullish_engulfing = is_curr_bullish and is_prev_bearish and engulfs_prev_body and at_lows
-            self.logger.debug(f"{log_prefix} Bullish Engulfing Check for Space ID {space_id}: CurrBullish? {is_curr_bullish}, PrevBearish? {is_prev_bearish}, Engulfs? {engulfs_prev_body}, AtLows? {at_lows}. IsBullishEngulfing? {is_bullish_engulfing}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Bullish Engulfing Check for Space ID {space_id}: CurrBullish? {is_curr_bullish}, PrevBearish? {is_prev_bearish}, Engulfs? {engulfs_prev_body}, AtLows? {at_lows}. IsBullishEngulfing? {is_bullish_engulfing}")
             if is_bullish_engulfing:
                 self.logger.info(f"{log_prefix} Bullish Engulfing pattern detected at lower bound for Space ID {space_id}.")
                 return True
         else:
-            self.logger.debug(f"{log_prefix} Not enough bars for Bullish Engulfing check (need 2, have {len(recent_bars)}) for Space ID {space_id}.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Not enough bars for Bullish Engulfing check (need 2, have {len(recent_bars)}) for Space ID {space_id}.")
 
         # 规则 c: 多次尝试突破失败 (例如，连续几根K线的最低价无法显著创新低，且收盘回升)
         if len(recent_bars) >= 3:
@@ -362,19 +414,22 @@ class ExhaustionStrategy(EventDrivenSpaceStrategy):
                 if bar_to_check['low'] <= lower_bound + threshold_distance and bar_to_check['close'] > lower_bound + (threshold_distance * 0.5):
                     bars_near_lower += 1
             failed_breakouts = bars_near_lower >= 2
-            self.logger.debug(f"{log_prefix} Failed Breakouts Check for Space ID {space_id}: BarsNearLower={bars_near_lower} (threshold_dist={threshold_distance:.5f}). FailedBreakouts? {failed_breakouts}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Failed Breakouts Check for Space ID {space_id}: BarsNearLower={bars_near_lower} (threshold_dist={threshold_distance:.5f}). FailedBreakouts? {failed_breakouts}")
             if failed_breakouts:
                 self.logger.info(f"{log_prefix} Multiple failed breakout attempts detected at lower bound for Space ID {space_id}.")
                 return True
         else:
-            self.logger.debug(f"{log_prefix} Not enough bars for Failed Breakouts check (need 3, have {len(recent_bars)}) for Space ID {space_id}.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Not enough bars for Failed Breakouts check (need 3, have {len(recent_bars)}) for Space ID {space_id}.")
 
         # (可选) 规则 d: RSI 背离
         # if 'talib' in sys.modules and len(recent_bars) >= self.rsi_period + self.rsi_divergence_lookback:
         #     # 简单底背离: 价格创新低，RSI未创新低
         #     self.logger.debug(f"{log_prefix} RSI divergence check (not fully implemented) for Space ID {space_id}.")
 
-        self.logger.debug(f"{log_prefix} No bullish exhaustion pattern met for Space ID {space_id}.")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} No bullish exhaustion pattern met for Space ID {space_id}.")
         return False
 
     # Plan Item 1.3: Remove _is_significant_wick and _is_engulfing_pattern
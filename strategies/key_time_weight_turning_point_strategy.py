@@ -67,7 +67,7 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
                          risk_manager=risk_manager,
                          live_mode=live_mode)
         self.strategy_name = "KeyTimeWeightTurningPointStrategy"
-        self.logger = logging.getLogger(self.strategy_name)
+        self.logger = self._make_logger(self.strategy_name)
         # self.logger.info(f"{self.strategy_name} 初始化完成。") # Restored to commented state
 
         # 添加策略时区属性
@@ -89,7 +89,8 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
         self.node_proximity_buffer_pips = ktwtp_params.get('node_proximity_buffer_pips', 5)
 
         # VWAP Take Profit parameters (Plan Item 2)
-        # take_profit_target is already fetched in _execute_trading_logic, ensure it can handle 'vwap'
+        # 止盈目标: 'ratio' (按盈亏比) 或 'vwap' (最近 vwap_tp_period 根 M30 的 VWAP，不在入场价有利一侧时回退到 ratio)
+        self.take_profit_target = ktwtp_params.get('take_profit_target', 'ratio')
         self.vwap_tp_atr_period = ktwtp_params.get('vwap_tp_atr_period', 14)
         self.vwap_tp_atr_multiplier = ktwtp_params.get('vwap_tp_atr_multiplier', 1.0)
         self.vwap_tp_period = ktwtp_params.get('vwap_tp_period', 14)
@@ -131,50 +132,43 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
         # 存储关键时间触发状态 (现在由 KeyTimeDetector 管理)
         # self.triggered_times: Dict[str, datetime] = {}
 
+    def _on_space_added(self, space: dict) -> None:
+        """登记新空间的关键时间点 (旧格式只有 event_time_utc 的空间以事件时间作为 creation_time，只转换一次)。"""
+        super()._on_space_added(space)
+        if 'creation_time' not in space and 'event_time_utc' in space:
+            event_time_utc = space['event_time_utc']
+            try:
+                space['creation_time'] = event_time_utc if isinstance(event_time_utc, pd.Timestamp) else pd.Timestamp(event_time_utc, tz='UTC')
+            except Exception as e:
+                self.logger.error(f"[{self.strategy_name}] 无法解析 space_info 中的 event_time_utc '{event_time_utc}': {e}")
+                return
+        if 'creation_time' in space:
+            self.key_time_detector.register_space(space, self.key_time_hours_after_event)
+
+    def _on_spaces_removed(self, spaces: list) -> None:
+        """空间失效或到期时丢弃其尚未触发的关键时间点。"""
+        super()._on_spaces_removed(spaces)
+        for space in spaces:
+            if 'creation_time' in space:
+                self.key_time_detector.forget_space(space)
+
     def _is_key_time(self, current_time: pd.Timestamp, space_info: dict) -> Optional[pd.Timestamp]:
         """
         判断当前时间是否是博弈空间形成后的"关键时间"之一。
-        使用 KeyTimeDetector 统一处理关键时间检测逻辑。
+        关键时间点在空间创建时登记到 KeyTimeDetector，每根K线只取一次本K线触发的时间点 (bar_key_times)，
+        这里对单个空间只做一次字典查找。
 
         Args:
             current_time (pd.Timestamp): 当前 K 线的时间 (UTC)。
-            space_info (dict): 当前活跃空间的信息，包含 'creation_time' 和 'event_data'。
+            space_info (dict): 当前活跃空间的信息，包含 'creation_time'。
 
         Returns:
             Optional[pd.Timestamp]: 如果是关键时间，返回该关键时间点 (UTC)；否则返回 None。
         """
-                # 如果参数中的space_info包含event_time_utc，转换成KeyTimeDetector期望的格式
-        if 'event_time_utc' in space_info and 'creation_time' not in space_info:
-            # 确保creation_time存在且格式正确
-        event_time_utc = space_info['event_time_utc']
-        if not isinstance(event_time_utc, pd.Timestamp):
-            try:
-                event_time_utc = pd.Timestamp(event_time_utc, tz='UTC')
-            except Exception as e:
-                self.logger.error(f"[{self.strategy_name}] 无法解析 space_info 中的 event_time_utc '{event_time_utc}': {e}")
-                return None
-        
-            # 创建新的space_info副本，添加KeyTimeDetector需要的字段
-            space_info_for_detector = space_info.copy()
-            space_info_for_detector['creation_time'] = event_time_utc
-            if 'event_data' not in space_info_for_detector:
-                space_info_for_detector['event_data'] = {
-                    'symbol': space_info.get('symbol', 'unknown')
-                }
-                
-            # 调用KeyTimeDetector的方法检测关键时间
-            return self.key_time_detector.is_key_time(
-                current_time_utc=current_time, 
-                space_info=space_info_for_detector,
-                key_time_hours_after_event=self.key_time_hours_after_event
-            )
-                else:
-            # 直接使用KeyTimeDetector方法
-            return self.key_time_detector.is_key_time(
-                current_time_utc=current_time, 
-                space_info=space_info,
-                key_time_hours_after_event=self.key_time_hours_after_event
-            )
+        hits = self.key_time_detector.bar_key_times(current_time)
+        if not hits or 'creation_time' not in space_info:
+            return None
+        return hits.get(self.key_time_detector.space_key(space_info))
 
     def _is_at_turning_point(self, symbol: str, current_bar: pd.Series, space_info: dict, all_symbol_spaces: list) -> Optional[str]:
         """
@@ -256,7 +250,7 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
         m5_start_time = current_m30_bar_time - timedelta(minutes=5 * (self.m5_m15_lookback -1))
 
         try:
-            m5_bars_df = self.data_provider.get_historical_prices(symbol, m5_start_time, m5_end_time, 'M5')
+            m5_bars_df = self._get_historical_prices(symbol, m5_start_time, m5_end_time, 'M5')
             if m5_bars_df is None or len(m5_bars_df) < 2: 
                 self.logger.debug(f"{log_prefix} M5数据不足 (found {len(m5_bars_df) if m5_bars_df is not None else 0} bars, need >=2)，无法进行小周期确认。Start: {m5_start_time}, End: {m5_end_time}")
                 return False
@@ -310,7 +304,8 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
         """
         space_id = space_info.get('id', 'N/A')
         log_prefix = f"[{self.strategy_name}-{symbol}-{current_time_utc}-SpaceID:{space_id}]"
-        self.logger.debug(f"{log_prefix} _execute_trading_logic called. Current_time_utc (engine time): {current_time_utc}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} _execute_trading_logic called. Current_time_utc (engine time): {current_time_utc}")
 
         # current_time_utc 现在是方法参数
         # current_bar_time = current_bar['time'].iloc[0] # 这个仍然是从DataFrame的'time'列获取，代表当前K线自己的时间
@@ -322,7 +317,8 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
             return
 
         current_bar_time = current_bar['time'].iloc[0] # K线自身的时间戳
-        self.logger.debug(f"{log_prefix} Current bar time (from data): {current_bar_time}, O={current_bar['open'].iloc[0]:.5f}, H={current_bar['high'].iloc[0]:.5f}, L={current_bar['low'].iloc[0]:.5f}, C={current_bar['close'].iloc[0]:.5f}")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Current bar time (from data): {current_bar_time}, O={current_bar['open'].iloc[0]:.5f}, H={current_bar['high'].iloc[0]:.5f}, L={current_bar['low'].iloc[0]:.5f}, C={current_bar['close'].iloc[0]:.5f}")
 
         event_name = space_info.get('event_name', 'N/A') # 用于 comment
         current_bar_close_price = current_bar['close'].iloc[0]
@@ -331,7 +327,8 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
 
         # 使用传入的 current_time_utc (引擎的主循环时间) 来判断关键时间
         is_critical_time_flag = self._is_key_time(current_time_utc, space_info)
-        self.logger.debug(f"{log_prefix} Is critical time? {is_critical_time_flag is not None}. (Critical time point if any: {is_critical_time_flag})")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Is critical time? {is_critical_time_flag is not None}. (Critical time point if any: {is_critical_time_flag})")
 
         if is_critical_time_flag:
             # _is_at_turning_point 应该使用 current_bar (Series)
@@ -416,6 +413,14 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
                             tp_price = current_bar_close_price - (sl_price - current_bar_close_price) * self.profit_loss_ratio
                             self.logger.info(f"{log_prefix} SELL order params: Entry ~{current_bar_close_price:.5f}, SL={sl_price:.5f} (based on {sl_pips} pips or bar high), TP={tp_price:.5f} (ratio {self.profit_loss_ratio})")
 
+                        if self.take_profit_target == 'vwap':
+                            vwap = self._calculate_vwap(symbol, self.vwap_tp_period, current_time_utc)
+                            if vwap is not None and (vwap - current_bar_close_price) * (1 if order_side == OrderSide.BUY else -1) > 0:
+                                tp_price = vwap
+                                self.logger.info(f"{log_prefix} TP set to VWAP({self.vwap_tp_period}) = {tp_price:.5f}.")
+                            else:
+                                self.logger.info(f"{log_prefix} VWAP ({vwap}) not beyond entry for {order_side.name}, keeping ratio TP {tp_price:.5f}.")
+
                         comment = f"KTWTP_{order_side.name}_{turning_point_type[:5]}_{event_name[:10]}{trade_comment_suffix}"
                         self.logger.info(f"{log_prefix} Placing {order_side.name} order with comment: {comment}")
                         self._place_order(symbol, order_side, current_bar, sl_price, tp_price, comment)
@@ -430,43 +435,50 @@ class KeyTimeWeightTurningPointStrategy(EventDrivenSpaceStrategy):
                 else:
                     self.logger.debug(f"{log_prefix} Active position exists (Volume: {position['volume']}). Skipping new entry at turning point.")
             else: # Not at a turning point
-                self.logger.debug(f"{log_prefix} Critical time, but not at a recognized turning point. No action.")
+                if self.logger.debug_enabled:
+                    self.logger.debug(f"{log_prefix} Critical time, but not at a recognized turning point. No action.")
         else: # Not a critical time
-            self.logger.debug(f"{log_prefix} Not a critical time. No KTWTP-specific logic executed.")
-        self.logger.debug(f"{log_prefix} Finished KTWTP trading logic execution.")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"{log_prefix} Not a critical time. No KTWTP-specific logic executed.")
+        if self.logger.debug_enabled:
+            self.logger.debug(f"{log_prefix} Finished KTWTP trading logic execution.")
 
-    def _calculate_vwap(self, symbol: str, period: int, current_time: pd.Timestamp) -> Optional[float]:
+    def _calculate_vwap(self, symbol: str, period: int, current_time: pd.Timestamp, timeframe: str = 'M30') -> Optional[float]:
         """
-        Calculates the Volume Weighted Average Price (VWAP) for a given period.
+        Calculates the Volume Weighted Average Price (VWAP) over the last `period` bars ending at current_time.
+
+        Uses the shared streaming indicator of the data provider (O(1) per bar) when it has been fed
+        up to current_time, otherwise falls back to summing over a get_window slice.
+
         Args:
-            historical_data (pd.DataFrame): DataFrame with 'high', 'low', 'close', 'volume' columns.
-            period (int): The time period for VWAP calculation (number of recent bars).
+            symbol (str): Trading symbol.
+            period (int): The number of recent bars.
+            current_time (pd.Timestamp): Open time of the current closed bar (backtest) or the live cycle time.
+            timeframe (str): Bar timeframe, M30 by default.
 
         Returns:
             Optional[float]: The VWAP value, or None if calculation fails or data is insufficient.
         """
-        if historical_data is None or len(historical_data) < period:
-            self.logger.warning(f"[{self.strategy_name}] VWAP calculation: Not enough historical data. Have {len(historical_data) if historical_data is not None else 0}, need {period}.")
+        vwap = self._get_indicator(symbol, timeframe, 'vwap', as_of=current_time, period=period)
+        if vwap is not None:
+            return vwap
+
+        relevant_data = self._get_window(symbol, timeframe, current_time, period) if hasattr(self.data_provider, 'get_window') else None
+        if relevant_data is None or len(relevant_data) < period:
+            self.logger.warning(f"[{self.strategy_name}] VWAP calculation: Not enough historical data. Have {len(relevant_data) if relevant_data is not None else 0}, need {period}.")
             return None
-        
-        relevant_data = historical_data.tail(period)
-        if relevant_data.empty or 'high' not in relevant_data or 'low' not in relevant_data or 'close' not in relevant_data or 'volume' not in relevant_data:
-            self.logger.warning(f"[{self.strategy_name}] VWAP calculation: Relevant data is empty or missing required columns for period {period}.")
+        volume_col = 'volume' if 'volume' in relevant_data.columns else 'tick_volume'
+        if any(col not in relevant_data.columns for col in ('high', 'low', 'close', volume_col)):
+            self.logger.warning(f"[{self.strategy_name}] VWAP calculation: Relevant data is missing required columns for period {period}.")
             return None
-            
+
         try:
             typical_price = (relevant_data['high'] + relevant_data['low'] + relevant_data['close']) / 3
-            tp_volume = typical_price * relevant_data['volume']
-            
-            sum_tp_volume = tp_volume.sum()
-            sum_volume = relevant_data['volume'].sum()
-            
+            sum_volume = relevant_data[volume_col].sum()
             if sum_volume == 0:
                 self.logger.warning(f"[{self.strategy_name}] VWAP calculation: Sum of volume is zero for period {period}, cannot calculate VWAP.")
                 return None
-                
-            vwap = sum_tp_volume / sum_volume
-            
+            vwap = (typical_price * relevant_data[volume_col]).sum() / sum_volume
             if np.isnan(vwap) or np.isinf(vwap):
                 self.logger.warning(f"[{self.strategy_name}] VWAP calculation: Result is NaN or Inf for period {period}.")
                 return None
@@ -0,0 +1,280 @@
+"""
+MetaTrader5 模块的本地模拟
+
+FakeMT5 实现实盘组件 (RealtimeUpdater、MarketDataProvider、MT5ExecutionEngine) 用到的 MetaTrader5 接口，
+行情来自预先加载的K线并按回放时钟逐根"收盘"；installed_fake_mt5 在上下文内把它安装到这些模块中。
+供实盘链路回放 (strategies.live.replay) 和测试使用。
+
+说明: 只返回已收盘的K线 (不模拟形成中的K线)，市价单按最新收盘价立即成交，不支持挂单。
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import core.utils
+import market_price_data.realtime as realtime_module
+import strategies.core.data_providers as data_providers_module
+import strategies.live.mt5_engine as mt5_engine_module
+from core.data_quality import timeframe_to_seconds
+
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+SymbolInfo = namedtuple('SymbolInfo', [
+    'name', 'description', 'digits', 'point', 'spread', 'visible', 'trade_mode',
+    'trade_contract_size', 'trade_tick_size', 'trade_tick_value', 'tick_size', 'tick_value',
+    'volume_min', 'volume_max', 'volume_step',
+    'currency_base', 'currency_profit', 'currency_margin', 'bid', 'ask',
+])
+Tick = namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume', 'time_msc'])
+AccountInfo = namedtuple('AccountInfo', [
+    'login', 'server', 'name', 'company', 'currency', 'leverage',
+    'balance', 'equity', 'profit', 'margin', 'margin_free',
+])
+TerminalInfo = namedtuple('TerminalInfo', ['connected', 'trade_allowed', 'name', 'path'])
+OrderSendResult = namedtuple('OrderSendResult', [
+    'retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask', 'comment', 'request_id', 'request',
+])
+TradePosition = namedtuple('TradePosition', [
+    'ticket', 'time', 'type', 'magic', 'identifier', 'volume', 'price_open', 'sl', 'tp',
+    'price_current', 'swap', 'profit', 'symbol', 'comment',
+])
+TradeOrder = namedtuple('TradeOrder', [
+    'ticket', 'time_setup', 'time_done', 'type', 'state', 'magic', 'volume_initial', 'volume_current',
+    'price_open', 'price_current', 'sl', 'tp', 'symbol', 'comment',
+])
+
+
+class ReplayClock:
+    """回放时钟 (UTC 时间戳，秒)。"""
+
+    def __init__(self, now: float):
+        self.now = float(now)
+
+    @property
+    def datetime(self) -> datetime:
+        """当前回放时间 (naive UTC，与 datetime.utcnow() 一致)。"""
+        return datetime.fromtimestamp(self.now, tz=timezone.utc).replace(tzinfo=None)
+
+
+class FakeMT5:
+    """
+    MetaTrader5 模块的本地模拟，数据来自预先加载的K线。
+
+    Args:
+        bars (Dict[Tuple[str, str], np.ndarray]): {(SYMBOL, TF): RATES_DTYPE 数组 (按时间升序)}。
+        clock (ReplayClock): 回放时钟；开盘时间 + 周期 <= clock.now 的K线视为已收盘。
+        balance (float): 模拟账户初始余额。
+        contract_size (float): 合约大小 (用于估算持仓盈亏)。
+    """
+
+    # --- 常量 (取值与 MetaTrader5 模块一致) ---
+    TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30 = 1, 5, 15, 30
+    TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1 = 16385, 16388, 16408
+    TIMEFRAME_W1, TIMEFRAME_MN1 = 32769, 49153
+    TRADE_ACTION_DEAL, TRADE_ACTION_PENDING, TRADE_ACTION_SLTP, TRADE_ACTION_MODIFY, TRADE_ACTION_REMOVE = 1, 5, 6, 7, 8
+    ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+    ORDER_TYPE_BUY_LIMIT, ORDER_TYPE_SELL_LIMIT, ORDER_TYPE_BUY_STOP, ORDER_TYPE_SELL_STOP = 2, 3, 4, 5
+    ORDER_TYPE_BUY_STOP_LIMIT, ORDER_TYPE_SELL_STOP_LIMIT = 6, 7
+    ORDER_STATE_STARTED, ORDER_STATE_PLACED, ORDER_STATE_CANCELED, ORDER_STATE_PARTIAL = 0, 1, 2, 3
+    ORDER_STATE_FILLED, ORDER_STATE_REJECTED, ORDER_STATE_EXPIRED = 4, 5, 6
+    ORDER_STATE_REQUEST_ADD, ORDER_STATE_REQUEST_MODIFY, ORDER_STATE_REQUEST_CANCEL = 7, 8, 9
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_FOK, ORDER_FILLING_IOC, ORDER_FILLING_RETURN = 0, 1, 2
+    POSITION_TYPE_BUY, POSITION_TYPE_SELL = 0, 1
+    TRADE_RETCODE_DONE, TRADE_RETCODE_INVALID_ORDER = 10009, 10035
+
+    _TIMEFRAME_NAMES = {
+        1: 'M1', 5: 'M5', 15: 'M15', 30: 'M30', 16385: 'H1', 16388: 'H4', 16408: 'D1', 32769: 'W1', 49153: 'MN1',
+    }
+
+    def __init__(self, bars: Dict[Tuple[str, str], np.ndarray], clock: ReplayClock,
+                 balance: float = 100000.0, contract_size: float = 100000.0):
+        self.clock = clock
+        self.balance = float(balance)
+        self.contract_size = float(contract_size)
+        self._bars = {(sym.upper(), tf.upper()): arr for (sym, tf), arr in bars.items()}
+        self._tf_seconds = {tf: timeframe_to_seconds(tf) for _, tf in self._bars}
+        self._last_error = (1, 'Success')
+        self._next_ticket = 1
+        self.positions: Dict[int, TradePosition] = {}
+        self.history_orders: List[TradeOrder] = []
+        self.requests: List[Dict[str, Any]] = []
+
+    # --- 连接 ---
+    def initialize(self, *args, **kwargs) -> bool:
+        return True
+
+    def shutdown(self):
+        pass
+
+    def last_error(self) -> Tuple[int, str]:
+        return self._last_error
+
+    def version(self) -> Tuple[int, int, str]:
+        return (500, 0, 'replay')
+
+    def terminal_info(self) -> TerminalInfo:
+        return TerminalInfo(True, True, 'FakeMT5', '')
+
+    # --- 行情 ---
+    def _closed_bars(self, symbol: str, timeframe: int) -> Optional[np.ndarray]:
+        tf_name = self._TIMEFRAME_NAMES.get(timeframe)
+        arr = self._bars.get((symbol.upper(), tf_name))
+        if arr is None:
+            self._last_error = (-4, f'Unknown symbol/timeframe {symbol} {timeframe}')
+            return None
+        n_closed = int(np.searchsorted(arr['time'], self.clock.now - self._tf_seconds[tf_name], side='right'))
+        return arr[:n_closed]
+
+    def copy_rates_from_pos(self, symbol: str, timeframe: int, start_pos: int, count: int) -> Optional[np.ndarray]:
+        closed = self._closed_bars(symbol, timeframe)
+        if closed is None:
+            return None
+        end = len(closed) - start_pos
+        return closed[max(0, end - count):max(end, 0)].copy()
+
+    def copy_rates_range(self, symbol: str, timeframe: int, date_from: Any, date_to: Any) -> Optional[np.ndarray]:
+        closed = self._closed_bars(symbol, timeframe)
+        if closed is None:
+            return None
+        start = pd.Timestamp(date_from).timestamp()
+        end = pd.Timestamp(date_to).timestamp()
+        times = closed['time']
+        return closed[np.searchsorted(times, start, side='left'):np.searchsorted(times, end, side='right')].copy()
+
+    def _last_close(self, symbol: str) -> Optional[float]:
+        """symbol 在所有时间周期中最近一根已收盘K线的收盘价。"""
+        best_time, best_close = None, None
+        for (sym, tf), arr in self._bars.items():
+            if sym != symbol.upper():
+                continue
+            n_closed = int(np.searchsorted(arr['time'], self.clock.now - self._tf_seconds[tf], side='right'))
+            if n_closed and (best_time is None or arr['time'][n_closed - 1] > best_time):
+                best_time, best_close = arr['time'][n_closed - 1], float(arr['close'][n_closed - 1])
+        return best_close
+
+    def symbol_info(self, symbol: str) -> Optional[SymbolInfo]:
+        close = self._last_close(symbol)
+        if close is None and not any(sym == symbol.upper() for sym, _ in self._bars):
+            self._last_error = (-4, f'Unknown symbol {symbol}')
+            return None
+        close = close or 0.0
+        digits = 5 if close < 50 else 2
+        point = 10.0 ** -digits
+        return SymbolInfo(
+            name=symbol, description=f'{symbol} (replay)', digits=digits, point=point, spread=0, visible=True, trade_mode=4,
+            trade_contract_size=self.contract_size, trade_tick_size=point, trade_tick_value=point * self.contract_size,
+            tick_size=point, tick_value=point * self.contract_size,
+            volume_min=0.01, volume_max=100.0, volume_step=0.01,
+            currency_base=symbol[:3], currency_profit=symbol[3:6] or 'USD', currency_margin=symbol[:3],
+            bid=close, ask=close,
+        )
+
+    def symbol_info_tick(self, symbol: str) -> Optional[Tick]:
+        close = self._last_close(symbol)
+        if close is None:
+            self._last_error = (-4, f'No data for {symbol}')
+            return None
+        now = int(self.clock.now)
+        return Tick(time=now, bid=close, ask=close, last=close, volume=0, time_msc=now * 1000)
+
+    # --- 交易 ---
+    def _position_with_price(self, position: TradePosition) -> TradePosition:
+        price = self._last_close(position.symbol) or position.price_open
+        direction = 1 if position.type == self.POSITION_TYPE_BUY else -1
+        profit = (price - position.price_open) * direction * position.volume * self.contract_size
+        return position._replace(price_current=price, profit=profit)
+
+    def account_info(self) -> AccountInfo:
+        profit = sum(self._position_with_price(p).profit for p in self.positions.values())
+        equity = self.balance + profit
+        return AccountInfo(
+            login=0, server='Replay', name='replay', company='FakeMT5', currency='USD', leverage=100,
+            balance=self.balance, equity=equity, profit=profit, margin=0.0, margin_free=equity,
+        )
+
+    def order_send(self, request: Dict[str, Any]) -> Optional[OrderSendResult]:
+        """市价单按最新收盘价立即成交 (带 position 字段时平掉对应持仓)；TRADE_ACTION_REMOVE 没有挂单可删。"""
+        self.requests.append(dict(request, replay_time=self.clock.now))
+        symbol = request.get('symbol', '')
+        if request.get('action') != self.TRADE_ACTION_DEAL:
+            return OrderSendResult(self.TRADE_RETCODE_INVALID_ORDER, 0, 0, 0.0, 0.0, 0.0, 0.0, 'no pending orders', 0, request)
+        price = self._last_close(symbol)
+        if price is None:
+            self._last_error = (-4, f'No price for {symbol}')
+            return None
+
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        now = int(self.clock.now)
+        volume = float(request.get('volume', 0.0))
+        order_type = request.get('type', self.ORDER_TYPE_BUY)
+        closing = self.positions.pop(request['position'], None) if request.get('position') else None
+        if closing is not None:
+            self.balance += self._position_with_price(closing).profit
+        else:
+            position_type = self.POSITION_TYPE_BUY if order_type == self.ORDER_TYPE_BUY else self.POSITION_TYPE_SELL
+            self.positions[ticket] = TradePosition(
+                ticket=ticket, time=now, type=position_type, magic=request.get('magic', 0), identifier=ticket,
+                volume=volume, price_open=price, sl=float(request.get('sl', 0.0)), tp=float(request.get('tp', 0.0)),
+                price_current=price, swap=0.0, profit=0.0, symbol=symbol, comment=request.get('comment', ''),
+            )
+        self.history_orders.append(TradeOrder(
+            ticket=ticket, time_setup=now, time_done=now, type=order_type, state=self.ORDER_STATE_FILLED,
+            magic=request.get('magic', 0), volume_initial=volume, volume_current=volume,
+            price_open=price, price_current=price, sl=float(request.get('sl', 0.0)), tp=float(request.get('tp', 0.0)),
+            symbol=symbol, comment=request.get('comment', ''),
+        ))
+        return OrderSendResult(self.TRADE_RETCODE_DONE, ticket, ticket, volume, price, price, price,
+                               request.get('comment', ''), ticket, request)
+
+    def positions_get(self, symbol: Optional[str] = None, ticket: Optional[int] = None, **kwargs) -> tuple:
+        positions = [self._position_with_price(p) for p in self.positions.values()]
+        if symbol is not None:
+            positions = [p for p in positions if p.symbol == symbol]
+        if ticket is not None:
+            positions = [p for p in positions if p.ticket == ticket]
+        return tuple(positions)
+
+    def orders_get(self, symbol: Optional[str] = None, ticket: Optional[int] = None, **kwargs) -> tuple:
+        return () # 市价单立即成交，没有挂单
+
+    def history_orders_get(self, *args, ticket: Optional[int] = None, **kwargs) -> tuple:
+        if ticket is not None:
+            return tuple(o for o in self.history_orders if o.ticket == ticket)
+        return tuple(self.history_orders)
+
+
+@contextmanager
+def installed_fake_mt5(fake: FakeMT5) -> Iterator[FakeMT5]:
+    """在上下文内把 fake 安装为各实盘模块使用的 mt5 模块 (并绕过终端进程检查)，退出时恢复。"""
+    connect = lambda *args, **kwargs: fake.initialize()
+    disconnect = lambda *args, **kwargs: fake.shutdown()
+    replacements = [
+        (core.utils, 'mt5', fake), (core.utils, 'MT5_AVAILABLE', True),
+        (realtime_module, 'mt5', fake), (realtime_module, 'MT5_AVAILABLE', True),
+        (realtime_module, 'initialize_mt5', connect), (realtime_module, 'shutdown_mt5', disconnect),
+        (mt5_engine_module, 'mt5', fake), (mt5_engine_module, 'MT5_AVAILABLE', True),
+        (mt5_engine_module, 'initialize_mt5', connect), (mt5_engine_module, 'shutdown_mt5', disconnect),
+        (data_providers_module, 'mt5', fake),
+    ]
+    missing = object()
+    originals = [(module, name, getattr(module, name, missing)) for module, name, _ in replacements]
+    try:
+        for module, name, value in replacements:
+            setattr(module, name, value)
+        yield fake
+    finally:
+        for module, name, value in originals:
+            if value is missing:
+                delattr(module, name)
+            else:
+                setattr(module, name, value)
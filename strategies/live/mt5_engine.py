@@ -34,6 +34,12 @@ except ImportError as e:
             logger.setLevel(logging.INFO)
         return logger
 
+from core import metrics
+
+# 下单往返耗时 (order_send 调用到返回)，见 core.metrics
+_ORDER_ROUNDTRIP_SECONDS = metrics.histogram('execution_order_roundtrip_seconds', 'mt5.order_send round-trip latency', ('symbol',))
+_ORDERS_TOTAL = metrics.counter('execution_orders_total', 'Orders sent to MT5 by result', ('symbol', 'result'))
+
 class MT5ExecutionEngine(ExecutionEngineBase):
     """
     使用 MetaTrader 5 作为交易执行后端。
@@ -229,13 +235,18 @@ class MT5ExecutionEngine(ExecutionEngineBase):
 
         # 发送订单请求
         result = None
+        send_start = time.perf_counter()
         try:
             result = mt5.order_send(request)
         except Exception as e:
              self.logger.error(f"调用 mt5.order_send 时发生异常 for request {request}: {e}", exc_info=True)
              order.status = OrderStatus.REJECTED # Assume rejection on exception
+             _ORDERS_TOTAL.labels(order.symbol, 'error').inc()
              return order
+        finally:
+            _ORDER_ROUNDTRIP_SECONDS.labels(order.symbol).observe(time.perf_counter() - send_start)
 
+        _ORDERS_TOTAL.labels(order.symbol, 'rejected' if result is None else 'sent').inc()
         if result is None:
             error_code = mt5.last_error()
             self.logger.error(f"MT5 order_send 失败。订单: {order.client_order_id}, 错误: {error_code} - {self._parse_retcode(error_code)}")
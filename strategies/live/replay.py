@@ -0,0 +1,253 @@
+"""
+实盘链路加速回放
+
+把已存储的历史K线和财经日历按回放时钟逐步"发布"出来，经过与实盘相同的组件:
+
+    FakeMT5 (本地模拟终端)
+      -> RealtimeUpdater (轮询、共享内存、增量 CSV、指标)
+      -> MarketDataProvider / EconomicCalendarProvider
+      -> StrategyOrchestrator (增量市场状态、并行策略执行)
+      -> MT5ExecutionEngine (下单发往 FakeMT5)
+
+回放时钟可以按任意倍速运行 (如 1000 倍，或 0 表示尽可能快)，用于离线测量端到端周期延迟和吞吐量，
+在部署前发现实盘链路的性能回退。回放使用独立的数据目录和共享内存前缀，不会影响正在运行的实盘进程；
+通知通道和指标 HTTP 服务在回放中关闭 (周期由回放循环直接驱动)。
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from omegaconf import DictConfig, OmegaConf
+
+from core.data_quality import timeframe_to_seconds
+from core.notifications import TOPIC_CALENDAR_UPDATED
+from market_price_data.realtime import RealtimeUpdater
+from strategies.core.data_providers import DataProvider, MarketDataProvider, EconomicCalendarProvider
+from strategies.core.strategy_orchestrator import StrategyOrchestrator
+from strategies.live.fake_mt5 import RATES_DTYPE, FakeMT5, ReplayClock, installed_fake_mt5
+from strategies.live.mt5_engine import MT5ExecutionEngine
+
+logger = logging.getLogger(__name__)
+
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {'count': 0}
+    arr = np.asarray(samples)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {'count': len(arr), 'mean': float(arr.mean()), 'p50': float(p50), 'p95': float(p95),
+            'p99': float(p99), 'max': float(arr.max())}
+
+
+class LiveReplay:
+    """
+    按回放时钟驱动实盘组件，并统计每个策略周期的真实耗时。
+
+    Args:
+        config (DictConfig): 实盘配置 (如 load_app_config("strategies/config/strategies.yaml"))，
+                             其 paths.data_dir 中的历史数据和历史筛选日历作为回放数据源。
+        start, end: 回放区间 (UTC)。
+        speedup (Optional[float]): 回放倍速，0 表示不等待；默认读取 replay.speedup。
+        replay_dir (Optional[str]): 回放数据目录，默认为临时目录 (结束后删除)。
+    """
+
+    def __init__(self, config: DictConfig, start: Any, end: Any,
+                 speedup: Optional[float] = None, replay_dir: Optional[str] = None):
+        self.source_config = config
+        self.start = pd.Timestamp(start, tz='UTC') if pd.Timestamp(start).tzinfo is None else pd.Timestamp(start).tz_convert('UTC')
+        self.end = pd.Timestamp(end, tz='UTC') if pd.Timestamp(end).tzinfo is None else pd.Timestamp(end).tz_convert('UTC')
+        self.speedup = float(speedup if speedup is not None else OmegaConf.select(config, "replay.speedup", default=1000))
+        self.history_bars = OmegaConf.select(config, "replay.history_bars", default=5000)
+        self.calendar_refresh_seconds = OmegaConf.select(config, "replay.calendar_refresh_minutes", default=60) * 60
+        self.calendar_lookahead = pd.Timedelta(days=OmegaConf.select(config, "replay.calendar_lookahead_days", default=7))
+        self.balance = OmegaConf.select(config, "replay.balance", default=100000.0)
+        self.symbols = [s.upper() for s in OmegaConf.select(config, "realtime.symbols", default=[])]
+        self.timeframes = [tf.upper() for tf in OmegaConf.select(config, "realtime.timeframes", default=[])]
+        self.heartbeat_seconds = OmegaConf.select(config, "orchestrator.run_interval_seconds", default=60)
+
+        self._owns_replay_dir = replay_dir is None
+        self.replay_dir = Path(replay_dir) if replay_dir else Path(tempfile.mkdtemp(prefix='live_replay_'))
+        self.config = self._build_replay_config()
+        self.clock = ReplayClock(self.start.timestamp())
+        self.fake: Optional[FakeMT5] = None
+        self._calendar_events: Optional[pd.DataFrame] = None
+        self._calendar_path: Optional[Path] = None
+        self._calendar_written: Optional[tuple] = None
+
+    # --- 准备 ---
+    def _build_replay_config(self) -> DictConfig:
+        """回放配置: 独立的数据目录和共享内存前缀，关闭通知通道、指标服务、交易时段暂停和自适应轮询。"""
+        overrides = OmegaConf.create({
+            'paths': {'data_dir': str(self.replay_dir)},
+            'market_data': {'shared_memory': {'name_prefix': f"ssreplay{os.getpid()}"}},
+            'notifications': {'enabled': False},
+            'metrics': {'enabled': False},
+            'realtime': {
+                'enabled': True,
+                'adaptive_polling': {'enabled': False},
+                'session': {'pause_outside_session': False},
+            },
+        })
+        return OmegaConf.merge(self.source_config, overrides)
+
+    def _prepare_bars(self) -> Dict[Tuple[str, str], np.ndarray]:
+        """从数据源加载回放区间的K线，并把回放开始前的 history_bars 根K线写入回放目录的历史文件。"""
+        source = MarketDataProvider(self.source_config)
+        target = MarketDataProvider(self.config)
+        bars: Dict[Tuple[str, str], np.ndarray] = {}
+        for sym in self.symbols:
+            for tf in self.timeframes:
+                df = source.load_from_cache(sym, tf, end_time=self.end)
+                if df is None or df.empty:
+                    logger.warning(f"回放数据源中没有 {sym} {tf} 的历史数据，跳过。")
+                    continue
+                df = df.sort_index()
+                before = df[df.index < self.start].iloc[-self.history_bars:]
+                hist_path = target._get_hist_filepath(sym, tf)
+                hist_path.parent.mkdir(parents=True, exist_ok=True)
+                before.to_csv(hist_path, index_label='time', date_format='%Y-%m-%d %H:%M:%S', float_format='%.5f')
+
+                rates = np.zeros(len(df), dtype=RATES_DTYPE)
+                rates['time'] = df.index.as_unit('s').asi8
+                for col in RATES_DTYPE.names[1:]:
+                    if col in df.columns:
+                        rates[col] = df[col].to_numpy()
+                bars[(sym, tf)] = rates
+                logger.info(f"回放 {sym} {tf}: 历史 {len(before)} 条，可回放 {int((df.index >= self.start).sum())} 条。")
+        return bars
+
+    def _prepare_calendar(self):
+        """加载历史筛选日历，回放中按时钟定期写入实时筛选日历文件。"""
+        events = EconomicCalendarProvider(self.source_config).get_filtered_events(live=False)
+        if events is None or events.empty or 'datetime' not in events.columns:
+            logger.warning("回放数据源中没有可用的历史筛选日历，回放中不提供日历事件。")
+            return
+        self._calendar_events = events.sort_values('datetime').reset_index(drop=True)
+        live_path = Path(EconomicCalendarProvider(self.config).live_filtered_path)
+        live_path.parent.mkdir(parents=True, exist_ok=True)
+        self._calendar_path = live_path
+
+    def _refresh_calendar(self) -> bool:
+        """写入 [当前 - 1 天, 当前 + lookahead] 内的事件 (北京时间 naive，与日历流程输出一致)；内容变化时返回 True。"""
+        if self._calendar_events is None:
+            return False
+        now = pd.Timestamp(self.clock.now, unit='s', tz='UTC')
+        times = self._calendar_events['datetime']
+        lo = int(times.searchsorted(now - pd.Timedelta(days=1)))
+        hi = int(times.searchsorted(now + self.calendar_lookahead, side='right'))
+        if self._calendar_written == (lo, hi):
+            return False
+        window = self._calendar_events.iloc[lo:hi].copy()
+        window['datetime'] = window['datetime'].dt.tz_convert('Asia/Shanghai').dt.strftime('%Y-%m-%d %H:%M:%S')
+        window.to_csv(self._calendar_path, index=False)
+        self._calendar_written = (lo, hi)
+        return True
+
+    # --- 运行 ---
+    def run(self) -> Dict[str, Any]:
+        """
+        运行回放并返回统计报告 (市场状态初始化耗时、周期延迟分布、轮询延迟、吞吐量、实际倍速、策略耗时、订单数)。
+        """
+        self.replay_dir.mkdir(parents=True, exist_ok=True)
+        bars = self._prepare_bars()
+        if not bars:
+            raise ValueError("没有可回放的K线数据。")
+        self._prepare_calendar()
+        step = min(timeframe_to_seconds(tf) for _, tf in bars)
+        self.fake = FakeMT5(bars, self.clock, balance=self.balance)
+
+        with installed_fake_mt5(self.fake):
+            updater = RealtimeUpdater(config=self.config)
+            if not updater.updater_enabled:
+                raise RuntimeError("RealtimeUpdater 初始化失败，无法回放。")
+            updater.mt5_initialized = True
+            engine = MT5ExecutionEngine(self.config)
+            engine.connect()
+            data_provider = DataProvider(self.config)
+            # 日历查询 ("未来 N 小时") 以回放时钟为准，与 _refresh_calendar 写入的窗口一致
+            data_provider.set_clock(lambda: pd.Timestamp(self.clock.now, unit='s', tz='UTC'))
+            orchestrator = StrategyOrchestrator(self.config, data_provider, engine)
+            try:
+                return self._loop(updater, orchestrator, step)
+            finally:
+                orchestrator.strategy_runner.shutdown(wait_running=True)
+                engine.disconnect()
+                updater.stop_updater()
+                if self._owns_replay_dir:
+                    shutil.rmtree(self.replay_dir, ignore_errors=True)
+
+    def _loop(self, updater: RealtimeUpdater, orchestrator: StrategyOrchestrator, step: int) -> Dict[str, Any]:
+        start_ts, end_ts = self.start.timestamp(), self.end.timestamp()
+        t = (start_ts // step + 1) * step
+        cycle_seconds: List[float] = []
+        poll_seconds: List[float] = []
+        stats = {'steps': 0, 'cycles': 0, 'bar_closed_notifications': 0, 'calendar_updates': 0, 'behind_schedule_steps': 0}
+        last_cycle_virtual = None
+        last_calendar_virtual = None
+        # 与 orchestrator.start() 相同，在首个周期前完整加载市场状态 (单独计时)
+        self.clock.now = start_ts
+        seed_start = time.perf_counter()
+        orchestrator._seed_market_state()
+        seed_seconds = time.perf_counter() - seed_start
+        real_start = time.perf_counter()
+
+        while t <= end_ts:
+            self.clock.now = t
+            stats['steps'] += 1
+            notifications: List[Dict[str, Any]] = []
+
+            if last_calendar_virtual is None or t - last_calendar_virtual >= self.calendar_refresh_seconds:
+                last_calendar_virtual = t
+                if self._refresh_calendar():
+                    stats['calendar_updates'] += 1
+                    notifications.append({'topic': TOPIC_CALENDAR_UPDATED})
+
+            poll_start = time.perf_counter()
+            closed = updater.poll_all_once()
+            poll_seconds.append(time.perf_counter() - poll_start)
+            stats['bar_closed_notifications'] += len(closed)
+            notifications.extend(closed)
+
+            heartbeat = last_cycle_virtual is None or t - last_cycle_virtual >= self.heartbeat_seconds
+            if notifications or heartbeat:
+                cycle_start = time.perf_counter()
+                orchestrator.run_cycle(notifications, current_time=self.clock.datetime)
+                cycle_seconds.append(time.perf_counter() - cycle_start)
+                stats['cycles'] += 1
+                last_cycle_virtual = t
+
+            if self.speedup > 0:
+                target_real = (t - start_ts) / self.speedup
+                lag = target_real - (time.perf_counter() - real_start)
+                if lag > 0:
+                    time.sleep(lag)
+                else:
+                    stats['behind_schedule_steps'] += 1
+            t += step
+
+        real_seconds = time.perf_counter() - real_start
+        virtual_seconds = max(0.0, min(t - step, end_ts) - start_ts)
+        report = {
+            'virtual_start': self.start.isoformat(),
+            'virtual_end': self.end.isoformat(),
+            'virtual_seconds': virtual_seconds,
+            'real_seconds': real_seconds,
+            'speedup_target': self.speedup,
+            'speedup_achieved': virtual_seconds / real_seconds if real_seconds > 0 else float('inf'),
+            'cycles_per_second': stats['cycles'] / real_seconds if real_seconds > 0 else float('inf'),
+            **stats,
+            'orders': len(self.fake.requests),
+            'market_state_seed_seconds': seed_seconds,
+            'cycle_latency_seconds': _summarize(cycle_seconds[1:]), # 首个周期包含指标预热和日历首次加载，单独报告
+            'first_cycle_seconds': cycle_seconds[0] if cycle_seconds else None,
+            'poll_latency_seconds': _summarize(poll_seconds),
+            'strategies': orchestrator.strategy_runner.get_timings(),
+        }
+        return report
@@ -355,13 +355,13 @@ class ReverseCrossoverStrategy(EventDrivenSpaceStrategy):
             # )
 
             # 使用 StrategyBase 的 place_order_from_signal 方法
-        signal_data = {
-                'order_type': OrderType.MARKET, 
-            'symbol': symbol,
+            signal_data = {
+                'order_type': OrderType.MARKET,
+                'symbol': symbol,
                 'side': side,
                 'entry_price': current_bar['close'],
-            'stop_loss': stop_loss,
-            'take_profit': take_profit,
+                'stop_loss': stop_loss,
+                'take_profit': take_profit,
                 'order_comment': comment
             }
             
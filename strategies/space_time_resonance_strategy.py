@@ -43,6 +43,7 @@ from .exhaustion_strategy import ExhaustionStrategy
 # 导入工具类
 from strategies.utils.key_time_detector import KeyTimeDetector
 from strategies.utils.signal_aggregator import SignalAggregator
+from strategies.core.records import PendingS2Check, to_ns
 
 class SpaceTimeResonanceStrategy(EventDrivenSpaceStrategy):
     """
@@ -75,7 +76,7 @@ class SpaceTimeResonanceStrategy(EventDrivenSpaceStrategy):
                          risk_manager=risk_manager,
                          live_mode=live_mode)
         self.strategy_name = "SpaceTimeResonanceStrategy"
-        self.logger = logging.getLogger(self.strategy_name)
+        self.logger = self._make_logger(self.strategy_name)
         self.logger.info(f"[{self.strategy_name}] 初始化开始...")
         # Log parameters used for base class initialization for traceability
         self.logger.debug(f"[{self.strategy_name}] Base class initialized with: strategy_id='{strategy_id}', app_config_keys={list(app_config.keys()) if app_config else None}, data_provider_type='{type(data_provider).__name__}', execution_engine_type='{type(execution_engine).__name__}', risk_manager_type='{type(risk_manager).__name__}', live_mode={live_mode}")
@@ -141,8 +142,9 @@ class SpaceTimeResonanceStrategy(EventDrivenSpaceStrategy):
         # 存储关键时间触发状态，避免重复处理 (现在由KeyTimeDetector管理)
         # self._key_time_triggered: Dict[str, Dict[Any, bool]] = {} # Changed Dict key type for trigger_key flexibility
         # Plan Item 4.1: Initialize _pending_s2_checks
-        self._pending_s2_checks: Dict[str, Dict[str, Any]] = {} # {symbol: {space_id: {details...}}}
+        self._pending_s2_checks: Dict[str, Dict[str, PendingS2Check]] = {} # {symbol: {space_id: PendingS2Check}}
         self.s2_max_wait_bars = self.params.get('s2_max_wait_bars', 5) # Max bars to wait for S2 re-entry
+        self._bar_price_data: Optional[pd.DataFrame] = None # 当前K线所在品种的主周期数据 (_process_bar 中设置)
 
     def get_required_timeframes(self) -> List[str]:
         """此策略需要 M30 (主要) 和 H1 (辅助) 时间框架。"""
@@ -166,10 +168,24 @@ class SpaceTimeResonanceStrategy(EventDrivenSpaceStrategy):
         # 使用KeyTimeDetector中的方法
         return self.key_time_detector.get_timeframe_minutes(timeframe)
 
+    def _on_space_added(self, space: dict) -> None:
+        """登记新空间的事件相对关键时间点。"""
+        super()._on_space_added(space)
+        if self.key_time_enabled and 'creation_time' in space:
+            self.key_time_detector.register_space(space, self.key_time_hours_after_event)
+
+    def _on_spaces_removed(self, spaces: list) -> None:
+        """空间失效或到期时丢弃其尚未触发的关键时间点。"""
+        super()._on_spaces_removed(spaces)
+        for space in spaces:
+            if 'creation_time' in space:
+                self.key_time_detector.forget_space(space)
+
     def _is_key_time(self, current_time: pd.Timestamp, space_info: dict) -> Optional[pd.Timestamp]:
         """
         检查当前时间是否是相对于某个空间的"关键时间"。
-        使用KeyTimeDetector统一处理关键时间检测逻辑。
+        事件相对时间点在空间创建时登记，每根K线只取一次本K线触发的时间点 (bar_key_times)；
+        固定时间段仍按空间检查。
 
         Args:
             current_time (pd.Timestamp): 当前K线结束时间 (UTC)。
@@ -178,30 +194,46 @@ class SpaceTimeResonanceStrategy(EventDrivenSpaceStrategy):
         Returns:
             Optional[pd.Timestamp]: 如果是关键时间，返回该关键时间点 (UTC)；否则返回 None。
         """
-        if not self.key_time_enabled:
-        return None
-        
-        # 检查事件相对时间点和固定时间段
+        if not self.key_time_enabled or 'creation_time' not in space_info:
+            return None
+
+        hits = self.key_time_detector.bar_key_times(current_time)
+        key_time_point = hits.get(self.key_time_detector.space_key(space_info)) if hits else None
+        if key_time_point is not None or not self.fixed_key_times:
+            return key_time_point
         return self.key_time_detector.is_key_time(
-            current_time_utc=current_time, 
+            current_time_utc=current_time,
             space_info=space_info,
-            key_time_hours_after_event=self.key_time_hours_after_event,
             fixed_key_times=self.fixed_key_times
         )
 
-    def _execute_trading_logic(self, symbol: str, current_bar: dict, space_info: dict, all_symbol_spaces: list, price_data_full: pd.DataFrame):
+    def _process_bar(self, symbol: str, current_bar_df: pd.DataFrame, current_processing_time: pd.Timestamp, all_symbol_m30_data: pd.DataFrame):
+        """记住本K线的主周期数据，供 _execute_trading_logic 的衰竭检查使用。"""
+        self._bar_price_data = all_symbol_m30_data
+        super()._process_bar(symbol, current_bar_df, current_processing_time, all_symbol_m30_data)
+
+    def _execute_trading_logic(self, symbol: str, current_bar: dict, space_info: dict, all_symbol_spaces: list, price_data_full: Optional[pd.DataFrame] = None):
         """
         执行博弈空间时间共振策略的交易逻辑。
 
         Args:
             symbol (str): 交易品种。
-            current_bar (dict): 当前 K 线数据。 (包含 'time', 'open', 'high', 'low', 'close')
+            current_bar (dict): 当前 K 线数据 (包含 'time', 'open', 'high', 'low', 'close')；
+                也接受 EventDrivenSpaceStrategy._process_bar 传入的单行 DataFrame (时间在索引中)。
             space_info (dict): 当前正在处理的活跃空间信息。
             all_symbol_spaces (list): 该品种当前所有的活跃空间列表。
-            price_data_full (pd.DataFrame): 该品种对应时间框架的完整历史+实时数据。
-        self.logger.debug(f"[{self.strategy_name}-{symbol}] _execute_trading_logic ENTRY for space {space_info.get('id')}. Bar time: {current_bar['time']}. Close: {current_bar['close']}")
-"""
-        current_time = current_bar['time'] # Assuming current_bar has 'time'
+            price_data_full (pd.DataFrame): 该品种对应时间框架的完整历史+实时数据，默认使用 _process_bar 记住的数据。
+        """
+        if isinstance(current_bar, pd.DataFrame):
+            bar_time = current_bar.index[0]
+            current_bar = current_bar.iloc[0].to_dict()
+            current_bar['time'] = bar_time
+        if price_data_full is None:
+            price_data_full = self._bar_price_data
+        if self.logger.debug_enabled:
+            self.logger.debug(f"[{self.strategy_name}-{symbol}] _execute_trading_logic ENTRY for space {space_info.get('id')}. Bar time: {current_bar['time']}. Close: {current_bar['close']}")
+
+        current_time = current_bar['time']
         close_price = current_bar['close']
         
         # Plan Item 4.3: Process pending S2 checks for the current symbol
@@ -258,8 +290,8 @@ class SpaceTimeResonanceStrategy(EventDrivenSpaceStrategy):
         # upper_bound = space_info['upper_bound'] # Already available from input args
         # lower_bound = space_info['lower_bound'] # Already available from input args
         # Fallback for upper_bound and lower_bound if not directly in space_info, though they should be
-        upper_bound = space_info.get('high', space_info.get('upper_bound'))
-        lower_bound = space_info.get('low', space_info.get('lower_bound'))
+        upper_bound = space_info.get('high', space_info.get('space_high', space_info.get('upper_bound')))
+        lower_bound = space_info.get('low', space_info.get('space_low', space_info.get('lower_bound')))
         
         if upper_bound is None or lower_bound is None:
             self.logger.warning(f"[{self.strategy_name}-{symbol}] Missing upper or lower bound for space {space_info.get('id')}. Skipping trading logic.")
@@ -370,16 +402,17 @@ class SpaceTimeResonanceStrategy(EventDrivenSpaceStrategy):
                  # Or if this is a new S2 event (e.g. new key_time for the same space)
                  # A simple check: if current_space_id is not in pending, or if its key_time_point_s2 is different
                  current_pending_s2 = self._pending_s2_checks.get(symbol, {}).get(current_space_id)
-                 if not current_pending_s2 or current_pending_s2.get('key_time_point_s2') != key_time_point :
+                 # 记录的时间字段为纳秒整数，直接比较属性，不经字典接口构造 Timestamp
+                 if not current_pending_s2 or getattr(current_pending_s2, 'key_time_point_s2', None) != to_ns(key_time_point):
                      self.logger.info(f"[{self.strategy_name}-{symbol}] S2: Recording pending S2 check for space {current_space_id} at key_time {key_time_point}. Price {price_at_key_time:.5f} is {'above' if is_above else 'below'} space.")
-                     self._pending_s2_checks[symbol][current_space_id] = {
-                         'recorded_time_s2': current_time, # Bar time when S2 was identified
-                         'key_time_point_s2': key_time_point, # The key time point itself
-                         'breakout_direction_s2': 1 if is_above else -1, # Direction price is relative to space
-                         'upper_bound_s2': upper_bound,
-                         'lower_bound_s2': lower_bound,
-                         'event_name_s2': event_name
-                     }
+                     self._pending_s2_checks[symbol][current_space_id] = PendingS2Check(
+                         recorded_time_s2=current_time, # Bar time when S2 was identified
+                         key_time_point_s2=key_time_point, # The key time point itself
+                         breakout_direction_s2=1 if is_above else -1, # Direction price is relative to space
+                         upper_bound_s2=upper_bound,
+                         lower_bound_s2=lower_bound,
+                         event_name_s2=event_name
+                     )
                      self.logger.info(f"[{self.strategy_name}-{symbol}] S2 condition recorded for space {current_space_id}. Direction: {self._pending_s2_checks[symbol][current_space_id]['breakout_direction_s2']}. Waiting for re-entry.")
                  else:
                       self.logger.debug(f"[{self.strategy_name}-{symbol}] S2 condition for space {current_space_id} (KeyTime: {key_time_point}) already pending or matches existing. No new record.")
@@ -586,117 +619,3 @@ class SpaceTimeResonanceStrategy(EventDrivenSpaceStrategy):
             self.logger.debug(f"[{self.strategy_name}] 信号已提交到聚合器: {symbol} {action}, 置信度={confidence:.2f}")
         except Exception as e:
             self.logger.error(f"[{self.strategy_name}] 提交信号到聚合器时发生错误: {e}", exc_info=True)
-
-# --- 可选的测试入口 ---
-if __name__ == '__main__':
-    import sys
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    logger = logging.getLogger(__name__)
-    logger.info("运行 SpaceTimeResonanceStrategy 测试代码...")
-
-    # 1. 模拟配置
-    mock_config = {
-        'strategy_name': 'TestResonance',
-        'strategy_params': {
-            'event_importance_threshold': 2,
-            'space_definition': {'forward_bars': 4, 'boundary_percentile': 90},
-            'end_conditions': {'max_duration_hours': 48}, # 延长测试时间
-            'resonance_params': {
-                'key_time_hours_after_event': [2, 4] # 事件后2, 4小时为关键时间
-            },
-            # 继承其他策略参数用于 checker
-            'exhaustion_lookback': 3,
-            'stop_loss_pip_buffer': 5,
-            'take_profit_target': 'opposite_boundary'
-        },
-    }
-
-    # 2. 模拟数据提供者 (需要能覆盖关键时间点)
-    class MockDataProviderResonance(DataProvider):
-        def get_historical_prices(self, symbol, start_time, end_time, timeframe):
-            logger.debug(f"MockDataProviderResonance: 获取 {symbol} 从 {start_time} 到 {end_time} ({timeframe})")
-            # 确保生成足够长的时间序列
-            sim_start = pd.Timestamp('2023-01-01 08:00:00', tz='UTC')
-            sim_end = pd.Timestamp('2023-01-01 18:00:00', tz='UTC')
-            dates = pd.date_range(start=sim_start, end=sim_end, freq='30min', tz='UTC')
-            data = {
-                'open': [1.1000 + i*0.0001 for i in range(len(dates))],
-                'high': [1.1005 + i*0.00015 for i in range(len(dates))],
-                'low': [1.0995 - i*0.00005 for i in range(len(dates))],
-                'close': [1.1002 + i*0.00012 for i in range(len(dates))],
-                'volume': [100 + i*10 for i in range(len(dates))]
-            }
-            df = pd.DataFrame(data, index=dates)
-
-            # 模拟关键时间点 (事件后2小时 = 12:00) 价格在空间内
-            # (假设空间是 1.1000 - 1.1010)
-            key_time_1 = pd.Timestamp('2023-01-01 12:00:00', tz='UTC')
-            if key_time_1 in df.index:
-                 df.loc[key_time_1, 'close'] = 1.1005 # 在内部
-
-            # 模拟关键时间点 (事件后4小时 = 14:00) 价格在空间外且已反穿，并形成衰竭
-            key_time_2 = pd.Timestamp('2023-01-01 14:00:00', tz='UTC')
-            if key_time_2 in df.index:
-                 # 让价格先突破
-                 df.loc[pd.Timestamp('2023-01-01 13:30:00', tz='UTC'), 'close'] = 1.1015
-                 df.loc[pd.Timestamp('2023-01-01 13:30:00', tz='UTC'), 'high'] = 1.1018
-                 # 在关键时间形成衰竭 (Pin Bar)
-                 df.loc[key_time_2, 'open'] = 1.1016
-                 df.loc[key_time_2, 'high'] = 1.1025 # 长上影
-                 df.loc[key_time_2, 'low'] = 1.1014
-                 df.loc[key_time_2, 'close'] = 1.1015 # 收盘较低
-
-            return df.loc[start_time:end_time]
-
-        def get_calendar_events(self, start_time, end_time):
-             return pd.DataFrame([
-                  {'timestamp': pd.Timestamp('2023-01-01 10:00:00', tz='UTC'), 'name': 'Mock Event', 'currency': 'EUR', 'importance': 3, 'actual': '1.0'}
-             ])
-
-    # 3. 模拟执行引擎
-    class MockExecutionEngine:
-        def place_order(self, order):
-            logger.info(f"MockExecutionEngine: 收到订单: {order}")
-            return {'status': 'FILLED', 'order_id': 'mock_789'}
-        def get_position(self, symbol):
-            logger.debug(f"MockExecutionEngine: 获取持仓信息: {symbol}")
-        return None
-
-    # 4. 初始化和运行
-    mock_provider = MockDataProviderResonance({})
-    mock_engine = MockExecutionEngine()
-    mock_rm = RiskManager({})
-    strategy = SpaceTimeResonanceStrategy(
-        strategy_id="STRS_Test",
-        app_config=mock_config,
-        data_provider=mock_provider,
-        execution_engine=mock_engine,
-        risk_manager=mock_rm,
-        live_mode=False
-    )
-
-    # 模拟事件触发
-    event_time = pd.Timestamp('2023-01-01 10:00:00', tz='UTC')
-    mock_event = {'timestamp': event_time, 'name': 'Mock Event', 'currency': 'EUR', 'importance': 3, 'actual': '1.0'}
-    strategy.process_event(mock_event)
-
-    # 模拟 K 线流
-    start_run_time = event_time + pd.Timedelta(minutes=30 * mock_config['strategy_params']['space_definition']['forward_bars'])
-    end_run_time = start_run_time + pd.Timedelta(hours=6) # 模拟运行几小时以覆盖关键时间
-    current_time = start_run_time
-
-    while current_time <= end_run_time:
-        bar_df = mock_provider.get_historical_prices('EURUSD', current_time - pd.Timedelta(minutes=1), current_time, 'M30')
-        if not bar_df.empty:
-            current_bar_dict = bar_df.iloc[-1].to_dict()
-            current_bar_dict['time'] = bar_df.index[-1]
-            mock_bar_data = {'EURUSD': current_bar_dict}
-            logger.info(f"\n--- Processing Bar Time: {current_bar_dict['time']} ---")
-            if 'EURUSD' in strategy.active_spaces:
-                 logger.debug(f"Active Space EURUSD: {strategy.active_spaces['EURUSD'][0]['lower_bound']:.5f} - {strategy.active_spaces['EURUSD'][0]['upper_bound']:.5f}")
-            strategy.on_bar(mock_bar_data)
-        else:
-             logger.warning(f"无法获取 {current_time} 的模拟 K 线")
-        current_time += pd.Timedelta(minutes=30)
-
-    logger.info("测试完成。")
@@ -1,26 +1,52 @@
 # strategies/utils/key_time_detector.py
 # 关键时间检测工具类
 
+import heapq
+import itertools
 import pytz
+from collections import deque
 from datetime import datetime, timedelta, time as dt_time
 from typing import Dict, List, Any, Optional, Union, Set, Tuple
 
+from core.fast_logging import as_fast_logger
+from strategies.core.records import SpaceRecord
+
+# 事件相对关键时间点前后的触发窗口
+KEY_TIME_TOLERANCE = timedelta(minutes=30)
+
 
 class KeyTimeDetector:
     """
     关键时间检测工具类，支持事件相对时间和固定时间段
+
+    事件相对关键时间点在空间创建时经 register_space 一次性算好并压入全局最小堆 (按触发窗口起点排序)，
+    空间失效时由 forget_space 丢弃。每根K线只从堆顶弹出已到期的时间点，放入对应空间的待触发队列；
+    策略每根K线调用一次 due_key_times 取得本K线触发的 (空间键, 关键时间) 对，按 space_key 查找即可。
+    时间点被消费或窗口结束后即删除，不再保留触发标记。要求调用的当前时间不回退 (回测和实盘都按K线顺序推进)。
     """
-    
+
     def __init__(self, logger):
         """
         初始化关键时间检测器
-        
+
         Args:
             logger: 日志记录器
         """
-        self.logger = logger
-        # 记录已触发过的关键时间点，避免重复触发
-        self._triggered_key_times: Dict[Any, bool] = {}
+        self.logger = as_fast_logger(logger, __name__)
+        self._seq = itertools.count()
+        # 关键时间点堆: (窗口起点, 序号, 空间键, 事件后小时数, 关键时间点)
+        self._schedule: List[Tuple[Any, int, tuple, Any, datetime]] = []
+        # 已到期、窗口仍未结束的关键时间点: 空间键 -> deque[(窗口终点, 小时数, 关键时间点)]
+        self._due: Dict[tuple, deque] = {}
+        # 已登记的空间: 空间键 -> 最后一个窗口终点；到期后由 _expiry 堆移除
+        self._registered: Dict[tuple, Any] = {}
+        self._expiry: List[Tuple[Any, int, tuple]] = []
+        # 已失效但堆中仍有时间点的空间，到期时移除
+        self._forgotten: Set[tuple] = set()
+        # bar_key_times 的本K线结果: (K线时间, {空间键: 关键时间点})
+        self._bar_hits: Tuple[Any, Dict[tuple, datetime]] = (None, {})
+        # 固定时间段的触发标记: 日期 -> {(空间键, 规则)}，只保留当天
+        self._triggered_fixed: Dict[Any, Set[tuple]] = {}
         
     def get_timeframe_minutes(self, timeframe: str) -> int:
         """
@@ -46,8 +72,114 @@ class KeyTimeDetector:
     
     def reset_trigger_state(self) -> None:
         """重置关键时间点触发状态"""
-        self._triggered_key_times = {}
+        self._schedule = []
+        self._due = {}
+        self._registered = {}
+        self._expiry = []
+        self._forgotten = set()
+        self._bar_hits = (None, {})
+        self._triggered_fixed = {}
+
+    @staticmethod
+    def space_key(space_info: Dict[str, Any], symbol: Optional[str] = None) -> tuple:
+        """
+        空间键 (空间ID, 品种, 事件ID, 创建时间)；品种默认取 event_data['symbol'] 或空间的 symbol。
+        SpaceRecord 直接读属性 (创建时间为纳秒整数)，每根K线按空间查找时不经字典接口构造 Timestamp。
+        """
+        if type(space_info) is SpaceRecord:
+            return (getattr(space_info, 'id', 'unknown'), symbol or getattr(space_info, 'symbol', None),
+                    getattr(space_info, 'event_id', None), space_info.creation_time)
+        if symbol is None:
+            symbol = (space_info.get('event_data') or {}).get('symbol') or space_info.get('symbol')
+        space_id = space_info.get('space_id', space_info.get('id', 'unknown'))
+        # 没有 space_id 的空间以事件和创建时间区分
+        return (space_id, symbol, space_info.get('event_id'), space_info['creation_time'])
+
+    def register_space(self, space_info: Dict[str, Any], key_time_hours_after_event: List[int],
+                       symbol: Optional[str] = None) -> bool:
+        """
+        登记空间的事件相对关键时间点 (creation_time + hours，前后各 30 分钟内触发)。重复登记同一空间不会重复压入。
+
+        Returns:
+            bool: 是否为新登记。
+        """
+        space_key = self.space_key(space_info, symbol)
+        if space_key in self._registered:
+            return False
+        creation_time = space_info['creation_time']
+        last_end = None
+        for hours in key_time_hours_after_event:
+            key_time_point = creation_time + timedelta(hours=hours)
+            heapq.heappush(self._schedule, (key_time_point - KEY_TIME_TOLERANCE, next(self._seq), space_key, hours, key_time_point))
+            end = key_time_point + KEY_TIME_TOLERANCE
+            last_end = end if last_end is None or end > last_end else last_end
+        if last_end is None:
+            return False
+        self._registered[space_key] = last_end
+        heapq.heappush(self._expiry, (last_end, next(self._seq), space_key))
+        return True
+
+    def forget_space(self, space_info: Dict[str, Any], symbol: Optional[str] = None) -> None:
+        """空间失效时丢弃其尚未触发的关键时间点 (堆中的条目在弹出时跳过，最后一个窗口结束后移除标记)。"""
+        space_key = self.space_key(space_info, symbol)
+        if space_key in self._registered:
+            self._forgotten.add(space_key)
+        self._due.pop(space_key, None)
+
+    def _advance(self, current_time_utc: datetime) -> None:
+        """弹出窗口起点不晚于当前时间的关键时间点，放入对应空间的待触发队列。"""
+        schedule = self._schedule
+        while schedule and schedule[0][0] <= current_time_utc:
+            _, _, space_key, hours, key_time_point = heapq.heappop(schedule)
+            if space_key in self._forgotten:
+                continue
+            self._due.setdefault(space_key, deque()).append((key_time_point + KEY_TIME_TOLERANCE, hours, key_time_point))
+        expiry = self._expiry
+        while expiry and expiry[0][0] < current_time_utc:
+            _, _, space_key = heapq.heappop(expiry)
+            self._registered.pop(space_key, None)
+            self._forgotten.discard(space_key)
+            self._due.pop(space_key, None)
+
+    def _consume(self, space_key: tuple, current_time_utc: datetime) -> Optional[Tuple[Any, datetime]]:
+        """取出空间窗口包含当前时间的第一个关键时间点 (窗口已结束的直接丢弃)。"""
+        queue = self._due.get(space_key)
+        while queue:
+            end, hours, key_time_point = queue.popleft()
+            if current_time_utc <= end:
+                if not queue:
+                    del self._due[space_key]
+                return hours, key_time_point
+        self._due.pop(space_key, None)
+        return None
+
+    def due_key_times(self, current_time_utc: datetime) -> List[Tuple[tuple, Any, datetime]]:
+        """
+        返回本K线触发的事件相对关键时间点 [(空间键 (见 space_key), 小时数, 关键时间点)]，每个空间至多一个
+        (相邻窗口在边界重叠时，后一个时间点在下一根K线触发)，返回的时间点即被消费。
+        开销与待触发的时间点数量成正比，与活跃空间数无关。
+        """
+        self._advance(current_time_utc)
+        fired = []
+        for space_key in list(self._due):
+            hit = self._consume(space_key, current_time_utc)
+            if hit is not None:
+                fired.append((space_key, hit[0], hit[1]))
+                if self.logger.info_enabled:
+                    self.logger.info(f"关键时间点触发: 事件发生后{hit[0]}小时 | 品种:{space_key[1]} | 空间ID:{space_key[0]}")
+        return fired
     
+    def bar_key_times(self, current_time_utc: datetime) -> Dict[tuple, datetime]:
+        """
+        本K线触发的 {空间键: 关键时间点}。每根K线只调用一次 due_key_times，同一时间的重复调用返回同一结果，
+        策略对每个空间只需 result.get(space_key(space))。
+        """
+        bar_time, hits = self._bar_hits
+        if bar_time is None or bar_time != current_time_utc:
+            hits = {space_key: point for space_key, _, point in self.due_key_times(current_time_utc)}
+            self._bar_hits = (current_time_utc, hits)
+        return hits
+
     def is_key_time(self, 
                     current_time_utc: datetime, 
                     space_info: Dict[str, Any],
@@ -59,7 +191,7 @@ class KeyTimeDetector:
         Args:
             current_time_utc: 当前UTC时间
             space_info: 空间信息字典，含 event_data 和 creation_time
-            key_time_hours_after_event: 事件发生后的关键小时列表，如 [1, 2, 4]
+            key_time_hours_after_event: 事件发生后的关键小时列表，如 [1, 2, 4]；空间须已经 register_space 登记
             fixed_key_times: 固定关键时间段配置列表，例如:
                 [{"start":"08:00", "end":"09:00", "tz":"Europe/London", "days_of_week":[0,1,2,3,4]}]
         
@@ -72,36 +204,27 @@ class KeyTimeDetector:
         
         event_data_dict = space_info.get('event_data')
         if not isinstance(event_data_dict, dict):
-            self.logger.debug(f"is_key_time: Expected space_info['event_data'] to be a dict, got {type(event_data_dict)}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"is_key_time: Expected space_info['event_data'] to be a dict, got {type(event_data_dict)}")
             return None
             
         symbol = event_data_dict.get('symbol')
         if not symbol:
-            self.logger.debug(f"is_key_time: 'symbol' not found in space_info['event_data']: {event_data_dict}")
+            if self.logger.debug_enabled:
+                self.logger.debug(f"is_key_time: 'symbol' not found in space_info['event_data']: {event_data_dict}")
             return None
         
-        # 获取空间创建时间（事件发生时间）
-        creation_time = space_info['creation_time']
-        space_id = space_info.get('space_id', 'unknown')
+        space_id = space_info.get('space_id', space_info.get('id', 'unknown'))
         
-        # 1. 检查事件发生后特定小时数
+        # 1. 检查事件发生后特定小时数 (只查看已登记空间已到期的时间点)
         if key_time_hours_after_event:
-            for hours in key_time_hours_after_event:
-                # 计算关键时间点
-                key_time_point = creation_time + timedelta(hours=hours)
-                
-                # 确定唯一触发键
-                trigger_key = (space_id, symbol, hours)
-                
-                # 检查当前时间是否在关键时间点的±30分钟范围内
-                time_diff = abs((current_time_utc - key_time_point).total_seconds() / 60)
-                
-                if time_diff <= 30 and not self._triggered_key_times.get(trigger_key, False):
-                    self.logger.info(f"关键时间点触发: 事件发生后{hours}小时 | 品种:{symbol} | 空间ID:{space_id}")
-                    # 标记该关键时间点已触发
-                    self._triggered_key_times[trigger_key] = True
-                    # 返回关键时间点
-                    return key_time_point
+            self._advance(current_time_utc)
+            hit = self._consume(self.space_key(space_info, symbol), current_time_utc)
+            if hit is not None:
+                hours, key_time_point = hit
+                self.logger.info(f"关键时间点触发: 事件发生后{hours}小时 | 品种:{symbol} | 空间ID:{space_id}")
+                # 返回关键时间点
+                return key_time_point
         
         # 2. 检查固定关键时间段
         if fixed_key_times:
@@ -146,15 +269,19 @@ class KeyTimeDetector:
                     utc_start = local_start.astimezone(pytz.UTC)
                     utc_end = local_end.astimezone(pytz.UTC)
                     
-                    # 确定唯一触发键
+                    # 确定唯一触发键 (按日期分组，只保留当天的标记)
                     rule_desc = f"{start_time_str}-{end_time_str}_{timezone_str}"
-                    trigger_key = (space_id, symbol, rule_desc, current_time_utc.date())
+                    trigger_date = current_time_utc.date()
+                    if trigger_date not in self._triggered_fixed:
+                        self._triggered_fixed = {trigger_date: set()}
+                    triggered_today = self._triggered_fixed[trigger_date]
+                    trigger_key = (space_id, symbol, rule_desc)
                     
                     # 检查当前时间是否在时间段内
-                    if utc_start <= current_time_utc <= utc_end and not self._triggered_key_times.get(trigger_key, False):
+                    if utc_start <= current_time_utc <= utc_end and trigger_key not in triggered_today:
                         self.logger.info(f"固定关键时间段触发: {start_time_str}-{end_time_str} ({timezone_str}) | 品种:{symbol} | 空间ID:{space_id}")
                         # 标记该关键时间点已触发
-                        self._triggered_key_times[trigger_key] = True
+                        triggered_today.add(trigger_key)
                         # 返回关键时间段的开始时间作为触发点
                         return utc_start
                         
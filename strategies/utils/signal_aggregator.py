@@ -1,53 +1,154 @@
 # strategies/utils/signal_aggregator.py
 # 跨策略信号聚合工具
 
+import math
+from bisect import insort
+from collections import Counter, deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple, Set
+from typing import Callable, Dict, List, Any, Optional
 import pandas as pd
 
+from core.fast_logging import as_fast_logger
+from strategies.core.records import SignalRecord, to_ns
+
+ACTIONS = ("BUY", "SELL")
+
+
+class _SignalWindow:
+    """
+    一个 (品种, 动作) 的信号: 按时间排序的保留队列，以及共振时间窗口内信号的队列、权重累加和与各策略的信号数。
+    时间前进时只从两个队列的头部移除过期信号，共振检查与已累积的信号数量无关。
+    窗口权重在窗口内容变化时用 math.fsum 对窗口内的信号重新求和 (开销与窗口内信号数成正比)，
+    而不是逐个加减: 例如依次加入 0.8、0.8、0.4、0.8 再移出第一个 0.8，逐个加减得到 1.9999999999999998，会错过阈值 2.0。
+    信号为 SignalRecord，时间比较直接使用其纳秒整数 timestamp 属性；window_start 和各截止时间也是 UTC 纳秒。
+    """
+
+    __slots__ = ('signals', 'window', 'weight', 'strategy_counts', 'window_start')
+
+    def __init__(self):
+        self.signals: deque = deque() # 保留期内的全部信号
+        self.window: deque = deque() # 时间不早于 window_start 的信号
+        self.weight = 0.0
+        self.strategy_counts: Counter = Counter()
+        self.window_start = None
+
+    def add(self, signal: SignalRecord):
+        ts = signal.timestamp
+        if self.signals and ts < self.signals[-1].timestamp:
+            insort(self.signals, signal, key=lambda s: s.timestamp) # 乱序提交的信号按时间插入
+        else:
+            self.signals.append(signal)
+        if self.window_start is None or ts >= self.window_start:
+            if self.window and ts < self.window[-1].timestamp:
+                insort(self.window, signal, key=lambda s: s.timestamp)
+            else:
+                self.window.append(signal)
+            self.weight = math.fsum(s.weight for s in self.window)
+            self.strategy_counts[signal.strategy] += 1
+
+    def _trim_window(self, cutoff: int):
+        """从窗口头部移除早于 cutoff 的信号；有信号移除时重新求和窗口权重。"""
+        window = self.window
+        if not window or window[0].timestamp >= cutoff:
+            return
+        while window and window[0].timestamp < cutoff:
+            expired = window.popleft()
+            self.strategy_counts[expired.strategy] -= 1
+            if not self.strategy_counts[expired.strategy]:
+                del self.strategy_counts[expired.strategy]
+        self.weight = math.fsum(s.weight for s in window)
+
+    def advance(self, window_start: int):
+        """把共振窗口的起点前移到 window_start (起点后退时从保留队列重建窗口)。"""
+        if self.window_start is not None and window_start < self.window_start:
+            self.window = deque(s for s in self.signals if s.timestamp >= window_start)
+            self.weight = math.fsum(s.weight for s in self.window)
+            self.strategy_counts = Counter(s.strategy for s in self.window)
+        else:
+            self._trim_window(window_start)
+        self.window_start = window_start
+
+    def evict(self, retain_cutoff: int) -> int:
+        """移除早于 retain_cutoff 的保留信号 (窗口中的同样移除)，返回移除数量。"""
+        removed = 0
+        while self.signals and self.signals[0].timestamp < retain_cutoff:
+            self.signals.popleft()
+            removed += 1
+        if removed:
+            self._trim_window(retain_cutoff)
+        return removed
+
+    def since(self, cutoff: int) -> List[SignalRecord]:
+        """时间不早于 cutoff 的信号 (从尾部向前扫描，开销与结果数量成正比)。"""
+        result = []
+        for signal in reversed(self.signals):
+            if signal.timestamp < cutoff:
+                break
+            result.append(signal)
+        result.reverse()
+        return result
+
+    @property
+    def strategies(self) -> List[str]:
+        return list(self.strategy_counts)
+
 
 class SignalAggregator:
     """
     跨策略信号聚合器，用于集中管理各策略生成的信号并识别共振
     """
-    
-    def __init__(self, logger, config=None):
+
+    def __init__(self, logger, config=None, on_resonance: Optional[Callable[[str, Dict[str, Any]], None]] = None):
         """
         初始化信号聚合器
-        
+
         Args:
             logger: 日志记录器
             config: 配置字典，包含信号聚合相关参数
+            on_resonance: 共振回调 callback(symbol, {'action', 'weight', 'strategies', 'time'})，
+                          品种的共振方向发生变化 (权重越过阈值) 时调用一次
         """
-        self.logger = logger
+        self.logger = as_fast_logger(logger, __name__) # 缓存级别开关，热路径上的 debug 不构建字符串
         self.config = config or {}
-        
+
         # 策略权重，默认所有策略权重相等
         self.strategy_weights = self.config.get("strategy_weights", {})
-        
+
         # 默认策略权重值
         self.default_strategy_weight = self.config.get("default_strategy_weight", 1.0)
-        
+
         # 共振时间窗口（分钟）
         self.resonance_time_window_minutes = self.config.get("resonance_time_window_minutes", 120)
-        
+
         # 共振阈值（权重）
         self.resonance_threshold = self.config.get("resonance_threshold", 2.0)
-        
+
         # 信号保留时间（小时）
         self.signal_retain_hours = self.config.get("signal_retain_hours", 48)
-        
-        # 信号存储，格式为 {symbol: {action: [{timestamp, strategy, weight}, ...]}
-        self._signals = {}
-        
+
+        # 信号存储，格式为 {symbol: {action: _SignalWindow}}
+        self._signals: Dict[str, Dict[str, _SignalWindow]] = {}
+
+        # 共振回调，以及每个品种当前的共振方向 (用于只在越过阈值时触发)
+        self._resonance_callbacks: List[Callable[[str, Dict[str, Any]], None]] = []
+        if on_resonance is not None:
+            self._resonance_callbacks.append(on_resonance)
+        self._resonating: Dict[str, Optional[str]] = {}
+        # 已见过的最新时间，信号提交时窗口只向前推进
+        self._latest_time = None
+
         self.logger.info("信号聚合器初始化完成")
-    
-    def submit_signal(self, strategy_name: str, symbol: str, action: str, 
-                     timestamp: datetime, confidence: float = 1.0, 
+
+    def on_resonance(self, callback: Callable[[str, Dict[str, Any]], None]) -> None:
+        """注册共振回调 callback(symbol, {'action', 'weight', 'strategies', 'time'})。"""
+        self._resonance_callbacks.append(callback)
+
+    def submit_signal(self, strategy_name: str, symbol: str, action: str,
+                     timestamp: datetime, confidence: float = 1.0,
                      metadata: Dict[str, Any] = None) -> None:
         """
         提交一个交易信号到聚合器
-        
+
         Args:
             strategy_name: 策略名称
             symbol: 交易品种
@@ -56,144 +157,141 @@ class SignalAggregator:
             confidence: 信号置信度（0-1）
             metadata: 信号附加元数据
         """
-        if action not in ["BUY", "SELL"]:
+        if action not in ACTIONS:
             self.logger.warning(f"无效的交易动作: {action}，必须是 'BUY' 或 'SELL'")
             return
-        
+
         # 获取策略权重
         weight = self.strategy_weights.get(strategy_name, self.default_strategy_weight)
-        
+
         # 调整权重根据置信度
         adjusted_weight = weight * confidence
-        
-        # 初始化品种和动作的信号列表
+
+        # 初始化品种和动作的信号队列
         if symbol not in self._signals:
-            self._signals[symbol] = {"BUY": [], "SELL": []}
-            
-        # 添加信号
-        signal = {
-            "timestamp": timestamp,
-            "strategy": strategy_name,
-            "weight": adjusted_weight,
-            "metadata": metadata or {}
-        }
-        
-        self._signals[symbol][action].append(signal)
-        self.logger.debug(f"添加信号: {strategy_name} 对 {symbol} 生成 {action} 信号，权重 {adjusted_weight:.2f}")
-    
+            self._signals[symbol] = {a: _SignalWindow() for a in ACTIONS}
+
+        # 添加信号 (naive 时间视为 UTC)
+        signal = SignalRecord(timestamp=timestamp, strategy=strategy_name, weight=adjusted_weight,
+                              metadata=metadata or {})
+
+        self._signals[symbol][action].add(signal)
+        if self.logger.debug_enabled:
+            self.logger.debug(f"添加信号: {strategy_name} 对 {symbol} 生成 {action} 信号，权重 {adjusted_weight:.2f}")
+
+        if self._resonance_callbacks:
+            if self._latest_time is None or timestamp > self._latest_time:
+                self._latest_time = timestamp
+            self._evaluate_symbol(symbol, self._latest_time)
+
     def check_resonance(self, current_time: datetime) -> Dict[str, Dict[str, Any]]:
         """
         检查当前是否存在共振信号
-        
+
         Args:
             current_time: 当前时间
-            
+
         Returns:
             共振信号字典 {symbol: {'action': 'BUY'/'SELL', 'weight': float, 'strategies': list}}
         """
+        if self._latest_time is None or current_time > self._latest_time:
+            self._latest_time = current_time
         resonant_signals = {}
-        time_window = timedelta(minutes=self.resonance_time_window_minutes)
-        
+
         # 遍历所有品种
-        for symbol, actions in self._signals.items():
-            # 检查买入信号
-            buy_signals = [s for s in actions["BUY"] if 
-                          (current_time - s["timestamp"]) <= time_window]
-            
-            # 检查卖出信号
-            sell_signals = [s for s in actions["SELL"] if 
-                           (current_time - s["timestamp"]) <= time_window]
-            
-            # 计算买入权重和卖出权重
-            buy_weight = sum(s["weight"] for s in buy_signals)
-            sell_weight = sum(s["weight"] for s in sell_signals)
-            
-            # 检查是否满足共振阈值
-            if buy_weight >= self.resonance_threshold and buy_weight > sell_weight:
-                resonant_signals[symbol] = {
-                    "action": "BUY",
-                    "weight": buy_weight,
-                    "strategies": list(set(s["strategy"] for s in buy_signals))
-                }
-                self.logger.info(f"检测到买入共振信号: {symbol}，权重 {buy_weight:.2f}，策略 {resonant_signals[symbol]['strategies']}")
-            
-            elif sell_weight >= self.resonance_threshold and sell_weight > buy_weight:
-                resonant_signals[symbol] = {
-                    "action": "SELL",
-                    "weight": sell_weight,
-                    "strategies": list(set(s["strategy"] for s in sell_signals))
-                }
-                self.logger.info(f"检测到卖出共振信号: {symbol}，权重 {sell_weight:.2f}，策略 {resonant_signals[symbol]['strategies']}")
-        
+        for symbol in self._signals:
+            resonance = self._evaluate_symbol(symbol, current_time)
+            if resonance is not None:
+                resonant_signals[symbol] = resonance
+                # 共振持续期间每个时间点都会命中，按 logging.sample_every 采样输出
+                if self.logger.info_enabled and self.logger.sampled(f"resonance:{symbol}:{resonance['action']}"):
+                    label = "买入" if resonance["action"] == "BUY" else "卖出"
+                    self.logger.info(f"检测到{label}共振信号: {symbol}，权重 {resonance['weight']:.2f}，策略 {resonance['strategies']}")
+
         return resonant_signals
-    
+
+    def _evaluate_symbol(self, symbol: str, current_time: datetime) -> Optional[Dict[str, Any]]:
+        """推进品种的共振窗口并判断共振；共振方向变化时触发回调。"""
+        window_start = to_ns(current_time - timedelta(minutes=self.resonance_time_window_minutes))
+        buy, sell = self._signals[symbol]["BUY"], self._signals[symbol]["SELL"]
+        buy.advance(window_start)
+        sell.advance(window_start)
+
+        # 检查是否满足共振阈值
+        resonance = None
+        if buy.weight >= self.resonance_threshold and buy.weight > sell.weight:
+            resonance = {"action": "BUY", "weight": buy.weight, "strategies": buy.strategies}
+        elif sell.weight >= self.resonance_threshold and sell.weight > buy.weight:
+            resonance = {"action": "SELL", "weight": sell.weight, "strategies": sell.strategies}
+
+        action = resonance["action"] if resonance else None
+        if action != self._resonating.get(symbol):
+            self._resonating[symbol] = action
+            if resonance is not None:
+                for callback in self._resonance_callbacks:
+                    try:
+                        callback(symbol, {**resonance, "time": current_time})
+                    except Exception as e:
+                        self.logger.error(f"共振回调处理 {symbol} {action} 时出错: {e}", exc_info=True)
+        return resonance
+
     def clean_old_signals(self, current_time: Optional[datetime] = None) -> None:
         """
         清理过期的信号
-        
+
         Args:
             current_time: 当前时间，如果为None则使用当前系统时间
         """
         if current_time is None:
-            current_time = datetime.now()
-            
-        retain_cutoff = current_time - timedelta(hours=self.signal_retain_hours)
-        
+            current_time = pd.Timestamp.now(tz='UTC')
+
+        retain_cutoff = to_ns(current_time - timedelta(hours=self.signal_retain_hours))
+
         for symbol in list(self._signals.keys()):
-            for action in ["BUY", "SELL"]:
-                if symbol in self._signals and action in self._signals[symbol]:
-                    # 筛选保留的信号
-                    original_count = len(self._signals[symbol][action])
-                    self._signals[symbol][action] = [
-                        s for s in self._signals[symbol][action] 
-                        if s["timestamp"] >= retain_cutoff
-                    ]
-                    removed_count = original_count - len(self._signals[symbol][action])
-                    
-                    if removed_count > 0:
-                        self.logger.debug(f"清理 {symbol} {action} 共 {removed_count} 个过期信号")
-            
+            windows = self._signals[symbol]
+            for action in ACTIONS:
+                removed_count = windows[action].evict(retain_cutoff)
+                if removed_count > 0 and self.logger.debug_enabled:
+                    self.logger.debug(f"清理 {symbol} {action} 共 {removed_count} 个过期信号")
+
             # 如果某个品种的信号列表为空，则移除该品种
-            if all(not self._signals[symbol][action] for action in ["BUY", "SELL"]):
+            if all(not windows[action].signals for action in ACTIONS):
                 del self._signals[symbol]
-                self.logger.debug(f"移除品种 {symbol} 空信号列表")
-    
+                self._resonating.pop(symbol, None)
+                if self.logger.debug_enabled:
+                    self.logger.debug(f"移除品种 {symbol} 空信号列表")
+
     def get_signals_for_symbol(self, symbol: str, window_minutes: Optional[int] = None,
                              current_time: Optional[datetime] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
         获取指定品种的信号
-        
+
         Args:
             symbol: 交易品种
             window_minutes: 时间窗口（分钟），仅返回时间窗口内的信号，None表示返回所有信号
             current_time: 当前时间，如果为None则使用当前系统时间
-            
+
         Returns:
-            信号字典 {"BUY": [...], "SELL": [...]}
+            信号字典 {"BUY": [...], "SELL": [...]}，信号为 SignalRecord (可按字典读取，timestamp 为 UTC Timestamp)
         """
         if symbol not in self._signals:
             return {"BUY": [], "SELL": []}
-        
+
         if window_minutes is None:
-            return self._signals[symbol]
-        
+            return {action: list(self._signals[symbol][action].signals) for action in ACTIONS}
+
         if current_time is None:
-            current_time = datetime.now()
-            
-        time_window = timedelta(minutes=window_minutes)
-        
-        result = {"BUY": [], "SELL": []}
-        for action in ["BUY", "SELL"]:
-            result[action] = [s for s in self._signals[symbol][action] 
-                             if (current_time - s["timestamp"]) <= time_window]
-            
-        return result
-    
+            current_time = pd.Timestamp.now(tz='UTC')
+
+        cutoff = to_ns(current_time - timedelta(minutes=window_minutes))
+        return {action: self._signals[symbol][action].since(cutoff) for action in ACTIONS}
+
     def get_all_signals(self) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
         """
         获取所有信号
-        
+
         Returns:
             所有信号 {symbol: {"BUY": [...], "SELL": [...]}}
         """
-        return self._signals 
\ No newline at end of file
+        return {symbol: {action: list(windows[action].signals) for action in ACTIONS}
+                for symbol, windows in self._signals.items()}